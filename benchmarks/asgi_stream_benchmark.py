@@ -0,0 +1,268 @@
+#!/usr/bin/env python
+"""
+Prueba de streams SSE abiertos: servidor Flask con hilos frente a ASGI.
+
+Un servidor local imita la API de chat de LM Studio: envía el primer
+fragmento en cuanto recibe la petición y mantiene el stream abierto (sin
+enviar nada) durante --hold segundos, como un modelo lento o una respuesta
+larga. Para cada servidor (en un proceso nuevo y un directorio de trabajo
+temporal, nuevos en cada nivel de concurrencia) se abren N conexiones a
+/agent/chat/stream y, con todas esperando a mitad de respuesta, se mide:
+
+- los streams que reciben su primer fragmento antes de --timeout y el tiempo
+  hasta ese fragmento;
+- la memoria (RSS) y los hilos del proceso servidor, y la memoria por stream
+  abierto respecto al servidor en reposo;
+- la latencia de una petición corta (/project/info) con los streams abiertos.
+
+Servidores:
+- hilos: app.run(threaded=True), el servidor de python src/app.py;
+- asgi: uvicorn --factory asgi:create_asgi_app (requiere asgiref, uvicorn y httpx).
+
+Uso:
+    python benchmarks/asgi_stream_benchmark.py
+    python benchmarks/asgi_stream_benchmark.py --streams 200 1000 2000 --hold 20
+"""
+import os
+import sys
+import json
+import time
+import socket
+import shutil
+import asyncio
+import argparse
+import resource
+import tempfile
+import subprocess
+from typing import Any, Dict, List, Optional
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC_DIR = os.path.join(ROOT_DIR, 'src')
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from context_journal_benchmark import percentile
+
+SERVERS = {
+    'hilos': [sys.executable, '-c',
+              "import sys, app; app.create_app().run(host='127.0.0.1', port=int(sys.argv[1]), threaded=True)"],
+    'asgi': [sys.executable, '-m', 'uvicorn', '--factory', 'asgi:create_asgi_app', '--app-dir', SRC_DIR,
+             '--host', '127.0.0.1', '--no-access-log', '--port'],
+}
+
+
+def free_port() -> int:
+    """
+    Devuelve un puerto TCP libre.
+    """
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def sse_chunk(data: bytes) -> bytes:
+    """
+    Codifica un fragmento de una respuesta chunked.
+    """
+    return b'%x\r\n%s\r\n' % (len(data), data)
+
+
+async def start_llm_stub(port: int, hold: float) -> asyncio.AbstractServer:
+    """
+    Arranca la imitación de la API de chat que mantiene los streams abiertos.
+    """
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                head = await reader.readuntil(b'\r\n\r\n')
+                length = 0
+                for line in head.split(b'\r\n'):
+                    if line.lower().startswith(b'content-length:'):
+                        length = int(line.split(b':', 1)[1])
+                await reader.readexactly(length)
+                if head.startswith(b'GET'):
+                    writer.write(b'HTTP/1.1 200 OK\r\nContent-Length: 11\r\n\r\n{"data":[]}')
+                    continue
+                writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nTransfer-Encoding: chunked\r\n\r\n')
+                delta = json.dumps({'choices': [{'delta': {'content': 'Hola'}}]})
+                writer.write(sse_chunk(f"data: {delta}\n\n".encode()))
+                await writer.drain()
+                await asyncio.sleep(hold)
+                writer.write(sse_chunk(b'data: [DONE]\n\n') + b'0\r\n\r\n')
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+            # CancelledError: streams que siguen abiertos al terminar la prueba
+            pass
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle, '127.0.0.1', port, backlog=4096)
+
+
+def read_status(pid: int) -> Dict[str, int]:
+    """
+    Lee la memoria residente (KB) y los hilos de un proceso en /proc.
+    """
+    values = {}
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            if line.startswith('VmRSS:'):
+                values['rss_kb'] = int(line.split()[1])
+            elif line.startswith('Threads:'):
+                values['threads'] = int(line.split()[1])
+    return values
+
+
+async def http_get(port: int, path: str) -> float:
+    """
+    Hace una petición GET corta y devuelve su latencia en milisegundos.
+    """
+    start = time.perf_counter()
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nConnection: close\r\n\r\n".encode())
+    await writer.drain()
+    await reader.read()
+    writer.close()
+    return (time.perf_counter() - start) * 1000
+
+
+async def open_stream(port: int, opened: List[float], streams: List[asyncio.StreamWriter]) -> None:
+    """
+    Abre un stream y espera a su primer fragmento; la conexión queda abierta.
+    """
+    start = time.perf_counter()
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    streams.append(writer)
+    writer.write(b"GET /agent/chat/stream?message=hola HTTP/1.1\r\nHost: 127.0.0.1\r\n"
+                 b"Accept: text/event-stream\r\n\r\n")
+    await writer.drain()
+    buffered = b''
+    while b'"token"' not in buffered:
+        data = await reader.read(4096)
+        if not data:
+            return
+        buffered += data
+    opened.append((time.perf_counter() - start) * 1000)
+
+
+async def wait_for_server(port: int, timeout: float = 30.0) -> None:
+    """
+    Espera a que el servidor acepte peticiones.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            await http_get(port, '/project/info')
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.2)
+
+
+async def measure_level(server: subprocess.Popen, port: int, count: int, timeout: float) -> Dict[str, Any]:
+    """
+    Abre count streams a la vez y mide el servidor con todos abiertos.
+    """
+    baseline = read_status(server.pid)
+    opened: List[float] = []
+    streams: List[asyncio.StreamWriter] = []
+    start = time.perf_counter()
+    tasks = [asyncio.ensure_future(open_stream(port, opened, streams)) for _ in range(count)]
+    await asyncio.wait(tasks, timeout=timeout)
+    elapsed = time.perf_counter() - start
+    status = read_status(server.pid)
+    probe = []
+    for _ in range(5):
+        try:
+            probe.append(await asyncio.wait_for(http_get(port, '/project/info'), timeout))
+        except asyncio.TimeoutError:
+            break
+
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    for writer in streams:
+        writer.close()
+    delta = status['rss_kb'] - baseline['rss_kb']
+    return {'opened': len(opened), 'seconds': elapsed, 'ttft_p50': percentile(opened, 50) if opened else None,
+            'ttft_p99': percentile(opened, 99) if opened else None, 'rss_mb': status['rss_kb'] / 1024,
+            'kb_per_stream': delta / len(opened) if opened else None, 'threads': status['threads'],
+            'probe_ms': percentile(probe, 50) if probe else None}
+
+
+async def run_server(name: str, count: int, llm_port: int, timeout: float) -> Optional[Dict[str, Any]]:
+    """
+    Arranca un servidor nuevo y mide un nivel de concurrencia.
+    """
+    workdir = tempfile.mkdtemp(prefix='asgi_stream_bench_')
+    port = free_port()
+    env = dict(os.environ, PYTHONPATH=SRC_DIR, PYTHONDONTWRITEBYTECODE='1', LM_STUDIO_URL=f"http://127.0.0.1:{llm_port}",
+               LEADS_DB_PATH=os.path.join(workdir, 'data', 'leads.db'), CONTEXT_MAINTENANCE_INTERVAL='0')
+    server = subprocess.Popen(SERVERS[name] + [str(port)], cwd=workdir, env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        await wait_for_server(port)
+        # Una conversación completa antes de medir: carga módulos y crea las bases de datos
+        warmup: List[asyncio.StreamWriter] = []
+        await asyncio.wait_for(open_stream(port, [], warmup), timeout)
+        warmup[0].close()
+        return await measure_level(server, port, count, timeout)
+    except (OSError, asyncio.TimeoutError) as e:
+        print(f"    {name}: el servidor no responde ({e})")
+        return None
+    finally:
+        server.terminate()
+        server.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+async def main_async(args: argparse.Namespace) -> int:
+    """
+    Ejecuta la prueba con los dos servidores.
+    """
+    llm_port = free_port()
+    stub = await start_llm_stub(llm_port, args.hold)
+    failed = False
+    try:
+        for name in ('hilos', 'asgi'):
+            print(f"\n{name}:")
+            for count in args.streams:
+                result = await run_server(name, count, llm_port, args.timeout)
+                if result is None:
+                    failed = True
+                    break
+                ttft = (f"primer fragmento p50 {result['ttft_p50']:.0f} ms, p99 {result['ttft_p99']:.0f} ms"
+                        if result['opened'] else "ningún fragmento")
+                probe = f"{result['probe_ms']:.0f} ms" if result['probe_ms'] is not None else "sin respuesta"
+                per_stream = f"{result['kb_per_stream']:.0f} KB/stream" if result['kb_per_stream'] is not None else "-"
+                print(f"    {count:>5} streams: {result['opened']} abiertos en {result['seconds']:.1f}s, {ttft}; "
+                      f"RSS {result['rss_mb']:.0f} MB ({per_stream}), {result['threads']} hilos; "
+                      f"/project/info {probe}")
+                if name == 'asgi' and result['opened'] < count:
+                    failed = True
+    finally:
+        stub.close()
+    return 1 if failed else 0
+
+
+def main() -> int:
+    """
+    Punto de entrada de la prueba.
+
+    Returns:
+        Código de salida (1 si el servidor ASGI no mantiene todos los streams abiertos)
+    """
+    parser = argparse.ArgumentParser(description="Streams SSE abiertos: hilos frente a ASGI")
+    parser.add_argument('--streams', type=int, nargs='+', default=[100, 500, 1000], help='Streams simultáneos por nivel')
+    parser.add_argument('--hold', type=float, default=15.0, help='Segundos que LM Studio mantiene abierto cada stream')
+    parser.add_argument('--timeout', type=float, default=10.0, help='Segundos para abrir los streams de un nivel')
+    args = parser.parse_args()
+
+    # Cada stream usa varios descriptores (cliente, servidor y LM Studio)
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    return asyncio.run(main_async(args))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
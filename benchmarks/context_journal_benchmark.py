@@ -0,0 +1,222 @@
+#!/usr/bin/env python
+"""
+Prueba de bytes escritos por turno al persistir contextos de conversación.
+
+Simula conversaciones en las que, como en AgentManager._process_with_agent,
+se guarda el contexto completo después de cada respuesta, y compara:
+
+- json: un archivo JSON con sangría por guardado (formato original)
+- sqlite: una instantánea completa por guardado (diario desactivado)
+- diario: deltas de solo anexado con compactación periódica
+
+Para cada modo muestra los bytes escritos por turno (medio y del último
+turno), el total, la latencia de save_context y de load_context, y
+comprueba que el contexto cargado coincide con el último guardado.
+
+Uso:
+    python benchmarks/context_journal_benchmark.py
+    python benchmarks/context_journal_benchmark.py --turns 500 --sessions 20 --compact-every 50
+"""
+import os
+import sys
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+from typing import Dict, Any, List, Tuple
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, 'src'))
+
+from utils.context_manager import ContextPersistenceManager
+from utils.context_store import SqliteContextStore, JsonFileContextStore
+from utils.sentiment_state import new_sentiment_state, update_sentiment_state
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """
+    Calcula un percentil por el método del rango más cercano.
+
+    Args:
+        values: Valores a evaluar
+        pct: Percentil entre 0 y 100
+
+    Returns:
+        Valor del percentil o 0.0 si no hay valores
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def new_context(user_id: str, session_number: int) -> Dict[str, Any]:
+    """
+    Crea el contexto inicial de una sesión con la forma que usa AgentManager.
+
+    Args:
+        user_id: Identificador del usuario
+        session_number: Número de la sesión
+
+    Returns:
+        Contexto de conversación
+    """
+    return {
+        'session_id': f"{user_id}-session{session_number}",
+        'user_id': user_id,
+        'message_count': 0,
+        'current_agent': None,
+        'previous_agent': None,
+        'user_info': {},
+        'project_info': {},
+        'messages': [],
+        'sentiment_state': new_sentiment_state()
+    }
+
+
+def advance_turn(context: Dict[str, Any], turn: int) -> None:
+    """
+    Aplica un turno de conversación: mensaje del usuario, análisis y respuesta.
+
+    Args:
+        context: Contexto a modificar
+        turn: Número de turno
+    """
+    context['message_count'] += 1
+    analysis = {'polarity': 0.1 * (turn % 7 - 3), 'urgency': 0.2 * (turn % 4),
+                'dominant_emotion': ('interest', 'frustration', None)[turn % 3]}
+    update_sentiment_state(context['sentiment_state'], analysis, context['message_count'])
+    context['current_sentiment'] = analysis
+    context['messages'].append({'role': 'user', 'content': f"Pregunta {turn} sobre la centralita virtual y sus precios"})
+    context['previous_agent'] = context['current_agent']
+    context['current_agent'] = ('SalesAgent', 'EngineerAgent')[turn % 2]
+    context['messages'].append({
+        'role': 'assistant',
+        'content': "La Centralita Virtual de Alisys permite gestionar llamadas desde la nube. " * 6,
+        'agent': context['current_agent']
+    })
+    if turn == 3:
+        context['project_info'] = {'interest': 'centralita', 'company': 'Ejemplo S.L.'}
+    if turn % 50 == 49:
+        # Edición de un mensaje anterior: el delta debe registrar la lista completa
+        context['messages'][turn // 2]['content'] += " (editado)"
+
+
+def measure_save(manager: ContextPersistenceManager, user_id: str, context: Dict[str, Any]) -> Tuple[float, int]:
+    """
+    Guarda el contexto y mide la latencia y los bytes de datos escritos.
+
+    En SQLite los bytes salen de los contadores del almacén; en JSON, del
+    tamaño del archivo que acaba de escribirse.
+
+    Args:
+        manager: Gestor de persistencia
+        user_id: Identificador del usuario
+        context: Contexto a guardar
+
+    Returns:
+        Tupla (latencia en milisegundos, bytes escritos)
+    """
+    store = manager.store
+    sqlite_store = isinstance(store, SqliteContextStore)
+    before = store.get_stats()['bytes_written'] if sqlite_store else 0
+    start = time.perf_counter()
+    manager.save_context(user_id, context)
+    latency = (time.perf_counter() - start) * 1000
+    if sqlite_store:
+        return latency, store.get_stats()['bytes_written'] - before
+    return latency, os.path.getsize(manager.list_user_sessions(user_id)[0]['file_path'])
+
+
+def run_mode(mode: str, workdir: str, sessions: int, turns: int, compact_every: int) -> Dict[str, Any]:
+    """
+    Ejecuta las conversaciones con un modo de persistencia.
+
+    Args:
+        mode: 'json', 'sqlite' o 'diario'
+        workdir: Directorio temporal de trabajo
+        sessions: Conversaciones simuladas
+        turns: Turnos por conversación
+        compact_every: Deltas antes de compactar (modo diario)
+
+    Returns:
+        Métricas del modo
+    """
+    storage_dir = os.path.join(workdir, mode)
+    if mode == 'json':
+        store = JsonFileContextStore(storage_dir)
+    else:
+        store = SqliteContextStore(os.path.join(storage_dir, 'contexts.db'),
+                                   compact_every if mode == 'diario' else 0)
+    manager = ContextPersistenceManager(storage_dir, store=store)
+
+    per_turn_bytes = [0] * turns
+    save_latencies = []
+    load_latencies = []
+    mismatches = 0
+    for session in range(sessions):
+        user_id = f"user{session}"
+        context = new_context(user_id, session)
+        for turn in range(turns):
+            advance_turn(context, turn)
+            latency, written = measure_save(manager, user_id, context)
+            save_latencies.append(latency)
+            per_turn_bytes[turn] += written
+
+        start = time.perf_counter()
+        loaded = manager.load_context(user_id)
+        load_latencies.append((time.perf_counter() - start) * 1000)
+        loaded.pop('_persistence_metadata', None)
+        if loaded != context:
+            mismatches += 1
+
+    total = sum(per_turn_bytes)
+    return {
+        'bytes_per_turn': total / (sessions * turns),
+        'last_turn_bytes': per_turn_bytes[-1] / sessions,
+        'total_mb': total / 1e6,
+        'save_p50_ms': percentile(save_latencies, 50),
+        'save_p99_ms': percentile(save_latencies, 99),
+        'load_p50_ms': percentile(load_latencies, 50),
+        'mismatches': mismatches
+    }
+
+
+def main() -> int:
+    """
+    Punto de entrada de la prueba de rendimiento.
+
+    Returns:
+        Código de salida (1 si algún contexto cargado no coincide)
+    """
+    parser = argparse.ArgumentParser(description="Bytes escritos por turno al persistir contextos")
+    parser.add_argument('--sessions', type=int, default=10, help='Conversaciones simuladas')
+    parser.add_argument('--turns', type=int, default=200, help='Turnos por conversación')
+    parser.add_argument('--compact-every', type=int, default=20, help='Deltas antes de compactar')
+    parser.add_argument('--modes', default='json,sqlite,diario', help='Modos a medir separados por comas')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR)
+    workdir = tempfile.mkdtemp(prefix='context_journal_bench_')
+    failed = False
+    try:
+        print(f"{args.sessions} conversaciones de {args.turns} turnos (compactación cada {args.compact_every} deltas)")
+        print("modo".ljust(8) + "bytes/turno".rjust(14) + "último turno".rjust(14) + "total (MB)".rjust(12)
+              + "save p50".rjust(10) + "save p99".rjust(10) + "load p50".rjust(10) + "  correcto")
+        for mode in args.modes.split(','):
+            result = run_mode(mode, workdir, args.sessions, args.turns, args.compact_every)
+            failed = failed or result['mismatches'] > 0
+            print(mode.ljust(8) + f"{result['bytes_per_turn']:.0f}".rjust(14)
+                  + f"{result['last_turn_bytes']:.0f}".rjust(14) + f"{result['total_mb']:.2f}".rjust(12)
+                  + f"{result['save_p50_ms']:.2f}".rjust(10) + f"{result['save_p99_ms']:.2f}".rjust(10)
+                  + f"{result['load_p50_ms']:.2f}".rjust(10)
+                  + ("  sí" if result['mismatches'] == 0 else f"  NO ({result['mismatches']})"))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,211 @@
+#!/usr/bin/env python
+"""
+Prueba del mantenimiento del almacén de contextos (compresión, retención y archivo).
+
+Llena un almacén con conversaciones simuladas, envejece una parte de las
+sesiones y ejecuta una pasada de mantenimiento. Muestra:
+
+- espacio de datos antes y después, y tamaño del archivo tras VACUUM;
+- ganancia del diccionario entrenado frente a comprimir sin diccionario;
+- latencia de load_latest antes y después (instantáneas comprimidas y
+  sesiones recuperadas del archivo);
+- que todos los usuarios cargan exactamente el mismo contexto que antes.
+
+Con --backend json se mide la retención del almacén de archivos JSON.
+
+Uso:
+    python benchmarks/context_maintenance_benchmark.py
+    python benchmarks/context_maintenance_benchmark.py --sessions 200 --turns 30 --journal
+    python benchmarks/context_maintenance_benchmark.py --backend json --max-mb-per-second 5
+"""
+import os
+import sys
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+from typing import Dict, Any, List
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, 'src'))
+
+from context_journal_benchmark import new_context, advance_turn, percentile
+from utils.context_manager import ContextPersistenceManager
+from utils.context_store import SqliteContextStore, JsonFileContextStore, _dumps
+from utils.context_maintenance import SqliteContextMaintenance, JsonContextMaintenance, format_report
+from utils.snapshot_codec import SnapshotCodec, resolve_codec, train_dictionary
+
+
+def fill_store(manager: ContextPersistenceManager, sessions: int, turns: int, restarts: int) -> List[str]:
+    """
+    Simula conversaciones guardando el contexto en cada turno.
+
+    Args:
+        manager: Gestor de persistencia
+        sessions: Conversaciones
+        turns: Turnos por conversación
+        restarts: Veces que se "reinicia el proceso" durante cada conversación
+            (cada reinicio crea una instantánea nueva de la sesión)
+
+    Returns:
+        Identificadores de usuario
+    """
+    users = []
+    store = manager.store
+    started = int(time.time())
+    for number in range(sessions):
+        user_id = f"user{number}"
+        users.append(user_id)
+        context = new_context(user_id, number)
+        for turn in range(turns):
+            advance_turn(context, turn)
+            if restarts and turn and turn % max(turns // (restarts + 1), 1) == 0 \
+                    and isinstance(store, SqliteContextStore):
+                store._journal_heads.clear()
+            if isinstance(store, JsonFileContextStore):
+                # Un archivo por turno: se simula el paso del tiempo en el nombre
+                filename = store.save(user_id, context)
+                os.rename(os.path.join(store.storage_dir, filename),
+                          os.path.join(store.storage_dir, f"{user_id}_{started - turns + turn}.json"))
+            else:
+                manager.save_context(user_id, context)
+    return users
+
+
+def age_sessions(store: Any, users: List[str], fraction: float, days: float) -> None:
+    """
+    Envejece una fracción de las sesiones para que superen el plazo de archivo.
+
+    Args:
+        store: Almacén de contextos
+        users: Usuarios simulados
+        fraction: Fracción de usuarios a envejecer
+        days: Días de antigüedad
+    """
+    aged = users[:int(len(users) * fraction)]
+    if isinstance(store, SqliteContextStore):
+        connection = store._get_connection()
+        with connection:
+            connection.executemany(
+                "UPDATE context_snapshots SET saved_at = saved_at - ? WHERE user_id = ?",
+                [(days * 86400, user_id) for user_id in aged]
+            )
+        return
+    for user_id in aged:
+        for filename in os.listdir(store.storage_dir):
+            if filename.startswith(f"{user_id}_") and filename.endswith('.json'):
+                timestamp = int(filename[len(user_id) + 1:-len('.json')])
+                os.rename(os.path.join(store.storage_dir, filename),
+                          os.path.join(store.storage_dir, f"{user_id}_{timestamp - int(days * 86400)}.json"))
+
+
+def load_all(manager: ContextPersistenceManager, users: List[str]) -> Dict[str, Any]:
+    """
+    Carga el último contexto de cada usuario y mide la latencia.
+
+    Returns:
+        Diccionario con los contextos y las latencias en milisegundos
+    """
+    contexts = {}
+    latencies = []
+    for user_id in users:
+        start = time.perf_counter()
+        contexts[user_id] = manager.store.load_latest(user_id)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return {'contexts': contexts, 'latencies': latencies}
+
+
+def dictionary_gain(contexts: List[Dict[str, Any]], dictionary_size: int) -> str:
+    """
+    Compara el tamaño comprimido con y sin diccionario entrenado.
+
+    Returns:
+        Resumen de la comparación
+    """
+    codec_name = resolve_codec('auto')
+    samples = [_dumps(context).encode('utf-8') for context in contexts]
+    half = len(samples) // 2
+    dictionary = train_dictionary(codec_name, samples[:half], dictionary_size)
+    tested = samples[half:]
+    raw = sum(len(sample) for sample in tested)
+    plain = sum(len(SnapshotCodec(codec_name).compress(sample)) for sample in tested)
+    trained = sum(len(SnapshotCodec(codec_name, dictionary).compress(sample)) for sample in tested)
+    return (f"{codec_name}: JSON {raw / 1e3:.0f} KB, sin diccionario {plain / 1e3:.0f} KB "
+            f"(x{raw / plain:.1f}), con diccionario de {len(dictionary)} bytes {trained / 1e3:.0f} KB "
+            f"(x{raw / trained:.1f})")
+
+
+def main() -> int:
+    """
+    Punto de entrada de la prueba.
+
+    Returns:
+        Código de salida (1 si algún contexto cambia tras el mantenimiento)
+    """
+    parser = argparse.ArgumentParser(description="Mantenimiento del almacén de contextos")
+    parser.add_argument('--backend', default='sqlite', choices=['sqlite', 'json'])
+    parser.add_argument('--sessions', type=int, default=100, help='Conversaciones simuladas')
+    parser.add_argument('--turns', type=int, default=20, help='Turnos por conversación')
+    parser.add_argument('--journal', action='store_true',
+                        help='Usar el diario de deltas (por defecto, una instantánea por guardado)')
+    parser.add_argument('--restarts', type=int, default=2, help='Reinicios simulados por conversación (diario)')
+    parser.add_argument('--keep', type=int, default=3, help='Instantáneas por sesión que se conservan')
+    parser.add_argument('--aged-fraction', type=float, default=0.3, help='Fracción de sesiones envejecidas')
+    parser.add_argument('--max-mb-per-second', type=float, default=0, help='Límite de E/S (0 = sin límite)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR)
+    workdir = tempfile.mkdtemp(prefix='context_maintenance_bench_')
+    try:
+        storage_dir = os.path.join(workdir, 'contexts')
+        if args.backend == 'sqlite':
+            store = SqliteContextStore(os.path.join(storage_dir, 'contexts.db'), 20 if args.journal else 0)
+        else:
+            store = JsonFileContextStore(storage_dir)
+        manager = ContextPersistenceManager(storage_dir, store=store)
+
+        start = time.perf_counter()
+        users = fill_store(manager, args.sessions, args.turns, args.restarts if args.journal else 0)
+        print(f"{args.backend}: {args.sessions} conversaciones x {args.turns} turnos en "
+              f"{time.perf_counter() - start:.1f}s")
+        age_sessions(store, users, args.aged_fraction, 60)
+
+        before = load_all(manager, users)
+        max_bytes_per_second = int(args.max_mb_per_second * 1e6)
+        if isinstance(store, SqliteContextStore):
+            print(dictionary_gain(list(before['contexts'].values()), 32768))
+            maintenance = SqliteContextMaintenance(store, keep=args.keep, archive_after_days=30,
+                                                   compress_idle_seconds=0,
+                                                   max_bytes_per_second=max_bytes_per_second)
+        else:
+            maintenance = JsonContextMaintenance(store, args.keep, 30, max_bytes_per_second)
+
+        report = maintenance.run()
+        print(f"Mantenimiento: {format_report(report)}")
+        if isinstance(maintenance, SqliteContextMaintenance):
+            file_before, file_after = maintenance.vacuum()
+            print(f"Archivo SQLite tras VACUUM: {file_before / 1e6:.2f} -> {file_after / 1e6:.2f} MB")
+
+        after = load_all(manager, users)
+        aged = int(len(users) * args.aged_fraction)
+        for label, indexes in (('activas', range(aged, len(users))), ('archivadas', range(aged))):
+            if not indexes:
+                continue
+            old = [before['latencies'][i] for i in indexes]
+            new = [after['latencies'][i] for i in indexes]
+            print(f"load_latest sesiones {label}: p50 {percentile(old, 50):.2f} -> {percentile(new, 50):.2f} ms, "
+                  f"p99 {percentile(old, 99):.2f} -> {percentile(new, 99):.2f} ms")
+
+        mismatches = [user_id for user_id in users if before['contexts'][user_id] != after['contexts'][user_id]]
+        if mismatches:
+            print(f"\n{len(mismatches)} contextos distintos tras el mantenimiento: {mismatches[:10]}")
+            return 1
+        print("\nTodos los contextos se cargan igual que antes del mantenimiento")
+        return 0
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
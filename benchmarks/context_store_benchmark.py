@@ -0,0 +1,216 @@
+#!/usr/bin/env python
+"""
+Prueba de rendimiento del almacén de contextos de conversación.
+
+Llena un almacén SQLite con un número grande de instantáneas (1M por
+defecto) repartidas entre usuarios y mide la latencia de las operaciones
+de ContextPersistenceManager: load_context, list_user_sessions,
+save_context y delete_context. Opcionalmente mide el backend de archivos
+JSON con un número menor de archivos como referencia, ya que su coste
+crece con el total de instantáneas del directorio.
+
+Uso:
+    python benchmarks/context_store_benchmark.py
+    python benchmarks/context_store_benchmark.py --sessions 100000 --json-files 5000
+    python benchmarks/context_store_benchmark.py --db /tmp/contexts.db --reuse
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import logging
+import argparse
+import tempfile
+from typing import Dict, Any, List, Iterator, Tuple
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, 'src'))
+
+from utils.context_manager import ContextPersistenceManager
+from utils.context_store import SqliteContextStore, JsonFileContextStore
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """
+    Calcula un percentil por el método del rango más cercano.
+
+    Args:
+        values: Valores a evaluar
+        pct: Percentil entre 0 y 100
+
+    Returns:
+        Valor del percentil o 0.0 si no hay valores
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def build_context(user_id: str, session_number: int, turns: int) -> Dict[str, Any]:
+    """
+    Construye un contexto sintético de tamaño realista.
+
+    Args:
+        user_id: Identificador del usuario
+        session_number: Número de instantánea del usuario
+        turns: Turnos de conversación incluidos
+
+    Returns:
+        Contexto de conversación
+    """
+    messages = []
+    for turn in range(turns):
+        messages.append({'role': 'user', 'content': f"Mensaje {turn} sobre un proyecto de contact center con IA"})
+        messages.append({'role': 'assistant', 'content': "Respuesta del asistente " * 8, 'agent': 'SalesAgent'})
+    return {
+        'session_id': f"{user_id}-s{session_number // 5}",
+        'user_id': user_id,
+        'message_count': turns,
+        'current_agent': 'SalesAgent',
+        'messages': messages,
+        '_persistence_metadata': {'last_saved': '2024-01-01T00:00:00', 'version': '1.0'}
+    }
+
+
+def iter_synthetic_snapshots(sessions: int, users: int, turns: int) -> Iterator[Tuple[str, str, float, Dict[str, Any]]]:
+    """
+    Genera instantáneas sintéticas repartidas entre usuarios.
+
+    Args:
+        sessions: Número total de instantáneas
+        users: Número de usuarios distintos
+        turns: Turnos por contexto
+
+    Returns:
+        Iterador de tuplas (snapshot_id, user_id, saved_at, contexto)
+    """
+    base = time.time() - sessions
+    for number in range(sessions):
+        user_id = f"user{number % users}"
+        yield f"{user_id}_bench{number}", user_id, base + number, build_context(user_id, number // users, turns)
+
+
+def time_operation(operation, arguments: List[Any]) -> Dict[str, float]:
+    """
+    Mide la latencia de una operación para cada argumento.
+
+    Args:
+        operation: Función a medir
+        arguments: Argumentos de cada llamada
+
+    Returns:
+        Latencias p50 y p99 en milisegundos
+    """
+    latencies = []
+    for argument in arguments:
+        start = time.perf_counter()
+        if isinstance(argument, tuple):
+            operation(*argument)
+        else:
+            operation(argument)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return {'p50_ms': percentile(latencies, 50), 'p99_ms': percentile(latencies, 99)}
+
+
+def run_operations(manager: ContextPersistenceManager, users: int, lookups: int, turns: int) -> Dict[str, Dict[str, float]]:
+    """
+    Mide las operaciones del gestor de persistencia.
+
+    Args:
+        manager: Gestor de persistencia configurado con el almacén a medir
+        users: Número de usuarios existentes
+        lookups: Operaciones por tipo
+        turns: Turnos de los contextos guardados
+
+    Returns:
+        Latencias por operación
+    """
+    random.seed(42)
+    user_ids = [f"user{random.randrange(users)}" for _ in range(lookups)]
+    results = {
+        'load_context': time_operation(manager.load_context, user_ids),
+        'list_user_sessions': time_operation(manager.list_user_sessions, user_ids),
+        'save_context': time_operation(
+            manager.save_context,
+            [(user_id, build_context(user_id, 0, turns)) for user_id in user_ids[:max(lookups // 10, 1)]]
+        )
+    }
+
+    # Eliminar las instantáneas recién guardadas
+    snapshot_ids = [manager.list_user_sessions(user_id)[0]['session_id'] for user_id in user_ids[:max(lookups // 10, 1)]]
+    results['delete_context'] = time_operation(manager.delete_context, snapshot_ids)
+    return results
+
+
+def print_results(title: str, results: Dict[str, Dict[str, float]]) -> None:
+    """
+    Muestra una tabla de latencias.
+
+    Args:
+        title: Título de la tabla
+        results: Latencias por operación
+    """
+    print(f"\n=== {title} ===")
+    print("operación".ljust(22) + "p50 (ms)".rjust(12) + "p99 (ms)".rjust(12))
+    for operation, latency in results.items():
+        print(operation.ljust(22) + f"{latency['p50_ms']:.3f}".rjust(12) + f"{latency['p99_ms']:.3f}".rjust(12))
+
+
+def main() -> int:
+    """
+    Punto de entrada de la prueba de rendimiento.
+
+    Returns:
+        Código de salida
+    """
+    parser = argparse.ArgumentParser(description="Rendimiento del almacén de contextos")
+    parser.add_argument('--sessions', type=int, default=1_000_000, help='Instantáneas almacenadas en SQLite')
+    parser.add_argument('--users', type=int, default=100_000, help='Usuarios distintos')
+    parser.add_argument('--turns', type=int, default=4, help='Turnos por contexto')
+    parser.add_argument('--lookups', type=int, default=1000, help='Operaciones medidas por tipo')
+    parser.add_argument('--json-files', type=int, default=20_000,
+                        help='Archivos para medir el backend JSON como referencia (0 = omitir)')
+    parser.add_argument('--db', help='Ruta de la base de datos (por defecto, temporal)')
+    parser.add_argument('--reuse', action='store_true', help='Reutilizar la base de datos si ya existe')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR)
+    workdir = tempfile.mkdtemp(prefix='context_store_bench_')
+    try:
+        db_path = args.db or os.path.join(workdir, 'contexts.db')
+        if os.path.exists(db_path) and not args.reuse:
+            os.remove(db_path)
+        store = SqliteContextStore(db_path)
+
+        if not args.reuse:
+            start = time.perf_counter()
+            inserted = store.import_snapshots(iter_synthetic_snapshots(args.sessions, args.users, args.turns), 5000)
+            elapsed = time.perf_counter() - start
+            print(f"Instantáneas insertadas: {inserted} en {elapsed:.1f}s "
+                  f"({inserted / elapsed:.0f}/s, {os.path.getsize(db_path) / 1e6:.0f} MB)")
+
+        manager = ContextPersistenceManager(os.path.join(workdir, 'sqlite'), store=store)
+        print_results(f"SQLite ({args.sessions} instantáneas, {args.users} usuarios)",
+                      run_operations(manager, args.users, args.lookups, args.turns))
+
+        if args.json_files > 0:
+            json_dir = os.path.join(workdir, 'json')
+            os.makedirs(json_dir)
+            json_users = max(args.json_files // 10, 1)
+            for snapshot_id, user_id, saved_at, context in iter_synthetic_snapshots(args.json_files, json_users, args.turns):
+                with open(os.path.join(json_dir, f"{user_id}_{int(saved_at)}.json"), 'w', encoding='utf-8') as f:
+                    json.dump(context, f, ensure_ascii=False, indent=2)
+            manager = ContextPersistenceManager(json_dir, store=JsonFileContextStore(json_dir))
+            print_results(f"JSON ({args.json_files} archivos, {json_users} usuarios)",
+                          run_operations(manager, json_users, min(args.lookups, 200), args.turns))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,187 @@
+#!/usr/bin/env python
+"""
+Prueba de latencia de la búsqueda de texto completo en conversaciones.
+
+Indexa N conversaciones sintéticas (50k de 20 mensajes por defecto, un
+millón de mensajes) con ConversationSearchIndex.record, como los guardados
+de ContextPersistenceManager, y mide:
+
+- búsquedas de términos frecuentes, raros, prefijos y frases, con y sin
+  acentos, en orden de actividad y por relevancia;
+- búsquedas combinadas con filtros (agente, lead capturado, fechas) y
+  páginas profundas;
+- el coste de indexar un turno nuevo de una conversación, y cómo cambia
+  mientras una conversación crece hasta --long-messages mensajes (solo se
+  indexan los mensajes nuevos, así que no debería depender de su longitud).
+
+Uso:
+    python benchmarks/conversation_search_benchmark.py
+    python benchmarks/conversation_search_benchmark.py --conversations 10000
+"""
+import os
+import sys
+import time
+import random
+import shutil
+import argparse
+import tempfile
+from typing import Any, Callable, Dict, List
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, 'src'))
+
+from utils.conversation_search import ConversationSearchIndex
+
+from context_journal_benchmark import percentile
+
+AGENTS = ['ConsultingAgent', 'SalesAgent', 'TechnicalAgent', 'DataCollectionAgent']
+USER_PHRASES = ['Hola, quería información sobre la centralita virtual',
+                '¿Cuánto cuesta el contact center para 50 agentes?',
+                'Necesitamos integrar WhatsApp Business con nuestro CRM',
+                '¿Tenéis agentes virtuales con inteligencia artificial?',
+                'Queremos migrar la telefonía desde Asterisk',
+                'Me interesa el envío de SMS masivos para campañas',
+                '¿Qué plazos de implantación manejáis?',
+                'Nuestra empresa tiene sedes en Madrid y Barcelona']
+ASSISTANT_PHRASES = ['Nuestra solución de centralita en la nube incluye grabación de llamadas y colas.',
+                     'El presupuesto depende del número de usuarios y de las integraciones necesarias.',
+                     'La integración con Salesforce y HubSpot está disponible mediante API.',
+                     'Los agentes virtuales entienden lenguaje natural y se conectan a vuestro CRM.',
+                     'La migración suele completarse en dos o tres semanas sin cortes de servicio.',
+                     'Podemos preparar una demostración personalizada para vuestro equipo técnico.',
+                     'El análisis técnico estima la complejidad y el coste total del proyecto.']
+QUERIES = [
+    ('término frecuente', 'centralita'),
+    ('sin acentos', 'migracion telefonia'),
+    ('prefijo', 'presup'),
+    ('frase', '"contact center"'),
+    ('términos en mensajes distintos', 'whatsapp salesforce'),
+    ('término raro', 'pedido7000'),
+    ('sin resultados', 'zanahoria'),
+]
+
+
+def make_context(number: int, messages: int, rng: random.Random) -> Dict[str, Any]:
+    """
+    Crea una conversación sintética con el formato de los contextos guardados.
+    """
+    history = []
+    agent = rng.choice(AGENTS)
+    for turn in range(messages // 2):
+        content = rng.choice(USER_PHRASES)
+        if turn == 0 and number % 1000 == 0:
+            content += f" (referencia pedido{number})"
+        history.append({'role': 'user', 'content': content})
+        if rng.random() < 0.2:
+            agent = rng.choice(AGENTS)
+        history.append({'role': 'assistant', 'agent': agent,
+                        'content': ' '.join(rng.sample(ASSISTANT_PHRASES, 2))})
+    return {'session_id': f"session-{number}", 'current_agent': agent, 'messages': history,
+            'form_completed': rng.random() < 0.15}
+
+
+def measure(label: str, function: Callable[[], Any], repeat: int = 20) -> Any:
+    """
+    Ejecuta una función varias veces y muestra sus percentiles de latencia.
+    """
+    latencies = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        latencies.append((time.perf_counter() - start) * 1000)
+    print(f"{label}: p50 {percentile(latencies, 50):.2f} ms, p99 {percentile(latencies, 99):.2f} ms")
+    return result
+
+
+def main() -> int:
+    """
+    Punto de entrada de la prueba.
+
+    Returns:
+        Código de salida (1 si alguna búsqueda no devuelve lo esperado)
+    """
+    parser = argparse.ArgumentParser(description="Latencia de la búsqueda en conversaciones")
+    parser.add_argument('--conversations', type=int, default=50000, help='Conversaciones indexadas')
+    parser.add_argument('--messages', type=int, default=20, help='Mensajes por conversación')
+    parser.add_argument('--updates', type=int, default=500, help='Conversaciones que reciben un turno nuevo')
+    parser.add_argument('--long-messages', type=int, default=1000, help='Mensajes de la conversación que crece')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='conversation_search_bench_')
+    try:
+        index = ConversationSearchIndex(os.path.join(workdir, 'contexts.db'))
+        rng = random.Random(42)
+        contexts: List[Dict[str, Any]] = []
+        base = time.time() - 90 * 86400
+        step = 90 * 86400 / args.conversations
+        start = time.perf_counter()
+        for number in range(args.conversations):
+            context = make_context(number, args.messages, rng)
+            index.record(f"user-{number % 20000}", f"snapshot-{number}", context, base + number * step)
+            if number < args.updates:
+                contexts.append(context)
+        elapsed = time.perf_counter() - start
+        print(f"{args.conversations} conversaciones ({args.conversations * args.messages} mensajes) "
+              f"indexadas en {elapsed:.1f}s ({args.conversations / elapsed:.0f}/s); "
+              f"base de datos: {os.path.getsize(index.db_path) / 1e6:.0f} MB\n")
+
+        for label, query in QUERIES:
+            result = measure(f"{label} {query} (20)", lambda: index.search(query))
+            print(f"    {len(result['conversations'])} conversaciones, más: {result['has_more']}")
+        measure("término frecuente por relevancia (20)", lambda: index.search('centralita', relevance=True))
+        measure("frase por relevancia (20)", lambda: index.search('"contact center"', relevance=True))
+        measure("término + agente + lead (20)",
+                lambda: index.search('migracion', agent='TechnicalAgent', lead=True))
+        week_ago = base + 60 * 86400
+        measure("término + rango de fechas antiguo (20)",
+                lambda: index.search('demostracion', since=base, until=week_ago))
+        measure("término, página 50 (offset 1000)", lambda: index.search('centralita', offset=1000))
+        measure("listado con lead, sin términos (20)", lambda: index.search(lead=True))
+
+        latencies = []
+        now = time.time()
+        for number, context in enumerate(contexts):
+            context['messages'].extend([{'role': 'user', 'content': f"Añado el presupuesto revisado {number}"},
+                                        {'role': 'assistant', 'agent': 'SalesAgent', 'content': 'Recibido.'}])
+            start = time.perf_counter()
+            index.record(f"user-{number % 20000}", f"snapshot-new-{number}", context, now)
+            latencies.append((time.perf_counter() - start) * 1000)
+        if latencies:
+            print(f"\nindexar un turno nuevo de una conversación: p50 {percentile(latencies, 50):.2f} ms, "
+                  f"p99 {percentile(latencies, 99):.2f} ms")
+
+        # Una conversación que crece turno a turno: coste de los primeros y de los últimos guardados
+        long_context = make_context(args.conversations, 2, rng)
+        long_context['session_id'] = 'session-long'
+        turn_latencies = []
+        while len(long_context['messages']) < args.long_messages:
+            long_context['messages'].extend(make_context(0, 2, rng)['messages'])
+            start = time.perf_counter()
+            index.record('user-long', 'snapshot-long', long_context, time.time())
+            turn_latencies.append((time.perf_counter() - start) * 1000)
+        if len(turn_latencies) >= 100:
+            first, last = turn_latencies[:50], turn_latencies[-50:]
+            print(f"conversación que crece hasta {len(long_context['messages'])} mensajes: "
+                  f"turnos 1-50 p50 {percentile(first, 50):.2f} ms, "
+                  f"últimos 50 turnos p50 {percentile(last, 50):.2f} ms")
+
+        rare = index.search('pedido7000')['conversations'] if args.conversations > 7000 else None
+        updated = index.search('presupuesto revisado 0')['conversations']
+        if rare is not None and [c['session_id'] for c in rare] != ['session-7000']:
+            print("La búsqueda del término raro no devuelve la conversación esperada")
+            return 1
+        if args.updates and (not updated or updated[0]['session_id'] != 'session-0'):
+            print("La conversación reindexada no aparece como la más reciente")
+            return 1
+        expected = args.conversations + (1 if turn_latencies else 0)
+        if index.count() != expected:
+            print(f"El índice tiene {index.count()} conversaciones, se esperaban {expected}")
+            return 1
+        return 0
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
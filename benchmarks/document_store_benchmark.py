@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+"""
+Prueba de subidas repetidas del mismo documento de proyecto.
+
+Los clientes suben a menudo el mismo RFP varias veces. Se suben --documents
+documentos distintos de --kb KB, cada uno --uploads veces, y se compara:
+
+- anterior: cada subida se copia a un archivo temporal y se extrae su texto,
+  que se guarda completo en la sesión (y viaja en el mensaje de análisis);
+  cada petición de análisis repite la llamada al LLM;
+- almacén: DocumentStore (hash SHA-256 de la subida); solo se extrae el texto
+  de los documentos nuevos, la sesión guarda el hash y el análisis del
+  EngineerAgent se memoriza por documento.
+
+La extracción de un PDF (PyPDF2) se simula con una espera de --extract-ms
+tras leer el archivo, y el análisis del LLM con una espera de --analysis-ms.
+Se muestran el tiempo por subida (primera y repetidas), los bytes de sesión
+por conversación y las llamadas al LLM para analizar los documentos.
+
+Uso:
+    python benchmarks/document_store_benchmark.py
+    python benchmarks/document_store_benchmark.py --documents 20 --uploads 5 --kb 2000
+"""
+import io
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import logging
+import argparse
+import tempfile
+from typing import Any, Callable, Dict, List
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, 'src'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from context_journal_benchmark import percentile
+from data.document_store import DocumentStore
+from agents.engineer_agent import EngineerAgent
+
+WORDS = ['requisito', 'integración', 'centralita', 'agente', 'llamadas', 'IVR', 'CRM', 'informe',
+         'disponibilidad', 'grabación', 'transcripción', 'campaña', 'cola', 'supervisor', 'señalización']
+
+
+def make_document(seed: int, kb: int) -> bytes:
+    """
+    Genera el texto de un documento de requisitos de unos kb KB.
+    """
+    rng = random.Random(seed)
+    lines = []
+    size = 0
+    while size < kb * 1024:
+        line = f"{len(lines) + 1}. " + ' '.join(rng.choice(WORDS) for _ in range(12)) + '.'
+        lines.append(line)
+        size += len(line.encode('utf-8')) + 1
+    return '\n'.join(lines).encode('utf-8')
+
+
+def slow_extractor(extract_ms: float) -> Callable[[str], str]:
+    """
+    Extractor que lee el archivo y espera extract_ms (el coste de PyPDF2).
+    """
+    def extract(path: str) -> str:
+        with open(path, 'rb') as f:
+            text = f.read().decode('utf-8', errors='ignore')
+        time.sleep(extract_ms / 1000)
+        return text
+    return extract
+
+
+def stub_analysis(calls: List[int], analysis_ms: float) -> Callable[[str], Dict[str, Any]]:
+    """
+    Sustituye analyze_project_requirements (una petición completa al LLM).
+    """
+    def analyze(file_content: str) -> Dict[str, Any]:
+        calls[0] += 1
+        time.sleep(analysis_ms / 1000)
+        return {'complejidad': 3, 'tiempo_estimado': '8 semanas', 'num_desarrolladores': 2,
+                'tecnologias_recomendadas': ['Python'], 'riesgos_principales': [], 'resumen': 'Centralita con IA'}
+    return analyze
+
+
+def run_previous(documents: List[bytes], args: argparse.Namespace, extract: Callable[[str], str]) -> Dict[str, Any]:
+    """
+    Comportamiento anterior: extracción en cada subida y texto completo en la sesión.
+    """
+    times = {'first': [], 'repeat': []}
+    session_bytes = []
+    calls = [0]
+    analyze = stub_analysis(calls, args.analysis_ms)
+    for upload in range(args.uploads):
+        for number, body in enumerate(documents):
+            start = time.perf_counter()
+            with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as temp:
+                temp.write(body)
+                temp_filename = temp.name
+            text = extract(temp_filename)
+            os.unlink(temp_filename)
+            times['first' if upload == 0 else 'repeat'].append((time.perf_counter() - start) * 1000)
+            session = {'project_file_content': text, 'project_file_name': f"rfp_{number}.pdf"}
+            session_bytes.append(len(json.dumps(session, ensure_ascii=False).encode('utf-8')))
+            analyze(text)
+    return {'times': times, 'session_bytes': session_bytes, 'llm_calls': calls[0]}
+
+
+def run_store(documents: List[bytes], args: argparse.Namespace, extract: Callable[[str], str],
+              root_dir: str) -> Dict[str, Any]:
+    """
+    Almacén de documentos: hash de la subida, extracción única y análisis memorizado.
+    """
+    store = DocumentStore(root_dir)
+    agent = EngineerAgent(document_store=store)
+    calls = [0]
+    agent.analyze_project_requirements = stub_analysis(calls, args.analysis_ms)
+    times = {'first': [], 'repeat': []}
+    session_bytes = []
+    for upload in range(args.uploads):
+        for number, body in enumerate(documents):
+            start = time.perf_counter()
+            document_hash, cached = store.store_upload(io.BytesIO(body), extract)
+            times['repeat' if cached else 'first'].append((time.perf_counter() - start) * 1000)
+            session = {'project_file_hash': document_hash, 'project_file_name': f"rfp_{number}.pdf"}
+            session_bytes.append(len(json.dumps(session, ensure_ascii=False).encode('utf-8')))
+            analysis, _ = agent.analyze_document(document_hash, f"rfp_{number}.pdf")
+            if analysis is None:
+                raise RuntimeError(f"El documento {document_hash} no está en el almacén")
+    return {'times': times, 'session_bytes': session_bytes, 'llm_calls': calls[0], 'stats': store.get_stats()}
+
+
+def main() -> int:
+    """
+    Punto de entrada de la prueba.
+
+    Returns:
+        Código de salida (1 si el almacén repite extracciones o análisis)
+    """
+    parser = argparse.ArgumentParser(description="Subidas repetidas de documentos de proyecto")
+    parser.add_argument('--documents', type=int, default=10, help='Documentos distintos')
+    parser.add_argument('--uploads', type=int, default=4, help='Subidas de cada documento')
+    parser.add_argument('--kb', type=int, default=500, help='Tamaño del texto de cada documento (KB)')
+    parser.add_argument('--extract-ms', type=float, default=150, help='Coste simulado de extraer el texto de un PDF')
+    parser.add_argument('--analysis-ms', type=float, default=50, help='Coste simulado del análisis del LLM')
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    documents = [make_document(seed, args.kb) for seed in range(args.documents)]
+    extract = slow_extractor(args.extract_ms)
+    root_dir = tempfile.mkdtemp(prefix='document_store_bench_')
+    try:
+        results = {'anterior': run_previous(documents, args, extract),
+                   'almacén': run_store(documents, args, extract, root_dir)}
+    finally:
+        shutil.rmtree(root_dir, ignore_errors=True)
+
+    print(f"{args.documents} documentos de {args.kb} KB, {args.uploads} subidas de cada uno")
+    for name, result in results.items():
+        times = result['times']
+        print(f"\n{name}:")
+        for kind, label in (('first', 'primera subida'), ('repeat', 'subidas repetidas')):
+            print(f"    {label:>17}: p50 {percentile(times[kind], 50):8.1f} ms, p99 {percentile(times[kind], 99):8.1f} ms")
+        print(f"    sesión por conversación: {max(result['session_bytes']):,} bytes")
+        print(f"    llamadas al LLM para analizar: {result['llm_calls']}")
+    stats = results['almacén']['stats']
+    print(f"\nmétricas del almacén: {stats}")
+
+    expected = args.documents
+    if stats['extractions'] != expected or results['almacén']['llm_calls'] != expected:
+        print("ERROR: el almacén repitió extracciones o análisis de documentos ya subidos")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+"""
+Prueba de latencia de escritura de leads con muchos leads ya guardados.
+
+Parte de N leads existentes (100k por defecto) y mide la latencia de
+guardar leads nuevos con:
+
+- JsonFileRepository: reescribe leads.json completo con indentación en cada lead;
+- LeadLog (registro JSONL) con cada política de fsync: 'never', 'batch' y 'always'.
+
+También mide la conversión de leads.json, la construcción del índice al
+abrir el registro y las búsquedas por email y del último lead.
+
+Uso:
+    python benchmarks/lead_log_benchmark.py
+    python benchmarks/lead_log_benchmark.py --leads 200000 --legacy-writes 5
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import contextlib
+from typing import Dict, Any, List
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, 'src'))
+
+with contextlib.redirect_stdout(open(os.devnull, 'w')):
+    from data.data_manager import JsonFileRepository
+from data.lead_log import LeadLog, convert_json_leads, FSYNC_POLICIES
+
+from context_journal_benchmark import percentile
+
+
+def make_lead(number: int) -> Dict[str, Any]:
+    """
+    Crea los datos de un lead como los guarda DataCollectionAgent.
+    """
+    return {'name': f"Cliente {number}", 'email': f"cliente{number}@example.com", 'phone': '600000000',
+            'company': f"Empresa {number % 5000}", 'interest': 'centralita virtual',
+            'timestamp': '2026-01-01T10:00:00'}
+
+
+def summary(latencies: List[float]) -> str:
+    """
+    Resume una lista de latencias en milisegundos.
+    """
+    return (f"p50 {percentile(latencies, 50):.3f} ms, p99 {percentile(latencies, 99):.3f} ms, "
+            f"máx {max(latencies):.3f} ms")
+
+
+def main() -> int:
+    """
+    Punto de entrada de la prueba.
+
+    Returns:
+        Código de salida (1 si el registro no contiene los leads esperados)
+    """
+    parser = argparse.ArgumentParser(description="Latencia de escritura de leads")
+    parser.add_argument('--leads', type=int, default=100000, help='Leads existentes')
+    parser.add_argument('--writes', type=int, default=1000, help='Leads nuevos por política de fsync')
+    parser.add_argument('--legacy-writes', type=int, default=10, help='Leads nuevos con leads.json')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='lead_log_bench_')
+    try:
+        leads = [make_lead(number) for number in range(args.leads)]
+        legacy_dir = os.path.join(workdir, 'legacy')
+        os.makedirs(legacy_dir)
+        with open(os.path.join(legacy_dir, 'leads.json'), 'w', encoding='utf-8') as f:
+            json.dump(leads, f, ensure_ascii=False, indent=2)
+
+        with contextlib.redirect_stdout(open(os.devnull, 'w')):
+            repository = JsonFileRepository(legacy_dir)
+            latencies = []
+            for number in range(args.legacy_writes):
+                start = time.perf_counter()
+                repository.save_lead(make_lead(args.leads + number))
+                latencies.append((time.perf_counter() - start) * 1000)
+        print(f"{args.leads} leads existentes\n")
+        print(f"leads.json (reescritura completa): {summary(latencies)}")
+
+        start = time.perf_counter()
+        log_path = os.path.join(workdir, 'leads.jsonl')
+        convert_json_leads(os.path.join(legacy_dir, 'leads.json'), log_path)
+        print(f"\nConversión de leads.json: {time.perf_counter() - start:.2f}s")
+
+        start = time.perf_counter()
+        log = LeadLog(log_path)
+        print(f"Índice al abrir el registro: {(time.perf_counter() - start) * 1000:.0f} ms "
+              f"({log.count()} leads)\n")
+
+        written = 0
+        for policy in FSYNC_POLICIES[::-1]:
+            log.fsync = policy
+            latencies = []
+            for number in range(args.writes):
+                start = time.perf_counter()
+                log.append(make_lead(args.leads + args.legacy_writes + written))
+                latencies.append((time.perf_counter() - start) * 1000)
+                written += 1
+            print(f"leads.jsonl fsync={policy}: {summary(latencies)}")
+
+        lookups = []
+        for number in range(0, args.leads, max(args.leads // 1000, 1)):
+            start = time.perf_counter()
+            log.find_by_email(f"cliente{number}@example.com")
+            lookups.append((time.perf_counter() - start) * 1000)
+        print(f"\nfind_by_email: {summary(lookups)}")
+        start = time.perf_counter()
+        latest = log.latest()
+        print(f"latest: {(time.perf_counter() - start) * 1000:.3f} ms")
+
+        expected = args.leads + args.legacy_writes + written
+        log.close()
+        if log.count() != expected or latest['id'] != expected:
+            print(f"El registro tiene {log.count()} leads, se esperaban {expected}")
+            return 1
+        return 0
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
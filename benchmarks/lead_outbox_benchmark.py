@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+"""
+Prueba de la cola de salida de leads.
+
+Con varios hilos guardando leads a la vez (como las peticiones de Flask)
+compara el coste en el hilo de la petición de:
+
+- antes: doble escritura directa (append al registro JSONL + save_lead en
+  SQLite, un commit por lead);
+- después: LeadOutbox.enqueue (un commit con fsync en la cola local).
+
+Después mide cuánto tarda el despachador en copiar la cola a los dos
+destinos por lotes, inyecta fallos en SQLite y en el registro JSONL para
+comprobar que los reintentos convergen sin duplicados, reenvía leads ya
+guardados para comprobar la idempotencia y termina con una reconciliación.
+
+Uso:
+    python benchmarks/lead_outbox_benchmark.py
+    python benchmarks/lead_outbox_benchmark.py --threads 16 --leads 200
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+import contextlib
+from typing import Dict, Any, List, Callable
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, 'src'))
+
+WORKDIR = tempfile.mkdtemp(prefix='lead_outbox_bench_')
+# La base de datos del módulo se crea en el primer uso: se lleva a un directorio temporal
+os.environ['LEADS_DB_PATH'] = os.path.join(WORKDIR, 'leads.db')
+
+with contextlib.redirect_stdout(open(os.devnull, 'w')):
+    from data import database
+from data.lead_log import LeadLog
+from services.lead_outbox import LeadOutbox
+
+from context_journal_benchmark import percentile
+
+
+def make_lead(prefix: str, number: int) -> Dict[str, Any]:
+    """
+    Crea los datos de un lead como los guarda DataCollectionAgent.
+    """
+    return {'name': f"Cliente {prefix}{number}", 'email': f"cliente.{prefix}{number}@example.com",
+            'phone': '600000000', 'company': 'Ejemplo S.L.', 'interest': 'centralita virtual',
+            'message': 'Quiero información sobre la centralita virtual'}
+
+
+def run_threads(threads: int, leads: int, prefix: str, save: Callable[[Dict[str, Any]], Any]) -> Dict[str, Any]:
+    """
+    Guarda leads desde varios hilos y mide la latencia de cada llamada.
+
+    Returns:
+        Diccionario con la duración y las latencias en milisegundos
+    """
+    latencies: List[float] = []
+    lock = threading.Lock()
+
+    def worker(number: int) -> None:
+        for index in range(leads):
+            data = make_lead(f"{prefix}{number}-", index)
+            start = time.perf_counter()
+            save(data)
+            elapsed = (time.perf_counter() - start) * 1000
+            with lock:
+                latencies.append(elapsed)
+
+    workers = [threading.Thread(target=worker, args=(number,)) for number in range(threads)]
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(open(os.devnull, 'w')):
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+    return {'duration': time.perf_counter() - start, 'latencies': latencies}
+
+
+def report(label: str, result: Dict[str, Any]) -> None:
+    """
+    Muestra el resultado de un caso.
+    """
+    latencies = result['latencies']
+    print(f"{label}: {len(latencies) / result['duration']:.0f} leads/s, p50 {percentile(latencies, 50):.2f} ms, "
+          f"p99 {percentile(latencies, 99):.2f} ms, máx {max(latencies):.1f} ms")
+
+
+def counts(log: LeadLog) -> str:
+    """
+    Leads en cada destino.
+    """
+    return f"SQLite {sum(1 for _ in database.iter_lead_keys())}, JSONL {log.count()}"
+
+
+class Flaky:
+    """
+    Envuelve una función y hace que falle las primeras veces.
+    """
+
+    def __init__(self, function: Callable, failures: int):
+        self.function = function
+        self.failures = failures
+
+    def __call__(self, *args, **kwargs):
+        if self.failures > 0:
+            self.failures -= 1
+            raise IOError("fallo inyectado")
+        return self.function(*args, **kwargs)
+
+
+def main() -> int:
+    """
+    Punto de entrada de la prueba.
+
+    Returns:
+        Código de salida (1 si los destinos no coinciden o hay duplicados)
+    """
+    parser = argparse.ArgumentParser(description="Cola de salida de leads")
+    parser.add_argument('--threads', type=int, default=8, help='Hilos que guardan leads')
+    parser.add_argument('--leads', type=int, default=100, help='Leads por hilo')
+    args = parser.parse_args()
+
+    try:
+        total = args.threads * args.leads
+        print(f"{args.threads} hilos x {args.leads} leads\n")
+
+        legacy_log = LeadLog(os.path.join(WORKDIR, 'legacy.jsonl'))
+
+        def dual_write(data: Dict[str, Any]) -> None:
+            legacy_log.append(data)
+            database.save_lead(data)
+
+        report("antes: doble escritura directa", run_threads(args.threads, args.leads, 'legacy', dual_write))
+        legacy_log.close()
+
+        log = LeadLog(os.path.join(WORKDIR, 'leads.jsonl'))
+        # El despachador no se arranca hasta medir la cola sola
+        outbox = LeadOutbox(os.path.join(WORKDIR, 'lead_outbox.db'), log, start=False)
+        report("después: enqueue", run_threads(args.threads, args.leads, 'outbox', outbox.enqueue))
+
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(open(os.devnull, 'w')):
+            outbox.flush()
+        elapsed = time.perf_counter() - start
+        stats = outbox.get_stats()
+        print(f"despachador: {total} leads en {elapsed * 1000:.0f} ms ({total / elapsed:.0f} leads/s, "
+              f"{stats['batches']} lotes) -> {counts(log)}")
+
+        # Fallos inyectados: dos lotes fallan en SQLite y uno en el registro
+        outbox.max_backoff = 0.05
+        save_leads_batch = database.save_leads_batch
+        append_many = log.append_many
+        database.save_leads_batch = Flaky(save_leads_batch, 2)
+        log.append_many = Flaky(append_many, 1)
+        for number in range(50):
+            outbox.enqueue(make_lead('flaky', number))
+        start = time.perf_counter()
+        while outbox.pending():
+            with contextlib.redirect_stdout(open(os.devnull, 'w')):
+                outbox.flush()
+            time.sleep(0.01)
+        stats = outbox.get_stats()
+        print(f"con fallos: cola vacía en {(time.perf_counter() - start) * 1000:.0f} ms, "
+              f"{stats['failures']} fallos -> {counts(log)}")
+        database.save_leads_batch = save_leads_batch
+        log.append_many = append_many
+
+        # Reenviar leads ya guardados no debe duplicarlos
+        for number in range(20):
+            outbox.enqueue(make_lead('outbox0-', number))
+        with contextlib.redirect_stdout(open(os.devnull, 'w')):
+            outbox.flush()
+        print(f"reenvío de 20 leads: {counts(log)}")
+
+        # Un lead que solo llegó a SQLite (p. ej. el registro se restauró de una copia)
+        database.save_leads_batch([dict(make_lead('solo-sqlite', 0), lead_key='a' * 64)])
+        report_before = outbox.reconcile()
+        report_after = outbox.reconcile(repair=True)
+        final = outbox.reconcile()
+        print(f"reconciliación: faltaban {len(report_before['missing_in_mirror'])} en JSONL y "
+              f"{len(report_before['missing_in_sqlite'])} en SQLite, reparados {report_after['repaired']}, "
+              f"coinciden: {final['consistent']}")
+
+        expected = total + 50 + 1
+        sqlite_count = sum(1 for _ in database.iter_lead_keys())
+        log.close()
+        if not final['consistent'] or sqlite_count != expected or log.count() != expected:
+            print(f"Se esperaban {expected} leads en cada destino: {sqlite_count} en SQLite, {log.count()} en JSONL")
+            return 1
+        return 0
+    finally:
+        shutil.rmtree(WORKDIR, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+"""
+Prueba de las estadísticas de leads con agregados incrementales.
+
+Llena una base de datos temporal con N leads (500k por defecto) y mide:
+
+- la reconstrucción de los agregados con una pasada en streaming;
+- get_lead_stats (día, semana y mes) leyendo solo los agregados;
+- lo mismo calculado como se haría sin agregados: get_leads() y contar en Python;
+- el coste que añade a save_lead actualizar los agregados.
+
+Después comprueba que los agregados incrementales coinciden con los
+reconstruidos desde cero.
+
+Uso:
+    python benchmarks/lead_stats_benchmark.py
+    python benchmarks/lead_stats_benchmark.py --rows 100000 --skip-legacy
+"""
+import os
+import sys
+import time
+import random
+import shutil
+import sqlite3
+import argparse
+import tempfile
+import datetime
+import contextlib
+from collections import Counter
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, 'src'))
+
+WORKDIR = tempfile.mkdtemp(prefix='lead_stats_bench_')
+# La base de datos del módulo se crea en el primer uso: se lleva a un directorio temporal
+os.environ['LEADS_DB_PATH'] = os.path.join(WORKDIR, 'leads.db')
+
+with contextlib.redirect_stdout(open(os.devnull, 'w')):
+    from data import database
+    database.init_db()
+
+from context_journal_benchmark import percentile
+
+INTERESTS = ['centralita', 'contact center', 'agentes virtuales', 'sms', 'whatsapp', 'ia conversacional']
+
+
+def fill_database(rows: int) -> None:
+    """
+    Inserta leads sintéticos repartidos en el último año (sin pasar por los agregados).
+    """
+    connection = sqlite3.connect(database.DB_PATH)
+    start = datetime.datetime.utcnow() - datetime.timedelta(days=365)
+    step = 365 * 86400 / rows
+    rng = random.Random(42)
+    batch = []
+    with connection:
+        for number in range(rows):
+            created_at = start + datetime.timedelta(seconds=number * step)
+            batch.append((f"Cliente {number}", f"cliente{number}@example.com",
+                          '600000000' if rng.random() < 0.8 else '',
+                          f"Empresa {rng.randrange(5000)}" if rng.random() < 0.7 else '',
+                          rng.choice(INTERESTS), 'Quiero información',
+                          created_at.strftime('%Y-%m-%d %H:%M:%S.%f')))
+            if len(batch) == 10000 or number == rows - 1:
+                connection.executemany(
+                    "INSERT INTO leads (name, email, phone, company, interest, message, created_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)", batch)
+                batch = []
+    connection.close()
+
+
+def legacy_stats() -> dict:
+    """
+    Leads por día e intereses de los últimos 30 días contando en Python sobre get_leads().
+    """
+    since = (datetime.datetime.utcnow() - datetime.timedelta(days=29)).strftime('%Y-%m-%d')
+    per_day = Counter()
+    interests = Counter()
+    for lead in database.get_leads():
+        day = lead.created_at.strftime('%Y-%m-%d')
+        if day >= since:
+            per_day[day] += 1
+            interests[lead.interest] += 1
+    return {'series': sorted(per_day.items()), 'top_interests': interests.most_common(10)}
+
+
+def rollup_rows() -> list:
+    """
+    Contenido de las dos tablas de agregados.
+    """
+    connection = sqlite3.connect(database.DB_PATH)
+    rows = (connection.execute("SELECT * FROM lead_rollup_daily ORDER BY 1, 2").fetchall(),
+            connection.execute("SELECT * FROM lead_rollup_totals ORDER BY 1, 2").fetchall())
+    connection.close()
+    return rows
+
+
+def main() -> int:
+    """
+    Punto de entrada de la prueba.
+
+    Returns:
+        Código de salida (1 si los agregados no coinciden)
+    """
+    parser = argparse.ArgumentParser(description="Estadísticas de leads con agregados")
+    parser.add_argument('--rows', type=int, default=500000, help='Leads en la base de datos')
+    parser.add_argument('--writes', type=int, default=500, help='Leads nuevos con save_lead')
+    parser.add_argument('--skip-legacy', action='store_true', help='No medir get_leads() completo')
+    args = parser.parse_args()
+
+    try:
+        fill_database(args.rows)
+        start = time.perf_counter()
+        count = database.rebuild_lead_rollups()
+        print(f"{args.rows} leads; reconstrucción de agregados: {time.perf_counter() - start:.2f}s ({count} leads)\n")
+
+        for bucket, days in (('day', 30), ('week', 90), ('month', 365)):
+            since = datetime.datetime.utcnow().date() - datetime.timedelta(days=days - 1)
+            latencies = []
+            for _ in range(20):
+                start = time.perf_counter()
+                stats = database.get_lead_stats(bucket, since)
+                latencies.append((time.perf_counter() - start) * 1000)
+            print(f"get_lead_stats bucket={bucket} ({days} días, {len(stats['series'])} periodos): "
+                  f"p50 {percentile(latencies, 50):.2f} ms")
+
+        if not args.skip_legacy:
+            start = time.perf_counter()
+            legacy = legacy_stats()
+            print(f"\nantes: get_leads() + contar en Python (30 días): {time.perf_counter() - start:.2f}s")
+            stats = database.get_lead_stats('day')
+            series = [(item['period'], item['leads']) for item in stats['series']]
+            if series != legacy['series']:
+                print("La serie diaria no coincide con el cálculo sobre get_leads()")
+                return 1
+            print("    la serie diaria coincide con get_lead_stats")
+
+        latencies = []
+        with contextlib.redirect_stdout(open(os.devnull, 'w')):
+            for number in range(args.writes):
+                data = {'name': f"Nuevo {number}", 'email': f"nuevo{number}@example.com", 'phone': '600000000',
+                        'company': f"Empresa {number % 7}", 'interest': INTERESTS[number % len(INTERESTS)],
+                        'message': 'Hola'}
+                start = time.perf_counter()
+                database.save_lead(data)
+                latencies.append((time.perf_counter() - start) * 1000)
+            batch = [{'name': f"Lote {number}", 'email': f"lote{number}@example.com", 'interest': 'sms',
+                      'lead_key': f"{number:064d}"} for number in range(args.writes)]
+            database.save_leads_batch(batch)
+            # Un lote repetido no debe contarse dos veces
+            database.save_leads_batch(batch)
+        print(f"\nsave_lead con agregados: p50 {percentile(latencies, 50):.2f} ms, "
+              f"p99 {percentile(latencies, 99):.2f} ms")
+
+        incremental = rollup_rows()
+        database.rebuild_lead_rollups()
+        if rollup_rows() != incremental:
+            print("Los agregados incrementales no coinciden con los reconstruidos")
+            return 1
+        print("agregados incrementales = agregados reconstruidos")
+        return 0
+    finally:
+        shutil.rmtree(WORKDIR, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+"""
+Prueba de escritura concurrente en la base de datos de leads.
+
+Varios hilos llaman a save_lead a la vez (como las peticiones de Flask en
+un servidor con hilos) mientras otros leen con get_leads. Se compara:
+
+- antes: motor por defecto (diario de rollback, synchronous=FULL, tiempo de
+  espera por defecto del driver y pool por defecto) sin cerrojo de escritura;
+- después: motor de create_database_engine (WAL, synchronous=NORMAL,
+  busy_timeout, mmap y pool dimensionado) con los commits serializados.
+
+Para cada caso muestra el rendimiento en leads por segundo, la latencia de
+save_lead (la cola alta es la espera por el bloqueo de escritura) y los
+errores "database is locked".
+
+Uso:
+    python benchmarks/leads_db_concurrency_benchmark.py
+    python benchmarks/leads_db_concurrency_benchmark.py --threads 32 --leads 100 --readers 4 --echo
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+import contextlib
+from typing import Dict, Any, List
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, 'src'))
+
+WORKDIR = tempfile.mkdtemp(prefix='leads_db_bench_')
+# La base de datos del módulo se crea en el primer uso: se lleva a un directorio temporal
+os.environ['LEADS_DB_PATH'] = os.path.join(WORKDIR, 'import.db')
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+with contextlib.redirect_stdout(open(os.devnull, 'w')):
+    from data import database
+
+from context_journal_benchmark import percentile
+
+
+def run_case(engine: Any, threads: int, leads: int, readers: int, write_lock: Any) -> Dict[str, Any]:
+    """
+    Lanza los hilos escritores y lectores contra un motor.
+
+    Args:
+        engine: Motor de SQLAlchemy
+        threads: Hilos que guardan leads
+        leads: Leads por hilo
+        readers: Hilos que leen la tabla mientras tanto
+        write_lock: Cerrojo de escritura de save_lead (nullcontext = sin cerrojo)
+
+    Returns:
+        Diccionario con la duración, las latencias y los errores
+    """
+    database.Base.metadata.create_all(engine)
+    database.Session = sessionmaker(bind=engine, expire_on_commit=False)
+    database._write_lock = write_lock
+    latencies: List[float] = []
+    reads: List[float] = []
+    errors: List[str] = []
+    lock = threading.Lock()
+    done = threading.Event()
+
+    def writer(number: int) -> None:
+        for index in range(leads):
+            data = {'name': f"Cliente {number}-{index}", 'email': f"cliente{number}.{index}@example.com",
+                    'phone': '600000000', 'company': 'Ejemplo S.L.', 'interest': 'centralita',
+                    'message': 'Quiero información sobre la centralita virtual ' * 4}
+            start = time.perf_counter()
+            try:
+                database.save_lead(data)
+                elapsed = (time.perf_counter() - start) * 1000
+                with lock:
+                    latencies.append(elapsed)
+            except Exception as e:
+                with lock:
+                    errors.append(str(e).splitlines()[0])
+
+    def reader() -> None:
+        while not done.is_set():
+            start = time.perf_counter()
+            database.get_leads()
+            with lock:
+                reads.append((time.perf_counter() - start) * 1000)
+            time.sleep(0.01)
+
+    workers = [threading.Thread(target=writer, args=(number,)) for number in range(threads)]
+    background = [threading.Thread(target=reader) for _ in range(readers)]
+    with contextlib.redirect_stdout(open(os.devnull, 'w')), contextlib.redirect_stderr(open(os.devnull, 'w')):
+        for thread in background:
+            thread.start()
+        start = time.perf_counter()
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        duration = time.perf_counter() - start
+        done.set()
+        for thread in background:
+            thread.join()
+    engine.dispose()
+    return {'duration': duration, 'latencies': latencies, 'reads': reads, 'errors': errors}
+
+
+def report(label: str, result: Dict[str, Any]) -> None:
+    """
+    Muestra el resultado de un caso.
+    """
+    latencies = result['latencies']
+    print(f"{label}: {len(latencies) / result['duration']:.0f} leads/s, "
+          f"save_lead p50 {percentile(latencies, 50):.1f} ms, p99 {percentile(latencies, 99):.1f} ms, "
+          f"máx {max(latencies, default=0):.0f} ms, errores {len(result['errors'])}")
+    if result['reads']:
+        print(f"    get_leads p50 {percentile(result['reads'], 50):.1f} ms, "
+              f"p99 {percentile(result['reads'], 99):.1f} ms ({len(result['reads'])} lecturas)")
+    for error in sorted(set(result['errors']))[:3]:
+        print(f"    {error}")
+
+
+def main() -> int:
+    """
+    Punto de entrada de la prueba.
+
+    Returns:
+        Código de salida (1 si el motor ajustado pierde escrituras)
+    """
+    parser = argparse.ArgumentParser(description="Escritura concurrente en la base de datos de leads")
+    parser.add_argument('--threads', type=int, default=16, help='Hilos que guardan leads')
+    parser.add_argument('--leads', type=int, default=50, help='Leads por hilo')
+    parser.add_argument('--readers', type=int, default=2, help='Hilos que leen mientras tanto')
+    parser.add_argument('--echo', action='store_true', help='Mantener echo=True en el motor anterior')
+    args = parser.parse_args()
+
+    try:
+        print(f"{args.threads} hilos x {args.leads} leads, {args.readers} lectores")
+        legacy = create_engine(f"sqlite:///{os.path.join(WORKDIR, 'legacy.db')}", echo=args.echo)
+        report("antes", run_case(legacy, args.threads, args.leads, args.readers, contextlib.nullcontext()))
+        tuned = database.create_database_engine(os.path.join(WORKDIR, 'tuned.db'), echo=False)
+        result = run_case(tuned, args.threads, args.leads, args.readers, threading.Lock())
+        report("después", result)
+        return 1 if result['errors'] else 0
+    finally:
+        shutil.rmtree(WORKDIR, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
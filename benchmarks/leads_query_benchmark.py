@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+"""
+Prueba de las consultas de administración de leads con muchas filas.
+
+Llena una base de datos temporal con N leads (1M por defecto) y mide:
+
+- página inicial, página profunda (siguiendo el cursor) y páginas
+  filtradas por interés, empresa y rango de fechas con get_leads_page;
+- el último lead con get_latest_lead;
+- la exportación completa con iter_leads (memoria constante);
+- lo que hacían antes /admin/leads y /admin/get-last-lead: get_leads()
+  con todos los leads como objetos ORM y después como diccionarios.
+
+La memoria es el crecimiento del máximo de RSS del proceso, por eso el
+caso anterior se mide al final.
+
+Uso:
+    python benchmarks/leads_query_benchmark.py
+    python benchmarks/leads_query_benchmark.py --rows 200000 --skip-legacy
+"""
+import os
+import sys
+import time
+import random
+import shutil
+import sqlite3
+import argparse
+import resource
+import tempfile
+import datetime
+import contextlib
+from typing import Any, Callable, Tuple
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, 'src'))
+
+WORKDIR = tempfile.mkdtemp(prefix='leads_query_bench_')
+# La base de datos del módulo se crea en el primer uso: se lleva a un directorio temporal
+os.environ['LEADS_DB_PATH'] = os.path.join(WORKDIR, 'leads.db')
+
+with contextlib.redirect_stdout(open(os.devnull, 'w')):
+    from data import database
+    database.init_db()
+
+INTERESTS = ['centralita', 'contact center', 'agentes virtuales', 'sms', 'whatsapp', 'ia conversacional']
+
+
+def fill_database(rows: int) -> None:
+    """
+    Inserta leads sintéticos repartidos en el último año.
+    """
+    connection = sqlite3.connect(database.DB_PATH)
+    start = datetime.datetime.utcnow() - datetime.timedelta(days=365)
+    step = 365 * 86400 / rows
+    rng = random.Random(42)
+    batch = []
+    with connection:
+        for number in range(rows):
+            created_at = start + datetime.timedelta(seconds=number * step + rng.random())
+            batch.append((f"Cliente {number}", f"cliente{number}@example.com", '600000000',
+                          f"Empresa {rng.randrange(5000)}", rng.choice(INTERESTS),
+                          'Quiero información sobre la centralita virtual',
+                          created_at.strftime('%Y-%m-%d %H:%M:%S.%f')))
+            if len(batch) == 10000:
+                connection.executemany(
+                    "INSERT INTO leads (name, email, phone, company, interest, message, created_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)", batch)
+                batch = []
+        if batch:
+            connection.executemany(
+                "INSERT INTO leads (name, email, phone, company, interest, message, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)", batch)
+    connection.execute("ANALYZE")
+    connection.close()
+
+
+def max_rss_mb() -> float:
+    """
+    Máximo de memoria residente del proceso en MB.
+    """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def measure(label: str, function: Callable[[], Any], repeat: int = 1) -> Tuple[Any, float]:
+    """
+    Ejecuta una función, muestra su latencia (la mejor de repeat) y el crecimiento de memoria.
+
+    Returns:
+        Tupla (resultado, milisegundos)
+    """
+    rss_before = max_rss_mb()
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(open(os.devnull, 'w')):
+            result = function()
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"{label}: {best:.1f} ms, +{max_rss_mb() - rss_before:.0f} MB de RSS máximo")
+    return result, best
+
+
+def deep_page(pages: int) -> Any:
+    """
+    Sigue el cursor durante varias páginas y devuelve la última.
+    """
+    cursor = None
+    for _ in range(pages):
+        leads, cursor = database.get_leads_page(100, cursor)
+    return leads
+
+
+def export_all() -> int:
+    """
+    Recorre todos los leads como lo hace la exportación en streaming.
+    """
+    return sum(1 for _ in database.iter_leads())
+
+
+def legacy_admin() -> Any:
+    """
+    Lo que hacían /admin/leads y /admin/get-last-lead con get_leads().
+    """
+    leads = database.get_leads()
+    data = [database.lead_to_dict(lead) for lead in leads]
+    return data[-1]
+
+
+def main() -> int:
+    """
+    Punto de entrada de la prueba.
+
+    Returns:
+        Código de salida (1 si el último lead no coincide)
+    """
+    parser = argparse.ArgumentParser(description="Consultas de leads con muchas filas")
+    parser.add_argument('--rows', type=int, default=1000000, help='Leads en la base de datos')
+    parser.add_argument('--skip-legacy', action='store_true', help='No medir get_leads() completo')
+    args = parser.parse_args()
+
+    try:
+        start = time.perf_counter()
+        fill_database(args.rows)
+        size = os.path.getsize(database.DB_PATH) / 1e6
+        print(f"{args.rows} leads insertados en {time.perf_counter() - start:.1f}s ({size:.0f} MB)")
+
+        connection = sqlite3.connect(database.DB_PATH)
+        plan = connection.execute(
+            "EXPLAIN QUERY PLAN SELECT * FROM leads WHERE created_at <= ? AND (created_at < ? OR id < ?) "
+            "ORDER BY created_at DESC, id DESC LIMIT 101", ('2030', '2030', 0)).fetchall()
+        connection.close()
+        print(f"Plan de la página: {' / '.join(row[-1] for row in plan)}\n")
+
+        since = datetime.datetime.utcnow() - datetime.timedelta(days=30)
+        latest, _ = measure("get_latest_lead", database.get_latest_lead, 20)
+        measure("primera página (100)", lambda: database.get_leads_page(100), 20)
+        measure("página 100 siguiendo el cursor (100 consultas)", lambda: deep_page(100), 3)
+        measure("interés + últimos 30 días (100)",
+                lambda: database.get_leads_page(100, interest='whatsapp', since=since), 20)
+        measure("empresa (100)", lambda: database.get_leads_page(100, company='Empresa 42'), 20)
+        count, _ = measure("exportación completa con iter_leads", export_all)
+        print(f"    {count} leads exportados")
+
+        if not args.skip_legacy:
+            legacy_latest, _ = measure("\nantes: get_leads() + diccionarios + leads[-1]", legacy_admin)
+            if legacy_latest['id'] != latest['id']:
+                print(f"El último lead no coincide: {legacy_latest['id']} != {latest['id']}")
+                return 1
+            print("    el último lead coincide con get_latest_lead")
+        return 0
+    finally:
+        shutil.rmtree(WORKDIR, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
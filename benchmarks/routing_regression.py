@@ -0,0 +1,342 @@
+#!/usr/bin/env python
+"""
+Corpus de regresión para el enrutamiento de agentes.
+
+Ejecuta AgentManager.select_agent (y, opcionalmente, motores de
+clasificación alternativos) sobre un corpus etiquetado de mensajes en
+español con su contexto previo. Informa de la matriz de confusión, la
+precisión y la latencia p50/p99 por mensaje, y compara el resultado con
+una línea base almacenada.
+
+Uso:
+    python benchmarks/routing_regression.py
+    python benchmarks/routing_regression.py --update-baseline
+    python benchmarks/routing_regression.py \\
+        --engine clasificador=utils.intent_classifier:classify_intent
+
+Devuelve un código de salida distinto de cero si la precisión cae por
+debajo de la línea base. La latencia depende de la máquina, así que solo se
+comprueba con --max-latency-regression y una línea base grabada en la misma
+máquina:
+
+    python benchmarks/routing_regression.py --update-baseline
+    python benchmarks/routing_regression.py --max-latency-regression 0.5
+"""
+import os
+import sys
+import copy
+import json
+import time
+import logging
+import argparse
+import importlib
+import tempfile
+import contextlib
+from collections import Counter, defaultdict
+from typing import Dict, List, Any, Callable, Optional, Tuple
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, 'src'))
+
+CORPUS_PATH = os.path.join(ROOT_DIR, 'benchmarks', 'routing', 'corpus.json')
+BASELINE_PATH = os.path.join(ROOT_DIR, 'benchmarks', 'routing', 'baseline.json')
+DEFAULT_ENGINE = 'agent_manager'
+ERROR_LABEL = '<error>'
+
+logger = logging.getLogger(__name__)
+
+
+def build_agent_manager(work_dir: str, cleanup: contextlib.ExitStack, use_cache: bool = False):
+    """
+    Crea un AgentManager con los mismos agentes y prioridades que las rutas.
+    Los leads, los resúmenes y los contextos se guardan en work_dir, no en
+    data/ ni en storage/contexts/.
+
+    Args:
+        work_dir: Directorio temporal de la ejecución
+        cleanup: Pila donde se registran los hilos que se detienen antes de borrar work_dir
+        use_cache: Si se mantiene la caché de decisiones de enrutamiento
+
+    Returns:
+        Función de enrutamiento basada en AgentManager.select_agent
+    """
+    from agents.agent_manager import AgentManager
+    from agents.general_agent import GeneralAgent
+    from agents.sales_agent import SalesAgent
+    from agents.engineer_agent import EngineerAgent
+    from agents.data_collection_agent import DataCollectionAgent
+    from data import database
+    from data.data_manager import DataManager
+    from utils.context_manager import ContextPersistenceManager
+    from utils.routing_cache import RoutingCache
+
+    database.init_db(os.path.join(work_dir, 'leads.db'))
+    data_manager = DataManager(data_dir=os.path.join(work_dir, 'data'))
+    manager = AgentManager(context_manager=ContextPersistenceManager(os.path.join(work_dir, 'contexts')))
+    for worker in (data_manager.outbox, manager.context_manager.maintenance):
+        if worker is not None:
+            cleanup.callback(worker.stop)
+    manager.register_agent(GeneralAgent())
+    manager.register_agent(SalesAgent())
+    manager.register_agent(EngineerAgent())
+    manager.register_agent(DataCollectionAgent(data_manager))
+
+    # Sin caché se mide el coste real de enrutamiento de cada mensaje
+    if not use_cache:
+        manager.routing_cache = RoutingCache(max_size=0)
+
+    return manager.select_agent
+
+
+def load_engine(spec: str) -> Callable[[str, Dict[str, Any]], Any]:
+    """
+    Carga un motor de clasificación alternativo a partir de "modulo:funcion".
+
+    Args:
+        spec: Ruta del callable con formato modulo:funcion
+
+    Returns:
+        Callable que recibe (mensaje, contexto)
+    """
+    module_name, _, attr = spec.partition(':')
+    if not attr:
+        raise ValueError(f"Motor inválido '{spec}', se esperaba modulo:funcion")
+    module = importlib.import_module(module_name)
+    return getattr(module, attr)
+
+
+def resolve_label(result: Any) -> str:
+    """
+    Convierte la salida de un motor en el nombre de un agente.
+    Admite agentes, nombres de agente o diccionarios de puntuaciones.
+
+    Args:
+        result: Resultado devuelto por el motor
+
+    Returns:
+        Nombre del agente predicho
+    """
+    if result is None:
+        return 'None'
+    if isinstance(result, str):
+        return result
+    if isinstance(result, dict):
+        return max(result.items(), key=lambda item: item[1])[0] if result else 'None'
+    return result.__class__.__name__
+
+
+def load_corpus(path: str) -> List[Dict[str, Any]]:
+    """
+    Carga el corpus etiquetado.
+
+    Args:
+        path: Ruta del archivo JSON del corpus
+
+    Returns:
+        Lista de muestras con mensaje, contexto y agente esperado
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """
+    Calcula un percentil por el método del rango más cercano.
+
+    Args:
+        values: Valores a evaluar
+        pct: Percentil entre 0 y 100
+
+    Returns:
+        Valor del percentil o 0.0 si no hay valores
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def run_engine(engine: Callable, corpus: List[Dict[str, Any]], repeat: int) -> Dict[str, Any]:
+    """
+    Ejecuta un motor sobre todo el corpus.
+
+    Args:
+        engine: Callable de enrutamiento (mensaje, contexto)
+        corpus: Muestras etiquetadas
+        repeat: Número de repeticiones para estabilizar la latencia
+
+    Returns:
+        Resultados con predicciones, precisión, matriz de confusión y latencias
+    """
+    latencies = []
+    predictions = []
+    confusion = defaultdict(Counter)
+
+    for sample in corpus:
+        sample_latencies = []
+        label = ERROR_LABEL
+        for _ in range(repeat):
+            context = copy.deepcopy(sample.get('context', {}))
+            start = time.perf_counter()
+            try:
+                label = resolve_label(engine(sample['message'], context))
+            except Exception as e:
+                logger.error(f"Error en la muestra {sample.get('id')}: {e}")
+                label = ERROR_LABEL
+            sample_latencies.append((time.perf_counter() - start) * 1000)
+        latencies.append(min(sample_latencies))
+        predictions.append(label)
+        confusion[sample['expected']][label] += 1
+
+    correct = sum(1 for sample, label in zip(corpus, predictions) if sample['expected'] == label)
+    return {
+        'accuracy': correct / len(corpus) if corpus else 0.0,
+        'p50_ms': percentile(latencies, 50),
+        'p99_ms': percentile(latencies, 99),
+        'predictions': predictions,
+        'confusion': {expected: dict(row) for expected, row in confusion.items()}
+    }
+
+
+def format_confusion(confusion: Dict[str, Dict[str, int]]) -> str:
+    """
+    Formatea la matriz de confusión (filas: esperado, columnas: predicho).
+
+    Args:
+        confusion: Matriz de confusión como diccionario anidado
+
+    Returns:
+        Tabla en texto plano
+    """
+    labels = sorted(set(confusion) | {p for row in confusion.values() for p in row})
+    width = max(len(label) for label in labels) + 2
+    lines = ["esperado \\ predicho".ljust(width) + "".join(label[:10].rjust(12) for label in labels)]
+    for expected in labels:
+        row = confusion.get(expected, {})
+        lines.append(expected.ljust(width) + "".join(str(row.get(p, 0)).rjust(12) for p in labels))
+    return "\n".join(lines)
+
+
+def compare_with_baseline(name: str, result: Dict[str, Any], baseline: Dict[str, Any],
+                          max_accuracy_drop: float, max_latency_regression: Optional[float]) -> List[str]:
+    """
+    Compara un resultado con la línea base almacenada.
+
+    Args:
+        name: Nombre del motor
+        result: Resultado de run_engine
+        baseline: Línea base del motor
+        max_accuracy_drop: Caída máxima de precisión tolerada (absoluta)
+        max_latency_regression: Aumento relativo máximo tolerado de p99 (None = no se comprueba)
+
+    Returns:
+        Lista de regresiones detectadas (vacía si no hay)
+    """
+    failures = []
+    accuracy_floor = baseline['accuracy'] - max_accuracy_drop
+    if result['accuracy'] < accuracy_floor:
+        failures.append(f"{name}: precisión {result['accuracy']:.3f} < {accuracy_floor:.3f} (línea base {baseline['accuracy']:.3f})")
+
+    if max_latency_regression is None:
+        return failures
+    latency_ceiling = baseline['p99_ms'] * (1 + max_latency_regression)
+    if result['p99_ms'] > latency_ceiling:
+        failures.append(f"{name}: p99 {result['p99_ms']:.3f} ms > {latency_ceiling:.3f} ms (línea base {baseline['p99_ms']:.3f} ms)")
+    return failures
+
+
+def parse_engines(specs: List[str], use_cache: bool, work_dir: str,
+                  cleanup: contextlib.ExitStack) -> List[Tuple[str, Callable]]:
+    """
+    Construye la lista de motores a evaluar.
+
+    Args:
+        specs: Especificaciones nombre=modulo:funcion
+        use_cache: Si el motor por defecto usa la caché de enrutamiento
+        work_dir: Directorio temporal del motor por defecto
+        cleanup: Pila de limpieza del motor por defecto (ver build_agent_manager)
+
+    Returns:
+        Lista de pares (nombre, motor)
+    """
+    engines = [(DEFAULT_ENGINE, build_agent_manager(work_dir, cleanup, use_cache))]
+    for spec in specs:
+        name, _, target = spec.partition('=')
+        if not target:
+            name, target = spec, spec
+        engines.append((name, load_engine(target)))
+    return engines
+
+
+def main() -> int:
+    """
+    Punto de entrada del corpus de regresión.
+
+    Returns:
+        Código de salida (0 si no hay regresiones)
+    """
+    parser = argparse.ArgumentParser(description="Corpus de regresión de enrutamiento de agentes")
+    parser.add_argument('--corpus', default=CORPUS_PATH, help='Ruta del corpus etiquetado')
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='Ruta de la línea base')
+    parser.add_argument('--engine', action='append', default=[],
+                        help='Motor alternativo nombre=modulo:funcion (repetible)')
+    parser.add_argument('--repeat', type=int, default=5, help='Repeticiones por mensaje para medir latencia')
+    parser.add_argument('--with-cache', action='store_true', help='Mantener la caché de enrutamiento activa')
+    parser.add_argument('--max-accuracy-drop', type=float, default=0.0,
+                        help='Caída absoluta de precisión tolerada')
+    parser.add_argument('--max-latency-regression', type=float, default=None,
+                        help='Aumento relativo de p99 tolerado (0.5 = +50%%); sin él no se compara la '
+                             'latencia, que solo es comparable con una línea base grabada en la misma máquina')
+    parser.add_argument('--update-baseline', action='store_true', help='Guardar los resultados como nueva línea base')
+    parser.add_argument('--show-errors', action='store_true', help='Mostrar las muestras mal clasificadas')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR)
+
+    corpus = load_corpus(args.corpus)
+    with tempfile.TemporaryDirectory(prefix='routing_regression_') as work_dir, contextlib.ExitStack() as cleanup:
+        engines = parse_engines(args.engine, args.with_cache, work_dir, cleanup)
+        results = [(name, run_engine(engine, corpus, args.repeat)) for name, engine in engines]
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    failures = []
+    new_baseline = {}
+    for name, result in results:
+        print(f"\n=== Motor: {name} ({len(corpus)} muestras) ===")
+        print(f"Precisión: {result['accuracy']:.3f}")
+        print(f"Latencia p50: {result['p50_ms']:.3f} ms | p99: {result['p99_ms']:.3f} ms")
+        print(format_confusion(result['confusion']))
+
+        if args.show_errors:
+            for sample, label in zip(corpus, result['predictions']):
+                if sample['expected'] != label:
+                    print(f"  [{sample['id']}] '{sample['message']}' -> {label} (esperado {sample['expected']})")
+
+        if name in baseline:
+            failures.extend(compare_with_baseline(
+                name, result, baseline[name], args.max_accuracy_drop, args.max_latency_regression))
+        new_baseline[name] = {k: result[k] for k in ('accuracy', 'p50_ms', 'p99_ms')}
+
+    if args.update_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(new_baseline, f, ensure_ascii=False, indent=2)
+        print(f"\nLínea base actualizada en {args.baseline}")
+        return 0
+
+    if failures:
+        print("\nREGRESIONES DETECTADAS:")
+        for failure in failures:
+            print(f"- {failure}")
+        return 1
+
+    print("\nSin regresiones respecto a la línea base.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
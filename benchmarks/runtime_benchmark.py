@@ -0,0 +1,209 @@
+#!/usr/bin/env python
+"""
+Prueba del Runtime compartido por proceso.
+
+1. Memoria de un worker: en procesos nuevos (y directorios de trabajo
+   temporales) se mide con tracemalloc lo que ocupan los objetos que crea
+   cada disposición:
+   - antes: dos AgentManager con sus agentes (rutas tradicionales y de
+     agentes), un DataManager por familia de rutas y otro por cada
+     DataCollectionAgent, y un cliente de LM Studio por agente;
+   - Runtime: un solo juego de gestores, agentes, analizador y cliente.
+2. Conexiones con LM Studio: contra un servidor local que imita la API de
+   chat, N peticiones secuenciales y concurrentes con el cliente de cada
+   agente (una conexión TCP nueva por petición) y con el cliente del Runtime
+   (pool keep-alive), contando las conexiones que acepta el servidor.
+
+Uso:
+    python benchmarks/runtime_benchmark.py
+    python benchmarks/runtime_benchmark.py --requests 2000 --threads 32
+"""
+import os
+import sys
+import json
+import time
+import socket
+import shutil
+import argparse
+import tempfile
+import threading
+import subprocess
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC_DIR = os.path.join(ROOT_DIR, 'src')
+sys.path.insert(0, SRC_DIR)
+
+from context_journal_benchmark import percentile
+
+# Se ejecuta en el proceso hijo; las salidas de la aplicación van a stderr
+LAYOUT_SCRIPT = r"""
+import sys, gc, json, tracemalloc, contextlib
+layout = sys.argv[1]
+tracemalloc.start(100)
+with contextlib.redirect_stdout(sys.stderr):
+    if layout == 'antes':
+        from data.data_manager import DataManager
+        from agents.agent_manager import AgentManager
+        from agents.general_agent import GeneralAgent
+        from agents.sales_agent import SalesAgent
+        from agents.engineer_agent import EngineerAgent
+        from agents.data_collection_agent import DataCollectionAgent
+        keep = [DataManager()]
+        for _ in range(2):
+            manager = AgentManager()
+            for agent in (GeneralAgent(), SalesAgent(), EngineerAgent(), DataCollectionAgent()):
+                manager.register_agent(agent)
+            keep.append(manager)
+    else:
+        from core.runtime import Runtime
+        keep = [Runtime()]
+gc.collect()
+# Sin lo que reservan las importaciones (también las que hacen los constructores)
+snapshot = tracemalloc.take_snapshot().filter_traces(
+    [tracemalloc.Filter(False, '<frozen importlib._bootstrap>', all_frames=True)])
+size = sum(stat.size for stat in snapshot.statistics('filename'))
+counts = {}
+for obj in gc.get_objects():
+    name = type(obj).__name__
+    if name in ('LMStudioClient', 'SentimentAnalyzer', 'DataManager', 'AgentManager',
+                'ContextPersistenceManager', 'Session'):
+        counts[name] = counts.get(name, 0) + 1
+print(json.dumps({'bytes': size, 'counts': counts}))
+"""
+
+
+class ChatHandler(BaseHTTPRequestHandler):
+    """
+    Respuesta fija de /v1/chat/completions con keep-alive (HTTP/1.1).
+    """
+    protocol_version = 'HTTP/1.1'
+    body = json.dumps({'choices': [{'message': {'role': 'assistant', 'content': 'Hola'}}]}).encode()
+
+    def setup(self) -> None:
+        super().setup()
+        # Cabeceras y cuerpo van en escrituras separadas: sin esto cada respuesta espera al ACK retardado
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_POST(self) -> None:
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(self.body)))
+        self.end_headers()
+        self.wfile.write(self.body)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+
+class ChatServer(ThreadingHTTPServer):
+    """
+    Servidor de la API de chat que cuenta las conexiones aceptadas.
+    """
+    daemon_threads = True
+    # La cola por defecto (5) descarta conexiones con 16 hilos conectando a la vez
+    request_queue_size = 128
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), ChatHandler)
+        self.lock = threading.Lock()
+        self.connections = 0
+
+
+def measure_layout(layout: str) -> Dict[str, Any]:
+    """
+    Mide la memoria y los objetos de una disposición en un proceso nuevo.
+    """
+    workdir = tempfile.mkdtemp(prefix='runtime_bench_')
+    try:
+        env = dict(os.environ, PYTHONPATH=SRC_DIR, PYTHONDONTWRITEBYTECODE='1',
+                   LEADS_DB_PATH=os.path.join(workdir, 'data', 'leads.db'),
+                   CONTEXT_MAINTENANCE_INTERVAL='0')
+        result = subprocess.run([sys.executable, '-c', LAYOUT_SCRIPT, layout], cwd=workdir, env=env,
+                                capture_output=True, text=True, check=True)
+        return json.loads(result.stdout.strip().splitlines()[-1])
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def run_requests(server: ChatServer, clients: List[Any], requests_count: int, threads: int) -> Dict[str, Any]:
+    """
+    Lanza peticiones de chat repartidas entre los clientes y mide su latencia.
+    """
+    latencies: List[float] = []
+    errors: List[str] = []
+    lock = threading.Lock()
+
+    def one(number: int) -> None:
+        client = clients[number % len(clients)]
+        start = time.perf_counter()
+        response = client.generate('Eres un asistente', f"Mensaje {number}")
+        elapsed = (time.perf_counter() - start) * 1000
+        with lock:
+            latencies.append(elapsed)
+            if response.startswith('Error'):
+                errors.append(response)
+
+    before = server.connections
+    start = time.perf_counter()
+    # generate imprime los errores de conexión con su traza
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull), contextlib.redirect_stderr(devnull):
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            list(executor.map(one, range(requests_count)))
+    elapsed = time.perf_counter() - start
+    return {'p50': percentile(latencies, 50), 'p99': percentile(latencies, 99), 'errors': len(errors),
+            'rate': requests_count / elapsed, 'connections': server.connections - before}
+
+
+def main() -> int:
+    """
+    Punto de entrada de la prueba.
+
+    Returns:
+        Código de salida (1 si el Runtime no reutiliza las conexiones)
+    """
+    parser = argparse.ArgumentParser(description="Runtime compartido por proceso")
+    parser.add_argument('--requests', type=int, default=1000, help='Peticiones de chat por caso')
+    parser.add_argument('--threads', type=int, default=16, help='Hilos del caso concurrente')
+    args = parser.parse_args()
+
+    print("Memoria de los objetos de un worker (tracemalloc, sin las importaciones de módulos):")
+    for layout in ('antes', 'runtime'):
+        result = measure_layout(layout)
+        counts = ', '.join(f"{name} {count}" for name, count in sorted(result['counts'].items()))
+        print(f"    {layout}: {result['bytes'] / 1024:.0f} KB; {counts}")
+
+    server = ChatServer()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ['LM_STUDIO_URL'] = f"http://127.0.0.1:{server.server_port}"
+    with contextlib.redirect_stdout(open(os.devnull, 'w')):
+        from services.lm_studio import LMStudioClient
+        from core.runtime import create_http_session
+        per_agent = [LMStudioClient() for _ in range(4)]
+        shared = [LMStudioClient(http=create_http_session())]
+
+    print(f"\nPeticiones a LM Studio ({args.requests} por caso):")
+    pooled = {}
+    for threads in (1, args.threads):
+        for label, clients in (('cliente por agente', per_agent), ('Runtime (pool)', shared)):
+            result = run_requests(server, clients, args.requests, threads)
+            print(f"    {threads:>2} hilos, {label}: p50 {result['p50']:.2f} ms, p99 {result['p99']:.2f} ms, "
+                  f"{result['rate']:.0f} peticiones/s, {result['connections']} conexiones, {result['errors']} errores")
+            if clients is shared:
+                pooled[threads] = result['connections']
+    server.shutdown()
+
+    if pooled[1] > 1 or pooled[args.threads] > args.threads:
+        print("El Runtime abrió más conexiones de las que admite su pool")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
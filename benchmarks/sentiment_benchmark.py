@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+"""
+Prueba de referencia y de rendimiento del analizador de sentimiento.
+
+Comprueba que SentimentAnalyzer.analyze produce exactamente la salida
+almacenada en benchmarks/sentiment/golden.json (generada con el analizador
+basado en expresiones regulares por palabra clave) y mide la latencia para
+mensajes de 10 a 10.000 caracteres, como las descripciones de proyecto
+pegadas por los usuarios.
+
+Uso:
+    python benchmarks/sentiment_benchmark.py
+    python benchmarks/sentiment_benchmark.py --lengths 10 1000 10000 --repeat 20
+    python benchmarks/sentiment_benchmark.py --compare otro_modulo:SentimentAnalyzer
+
+Devuelve un código de salida distinto de cero si algún resultado difiere
+de la referencia.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import importlib
+from typing import Dict, List, Any
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, 'src'))
+
+GOLDEN_PATH = os.path.join(ROOT_DIR, 'benchmarks', 'sentiment', 'golden.json')
+DEFAULT_LENGTHS = [10, 100, 1000, 5000, 10000]
+
+# Texto base para construir mensajes largos (descripción de proyecto típica)
+SAMPLE_TEXT = (
+    "Somos una empresa de logística y queremos automatizar la atención al cliente. "
+    "El proceso actual es muy lento y complicado, los clientes están molestos. "
+    "Nos gusta la idea de un asistente con IA, sería genial para reducir errores. "
+    "No entiendo bien cómo se integraría con nuestro ERP, ¿por qué haría falta una API?? "
+    "Es importante tenerlo pronto, gracias :) "
+)
+
+
+def load_golden(path: str) -> List[Dict[str, Any]]:
+    """
+    Carga los casos de referencia.
+
+    Args:
+        path: Ruta del archivo JSON de referencia
+
+    Returns:
+        Lista de casos con mensaje y resultado esperado
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def check_golden(analyzer, cases: List[Dict[str, Any]]) -> List[str]:
+    """
+    Compara la salida del analizador con la referencia.
+
+    Args:
+        analyzer: Instancia con método analyze(texto)
+        cases: Casos de referencia
+
+    Returns:
+        Lista de diferencias encontradas (vacía si todo coincide)
+    """
+    failures = []
+    for case in cases:
+        result = analyzer.analyze(case['message'])
+        if result != case['expected']:
+            failures.append(f"[{case['id']}] '{case['message'][:60]}': {result} != {case['expected']}")
+    return failures
+
+
+def build_message(length: int) -> str:
+    """
+    Construye un mensaje de la longitud indicada repitiendo el texto base.
+
+    Args:
+        length: Número de caracteres
+
+    Returns:
+        Mensaje de prueba
+    """
+    repeats = length // len(SAMPLE_TEXT) + 1
+    return (SAMPLE_TEXT * repeats)[:length]
+
+
+def time_analyzer(analyzer, lengths: List[int], repeat: int) -> Dict[int, float]:
+    """
+    Mide la latencia de analyze para cada longitud de mensaje.
+
+    Args:
+        analyzer: Instancia con método analyze(texto)
+        lengths: Longitudes de mensaje a evaluar
+        repeat: Repeticiones por longitud (se toma la mejor)
+
+    Returns:
+        Diccionario longitud -> latencia en milisegundos
+    """
+    timings = {}
+    for length in lengths:
+        message = build_message(length)
+        best = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            analyzer.analyze(message)
+            best = min(best, time.perf_counter() - start)
+        timings[length] = best * 1000
+    return timings
+
+
+def load_analyzer(spec: str):
+    """
+    Instancia un analizador alternativo a partir de "modulo:Clase".
+
+    Args:
+        spec: Ruta de la clase con formato modulo:Clase
+
+    Returns:
+        Instancia del analizador
+    """
+    module_name, _, attr = spec.partition(':')
+    if not attr:
+        raise ValueError(f"Analizador inválido '{spec}', se esperaba modulo:Clase")
+    module = importlib.import_module(module_name)
+    return getattr(module, attr)()
+
+
+def main() -> int:
+    """
+    Punto de entrada de la prueba de rendimiento.
+
+    Returns:
+        Código de salida (0 si la salida coincide con la referencia)
+    """
+    parser = argparse.ArgumentParser(description="Referencia y rendimiento del analizador de sentimiento")
+    parser.add_argument('--golden', default=GOLDEN_PATH, help='Ruta de los casos de referencia')
+    parser.add_argument('--lengths', type=int, nargs='+', default=DEFAULT_LENGTHS,
+                        help='Longitudes de mensaje en caracteres')
+    parser.add_argument('--repeat', type=int, default=10, help='Repeticiones por longitud')
+    parser.add_argument('--compare', action='append', default=[],
+                        help='Analizador alternativo modulo:Clase a medir (repetible)')
+    args = parser.parse_args()
+
+    from utils.sentiment_analyzer import SentimentAnalyzer
+
+    analyzers = [('SentimentAnalyzer', SentimentAnalyzer())]
+    for spec in args.compare:
+        analyzers.append((spec, load_analyzer(spec)))
+
+    cases = load_golden(args.golden)
+    failures = check_golden(analyzers[0][1], cases)
+    print(f"Casos de referencia: {len(cases) - len(failures)}/{len(cases)} coinciden")
+
+    results = {name: time_analyzer(analyzer, args.lengths, args.repeat) for name, analyzer in analyzers}
+
+    header = "caracteres".rjust(12) + "".join(name[-28:].rjust(30) for name, _ in analyzers)
+    print(f"\nLatencia por mensaje (ms, mejor de {args.repeat}):")
+    print(header)
+    for length in args.lengths:
+        print(str(length).rjust(12) + "".join(f"{results[name][length]:.3f}".rjust(30) for name, _ in analyzers))
+
+    if failures:
+        print("\nDIFERENCIAS CON LA REFERENCIA:")
+        for failure in failures:
+            print(f"- {failure}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
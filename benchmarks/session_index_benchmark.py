@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+"""
+Prueba del índice de metadatos de sesiones.
+
+Llena un almacén con conversaciones simuladas (una parte con lead
+capturado) y compara dos formas de responder a las consultas de
+administración "últimas sesiones", "sesiones con lead de un agente" y
+"sesiones más largas":
+
+- recorrer y decodificar el último contexto de cada sesión, filtrar y
+  ordenar en Python (lo que había que hacer sin índice);
+- consultar el índice session_index con paginación.
+
+Comprueba además que ambas formas devuelven las mismas sesiones y mide
+cuánto añade el índice a cada guardado.
+
+Uso:
+    python benchmarks/session_index_benchmark.py
+    python benchmarks/session_index_benchmark.py --sessions 2000 --turns 10 --backend json
+"""
+import os
+import sys
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+from typing import Dict, Any, List, Optional
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, 'src'))
+
+from context_journal_benchmark import new_context, advance_turn, percentile
+from utils.context_manager import ContextPersistenceManager
+from utils.context_store import SqliteContextStore, JsonFileContextStore
+from utils.session_index import lead_captured
+
+
+def fill_store(manager: ContextPersistenceManager, sessions: int, turns: int, lead_every: int) -> List[float]:
+    """
+    Simula conversaciones guardando el contexto en cada turno.
+
+    Returns:
+        Latencias de guardado en milisegundos
+    """
+    latencies = []
+    for number in range(sessions):
+        user_id = f"user{number}"
+        context = new_context(user_id, number)
+        for turn in range(turns + number % 7):
+            advance_turn(context, turn)
+            if lead_every and number % lead_every == 0 and turn == turns - 1:
+                context['form_completed'] = True
+            start = time.perf_counter()
+            manager.save_context(user_id, context)
+            latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def scan_query(manager: ContextPersistenceManager, agent: Optional[str], lead: Optional[bool],
+               order_by: str, limit: int) -> List[Any]:
+    """
+    Responde a una consulta recorriendo todos los contextos guardados.
+
+    Returns:
+        session_id de la página pedida (o message_count si se ordena por él,
+        porque los empates pueden salir en cualquier orden)
+    """
+    rows = []
+    for _, context in manager.iter_latest_contexts():
+        if agent is not None and context.get('current_agent') != agent:
+            continue
+        if lead is not None and lead_captured(context) != lead:
+            continue
+        if order_by == 'message_count':
+            rows.append((context.get('message_count', 0), context.get('message_count', 0)))
+        else:
+            # El nombre de archivo solo tiene segundos; la fecha del guardado es más precisa
+            rows.append((context['_persistence_metadata']['last_saved'], context.get('session_id')))
+    rows.sort(key=lambda row: row[0], reverse=True)
+    return [value for _, value in rows[:limit]]
+
+
+def timed(function: Any, repeat: int) -> Dict[str, Any]:
+    """
+    Ejecuta una función varias veces y mide la latencia.
+
+    Returns:
+        Diccionario con el último resultado y las latencias en milisegundos
+    """
+    latencies = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        latencies.append((time.perf_counter() - start) * 1000)
+    return {'result': result, 'latencies': latencies}
+
+
+def main() -> int:
+    """
+    Punto de entrada de la prueba.
+
+    Returns:
+        Código de salida (1 si el índice y el recorrido no coinciden)
+    """
+    parser = argparse.ArgumentParser(description="Índice de metadatos de sesiones")
+    parser.add_argument('--backend', default='sqlite', choices=['sqlite', 'json'])
+    parser.add_argument('--sessions', type=int, default=500, help='Conversaciones simuladas')
+    parser.add_argument('--turns', type=int, default=6, help='Turnos mínimos por conversación')
+    parser.add_argument('--lead-every', type=int, default=4, help='Una de cada N conversaciones captura un lead')
+    parser.add_argument('--repeat', type=int, default=5, help='Repeticiones de cada consulta')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR)
+    workdir = tempfile.mkdtemp(prefix='session_index_bench_')
+    try:
+        storage_dir = os.path.join(workdir, 'contexts')
+        if args.backend == 'sqlite':
+            store = SqliteContextStore(os.path.join(storage_dir, 'contexts.db'))
+        else:
+            store = JsonFileContextStore(storage_dir)
+        manager = ContextPersistenceManager(storage_dir, store=store)
+
+        start = time.perf_counter()
+        saves = fill_store(manager, args.sessions, args.turns, args.lead_every)
+        print(f"{args.backend}: {args.sessions} conversaciones en {time.perf_counter() - start:.1f}s, "
+              f"guardado p50 {percentile(saves, 50):.2f} ms, p99 {percentile(saves, 99):.2f} ms")
+
+        queries = [
+            ('últimas sesiones', None, None, 'last_saved_at'),
+            ('leads de SalesAgent', 'SalesAgent', True, 'last_saved_at'),
+            ('sesiones más largas', None, None, 'message_count'),
+        ]
+        failures = 0
+        for label, agent, lead, order_by in queries:
+            scan = timed(lambda: scan_query(manager, agent, lead, order_by, 20), args.repeat)
+            indexed = timed(lambda: manager.query_sessions(agent=agent, lead=lead, order_by=order_by, limit=20),
+                            args.repeat)
+            field = 'message_count' if order_by == 'message_count' else 'session_id'
+            same = scan['result'] == [row[field] for row in indexed['result']['sessions']]
+            failures += not same
+            print(f"{label}: recorrido p50 {percentile(scan['latencies'], 50):.1f} ms, "
+                  f"índice p50 {percentile(indexed['latencies'], 50):.2f} ms "
+                  f"(total {indexed['result']['total']}){'' if same else '  <- resultados distintos'}")
+
+        sample = dict(next(iter(manager.iter_latest_contexts()))[1], session_id='bench')
+        started = time.perf_counter()
+        for _ in range(200):
+            manager.index.record(sample['user_id'], 'bench', sample)
+        print(f"\nCoste del índice por guardado: {(time.perf_counter() - started) * 1000 / 200:.3f} ms")
+
+        if failures:
+            return 1
+        print("\nEl índice devuelve las mismas sesiones que el recorrido completo")
+        return 0
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
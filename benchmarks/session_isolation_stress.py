@@ -0,0 +1,285 @@
+#!/usr/bin/env python
+"""
+Prueba de concurrencia del aislamiento de sesiones en AgentManager.
+
+Lanza muchos hilos que envían turnos a un único AgentManager compartido
+(como el de las rutas de Flask) con un agente de eco que responde en
+streaming con pausas entre fragmentos. Comprueba con asserts que:
+
+- cada sesión contiene solo sus propios mensajes, en orden y alternando
+  usuario/asistente (sin mezclas entre sesiones);
+- los turnos concurrentes de una misma sesión se serializan (ningún
+  mensaje se intercala con otro turno);
+- el estado de cada petición (updates de process_message, como hacen las
+  rutas) se escribe en el contexto con el bloqueo de la sesión: ninguna
+  petición simultánea lo cambia mientras otro turno se genera;
+- la conversación por defecto del gestor no recibe datos de las sesiones;
+- las sesiones distintas se procesan en paralelo (el tiempo total se
+  acerca al de una sola sesión, no a la suma de todas).
+
+Uso:
+    python -m pytest benchmarks/session_isolation_stress.py
+    python benchmarks/session_isolation_stress.py
+    python benchmarks/session_isolation_stress.py --sessions 64 --turns 10 --delay 0.002
+"""
+import os
+import sys
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+import threading
+from typing import Dict, Any, Generator, List, Optional
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, 'src'))
+
+from agents.base_agent import BaseAgent
+from agents.agent_manager import AgentManager
+from utils.context_manager import ContextPersistenceManager
+
+# Valores por defecto (los de pytest; la línea de comandos permite cambiarlos)
+DEFAULT_SESSIONS = 32
+DEFAULT_TURNS = 5
+DEFAULT_CHUNKS = 5
+DEFAULT_DELAY = 0.005
+DEFAULT_SAME_SESSION_THREADS = 8
+
+
+class EchoAgent(BaseAgent):
+    """Agente de prueba que responde con el identificador de la sesión"""
+
+    def __init__(self, chunks: int, delay: float):
+        super().__init__(name="EchoAgent", description="Agente de eco para pruebas de concurrencia")
+        self.chunks = chunks
+        self.delay = delay
+
+    def can_handle(self, message: str, context: Dict[str, Any]) -> float:
+        return 0.9
+
+    def get_system_prompt(self, context: Dict[str, Any]) -> str:
+        return ""
+
+    def process(self, message: str, context: Dict[str, Any]) -> Generator[str, None, None]:
+        session_id = context['session_id']
+        for index in range(self.chunks):
+            time.sleep(self.delay)
+            # El contexto no debe cambiar de sesión mientras se genera la respuesta
+            if context['session_id'] != session_id:
+                raise RuntimeError(f"Contexto cambiado durante el turno: {session_id} -> {context['session_id']}")
+            # Ni recibir el estado de otra petición de la misma sesión
+            if 'request_message' in context and context['request_message'] != message:
+                raise RuntimeError(f"Estado de otra petición durante el turno {message}: {context['request_message']}")
+            yield f"{session_id}:{message}:{index};"
+        context['user_info'].setdefault('turns', 0)
+        context['user_info']['turns'] += 1
+
+
+def create_manager(storage_dir: str, chunks: int = DEFAULT_CHUNKS, delay: float = DEFAULT_DELAY) -> AgentManager:
+    """
+    Crea el gestor compartido con el agente de eco y los contextos en storage_dir.
+    """
+    manager = AgentManager(context_manager=ContextPersistenceManager(storage_dir))
+    manager.register_agent(EchoAgent(chunks, delay))
+    return manager
+
+
+def run_session(manager: AgentManager, session_key: str, turns: int, tag: str, errors: List[str],
+                with_updates: bool = False) -> None:
+    """
+    Envía varios turnos a una sesión.
+
+    Args:
+        manager: Gestor compartido
+        session_key: Sesión a la que pertenecen los turnos
+        turns: Número de turnos
+        tag: Marca del hilo para distinguir sus mensajes
+        errors: Lista donde registrar los errores
+        with_updates: Enviar el estado de la petición como las rutas (updates de process_message)
+    """
+    try:
+        for turn in range(turns):
+            context = manager.get_session_context(session_key)
+            message = f"{tag}-{turn}"
+            updates = {'request_message': message} if with_updates else None
+            response = "".join(manager.process_message(message, context, updates))
+            expected = "".join(f"{session_key}:{message}:{index};" for index in range(manager.agents[0].chunks))
+            if response != expected:
+                errors.append(f"{session_key}: respuesta inesperada para {message}: {response[:80]}")
+    except Exception as e:
+        errors.append(f"{session_key}: {type(e).__name__}: {e}")
+
+
+def check_session(manager: AgentManager, session_key: str, expected_turns: int) -> List[str]:
+    """
+    Verifica el historial de una sesión.
+
+    Args:
+        manager: Gestor compartido
+        session_key: Sesión a verificar
+        expected_turns: Turnos que debe contener
+
+    Returns:
+        Lista de problemas encontrados
+    """
+    problems = []
+    context = manager.get_session_context(session_key)
+    messages = context['messages']
+    if len(messages) != expected_turns * 2:
+        problems.append(f"{session_key}: {len(messages)} mensajes, se esperaban {expected_turns * 2}")
+    for index in range(0, len(messages) - 1, 2):
+        user, assistant = messages[index], messages[index + 1]
+        if user['role'] != 'user' or assistant['role'] != 'assistant':
+            problems.append(f"{session_key}: roles intercalados en la posición {index}")
+            break
+        if not assistant['content'].startswith(f"{session_key}:{user['content']}:"):
+            problems.append(f"{session_key}: respuesta de otro turno o sesión en la posición {index}")
+            break
+    if context['user_info'].get('turns') != expected_turns:
+        problems.append(f"{session_key}: user_info registra {context['user_info'].get('turns')} turnos")
+    if context['message_count'] != expected_turns:
+        problems.append(f"{session_key}: message_count {context['message_count']} != {expected_turns}")
+    return problems
+
+
+def run_threads(targets: List[tuple]) -> float:
+    """
+    Ejecuta funciones en hilos simultáneos y mide el tiempo total.
+
+    Args:
+        targets: Tuplas (función, argumentos)
+
+    Returns:
+        Segundos transcurridos
+    """
+    threads = [threading.Thread(target=target, args=args) for target, args in targets]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start
+
+
+def check_distinct_sessions(manager: AgentManager, sessions: int = DEFAULT_SESSIONS,
+                            turns: int = DEFAULT_TURNS) -> float:
+    """
+    Una sesión por hilo: cada sesión conserva solo lo suyo y todas avanzan en paralelo.
+
+    Returns:
+        Segundos transcurridos
+    """
+    errors = []
+    elapsed = run_threads([
+        (run_session, (manager, f"session-{number}", turns, "t0", errors))
+        for number in range(sessions)
+    ])
+    problems = list(errors)
+    for number in range(sessions):
+        problems.extend(check_session(manager, f"session-{number}", turns))
+    assert not problems, f"{len(problems)} problemas de aislamiento: {problems[:5]}"
+
+    echo = manager.agents[0]
+    sequential = sessions * turns * echo.chunks * echo.delay
+    # En paralelo el tiempo se acerca al de una sesión; con margen para máquinas lentas
+    assert elapsed < sequential / 2, f"Las sesiones distintas no se procesaron en paralelo ({elapsed:.2f}s)"
+    assert not manager.context['messages'], "La conversación por defecto recibió mensajes de las sesiones"
+    return elapsed
+
+
+def check_same_session(manager: AgentManager, threads: int = DEFAULT_SAME_SESSION_THREADS,
+                       turns: int = DEFAULT_TURNS, session_key: str = "shared-session",
+                       with_updates: bool = False) -> float:
+    """
+    Varios hilos sobre la misma sesión: los turnos se serializan y el estado de
+    cada petición no se mezcla con el turno en curso.
+
+    Returns:
+        Segundos transcurridos
+    """
+    errors = []
+    elapsed = run_threads([
+        (run_session, (manager, session_key, turns, f"t{number}", errors, with_updates))
+        for number in range(threads)
+    ])
+    problems = errors + check_session(manager, session_key, turns * threads)
+    assert not problems, f"{len(problems)} problemas de aislamiento: {problems[:5]}"
+
+    echo = manager.agents[0]
+    minimum = threads * turns * echo.chunks * echo.delay
+    assert elapsed >= minimum * 0.9, f"Los turnos de una misma sesión no se serializaron ({elapsed:.2f}s)"
+    return elapsed
+
+
+def _with_manager(check, **kwargs) -> None:
+    """Ejecuta una comprobación con un gestor cuyos contextos están en un directorio temporal"""
+    with tempfile.TemporaryDirectory(prefix='session_isolation_') as workdir:
+        manager = create_manager(os.path.join(workdir, 'contexts'))
+        try:
+            check(manager, **kwargs)
+        finally:
+            manager.persistence.flush(30)
+            if manager.context_manager.maintenance is not None:
+                manager.context_manager.maintenance.stop()
+
+
+def test_distinct_sessions_are_isolated_and_parallel():
+    _with_manager(check_distinct_sessions)
+
+
+def test_same_session_turns_are_serialized():
+    _with_manager(check_same_session)
+
+
+def test_request_updates_are_applied_under_the_session_lock():
+    _with_manager(check_same_session, with_updates=True)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Punto de entrada de la prueba.
+
+    Returns:
+        Código de salida (1 si se detecta algún problema de aislamiento)
+    """
+    parser = argparse.ArgumentParser(description="Aislamiento y paralelismo de sesiones en AgentManager")
+    parser.add_argument('--sessions', type=int, default=DEFAULT_SESSIONS, help='Sesiones concurrentes')
+    parser.add_argument('--turns', type=int, default=DEFAULT_TURNS, help='Turnos por sesión')
+    parser.add_argument('--chunks', type=int, default=DEFAULT_CHUNKS, help='Fragmentos por respuesta')
+    parser.add_argument('--delay', type=float, default=DEFAULT_DELAY, help='Pausa entre fragmentos (segundos)')
+    parser.add_argument('--same-session-threads', type=int, default=DEFAULT_SAME_SESSION_THREADS,
+                        help='Hilos que envían turnos a la vez a una misma sesión')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.ERROR)
+    workdir = tempfile.mkdtemp(prefix='session_isolation_')
+    try:
+        manager = create_manager(os.path.join(workdir, 'contexts'), args.chunks, args.delay)
+        elapsed = check_distinct_sessions(manager, args.sessions, args.turns)
+        sequential = args.sessions * args.turns * args.chunks * args.delay
+        print(f"Sesiones distintas: {args.sessions} x {args.turns} turnos en {elapsed:.2f}s "
+              f"(en serie serían ~{sequential:.2f}s, aceleración x{sequential / elapsed:.1f})")
+
+        minimum = args.same_session_threads * args.turns * args.chunks * args.delay
+        for with_updates, label in ((False, "Misma sesión"), (True, "Misma sesión con estado de la petición")):
+            elapsed = check_same_session(manager, args.same_session_threads, args.turns,
+                                         f"shared-session-{int(with_updates)}", with_updates)
+            print(f"{label}: {args.same_session_threads} hilos x {args.turns} turnos en {elapsed:.2f}s "
+                  f"(serializados, mínimo ~{minimum:.2f}s)")
+
+        manager.persistence.flush(30)
+        print(f"Bloqueos: {manager.get_session_lock_stats()}")
+        print(f"Caché de sesiones: {manager.get_session_cache_stats()}")
+    except AssertionError as e:
+        print(f"\nERROR: {e}")
+        return 1
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print("\nAislamiento correcto")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,324 @@
+#!/usr/bin/env python
+"""
+Prueba de sesiones compartidas entre varios procesos de la aplicación.
+
+Arranca un servidor RESP mínimo que sustituye a Redis (GET, SET con EX,
+DEL, PING) y varios procesos trabajadores, cada uno con la aplicación Flask
+completa (SESSION_BACKEND=redis) en su propio puerto, como si estuvieran
+detrás de un balanceador sin afinidad de sesión. Después comprueba:
+
+- sesión de Flask: cada usuario sube un archivo a un proceso, guarda una
+  estimación en otro y lee la información del proyecto desde un tercero;
+  los datos deben coincidir y la cookie solo debe llevar el identificador;
+- contexto de conversación: los turnos de cada sesión se reparten entre los
+  procesos y cada uno debe ver todos los mensajes anteriores, en orden.
+
+Uso:
+    python benchmarks/session_multiworker_test.py
+    python benchmarks/session_multiworker_test.py --workers 4 --users 20 --turns 12
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import shutil
+import logging
+import argparse
+import tempfile
+import threading
+import subprocess
+import socketserver
+import urllib.request
+from typing import Dict, Any, List, Optional
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC_DIR = os.path.join(ROOT_DIR, 'src')
+
+# Prefijo de las líneas del protocolo entre el proceso principal y los trabajadores
+PROTOCOL_PREFIX = '@@ '
+
+
+class RespStandInHandler(socketserver.StreamRequestHandler):
+    """Atiende una conexión del servidor RESP de prueba"""
+
+    def read_command(self) -> Optional[List[bytes]]:
+        """Lee un array de cadenas RESP (None si se cierra la conexión)"""
+        header = self.rfile.readline()
+        if not header:
+            return None
+        if not header.startswith(b'*'):
+            raise ValueError(f"Comando no válido: {header!r}")
+        args = []
+        for _ in range(int(header[1:-2])):
+            length = int(self.rfile.readline()[1:-2])
+            args.append(self.rfile.read(length + 2)[:-2])
+        return args
+
+    def handle(self) -> None:
+        server = self.server
+        while True:
+            try:
+                args = self.read_command()
+            except (ValueError, ConnectionError):
+                return
+            if args is None:
+                return
+            command = args[0].upper()
+            with server.lock:
+                server.commands += 1
+                now = time.monotonic()
+                if command == b'PING':
+                    reply = b'+PONG\r\n'
+                elif command == b'GET':
+                    entry = server.values.get(args[1])
+                    if entry is None or entry[1] <= now:
+                        server.values.pop(args[1], None)
+                        reply = b'$-1\r\n'
+                    else:
+                        reply = b'$%d\r\n%s\r\n' % (len(entry[0]), entry[0])
+                elif command == b'SET':
+                    ttl = int(args[4]) if len(args) > 4 and args[3].upper() == b'EX' else 10 ** 9
+                    server.values[args[1]] = (args[2], now + ttl)
+                    server.bytes_stored += len(args[2])
+                    reply = b'+OK\r\n'
+                elif command == b'DEL':
+                    removed = sum(1 for key in args[1:] if server.values.pop(key, None) is not None)
+                    reply = b':%d\r\n' % removed
+                else:
+                    reply = b'-ERR unknown command\r\n'
+            self.wfile.write(reply)
+
+
+class RespStandInServer(socketserver.ThreadingTCPServer):
+    """Servidor clave-valor en memoria que habla el subconjunto de RESP usado por las sesiones"""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), RespStandInHandler)
+        self.lock = threading.Lock()
+        self.values = {}
+        self.commands = 0
+        self.bytes_stored = 0
+
+
+def run_worker() -> None:
+    """
+    Proceso trabajador: sirve la aplicación por HTTP y atiende por la
+    entrada estándar las órdenes de la prueba de contextos.
+    """
+    sys.path.insert(0, SRC_DIR)
+    logging.basicConfig(level=logging.ERROR)
+    from werkzeug.serving import make_server
+    from app import create_app
+    from core.runtime import get_runtime
+
+    app = create_app()
+    agent_manager = get_runtime().agent_manager
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    def reply(payload: Dict[str, Any]) -> None:
+        sys.stdout.write(PROTOCOL_PREFIX + json.dumps(payload) + '\n')
+        sys.stdout.flush()
+
+    reply({'port': server.server_port})
+    for line in sys.stdin:
+        order = json.loads(line)
+        if order['command'] == 'turn':
+            # Un turno: añadir un mensaje al contexto vivo y publicarlo
+            context = agent_manager.get_session_context(order['session'])
+            seen = [message['content'] for message in context['messages']]
+            context['messages'].append({'role': 'user', 'content': order['message']})
+            agent_manager.session_cache.put(order['session'], context)
+            reply({'seen': seen})
+        elif order['command'] == 'stats':
+            agent_manager.persistence.flush(30)
+            reply({'session_backend': agent_manager.get_session_backend_stats(),
+                   'session_cache': agent_manager.get_session_cache_stats()})
+        elif order['command'] == 'stop':
+            break
+    server.shutdown()
+
+
+class Worker:
+    """Proceso trabajador visto desde el proceso principal"""
+
+    def __init__(self, workdir: str, redis_url: str):
+        env = dict(os.environ, SESSION_BACKEND='redis', SESSION_REDIS_URL=redis_url,
+                   PYTHONPATH=SRC_DIR, SECRET_KEY='multiworker-test')
+        self.process = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--worker'],
+                                        cwd=workdir, env=env, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                        stderr=subprocess.DEVNULL, text=True)
+        self.port = self.read()['port']
+
+    def read(self) -> Dict[str, Any]:
+        """Lee la siguiente respuesta del trabajador"""
+        for line in self.process.stdout:
+            if line.startswith(PROTOCOL_PREFIX):
+                return json.loads(line[len(PROTOCOL_PREFIX):])
+        raise RuntimeError("El proceso trabajador terminó inesperadamente")
+
+    def send(self, **order: Any) -> Dict[str, Any]:
+        """Envía una orden y espera su respuesta"""
+        self.process.stdin.write(json.dumps(order) + '\n')
+        self.process.stdin.flush()
+        return self.read()
+
+    def stop(self) -> None:
+        """Detiene el trabajador"""
+        try:
+            self.process.stdin.write(json.dumps({'command': 'stop'}) + '\n')
+            self.process.stdin.flush()
+            self.process.wait(10)
+        except (OSError, subprocess.TimeoutExpired):
+            self.process.kill()
+
+
+class Browser:
+    """Cliente HTTP con una única cookie de sesión, como un navegador"""
+
+    def __init__(self):
+        self.cookie = None
+        self.cookie_lengths = []
+
+    def request(self, port: int, path: str, data: Optional[bytes] = None,
+                headers: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+        """
+        Envía una petición a un trabajador con la cookie actual.
+
+        Returns:
+            Cuerpo JSON de la respuesta
+        """
+        request = urllib.request.Request(f"http://127.0.0.1:{port}{path}", data=data, headers=headers or {})
+        if self.cookie:
+            request.add_header('Cookie', self.cookie)
+        with urllib.request.urlopen(request, timeout=30) as response:
+            set_cookie = response.headers.get('Set-Cookie')
+            if set_cookie:
+                self.cookie = set_cookie.split(';', 1)[0]
+                self.cookie_lengths.append(len(self.cookie))
+            return json.loads(response.read())
+
+    def upload(self, port: int, path: str, filename: str, content: str) -> Dict[str, Any]:
+        """Sube un archivo en un formulario multipart"""
+        boundary = uuid.uuid4().hex
+        body = (f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"{filename}\"\r\n"
+                f"Content-Type: text/plain\r\n\r\n{content}\r\n--{boundary}--\r\n").encode('utf-8')
+        return self.request(port, path, body, {'Content-Type': f"multipart/form-data; boundary={boundary}"})
+
+
+def check_flask_sessions(workers: List[Worker], users: int) -> List[str]:
+    """
+    Reparte las peticiones de cada usuario entre procesos distintos.
+
+    Returns:
+        Lista de problemas encontrados
+    """
+    problems = []
+    browsers = []
+    for number in range(users):
+        browser = Browser()
+        browsers.append(browser)
+        content = f"Proyecto {number}: centralita virtual para 40 agentes. " * 400
+        estimate = {'hours': 100 + number, 'user': number}
+        first, second, third = (workers[(number + offset) % len(workers)].port for offset in range(3))
+
+        browser.upload(first, '/process-txt', f"proyecto_{number}.txt", content)
+        browser.request(second, '/project/estimate', json.dumps({'estimate': estimate}).encode('utf-8'),
+                        {'Content-Type': 'application/json'})
+        info = browser.request(third, '/project/info')['project_info']
+        if info['file_name'] != f"proyecto_{number}.txt" or info['file_content'] != content:
+            problems.append(f"usuario {number}: el archivo subido no llegó al proceso {third}")
+        if info['estimate'] != estimate:
+            problems.append(f"usuario {number}: estimación {info['estimate']} en lugar de {estimate}")
+        if len(set(browser.cookie_lengths)) > 1 or browser.cookie_lengths[0] > 128:
+            problems.append(f"usuario {number}: la cookie no es solo un identificador ({browser.cookie_lengths})")
+    lengths = [length for browser in browsers for length in browser.cookie_lengths]
+    print(f"Sesiones de Flask: {users} usuarios, cookie de {max(lengths)} bytes "
+          f"(el archivo del proyecto ocupa ~{len(content) // 1024} KB)")
+    return problems
+
+
+def check_conversation_contexts(workers: List[Worker], sessions: int, turns: int) -> List[str]:
+    """
+    Reparte los turnos de cada conversación entre los procesos.
+
+    Returns:
+        Lista de problemas encontrados
+    """
+    problems = []
+    start = time.perf_counter()
+    for turn in range(turns):
+        for number in range(sessions):
+            session_key = f"conversation-{number}"
+            worker = workers[(turn + number) % len(workers)]
+            seen = worker.send(command='turn', session=session_key, message=f"{session_key}/{turn}")['seen']
+            expected = [f"{session_key}/{previous}" for previous in range(turn)]
+            if seen != expected:
+                problems.append(f"{session_key}, turno {turn}: el proceso vio {len(seen)} mensajes "
+                                f"en lugar de {len(expected)}")
+    elapsed = time.perf_counter() - start
+    print(f"Contextos de conversación: {sessions} sesiones x {turns} turnos alternando procesos "
+          f"({elapsed * 1000 / (sessions * turns):.2f} ms por turno)")
+    return problems
+
+
+def main() -> int:
+    """
+    Punto de entrada de la prueba.
+
+    Returns:
+        Código de salida (1 si algún proceso no ve el estado de otro)
+    """
+    parser = argparse.ArgumentParser(description="Sesiones compartidas entre varios procesos")
+    parser.add_argument('--workers', type=int, default=3, help='Procesos de la aplicación')
+    parser.add_argument('--users', type=int, default=12, help='Usuarios de la prueba de sesiones de Flask')
+    parser.add_argument('--sessions', type=int, default=8, help='Conversaciones de la prueba de contextos')
+    parser.add_argument('--turns', type=int, default=10, help='Turnos por conversación')
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker()
+        return 0
+
+    server = RespStandInServer()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    redis_url = f"redis://127.0.0.1:{server.server_address[1]}/0"
+    workdir = tempfile.mkdtemp(prefix='session_multiworker_')
+    workers = []
+    problems = []
+    try:
+        start = time.perf_counter()
+        workers = [Worker(workdir, redis_url) for _ in range(args.workers)]
+        print(f"{len(workers)} procesos en los puertos {[worker.port for worker in workers]} "
+              f"(arranque {time.perf_counter() - start:.1f}s), servidor de sesiones en {redis_url}")
+
+        problems.extend(check_flask_sessions(workers, args.users))
+        problems.extend(check_conversation_contexts(workers, args.sessions, args.turns))
+
+        stats = workers[0].send(command='stats')
+        print(f"Almacén de sesiones (proceso 0): {stats['session_backend']}")
+        print(f"Caché de sesiones (proceso 0): {stats['session_cache']}")
+        print(f"Servidor RESP: {server.commands} comandos, {len(server.values)} claves, "
+              f"{server.bytes_stored / 1024:.0f} KB escritos")
+    finally:
+        for worker in workers:
+            worker.stop()
+        server.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if problems:
+        print(f"\n{len(problems)} problemas:")
+        for problem in problems[:20]:
+            print(f"  - {problem}")
+        return 1
+    print("\nEstado compartido correctamente entre procesos")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+"""
+Prueba del tiempo de arranque de la aplicación.
+
+Lanza varios procesos nuevos de Python (cada uno en un directorio de trabajo
+temporal, para no tocar data/ ni storage/) y mide en cada uno:
+
+- la importación de app (lo que paga un worker o la recolección de pruebas
+  que solo importa los módulos), y los módulos propios más lentos según
+  python -X importtime;
+- create_app();
+- la primera petición (GET /) y una segunda, ya en caliente.
+
+Uso:
+    python benchmarks/startup_benchmark.py
+    python benchmarks/startup_benchmark.py --runs 10
+"""
+import os
+import sys
+import json
+import shutil
+import argparse
+import tempfile
+import subprocess
+from typing import Dict, List
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC_DIR = os.path.join(ROOT_DIR, 'src')
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from context_journal_benchmark import percentile
+
+# Se ejecuta en el proceso hijo: las salidas de la aplicación van a stderr
+CHILD_SCRIPT = r"""
+import io, sys, time, json, contextlib
+start = time.perf_counter()
+with contextlib.redirect_stdout(sys.stderr):
+    import app
+    imported = time.perf_counter()
+    flask_app = app.create_app()
+    created = time.perf_counter()
+    client = flask_app.test_client()
+    status = client.get('/').status_code
+    first = time.perf_counter()
+    client.get('/')
+    second = time.perf_counter()
+print(json.dumps({'import': imported - start, 'create_app': created - imported,
+                  'first_request': first - created, 'second_request': second - first, 'status': status}))
+"""
+
+# Módulos propios de la aplicación (para el desglose de -X importtime)
+APP_PACKAGES = ('app', 'api', 'agents', 'core', 'data', 'services', 'utils')
+
+
+def run_child(workdir: str, importtime: bool = False) -> Dict[str, float]:
+    """
+    Arranca la aplicación en un proceso nuevo y devuelve sus tiempos (en segundos).
+    """
+    env = dict(os.environ, PYTHONPATH=SRC_DIR, PYTHONDONTWRITEBYTECODE='1',
+               LEADS_DB_PATH=os.path.join(workdir, 'data', 'leads.db'))
+    command = [sys.executable] + (['-X', 'importtime'] if importtime else []) + ['-c', CHILD_SCRIPT]
+    result = subprocess.run(command, cwd=workdir, env=env, capture_output=True, text=True, check=True)
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    if importtime:
+        modules = []
+        for line in result.stderr.splitlines():
+            if line.startswith('import time:') and '|' in line:
+                _, cumulative, name = line[len('import time:'):].split('|')
+                if name.strip().split('.')[0] in APP_PACKAGES and cumulative.strip().isdigit():
+                    modules.append((int(cumulative), name.rstrip()))
+        timings['modules'] = sorted(modules, reverse=True)[:12]
+    return timings
+
+
+def main() -> int:
+    """
+    Punto de entrada de la prueba.
+
+    Returns:
+        Código de salida (1 si la primera petición no responde 200)
+    """
+    parser = argparse.ArgumentParser(description="Tiempo de arranque de la aplicación")
+    parser.add_argument('--runs', type=int, default=5, help='Procesos medidos')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='startup_bench_')
+    try:
+        # Un primer arranque crea las bases de datos y los directorios; los medidos ya los encuentran
+        run_child(workdir)
+        samples: Dict[str, List[float]] = {}
+        for _ in range(args.runs):
+            timings = run_child(workdir)
+            if timings['status'] != 200:
+                print(f"GET / respondió {timings['status']}")
+                return 1
+            for key in ('import', 'create_app', 'first_request', 'second_request'):
+                samples.setdefault(key, []).append(timings[key] * 1000)
+        for key, values in samples.items():
+            print(f"{key}: p50 {percentile(values, 50):.1f} ms, máx {max(values):.1f} ms")
+        total = [sum(values) for values in zip(samples['import'], samples['create_app'], samples['first_request'])]
+        print(f"hasta la primera respuesta: p50 {percentile(total, 50):.1f} ms")
+
+        print("\nmódulos propios más lentos al importar app (-X importtime, acumulado):")
+        for cumulative, name in run_child(workdir, importtime=True)['modules']:
+            print(f"    {cumulative / 1000:8.1f} ms  {name}")
+        return 0
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,241 @@
+#!/usr/bin/env python
+"""
+Prueba de reconexión de streams SSE en /agent/chat/stream.
+
+Un servidor local imita la API de chat de LM Studio: envía --tokens
+fragmentos separados por --delay segundos y cuenta las peticiones que recibe.
+Para cada servidor (en un proceso nuevo y un directorio de trabajo temporal)
+se abren --conversations conversaciones a la vez; cada una corta su conexión
+tras recibir --cut fragmentos, espera --gap segundos (la red móvil sin
+cobertura) y vuelve a conectar como lo haría un EventSource:
+
+- con Last-Event-ID: el servidor reanuda el stream original;
+- sin Last-Event-ID (el comportamiento anterior): la reconexión reenvía el mensaje.
+
+Se mide cuántas generaciones del LLM hace cada turno, si el texto recibido
+entre las dos conexiones es exactamente la respuesta (ni fragmentos perdidos
+ni repetidos) y el tiempo hasta el primer evento tras reconectar.
+
+Servidores:
+- hilos: app.run(threaded=True), el servidor de python src/app.py;
+- asgi: uvicorn --factory asgi:create_asgi_app (requiere asgiref, uvicorn y httpx).
+
+Uso:
+    python benchmarks/stream_resume_benchmark.py
+    python benchmarks/stream_resume_benchmark.py --conversations 200 --tokens 100 --cut 30
+"""
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import asyncio
+import argparse
+import tempfile
+import subprocess
+from typing import Any, Dict, List, Optional, Tuple
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC_DIR = os.path.join(ROOT_DIR, 'src')
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from context_journal_benchmark import percentile
+from asgi_stream_benchmark import SERVERS, free_port, sse_chunk, wait_for_server
+
+# Eventos SSE en la respuesta (cada evento se envía en un único fragmento chunked)
+EVENT_RE = re.compile(rb'(?:id: (\S+)\n)?data: (.*?)\n\n')
+COOKIE_RE = re.compile(rb'\r\nset-cookie: ([^;\r\n]+)', re.IGNORECASE)
+
+
+async def start_llm_stub(port: int, tokens: int, delay: float, calls: List[int]) -> asyncio.AbstractServer:
+    """
+    Arranca la imitación de la API de chat; calls[0] cuenta las generaciones.
+    """
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                head = await reader.readuntil(b'\r\n\r\n')
+                length = 0
+                for line in head.split(b'\r\n'):
+                    if line.lower().startswith(b'content-length:'):
+                        length = int(line.split(b':', 1)[1])
+                await reader.readexactly(length)
+                if head.startswith(b'GET'):
+                    writer.write(b'HTTP/1.1 200 OK\r\nContent-Length: 11\r\n\r\n{"data":[]}')
+                    continue
+                calls[0] += 1
+                writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nTransfer-Encoding: chunked\r\n\r\n')
+                for i in range(tokens):
+                    delta = json.dumps({'choices': [{'delta': {'content': f" t{i}"}}]})
+                    writer.write(sse_chunk(f"data: {delta}\n\n".encode()))
+                    await writer.drain()
+                    await asyncio.sleep(delay)
+                writer.write(sse_chunk(b'data: [DONE]\n\n') + b'0\r\n\r\n')
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle, '127.0.0.1', port, backlog=4096)
+
+
+async def read_stream(port: int, headers: str, cut: Optional[int]) -> Tuple[List[str], Optional[str], Optional[str], bool, float]:
+    """
+    Lee un stream hasta el evento final o hasta recibir cut fragmentos (y corta la conexión).
+
+    Returns:
+        Tupla (fragmentos, último id, cookie de sesión, evento final recibido, ms hasta el primer evento)
+    """
+    start = time.perf_counter()
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(f"GET /agent/chat/stream?message=hola HTTP/1.1\r\nHost: 127.0.0.1\r\n"
+                 f"Accept: text/event-stream\r\n{headers}\r\n".encode())
+    await writer.drain()
+    buffered = b''
+    tokens: List[str] = []
+    last_id = cookie = None
+    first_event = None
+    done = False
+    position = 0
+    try:
+        while not done and (cut is None or len(tokens) < cut):
+            data = await reader.read(65536)
+            if not data:
+                break
+            buffered += data
+            if cookie is None and COOKIE_RE.search(buffered):
+                cookie = COOKIE_RE.search(buffered).group(1).decode()
+            for match in EVENT_RE.finditer(buffered, position):
+                position = match.end()
+                if first_event is None:
+                    first_event = (time.perf_counter() - start) * 1000
+                if match.group(1):
+                    last_id = match.group(1).decode()
+                event = json.loads(match.group(2))
+                if 'token' in event:
+                    tokens.append(event['token'])
+                if event.get('done') or 'error' in event:
+                    done = True
+                    break
+                if cut is not None and len(tokens) >= cut:
+                    break
+            # El id del primer frame (sin datos) también cuenta como último id
+            if last_id is None:
+                opening = re.search(rb'\nid: (\S+)\n\n', buffered)
+                if opening:
+                    last_id = opening.group(1).decode()
+    finally:
+        writer.close()
+    return tokens, last_id, cookie, done, first_event or 0.0
+
+
+async def interrupted_turn(port: int, args: argparse.Namespace, resume: bool) -> Dict[str, Any]:
+    """
+    Una conversación: primer mensaje, corte tras args.cut fragmentos y reconexión.
+    """
+    first, last_id, cookie, _, _ = await read_stream(port, '', args.cut)
+    await asyncio.sleep(args.gap)
+    headers = f"Cookie: {cookie}\r\n" if cookie else ''
+    if resume and last_id:
+        headers += f"Last-Event-ID: {last_id}\r\n"
+    rest, _, _, done, reconnect_ms = await read_stream(port, headers, None)
+    return {'text': ''.join(first + rest), 'done': done, 'reconnect_ms': reconnect_ms}
+
+
+async def run_server(name: str, args: argparse.Namespace, llm_port: int, calls: List[int],
+                     expected: str) -> Optional[Dict[str, Any]]:
+    """
+    Arranca un servidor nuevo y mide las reconexiones con y sin Last-Event-ID.
+    """
+    workdir = tempfile.mkdtemp(prefix='stream_resume_bench_')
+    port = free_port()
+    env = dict(os.environ, PYTHONPATH=SRC_DIR, PYTHONDONTWRITEBYTECODE='1', LM_STUDIO_URL=f"http://127.0.0.1:{llm_port}",
+               LEADS_DB_PATH=os.path.join(workdir, 'data', 'leads.db'), CONTEXT_MAINTENANCE_INTERVAL='0')
+    server = subprocess.Popen(SERVERS[name] + [str(port)], cwd=workdir, env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    results = {}
+    try:
+        await wait_for_server(port)
+        for resume in (False, True):
+            calls[0] = 0
+            turns = await asyncio.gather(*[interrupted_turn(port, args, resume) for _ in range(args.conversations)])
+            reconnects = [turn['reconnect_ms'] for turn in turns]
+            results[resume] = {
+                'generations': calls[0] / len(turns),
+                'exact': sum(1 for turn in turns if turn['done'] and turn['text'] == expected),
+                'reconnect_p50': percentile(reconnects, 50),
+                'reconnect_p99': percentile(reconnects, 99)
+            }
+        results['health'] = json.loads((await asyncio.to_thread(fetch_health, port)) or '{}').get('stream_replay')
+        return results
+    except (OSError, asyncio.TimeoutError) as e:
+        print(f"    {name}: el servidor no responde ({e})")
+        return None
+    finally:
+        server.terminate()
+        server.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def fetch_health(port: int) -> Optional[str]:
+    """
+    Lee /agent/health (métricas de los streams reanudables).
+    """
+    import urllib.request
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/agent/health", timeout=10) as response:
+            return response.read().decode()
+    except OSError:
+        return None
+
+
+async def main_async(args: argparse.Namespace) -> int:
+    """
+    Ejecuta la prueba con los dos servidores.
+    """
+    llm_port = free_port()
+    calls = [0]
+    stub = await start_llm_stub(llm_port, args.tokens, args.delay, calls)
+    expected = ''.join(f" t{i}" for i in range(args.tokens))
+    failed = False
+    try:
+        for name in ('hilos', 'asgi'):
+            print(f"\n{name}:")
+            results = await run_server(name, args, llm_port, calls, expected)
+            if results is None:
+                failed = True
+                continue
+            for resume, label in ((False, 'sin Last-Event-ID'), (True, 'con Last-Event-ID')):
+                result = results[resume]
+                print(f"    {label:>17}: {result['generations']:.2f} generaciones por turno, "
+                      f"{result['exact']}/{args.conversations} respuestas exactas; primer evento tras reconectar "
+                      f"p50 {result['reconnect_p50']:.1f} ms, p99 {result['reconnect_p99']:.1f} ms")
+            print(f"    stream_replay: {results['health']}")
+            if results[True]['exact'] < args.conversations or results[True]['generations'] != 1:
+                failed = True
+    finally:
+        stub.close()
+    return 1 if failed else 0
+
+
+def main() -> int:
+    """
+    Punto de entrada de la prueba.
+
+    Returns:
+        Código de salida (1 si alguna reconexión con Last-Event-ID no reanuda exactamente la respuesta)
+    """
+    parser = argparse.ArgumentParser(description="Reconexión de streams SSE con y sin Last-Event-ID")
+    parser.add_argument('--conversations', type=int, default=50, help='Conversaciones simultáneas')
+    parser.add_argument('--tokens', type=int, default=60, help='Fragmentos de cada respuesta')
+    parser.add_argument('--delay', type=float, default=0.02, help='Segundos entre fragmentos')
+    parser.add_argument('--cut', type=int, default=20, help='Fragmentos recibidos antes de cortar la conexión')
+    parser.add_argument('--gap', type=float, default=0.3, help='Segundos sin conexión antes de reconectar')
+    args = parser.parse_args()
+    return asyncio.run(main_async(args))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
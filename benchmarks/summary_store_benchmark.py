@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+"""
+Prueba de latencia del almacén de resúmenes de proyecto.
+
+Genera N clientes (50k por defecto) con sus archivos client_summary_*.txt y
+client_summary_*.json, los importa con SummaryStore.import_files y mide:
+
+- la primera página del listado y páginas profundas;
+- búsquedas de texto completo (tecnologías, intereses, nombres, prefijos),
+  en orden de actualización y por relevancia;
+- la consulta de un cliente por email;
+- lo que hacía antes /admin/project-summaries: leer todos los archivos y
+  fusionar los JSON con los TXT con un next(...) lineal por archivo (solo con
+  los primeros --legacy-files clientes, porque es cuadrático).
+
+Uso:
+    python benchmarks/summary_store_benchmark.py
+    python benchmarks/summary_store_benchmark.py --summaries 20000 --legacy-files 2000
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+from typing import Any, Callable, Dict, List
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, 'src'))
+
+from data.summary_store import SummaryStore, FTS5_SUPPORT, format_summary_text
+
+from context_journal_benchmark import percentile
+
+TECHNOLOGIES = ['Python', 'Django', 'React', 'Node.js', 'Twilio', 'Asterisk', 'Kubernetes', 'PostgreSQL',
+                'Dialogflow', 'Rasa', 'WebRTC', 'Java', 'Angular', 'AWS', 'Azure']
+INTERESTS = ['centralita virtual', 'contact center', 'agentes virtuales', 'sms masivos', 'whatsapp business',
+             'ia conversacional', 'telefonía ip']
+QUERIES = ['asterisk', 'contact center', 'kubernetes postgresql', 'whats', 'empresa 42', 'cliente1234',
+           'presupuesto', 'rasa dialogflow python']
+
+
+def make_summary(number: int, rng: random.Random) -> Dict[str, Any]:
+    """
+    Crea los datos de un resumen como los genera DataManager.generate_project_summary.
+    """
+    technical_analysis = {}
+    if rng.random() < 0.6:
+        technical_analysis = {'complejidad': rng.choice(['Baja', 'Media', 'Alta']),
+                              'tecnologias_recomendadas': rng.sample(TECHNOLOGIES, 3),
+                              'tiempo_estimado': f"{rng.randrange(2, 20)} semanas",
+                              'num_desarrolladores': rng.randrange(1, 6),
+                              'costo_total': rng.randrange(5000, 90000), 'moneda': 'EUR'}
+    return {
+        'client_info': {'name': f"Cliente {number}", 'email': f"cliente{number}@example.com",
+                        'phone': '600000000', 'company': f"Empresa {number % 5000}",
+                        'interest': rng.choice(INTERESTS)},
+        'project_info': {'has_uploaded_file': bool(technical_analysis), 'file_name': 'requisitos.pdf',
+                         'conversation_summary': 'Quiero integrar la centralita con nuestro CRM y '
+                                                 'automatizar la atención fuera de horario'},
+        'technical_analysis': technical_analysis,
+        'timestamp': '2026-01-01T10:00:00'
+    }
+
+
+def write_files(data_dir: str, count: int) -> None:
+    """
+    Escribe los archivos .txt y .json de cada cliente, como DataCollectionAgent y DataManager.
+    """
+    rng = random.Random(42)
+    for number in range(count):
+        summary_data = make_summary(number, rng)
+        filename = f"client_summary_cliente{number}_at_example.com"
+        with open(os.path.join(data_dir, filename + '.json'), 'w', encoding='utf-8') as f:
+            json.dump(summary_data, f, ensure_ascii=False, indent=2)
+        with open(os.path.join(data_dir, filename + '.txt'), 'w', encoding='utf-8') as f:
+            f.write(format_summary_text(summary_data, '01/01/2026 10:00'))
+
+
+def legacy_listing(data_dir: str, limit: int) -> List[Dict[str, Any]]:
+    """
+    Listado como lo hacía /admin/project-summaries (sin generar el texto de los JSON).
+    """
+    summaries = []
+    filenames = sorted(os.listdir(data_dir))[:limit * 2]
+    for filename in filenames:
+        if filename.startswith("client_summary_") and filename.endswith(".txt"):
+            with open(os.path.join(data_dir, filename), 'r', encoding='utf-8') as f:
+                summaries.append({'email': filename[15:-4].replace("_at_", "@"), 'summary': f.read()})
+    for filename in filenames:
+        if filename.startswith("client_summary_") and filename.endswith(".json"):
+            with open(os.path.join(data_dir, filename), 'r', encoding='utf-8') as f:
+                json.load(f)
+            email = filename[15:-5].replace("_at_", "@")
+            if not next((s for s in summaries if s['email'] == email), None):
+                summaries.append({'email': email})
+    return summaries
+
+
+def measure(label: str, function: Callable[[], Any], repeat: int = 20) -> Any:
+    """
+    Ejecuta una función varias veces y muestra sus percentiles de latencia.
+    """
+    latencies = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        latencies.append((time.perf_counter() - start) * 1000)
+    print(f"{label}: p50 {percentile(latencies, 50):.2f} ms, p99 {percentile(latencies, 99):.2f} ms")
+    return result
+
+
+def main() -> int:
+    """
+    Punto de entrada de la prueba.
+
+    Returns:
+        Código de salida (1 si el almacén no contiene los resúmenes esperados)
+    """
+    parser = argparse.ArgumentParser(description="Latencia del almacén de resúmenes")
+    parser.add_argument('--summaries', type=int, default=50000, help='Clientes con resumen')
+    parser.add_argument('--legacy-files', type=int, default=5000, help='Clientes para el listado anterior')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='summary_store_bench_')
+    try:
+        data_dir = os.path.join(workdir, 'data')
+        os.makedirs(data_dir)
+        start = time.perf_counter()
+        write_files(data_dir, args.summaries)
+        print(f"{args.summaries} clientes ({args.summaries * 2} archivos) en {time.perf_counter() - start:.1f}s; "
+              f"FTS5: {FTS5_SUPPORT}")
+
+        store = SummaryStore(os.path.join(workdir, 'project_summaries.db'))
+        start = time.perf_counter()
+        imported = store.import_files(data_dir)
+        print(f"Importación: {imported} resúmenes en {time.perf_counter() - start:.1f}s\n")
+
+        measure("listado, primera página (50)", lambda: store.search(limit=50))
+        measure("listado, página 500 (offset 25000)", lambda: store.search(limit=50, offset=25000))
+        for query in QUERIES:
+            result = measure(f"búsqueda '{query}' (50)", lambda: store.search(query, limit=50))
+            print(f"    {result['total']} resultados")
+        measure("búsqueda 'presupuesto' por relevancia (50)",
+                lambda: store.search('presupuesto', limit=50, relevance=True))
+        rng = random.Random(7)
+        measure("por email", lambda: store.get(f"cliente{rng.randrange(args.summaries)}@example.com"), 200)
+
+        if args.legacy_files:
+            start = time.perf_counter()
+            legacy = legacy_listing(data_dir, args.legacy_files)
+            print(f"\nantes: listado con {len(legacy)} clientes leyendo los archivos: "
+                  f"{time.perf_counter() - start:.2f}s (cuadrático en el número de clientes)")
+
+        summary = store.get('cliente123@example.com')
+        if store.count() != args.summaries or summary is None or summary['name'] != 'Cliente 123':
+            print(f"El almacén tiene {store.count()} resúmenes, se esperaban {args.summaries}")
+            return 1
+        return 0
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
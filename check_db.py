@@ -4,6 +4,7 @@ Script para verificar el contenido de la base de datos SQLite.
 """
 import sqlite3
 import os
+import sys
 import json
 
 # Ruta a la base de datos
@@ -63,12 +64,28 @@ try:
     # Cerrar conexión
     conn.close()
     
-    # También verificar el archivo JSON
+    # También verificar la copia en archivo: leads.jsonl (registro de solo escritura
+    # al final, LEADS_FILE_FORMAT=jsonl) o, si no se ha convertido, leads.json
+    jsonl_path = 'data/leads.jsonl'
     json_path = 'data/leads.json'
-    print(f"\nVerificando archivo JSON en: {os.path.abspath(json_path)}")
-    print("-" * 50)
-    
-    if os.path.exists(json_path):
+    if os.path.exists(jsonl_path):
+        print(f"\nVerificando registro JSONL en: {os.path.abspath(jsonl_path)}")
+        print("-" * 50)
+        # El registro se lee con LeadLog: incluye los segmentos rotados y descarta los leads borrados
+        sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src'))
+        from data.lead_log import LeadLog
+        lead_log = LeadLog(jsonl_path)
+        leads_jsonl = list(lead_log.iter_leads())
+        lead_log.close()
+        print(f"Total de leads en JSONL: {len(leads_jsonl)}")
+        for i, lead in enumerate(leads_jsonl):
+            print(f"Lead JSONL #{i+1}:")
+            for key, value in lead.items():
+                print(f"  {key}: {value}")
+            print("-" * 30)
+    elif os.path.exists(json_path):
+        print(f"\nVerificando archivo JSON en: {os.path.abspath(json_path)}")
+        print("-" * 50)
         with open(json_path, 'r', encoding='utf-8') as f:
             try:
                 leads_json = json.load(f)
@@ -81,7 +98,7 @@ try:
             except json.JSONDecodeError:
                 print("ERROR: El archivo JSON no tiene un formato válido")
     else:
-        print(f"ERROR: El archivo JSON no existe en {json_path}")
+        print(f"ERROR: No existe ni {jsonl_path} ni {json_path}")
     
 except sqlite3.Error as e:
     print(f"ERROR de SQLite: {e}")
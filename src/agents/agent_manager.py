@@ -3,47 +3,102 @@ Gestor de agentes para el chatbot de Alisys.
 Se encarga de seleccionar el agente adecuado para cada mensaje y coordinar
 la interacción entre ellos.
 """
-from typing import Dict, List, Any, Optional, Generator, Tuple
+from typing import Dict, List, Any, Optional, Generator, AsyncGenerator, Tuple
+import asyncio
 import traceback
 import logging
 import uuid
-from .base_agent import BaseAgent
+from .base_agent import BaseAgent, iterate_in_thread
 from utils.intent_classifier import get_confidence_explanation, detect_agent_change_keywords
 from utils.context_manager import ContextPersistenceManager
 from utils.sentiment_analyzer import SentimentAnalyzer
+from utils.sentiment_state import (
+    SentimentAnalyticsStore, new_sentiment_state, update_sentiment_state, state_from_history
+)
+from core.config import SENTIMENT_ANALYTICS_FILE
+from utils.routing_cache import RoutingCache, build_routing_key
+from utils.session_cache import SessionCache
+from utils.session_locks import SessionLockTable
+from services.persistence_worker import get_persistence_worker
+from services.session_backend import get_session_backend
 
 # Configurar logging
 logger = logging.getLogger(__name__)
 
+def new_conversation_context(session_id: Optional[str] = None, user_id: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Crea el contexto vacío de una conversación.
+    
+    Args:
+        session_id: Identificador de la sesión (por defecto, uno nuevo)
+        user_id: Identificador del usuario (se omite si es None)
+        
+    Returns:
+        Contexto inicial de la conversación
+    """
+    context = {
+        'conversation_history': [],
+        'messages': [],
+        'user_info': {},
+        'project_info': {},
+        'current_agent': None,
+        'previous_agent': None,
+        'agent_selection_history': [],  # Historial de selecciones de agentes
+        'sentiment_state': new_sentiment_state(),  # Ventana acotada de sentimiento
+        'session_id': session_id or str(uuid.uuid4())  # ID único para la sesión
+    }
+    if user_id is not None:
+        context['user_id'] = user_id
+    return context
+
 class AgentManager:
     """
     Gestor de agentes que coordina la selección y ejecución de agentes.
+    
+    El gestor no guarda estado de ninguna conversación web: cada petición
+    trae el contexto de su sesión (ver get_session_context) y los turnos de
+    una misma sesión se serializan con un bloqueo propio, de modo que las
+    sesiones distintas se procesan en paralelo sin compartir datos.
+    self.context solo es la conversación por defecto de los usos sin
+    contexto externo (línea de comandos y ejemplos).
     """
     
-    def __init__(self):
+    def __init__(self, sentiment_store: Optional[SentimentAnalyticsStore] = None,
+                 sentiment_analyzer: Optional[SentimentAnalyzer] = None,
+                 context_manager: Optional[ContextPersistenceManager] = None):
         """
         Inicializa el gestor de agentes.
+        
+        Args:
+            sentiment_store: Almacén opcional de análisis completos por mensaje
+                (por defecto, el indicado en SENTIMENT_ANALYTICS_FILE)
+            sentiment_analyzer: Analizador de sentimiento compartido (por defecto, uno propio)
+            context_manager: Persistencia de contextos (por defecto, la de storage/contexts)
         """
         self.agents = []
-        self.current_agent = None
-        self.context = {
-            'conversation_history': [],
-            'messages': [],
-            'user_info': {},
-            'project_info': {},
-            'current_agent': None,
-            'previous_agent': None,
-            'agent_selection_history': [],  # Historial de selecciones de agentes
-            'sentiment_history': [],        # Historial de análisis de sentimiento
-            'session_id': str(uuid.uuid4())  # ID único para la sesión
-        }
+        self.context = new_conversation_context()
         
         # Inicializar componentes
-        self.context_manager = ContextPersistenceManager()
-        self.sentiment_analyzer = SentimentAnalyzer()
+        self.context_manager = context_manager or ContextPersistenceManager()
+        self.sentiment_analyzer = sentiment_analyzer or SentimentAnalyzer()
+        self.persistence = get_persistence_worker()
+        if sentiment_store is None and SENTIMENT_ANALYTICS_FILE:
+            sentiment_store = SentimentAnalyticsStore(SENTIMENT_ANALYTICS_FILE, self.persistence)
+        self.sentiment_store = sentiment_store
+        self.routing_cache = RoutingCache()
+        self.session_backend = get_session_backend()
+        # Los contextos se publican en el almacén de sesiones solo si otros procesos pueden leerlo
+        self.session_cache = SessionCache(self.context_manager, self.persistence,
+                                          shared=self.session_backend if self.session_backend.shared else None)
+        self.session_locks = SessionLockTable()
         
         logger.info(f"AgentManager inicializado. Session ID: {self.context['session_id']}")
     
+    @property
+    def current_agent(self) -> Optional[BaseAgent]:
+        """Agente actual de la conversación por defecto"""
+        return self._get_agent_by_name(self.context.get('current_agent'))
+    
     def register_agent(self, agent: BaseAgent) -> None:
         """
         Registra un nuevo agente en el sistema.
@@ -52,11 +107,16 @@ class AgentManager:
             agent: El agente a registrar
         """
         self.agents.append(agent)
+        
+        # Las decisiones almacenadas dejan de ser válidas con un nuevo agente
+        self.routing_cache.invalidate()
         logger.info(f"Agente registrado: {agent.name} - {agent.description}")
     
     def select_agent(self, message: str, context: Dict[str, Any] = None) -> Optional[BaseAgent]:
         """
         Selecciona el agente más adecuado para manejar el mensaje.
+        Las decisiones se almacenan en una caché LRU indexada por el mensaje
+        y los indicadores relevantes del contexto.
         
         Args:
             message: El mensaje del usuario
@@ -69,6 +129,43 @@ class AgentManager:
         if context is None:
             context = {}
         
+        # Consultar la caché de decisiones antes de evaluar todos los agentes
+        cache_key = build_routing_key(message, context)
+        decision = self.routing_cache.get(cache_key)
+        if decision is None:
+            decision = self._compute_routing_decision(message, context)
+            self.routing_cache.put(cache_key, decision)
+        else:
+            logger.debug(f"Decisión de enrutamiento obtenida de la caché: {decision['agent']}")
+        
+        selected_agent_name = decision['agent']
+        if not selected_agent_name:
+            return None
+        selected_agent = self._get_agent_by_class_name(selected_agent_name)
+        
+        # Registrar la selección para el historial
+        if 'history' in context and decision['reason']:
+            context['history'].append({
+                'message': message,
+                'agent': selected_agent_name,
+                'confidence': decision['confidence'],
+                'reason': decision['reason']
+            })
+        
+        return selected_agent
+    
+    def _compute_routing_decision(self, message: str, context: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Calcula la decisión de enrutamiento evaluando todos los agentes.
+        
+        Args:
+            message: El mensaje del usuario
+            context: Contexto para la selección
+            
+        Returns:
+            Diccionario con el agente seleccionado, su confianza, la razón
+            y las puntuaciones de todos los agentes
+        """
         # Detección rápida de preguntas sobre servicios o información general
         message_lower = message.lower()
         service_info_patterns = [
@@ -79,27 +176,20 @@ class AgentManager:
         
         # Si es una pregunta sobre servicios, forzar el uso del GeneralAgent
         is_service_question = any(pattern in message_lower for pattern in service_info_patterns)
-        if is_service_question:
-            for agent in self.agents:
-                if agent.__class__.__name__ == 'GeneralAgent':
-                    logger.info("Pregunta sobre servicios detectada, utilizando GeneralAgent")
-                    return agent
+        if is_service_question and self._get_agent_by_class_name('GeneralAgent'):
+            logger.info("Pregunta sobre servicios detectada, utilizando GeneralAgent")
+            return {'agent': 'GeneralAgent', 'confidence': None, 'reason': None, 'scores': {}}
         
         # Verificar si hay una solicitud explícita de cambio de agente
         explicit_agent = detect_agent_change_keywords(message)
-        if explicit_agent:
-            for agent in self.agents:
-                if agent.__class__.__name__ == explicit_agent:
-                    logger.info(f"Cambio explícito al agente: {explicit_agent}")
-                    # Actualizar el historial con el cambio de agente
-                    if 'history' in context:
-                        context['history'].append({
-                            'message': message,
-                            'agent': explicit_agent,
-                            'confidence': 1.0,
-                            'reason': 'Selección explícita del usuario'
-                        })
-                    return agent
+        if explicit_agent and self._get_agent_by_class_name(explicit_agent):
+            logger.info(f"Cambio explícito al agente: {explicit_agent}")
+            return {
+                'agent': explicit_agent,
+                'confidence': 1.0,
+                'reason': 'Selección explícita del usuario',
+                'scores': {}
+            }
         
         # Calcular puntuaciones de confianza para cada agente
         agent_scores = {}
@@ -111,7 +201,6 @@ class AgentManager:
         
         # Encontrar el agente con la mayor puntuación
         max_confidence = -1
-        selected_agent = None
         selected_agent_name = None
         
         # Umbrales específicos por agente (ajustados para mayor consistencia)
@@ -131,29 +220,96 @@ class AgentManager:
             
             if confidence > max_confidence and confidence >= threshold:
                 max_confidence = confidence
-                selected_agent = agent
                 selected_agent_name = agent_name
         
         # Si ningún agente supera su umbral, usar el agente de respaldo (GeneralAgent)
-        if not selected_agent:
+        if not selected_agent_name:
             logger.info("Ningún agente supera el umbral. Usando agente de respaldo.")
-            for agent in self.agents:
-                if agent.__class__.__name__ == 'GeneralAgent':
-                    selected_agent = agent
-                    selected_agent_name = 'GeneralAgent'
-                    break
-        
-        # Registrar la selección para el historial
-        if 'history' in context and selected_agent_name:
-            context['history'].append({
-                'message': message,
-                'agent': selected_agent_name,
-                'confidence': max_confidence,
-                'reason': 'Selección automática por puntuación'
-            })
+            if self._get_agent_by_class_name('GeneralAgent'):
+                selected_agent_name = 'GeneralAgent'
         
         logger.info(f"Agente seleccionado: {selected_agent_name} con confianza {max_confidence}")
-        return selected_agent
+        return {
+            'agent': selected_agent_name,
+            'confidence': max_confidence,
+            'reason': 'Selección automática por puntuación',
+            'scores': agent_scores
+        }
+    
+    def _get_agent_by_class_name(self, class_name: str) -> Optional[BaseAgent]:
+        """
+        Busca un agente registrado por el nombre de su clase.
+        
+        Args:
+            class_name: Nombre de la clase del agente
+            
+        Returns:
+            El agente si está registrado, None en caso contrario
+        """
+        return next((a for a in self.agents if a.__class__.__name__ == class_name), None)
+    
+    def get_routing_cache_stats(self) -> Dict[str, Any]:
+        """
+        Devuelve las métricas de la caché de decisiones de enrutamiento.
+        
+        Returns:
+            Diccionario con aciertos, fallos, tasa de aciertos y tamaño
+        """
+        return self.routing_cache.get_stats()
+    
+    def get_persistence_stats(self) -> Dict[str, Any]:
+        """
+        Devuelve las métricas de la cola de persistencia diferida.
+        
+        Returns:
+            Diccionario con profundidad de la cola, escrituras combinadas y tiempos
+        """
+        return self.persistence.get_metrics()
+    
+    def get_session_cache_stats(self) -> Dict[str, Any]:
+        """
+        Devuelve las métricas de la caché de contextos de sesión.
+        
+        Returns:
+            Diccionario con tasa de aciertos, expulsiones y memoria estimada
+        """
+        return self.session_cache.get_stats()
+    
+    def get_session_backend_stats(self) -> Dict[str, Any]:
+        """
+        Devuelve las métricas del almacén de sesiones.
+        
+        Returns:
+            Diccionario con lecturas, escrituras, errores y compresión
+        """
+        return self.session_backend.get_stats()
+    
+    def get_session_context(self, session_key: str) -> Dict[str, Any]:
+        """
+        Obtiene el contexto vivo de una sesión web.
+        Se busca en la caché de sesiones (y, si no está, en el almacén); si la
+        sesión es nueva se crea un contexto vacío identificado por la clave.
+        
+        Args:
+            session_key: Identificador de la sesión del navegador
+            
+        Returns:
+            Contexto de la conversación, compartido entre peticiones de la sesión
+        """
+        context = self.session_cache.get(session_key)
+        if context is None:
+            context = new_conversation_context(session_key, session_key)
+            self.session_cache.put(session_key, context, write_through=False)
+        return context
+    
+    def get_session_lock_stats(self) -> Dict[str, Any]:
+        """
+        Devuelve las métricas de los bloqueos por sesión.
+        
+        Returns:
+            Diccionario con adquisiciones, esperas y sesiones activas
+        """
+        return self.session_locks.get_stats()
     
     def _update_agent_selection(self, agent: BaseAgent, confidence: float, context: Dict[str, Any], reason: str) -> None:
         """
@@ -179,9 +335,6 @@ class AgentManager:
             'reason': reason,
             'message_count': context.get('message_count', 0)
         })
-        
-        # Actualizar el agente actual en el gestor
-        self.current_agent = agent
     
     def _get_agent_by_name(self, agent_name: Optional[str]) -> Optional[BaseAgent]:
         """
@@ -254,9 +407,88 @@ class AgentManager:
         # Si no hay GeneralAgent, usar el último agente registrado
         return self.agents[-1]
     
-    def process_message(self, message: str, context: Dict[str, Any] = None) -> Generator[str, None, None]:
+    def process_message(self, message: str, context: Dict[str, Any] = None,
+                        updates: Optional[Dict[str, Any]] = None,
+                        defaults: Optional[Dict[str, Any]] = None) -> Generator[str, None, None]:
         """
         Procesa un mensaje seleccionando el agente adecuado.
+        Los turnos de una misma sesión se procesan de uno en uno.
+        
+        Args:
+            message: El mensaje del usuario
+            context: Contexto de la sesión (por defecto, la conversación por defecto)
+            updates: Valores de la petición que se escriben en el contexto (ver _apply_updates)
+            defaults: Valores que solo se escriben si el contexto no tiene uno
+            
+        Returns:
+            Un generador que produce la respuesta del agente
+        """
+        session_context = self.context if context is None else context
+        if 'session_id' not in session_context:
+            session_context['session_id'] = session_context.get('user_id') or str(uuid.uuid4())
+        
+        # El bloqueo se mantiene mientras se consume la respuesta y se libera al cerrar el generador
+        with self.session_locks.hold(session_context['session_id']):
+            self._apply_updates(session_context, updates, defaults)
+            return (yield from self._process_turn(message, context))
+    
+    async def process_message_async(self, message: str, context: Dict[str, Any] = None,
+                                    updates: Optional[Dict[str, Any]] = None,
+                                    defaults: Optional[Dict[str, Any]] = None) -> AsyncGenerator[str, None]:
+        """
+        Versión asíncrona de process_message para el servidor ASGI. La selección
+        del agente y el guardado del turno se ejecutan en el executor; la
+        respuesta del LLM se espera en el bucle de eventos sin ocupar un hilo.
+        
+        Args:
+            message: El mensaje del usuario
+            context: Contexto de la sesión (por defecto, la conversación por defecto)
+            updates: Valores de la petición que se escriben en el contexto (ver _apply_updates)
+            defaults: Valores que solo se escriben si el contexto no tiene uno
+            
+        Returns:
+            Un generador asíncrono que produce la respuesta del agente
+        """
+        session_context = self.context if context is None else context
+        if 'session_id' not in session_context:
+            session_context['session_id'] = session_context.get('user_id') or str(uuid.uuid4())
+        
+        loop = asyncio.get_running_loop()
+        async with self.session_locks.hold_async(session_context['session_id']):
+            self._apply_updates(session_context, updates, defaults)
+            agent, working_context = await loop.run_in_executor(None, self._route_turn, message, context)
+            if not agent:
+                yield self._no_agent_response(working_context)
+                return
+            
+            logger.info(f"Procesando mensaje con el agente: {agent.name}")
+            async for chunk in self._process_with_agent_async(agent, message, working_context):
+                yield chunk
+    
+    @staticmethod
+    def _apply_updates(context: Dict[str, Any], updates: Optional[Dict[str, Any]],
+                       defaults: Optional[Dict[str, Any]]) -> None:
+        """
+        Escribe en el contexto vivo el estado de la petición (variables de la
+        sesión, agente pedido...). Se llama con el bloqueo de la sesión
+        adquirido: si las rutas modificaran el contexto antes, dos peticiones
+        simultáneas de la misma sesión podrían mezclar sus valores con el
+        turno en curso.
+        
+        Args:
+            context: Contexto vivo de la sesión
+            updates: Valores que se escriben siempre
+            defaults: Valores que solo se escriben si el contexto no tiene uno
+        """
+        if updates:
+            context.update(updates)
+        for key, value in (defaults or {}).items():
+            if not context.get(key):
+                context[key] = value
+    
+    def _process_turn(self, message: str, context: Optional[Dict[str, Any]]) -> Generator[str, None, None]:
+        """
+        Procesa un turno con el bloqueo de la sesión adquirido.
         
         Args:
             message: El mensaje del usuario
@@ -265,6 +497,32 @@ class AgentManager:
         Returns:
             Un generador que produce la respuesta del agente
         """
+        agent, working_context = self._route_turn(message, context)
+        
+        if not agent:
+            # Si no hay agente disponible, devolver un mensaje de error
+            yield self._no_agent_response(working_context)
+            return
+        
+        # Registrar el cambio de agente
+        logger.info(f"Procesando mensaje con el agente: {agent.name}")
+        
+        # Procesar el mensaje y capturar la respuesta
+        response = yield from self._process_with_agent(agent, message, working_context)
+        
+        return response
+    
+    def _route_turn(self, message: str, context: Optional[Dict[str, Any]]) -> Tuple[Optional[BaseAgent], Dict[str, Any]]:
+        """
+        Prepara el contexto del turno y elige el agente que lo responde.
+        
+        Args:
+            message: El mensaje del usuario
+            context: Contexto externo para el procesamiento (opcional)
+            
+        Returns:
+            Tupla (agente o None si no hay ninguno, contexto de trabajo)
+        """
         # Actualizar contexto y añadir el mensaje
         working_context = self._prepare_context(message, context)
         
@@ -355,30 +613,27 @@ class AgentManager:
                     # Utilizar la selección normal basada en confianza
                     agent = self.select_agent(message, working_context)
         
-        if not agent:
-            # Si no hay agente disponible, devolver un mensaje de error
-            error_message = "No hay agentes disponibles para procesar tu mensaje."
-            logger.error("No se encontró ningún agente para procesar el mensaje")
-            yield error_message
-            
-            # Añadir el mensaje de error al historial
-            working_context['messages'].append({
-                'role': 'assistant',
-                'content': error_message
-            })
-            
-            return
-        
-        # Registrar el cambio de agente
-        logger.info(f"Procesando mensaje con el agente: {agent.name}")
-        
-        # Procesar el mensaje y capturar la respuesta
-        response = yield from self._process_with_agent(agent, message, working_context)
+        return agent, working_context
+    
+    def _no_agent_response(self, working_context: Dict[str, Any]) -> str:
+        """
+        Registra en el historial que ningún agente puede responder.
         
-        # Actualizar el contexto compartido
-        self._update_shared_context(working_context)
+        Args:
+            working_context: Contexto del turno
+            
+        Returns:
+            Mensaje de error para el usuario
+        """
+        error_message = "No hay agentes disponibles para procesar tu mensaje."
+        logger.error("No se encontró ningún agente para procesar el mensaje")
         
-        return response
+        # Añadir el mensaje de error al historial
+        working_context['messages'].append({
+            'role': 'assistant',
+            'content': error_message
+        })
+        return error_message
     
     def _prepare_context(self, message: str, external_context: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """
@@ -391,24 +646,9 @@ class AgentManager:
         Returns:
             El contexto unificado
         """
-        # Usar el contexto proporcionado o el interno
-        if external_context is not None:
-            # Actualizar el contexto interno con valores del externo
-            self.context.update({
-                'current_agent': external_context.get('current_agent', self.context.get('current_agent')),
-                'previous_agent': external_context.get('previous_agent', self.context.get('previous_agent')),
-                'user_info': external_context.get('user_info', self.context.get('user_info', {})),
-                'project_info': external_context.get('project_info', self.context.get('project_info', {})),
-                'messages': external_context.get('messages', self.context.get('messages', []))
-            })
-            # Usar el contexto externo para el procesamiento
-            working_context = external_context
-            
-            # Asegurar que el contexto externo tiene un session_id
-            if 'session_id' not in working_context:
-                working_context['session_id'] = self.context.get('session_id', str(uuid.uuid4()))
-        else:
-            working_context = self.context
+        # Usar el contexto de la sesión o el de la conversación por defecto
+        # (el contexto externo no se mezcla con el interno: cada sesión es independiente)
+        working_context = external_context if external_context is not None else self.context
         
         # Inicializar el historial de mensajes si no existe
         if 'messages' not in working_context:
@@ -422,15 +662,17 @@ class AgentManager:
         # Analizar sentimiento del mensaje
         sentiment_analysis = self.sentiment_analyzer.analyze(message)
         
-        # Almacenar análisis de sentimiento en el historial
-        if 'sentiment_history' not in working_context:
-            working_context['sentiment_history'] = []
-            
-        working_context['sentiment_history'].append({
-            'message': message,
-            'analysis': sentiment_analysis,
-            'message_index': working_context['message_count']
-        })
+        # Actualizar el estado acotado de sentimiento (ventana reciente y agregados)
+        # Los contextos antiguos guardaban el historial completo de análisis
+        legacy_history = working_context.pop('sentiment_history', None)
+        if legacy_history or 'sentiment_state' not in working_context:
+            working_context['sentiment_state'] = state_from_history(legacy_history or [])
+        update_sentiment_state(working_context['sentiment_state'], sentiment_analysis,
+                               working_context['message_count'])
+        
+        # Los análisis completos solo se conservan en el almacén de analítica
+        if self.sentiment_store:
+            self.sentiment_store.record(working_context, message, sentiment_analysis)
         
         # Almacenar el análisis actual para uso inmediato
         working_context['current_sentiment'] = sentiment_analysis
@@ -438,8 +680,7 @@ class AgentManager:
         # Añadir el mensaje del usuario al historial
         working_context['messages'].append({
             'role': 'user',
-            'content': message,
-            'sentiment': sentiment_analysis
+            'content': message
         })
         
         # Registrar información del contexto para debugging
@@ -472,52 +713,90 @@ class AgentManager:
                 full_response += chunk
                 yield chunk
             
-            # Añadir la respuesta al historial de mensajes
-            context['messages'].append({
-                'role': 'assistant',
-                'content': full_response
-            })
-            
-            # Guardar el contexto actualizado para persistencia
-            user_id = context.get('user_id', 'anonymous')
-            self.context_manager.save_context(user_id, context)
-            logger.info(f"Contexto guardado para usuario {user_id} después de la respuesta")
-            
+            self._complete_turn(agent, context, full_response)
             return full_response
         except Exception as e:
             # En caso de error, registrar y devolver un mensaje genérico
-            logger.error(f"Error al procesar mensaje con el agente {agent.name}: {str(e)}")
-            traceback.print_exc()
-            
-            error_message = "Lo siento, ha ocurrido un error al procesar tu mensaje. Por favor, inténtalo de nuevo."
+            error_message = self._fail_turn(agent, context, e)
             yield error_message
+            return error_message
+    
+    async def _process_with_agent_async(self, agent: BaseAgent, message: str,
+                                        context: Dict[str, Any]) -> AsyncGenerator[str, None]:
+        """
+        Versión asíncrona de _process_with_agent. Los agentes sin process_async
+        se ejecutan en el executor con iterate_in_thread.
+        
+        Args:
+            agent: El agente a utilizar
+            message: El mensaje del usuario
+            context: Contexto de procesamiento
             
-            # Añadir el mensaje de error al historial
-            context['messages'].append({
-                'role': 'assistant',
-                'content': error_message
-            })
+        Returns:
+            Un generador asíncrono con la respuesta del agente
+        """
+        try:
+            context['current_agent'] = agent.__class__.__name__
             
-            return error_message
+            process_async = getattr(agent, 'process_async', None)
+            if process_async:
+                chunks = process_async(message, context)
+            else:
+                chunks = iterate_in_thread(agent.process(message, context))
+            
+            full_response = ""
+            async for chunk in chunks:
+                full_response += chunk
+                yield chunk
+            
+            await asyncio.get_running_loop().run_in_executor(None, self._complete_turn, agent, context, full_response)
+        except Exception as e:
+            yield self._fail_turn(agent, context, e)
+    
+    def _complete_turn(self, agent: BaseAgent, context: Dict[str, Any], full_response: str) -> None:
+        """
+        Añade la respuesta al historial y guarda el contexto de la sesión.
+        
+        Args:
+            agent: El agente que ha respondido
+            context: Contexto de procesamiento
+            full_response: Respuesta completa del agente
+        """
+        # Añadir la respuesta al historial de mensajes
+        context['messages'].append({
+            'role': 'assistant',
+            'content': full_response,
+            'agent': agent.__class__.__name__
+        })
+        
+        # Actualizar la caché de sesiones y encolar el guardado del contexto
+        user_id = context.get('user_id', 'anonymous')
+        self.session_cache.put(user_id, context)
+        logger.info(f"Contexto encolado para persistencia del usuario {user_id} después de la respuesta")
     
-    def _update_shared_context(self, context: Dict[str, Any]) -> None:
+    def _fail_turn(self, agent: BaseAgent, context: Dict[str, Any], error: Exception) -> str:
         """
-        Actualiza el contexto interno con información compartida entre agentes.
+        Registra el error de un agente y lo anota en el historial.
         
         Args:
-            context: El contexto actualizado por el agente
+            agent: El agente que ha fallado
+            context: Contexto de procesamiento
+            error: Excepción producida
+            
+        Returns:
+            Mensaje genérico de error para el usuario
         """
-        # Actualizar información del usuario
-        if 'user_info' in context:
-            self.context['user_info'].update(context['user_info'])
+        logger.error(f"Error al procesar mensaje con el agente {agent.name}: {str(error)}")
+        traceback.print_exc()
         
-        # Actualizar información del proyecto
-        if 'project_info' in context:
-            self.context['project_info'].update(context['project_info'])
+        error_message = "Lo siento, ha ocurrido un error al procesar tu mensaje. Por favor, inténtalo de nuevo."
         
-        # Actualizar historial de selección de agentes
-        if 'agent_selection_history' in context:
-            self.context['agent_selection_history'] = context['agent_selection_history']
+        # Añadir el mensaje de error al historial
+        context['messages'].append({
+            'role': 'assistant',
+            'content': error_message
+        })
+        return error_message
     
     def load_session(self, user_id: str) -> bool:
         """
@@ -530,21 +809,17 @@ class AgentManager:
             True si se cargó correctamente, False en caso contrario
         """
         try:
-            # Cargar el contexto desde el almacenamiento
-            loaded_context = self.context_manager.load_context(user_id)
+            # Cargar el contexto desde la caché de sesiones o el almacenamiento
+            loaded_context = self.session_cache.get(user_id)
             
             if not loaded_context:
                 logger.warning(f"No se encontró contexto para el usuario {user_id}")
                 return False
             
-            # Actualizar el contexto interno con los datos cargados
+            # Actualizar la conversación por defecto con los datos cargados
+            # (el agente actual se deriva de su 'current_agent')
             self.context.update(loaded_context)
             
-            # Restaurar el agente actual si está disponible
-            current_agent_name = self.context.get('current_agent')
-            if current_agent_name:
-                self.current_agent = self._get_agent_by_name(current_agent_name)
-            
             logger.info(f"Sesión cargada para usuario {user_id}, {len(self.context.get('messages', []))} mensajes recuperados")
             return True
             
@@ -591,27 +866,16 @@ class AgentManager:
             Lista de metadatos de sesiones
         """
         return self.context_manager.list_user_sessions(user_id)
-
+    
     def reset(self) -> None:
         """
-        Reinicia el estado del gestor de agentes.
+        Reinicia la conversación por defecto del gestor de agentes.
+        Las conversaciones de las sesiones web no se ven afectadas.
         """
         # Guardar el user_id para mantener referencia
         user_id = self.context.get('user_id', 'anonymous')
         
-        # Reiniciar el contexto
-        self.current_agent = None
-        self.context = {
-            'conversation_history': [],
-            'messages': [],
-            'user_info': {},
-            'project_info': {},
-            'current_agent': None,
-            'previous_agent': None,
-            'agent_selection_history': [],
-            'sentiment_history': [],
-            'session_id': str(uuid.uuid4()),
-            'user_id': user_id  # Mantener el ID de usuario
-        }
+        # Reiniciar el contexto (manteniendo el ID de usuario)
+        self.context = new_conversation_context(user_id=user_id)
         
         logger.info(f"AgentManager reiniciado. Nueva session ID: {self.context['session_id']}") 
\ No newline at end of file
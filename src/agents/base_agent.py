@@ -2,33 +2,67 @@
 Clase base para todos los agentes del chatbot de Alisys.
 Define la interfaz común y funcionalidad básica que todos los agentes deben implementar.
 """
-from typing import Dict, Any, Generator, List, Optional
+from typing import Dict, Any, Generator, AsyncGenerator, Iterator, List, Optional
 from abc import ABC, abstractmethod
+import asyncio
 import traceback
 import logging
 from services.lm_studio import LMStudioClient
 from utils.intent_classifier import classify_intent, detect_agent_change_keywords, get_confidence_explanation
+from utils.sentiment_state import recurring_emotion
 
 # Configurar logging
 logger = logging.getLogger(__name__)
 
+# Marca de fin de un generador consumido desde otro hilo
+_EXHAUSTED = object()
+
+async def iterate_in_thread(chunks: Iterator[str]) -> AsyncGenerator[str, None]:
+    """
+    Consume un generador síncrono en el executor del bucle de eventos.
+    Cada fragmento ocupa un hilo solo mientras se calcula; es el camino de
+    los agentes que no tienen versión asíncrona de su procesamiento.
+    
+    Args:
+        chunks: Generador síncrono (p. ej. agent.process)
+        
+    Returns:
+        Generador asíncrono con los mismos fragmentos
+    """
+    loop = asyncio.get_running_loop()
+    try:
+        while True:
+            chunk = await loop.run_in_executor(None, next, chunks, _EXHAUSTED)
+            if chunk is _EXHAUSTED:
+                return
+            yield chunk
+    finally:
+        close = getattr(chunks, 'close', None)
+        try:
+            if close:
+                close()
+        except ValueError:
+            # Cancelado mientras un hilo calculaba el siguiente fragmento
+            pass
+
 class BaseAgent(ABC):
     """
     Clase base abstracta para todos los agentes del sistema.
     Proporciona la estructura común y métodos que todos los agentes deben implementar.
     """
     
-    def __init__(self, name: str, description: str):
+    def __init__(self, name: str, description: str, lm_client: Optional[LMStudioClient] = None):
         """
         Inicializa un nuevo agente.
         
         Args:
             name: Nombre único del agente
             description: Descripción breve de la función del agente
+            lm_client: Cliente de LM Studio compartido (por defecto, uno propio)
         """
         self.name = name
         self.description = description
-        self.lm_client = LMStudioClient()
+        self.lm_client = lm_client or LMStudioClient()
     
     def can_handle(self, message: str, context: Dict[str, Any]) -> float:
         """
@@ -116,25 +150,85 @@ class BaseAgent(ABC):
         
         # Generar la respuesta utilizando el LLM
         try:
-            # Aplicar ajustes basados en el análisis de sentimiento
-            adjusted_system_prompt = self._adjust_prompt_for_sentiment(system_prompt, context)
-            
-            for chunk in self._generate_response(adjusted_system_prompt, message):
+            for chunk in self._generate_response(self._prepare_system_prompt(system_prompt, context), message):
                 full_response += chunk
                 yield chunk
             
-            # Actualizar el contexto con la conversación
-            self._update_conversation_history(message, full_response, context)
+            self._record_turn(message, full_response, context)
             
-            # Actualizar el agente actual en el contexto
-            context['current_agent'] = self.name
+        except Exception as e:
+            yield self._error_response(e)
+    
+    async def process_async(self, message: str, context: Dict[str, Any]) -> AsyncGenerator[str, None]:
+        """
+        Versión asíncrona de process: la respuesta del LLM se espera en el bucle
+        de eventos, sin ocupar un hilo durante la generación. Los agentes que
+        redefinen process y no esta versión se ejecutan con iterate_in_thread.
+        
+        Args:
+            message: Mensaje del usuario
+            context: Contexto de la conversación
+            
+        Returns:
+            Generador asíncrono que produce la respuesta del agente
+        """
+        if type(self).process is not BaseAgent.process:
+            async for chunk in iterate_in_thread(self.process(message, context)):
+                yield chunk
+            return
+        
+        system_prompt = self.get_system_prompt(context)
+        full_response = ""
+        
+        try:
+            async for chunk in self._generate_response_async(self._prepare_system_prompt(system_prompt, context),
+                                                             message):
+                full_response += chunk
+                yield chunk
+            
+            self._record_turn(message, full_response, context)
             
         except Exception as e:
-            # En caso de error, registrar el error completo y devolver un mensaje genérico
-            logger.error(f"Error en el agente {self.name}: {str(e)}")
-            traceback.print_exc()
-            error_message = f"Lo siento, ha ocurrido un error al procesar tu mensaje. Por favor, inténtalo de nuevo."
-            yield error_message
+            yield self._error_response(e)
+    
+    def _prepare_system_prompt(self, system_prompt: str, context: Dict[str, Any]) -> str:
+        """
+        Prompt del sistema que se envía al LLM (process y process_async).
+        
+        Args:
+            system_prompt: Prompt de get_system_prompt
+            context: Contexto de la conversación
+            
+        Returns:
+            Prompt con los ajustes basados en el análisis de sentimiento
+        """
+        return self._adjust_prompt_for_sentiment(system_prompt, context)
+    
+    def _record_turn(self, message: str, full_response: str, context: Dict[str, Any]) -> None:
+        """
+        Registra un turno respondido: actualiza el historial y el agente actual del contexto.
+        
+        Args:
+            message: Mensaje del usuario
+            full_response: Respuesta completa del agente
+            context: Contexto de la conversación
+        """
+        self._update_conversation_history(message, full_response, context)
+        context['current_agent'] = self.name
+    
+    def _error_response(self, error: Exception) -> str:
+        """
+        Registra el error completo de un turno y devuelve el mensaje genérico para el usuario.
+        
+        Args:
+            error: Excepción producida al generar la respuesta
+            
+        Returns:
+            Mensaje de error
+        """
+        logger.error(f"Error en el agente {self.name}: {str(error)}")
+        traceback.print_exc()
+        return "Lo siento, ha ocurrido un error al procesar tu mensaje. Por favor, inténtalo de nuevo."
     
     def _generate_response(self, system_prompt: str, message: str) -> Generator[str, None, None]:
         """
@@ -149,6 +243,19 @@ class BaseAgent(ABC):
         """
         return self.lm_client.generate_stream(system_prompt, message)
     
+    def _generate_response_async(self, system_prompt: str, message: str) -> AsyncGenerator[str, None]:
+        """
+        Versión asíncrona de _generate_response.
+        
+        Args:
+            system_prompt: Prompt del sistema
+            message: Mensaje del usuario
+            
+        Returns:
+            Generador asíncrono que produce la respuesta del modelo
+        """
+        return self.lm_client.generate_stream_async(system_prompt, message)
+    
     def _update_conversation_history(self, user_message: str, assistant_response: str, context: Dict[str, Any]) -> None:
         """
         Actualiza el historial de conversación en el contexto.
@@ -194,10 +301,11 @@ class BaseAgent(ABC):
             formatted_history += f"{role.capitalize()}: {content}\n"
         
         return formatted_history
-
+    
     def _adjust_prompt_for_sentiment(self, system_prompt: str, context: Dict[str, Any]) -> str:
         """
-        Ajusta el prompt del sistema según el análisis de sentimiento del mensaje.
+        Ajusta el prompt del sistema según el análisis de sentimiento del mensaje
+        y la tendencia reciente de la conversación.
         
         Args:
             system_prompt: Prompt original del sistema
@@ -211,12 +319,19 @@ class BaseAgent(ABC):
             return system_prompt
             
         sentiment = context['current_sentiment']
+        state = context.get('sentiment_state')
         
         # Obtener emoción dominante y polaridad
         dominant_emotion = sentiment.get('dominant_emotion')
         polarity = sentiment.get('polarity', 0)
         urgency = sentiment.get('urgency', 0)
         
+        # Suavizar con la tendencia de los últimos mensajes si la hay
+        if state and state.get('count', 0) > 1:
+            dominant_emotion = dominant_emotion or recurring_emotion(state)
+            polarity = state.get('polarity_ewma', polarity)
+            urgency = max(urgency, state.get('max_urgency', 0))
+        
         # Generar instrucciones adicionales basadas en el sentimiento
         sentiment_instructions = []
         
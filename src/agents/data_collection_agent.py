@@ -3,10 +3,14 @@ Agente de recopilación de datos para el chatbot de Alisys.
 Este agente se encarga de solicitar y recopilar información de contacto
 del usuario de manera estructurada.
 """
-from typing import Dict, List, Any, Optional, Tuple, Generator
+from typing import Dict, List, Any, Optional, Tuple, Generator, AsyncGenerator
 from .base_agent import BaseAgent
+from services.lm_studio import LMStudioClient
 from data.data_manager import DataManager
+from services.persistence_worker import get_persistence_worker, snapshot_context
+from core.config import PROJECT_SUMMARY_FILES
 import re
+import asyncio
 import logging
 import os
 import traceback
@@ -16,15 +20,21 @@ class DataCollectionAgent(BaseAgent):
     Agente especializado en recopilar información de contacto del usuario.
     """
     
-    def __init__(self):
+    def __init__(self, data_manager: Optional[DataManager] = None, lm_client: Optional[LMStudioClient] = None):
         """
         Inicializa el agente de recopilación de datos.
+        
+        Args:
+            data_manager: Gestor de datos compartido (por defecto, uno propio)
+            lm_client: Cliente de LM Studio compartido (por defecto, uno propio)
         """
         super().__init__(
             name="DataCollectionAgent",
-            description="Especialista en recopilar información de contacto del usuario"
+            description="Especialista en recopilar información de contacto del usuario",
+            lm_client=lm_client
         )
-        self.data_manager = DataManager()
+        self.data_manager = data_manager or DataManager()
+        self.persistence = get_persistence_worker()
         self.required_fields = ["name", "email", "phone", "company"]
     
     def can_handle(self, message: str, context: Dict[str, Any]) -> bool:
@@ -209,6 +219,54 @@ Historial de conversación:
         Returns:
             Generador que produce la respuesta del agente
         """
+        system_prompt = self._prepare_turn(message, context)
+        
+        # Obtener respuesta del LLM en modo streaming
+        for chunk in self.lm_client.generate_stream(
+            system_prompt=system_prompt,
+            user_message=message
+        ):
+            yield chunk
+            
+        # Actualizar el contexto con el agente actual
+        context['current_agent'] = self.name
+    
+    async def process_async(self, message: str, context: Dict[str, Any]) -> AsyncGenerator[str, None]:
+        """
+        Versión asíncrona de process. La extracción de datos y el guardado del
+        lead se hacen en un hilo del executor; la respuesta del LLM se espera
+        en el bucle de eventos.
+        
+        Args:
+            message: Mensaje del usuario
+            context: Contexto de la conversación
+            
+        Returns:
+            Generador asíncrono que produce la respuesta del agente
+        """
+        loop = asyncio.get_running_loop()
+        system_prompt = await loop.run_in_executor(None, self._prepare_turn, message, context)
+        
+        async for chunk in self.lm_client.generate_stream_async(
+            system_prompt=system_prompt,
+            user_message=message
+        ):
+            yield chunk
+        
+        context['current_agent'] = self.name
+    
+    def _prepare_turn(self, message: str, context: Dict[str, Any]) -> str:
+        """
+        Extrae los datos de contacto del mensaje, guarda el lead si ya está
+        completo y construye el prompt del sistema.
+        
+        Args:
+            message: Mensaje del usuario
+            context: Contexto de la conversación
+            
+        Returns:
+            Prompt del sistema para la respuesta
+        """
         # Inicializar user_info si no existe
         if 'user_info' not in context:
             context['user_info'] = {}
@@ -235,17 +293,7 @@ Historial de conversación:
                 context['data_collection_complete'] = True
         
         # Generar el prompt del sistema
-        system_prompt = self.get_system_prompt(context)
-        
-        # Obtener respuesta del LLM en modo streaming
-        for chunk in self.lm_client.generate_stream(
-            system_prompt=system_prompt,
-            user_message=message
-        ):
-            yield chunk
-            
-        # Actualizar el contexto con el agente actual
-        context['current_agent'] = self.name
+        return self.get_system_prompt(context)
     
     def _extract_contact_info(self, message: str, context: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -500,12 +548,28 @@ Historial de conversación:
         }
         
         # Si hay información de proyecto, añadirla
-        if context.get('project_file_content'):
+        if context.get('project_file_hash'):
             lead_data['project_file_name'] = context.get('project_file_name', 'documento.txt')
         
         if context.get('project_estimate'):
             lead_data['project_estimate'] = context.get('project_estimate')
         
+        # Encolar el guardado del lead y de sus resúmenes (fuera de la respuesta en streaming)
+        self.persistence.enqueue(('lead', lead_data['email']), self._persist_lead,
+                                 lead_data, snapshot_context(context))
+        
+        # Marcar que el formulario ha sido completado en el contexto
+        context['form_completed'] = True
+    
+    def _persist_lead(self, lead_data: Dict[str, Any], context: Dict[str, Any]) -> None:
+        """
+        Guarda el lead en los repositorios y genera sus resúmenes.
+        Se ejecuta en el trabajador de persistencia.
+        
+        Args:
+            lead_data: Datos del lead
+            context: Copia del contexto de la conversación
+        """
         # Guardar el lead
         save_success = self.data_manager.save_lead(lead_data)
         
@@ -515,14 +579,15 @@ Historial de conversación:
                 # Generar resumen detallado del proyecto
                 project_summary = self.data_manager.generate_project_summary(lead_data, context)
                 
-                # Guardar el resumen en un archivo separado para facilitar su acceso
-                summary_filename = f"client_summary_{lead_data.get('email', '').replace('@', '_at_')}.txt"
-                summary_path = os.path.join("data", summary_filename)
-                with open(summary_path, 'w', encoding='utf-8') as f:
-                    f.write(project_summary)
+                # El resumen ya está en el almacén de resúmenes; el archivo de texto es opcional
+                if PROJECT_SUMMARY_FILES:
+                    summary_filename = f"client_summary_{lead_data.get('email', '').replace('@', '_at_')}.txt"
+                    summary_path = os.path.join("data", summary_filename)
+                    with open(summary_path, 'w', encoding='utf-8') as f:
+                        f.write(project_summary)
+                    print(f"Resumen del proyecto guardado en: {summary_path}")
                 
                 # Log del resumen para depuración
-                print(f"Resumen del proyecto generado y guardado en: {summary_path}")
                 print(f"Resumen: {project_summary[:200]}...")
                 
                 # Enviar correo electrónico con el resumen del proyecto (implementación futura)
@@ -531,9 +596,6 @@ Historial de conversación:
             except Exception as e:
                 print(f"Error al generar o guardar el resumen del proyecto: {str(e)}")
                 traceback.print_exc()
-        
-        # Marcar que el formulario ha sido completado en el contexto
-        context['form_completed'] = True
     
     def _contains_contact_data(self, message: str) -> bool:
         """
@@ -603,7 +665,7 @@ Historial de conversación:
             formatted_history.append(f"{role}: {content}")
         
         return "\n".join(formatted_history)
-
+    
     def _check_previous_info_confirmation(self, message: str) -> bool:
         """
         Verifica si el usuario ha confirmado que ya proporcionó información anteriormente.
@@ -8,7 +8,11 @@ from services.lm_studio import send_chat_request
 class EngineerAgent:
     """Agente especializado en consultas técnicas y de ingeniería"""
     
-    def __init__(self):
+    def __init__(self, lm_client=None, document_store=None):
+        # Cliente de LM Studio compartido (None = send_chat_request crea uno por petición)
+        self.lm_client = lm_client
+        # Almacén de documentos subidos: texto por hash y análisis memorizados (None = sin documentos)
+        self.document_store = document_store
         self.name = "EngineerAgent"
         self.description = "Especialista en consultas técnicas y de ingeniería."
         self.confidence_threshold = 0.7
@@ -87,6 +91,19 @@ class EngineerAgent:
             "metodologias": ["Agile", "Scrum", "Kanban", "DevOps", "CI/CD", "TDD", "BDD"]
         }
     
+    def can_handle(self, message, context):
+        """
+        Interfaz común con BaseAgent utilizada por AgentManager.select_agent.
+        
+        Args:
+            message (str): El mensaje del usuario
+            context (dict): El contexto de la conversación
+        
+        Returns:
+            float: Nivel de confianza entre 0 y 1
+        """
+        return self.evaluate_confidence(message, context)
+    
     def evaluate_confidence(self, message, context):
         """
         Evalúa la confianza de este agente para responder al mensaje.
@@ -131,13 +148,13 @@ class EngineerAgent:
         # Consultas sobre estimar o presupuestar proyectos
         if re.search(r'(estimar|presupuesto|costo|coste|precio|cuánto cuesta|cuanto cuesta|valor)', normalized_message):
             confidence += 0.15
-
+        
         # Consultas sobre requisitos técnicos
         if re.search(r'(requisitos|especificaciones|features|funcionalidades|tecnología)', normalized_message):
             confidence += 0.15
         
         # Análisis de archivos de proyecto subidos
-        if context.get('project_file_content') is not None:
+        if context.get('project_file_hash') is not None:
             confidence += 0.3  # Alta confianza si hay un archivo de proyecto
         
         # Permitir transición hacia el agente de ventas para presupuestos
@@ -195,7 +212,7 @@ Responde SOLO con el JSON, sin texto adicional."""
         try:
             # Enviar solicitud para analizar requisitos
             analysis_json = ""
-            for chunk in send_chat_request(prompt, stream=True):
+            for chunk in send_chat_request(prompt, stream=True, client=self.lm_client):
                 chunk_data = json.loads(chunk.replace('data: ', ''))
                 if 'token' in chunk_data:
                     analysis_json += chunk_data['token']
@@ -222,6 +239,44 @@ Responde SOLO con el JSON, sin texto adicional."""
                 "error": str(e)
             }
     
+    def analyze_document(self, document_hash, file_name=None):
+        """
+        Analiza un documento del almacén y genera su estimación de presupuesto.
+        El resultado se memoriza por hash del documento: volver a subir el
+        mismo archivo (o pedir el análisis en otra conversación) no repite la
+        petición al modelo.
+        
+        Args:
+            document_hash (str): Hash SHA-256 del documento
+            file_name (str, optional): Nombre del archivo
+            
+        Returns:
+            tuple: (análisis del proyecto, estimación de presupuesto), o (None, None) si el documento no está
+        """
+        if self.document_store is None:
+            return None, None
+        
+        memoized = self.document_store.get_analysis(document_hash)
+        if memoized is None:
+            file_content = self.document_store.text(document_hash)
+            if file_content is None:
+                return None, None
+            
+            project_analysis = self.analyze_project_requirements(file_content)
+            memoized = {
+                'analysis': project_analysis,
+                'estimate': self.generate_budget_estimate(project_analysis)
+            }
+            # Los análisis fallidos no se memorizan: se reintentan en la siguiente petición
+            if 'error' not in project_analysis:
+                self.document_store.put_analysis(document_hash, memoized)
+        
+        # El nombre del archivo no forma parte del análisis memorizado (depende de la subida)
+        project_analysis = dict(memoized['analysis'])
+        if file_name:
+            project_analysis['archivo_origen'] = file_name
+        return project_analysis, memoized['estimate']
+    
     def generate_budget_estimate(self, project_analysis):
         """
         Genera una estimación de presupuesto basada en el análisis del proyecto
@@ -331,25 +386,21 @@ Responde SOLO con el JSON, sin texto adicional."""
         if 'previous_agent' not in context or context['previous_agent'] != self.name:
             context['previous_agent'] = context.get('current_agent')
         
-        # Analizar si hay un archivo de proyecto en el contexto
-        if context.get('project_file_content') and not context.get('project_analysis'):
-            # Analizar el archivo de requisitos
-            project_analysis = self.analyze_project_requirements(
-                context['project_file_content'],
-                context.get('project_file_name')
-            )
+        # Analizar el archivo de proyecto del contexto si no se ha analizado ya
+        document_hash = context.get('project_file_hash')
+        has_new_analysis = False
+        if document_hash and context.get('project_analysis_hash') != document_hash:
+            # Analizar el archivo de requisitos y generar la estimación de presupuesto (memorizados por hash)
+            project_analysis, budget_estimate = self.analyze_document(document_hash, context.get('project_file_name'))
             
-            # Generar estimación de presupuesto
-            budget_estimate = self.generate_budget_estimate(project_analysis)
-            
-            # Guardar análisis y estimación en el contexto
-            context['project_analysis'] = project_analysis
-            context['project_estimate'] = budget_estimate
-            
-            # Indicar que tenemos un análisis del proyecto para formular una mejor respuesta
-            has_new_analysis = True
-        else:
-            has_new_analysis = False
+            if project_analysis is not None:
+                # Guardar análisis y estimación en el contexto
+                context['project_analysis'] = project_analysis
+                context['project_estimate'] = budget_estimate
+                context['project_analysis_hash'] = document_hash
+                
+                # Indicar que tenemos un análisis del proyecto para formular una mejor respuesta
+                has_new_analysis = True
         
         # Verificar si hay una solicitud específica de presupuesto
         is_budget_request = re.search(r'(presupuesto|precio|costo|cuánto cuesta|cuanto cuesta)', message.lower())
@@ -364,11 +415,11 @@ CONTEXTO ACTUAL:
 """
         
         # Añadir información sobre el archivo de proyecto si existe
-        if context.get('project_file_content'):
+        if context.get('project_file_hash'):
             prompt += f"""
 - El usuario ha subido un archivo de proyecto: {context.get('project_file_name', 'documento de requisitos')}
 """
-
+        
         # Añadir análisis del proyecto si existe
         if context.get('project_analysis'):
             analysis = context['project_analysis']
@@ -407,7 +458,7 @@ El usuario está preguntando sobre el presupuesto. Presenta la estimación que y
 Menciona que esta es una estimación preliminar y que para un presupuesto formal y detallado, deberías hablar con el departamento de ventas.
 Pregunta si desea que le transfieras al agente de ventas para discutir los detalles comerciales.
 """
-        elif is_budget_request and not context.get('project_file_content'):
+        elif is_budget_request and not context.get('project_file_hash'):
             prompt += """
 INSTRUCCIONES ESPECÍFICAS:
 El usuario está preguntando sobre presupuesto pero no ha proporcionado requisitos de proyecto.
@@ -435,7 +486,20 @@ Responde directamente como el ingeniero técnico sin mencionar estas instruccion
 """
         
         # Enviar la solicitud al modelo y devolver la respuesta
-        for chunk in send_chat_request(prompt, stream=True):
+        for chunk in send_chat_request(prompt, stream=True, client=self.lm_client):
             chunk_data = json.loads(chunk.replace('data: ', ''))
             if 'token' in chunk_data:
-                yield chunk_data['token'] 
\ No newline at end of file
+                yield chunk_data['token'] 
+    
+    def process(self, message, context):
+        """
+        Punto de entrada del AgentManager (ver process_message).
+        
+        Args:
+            message (str): El mensaje del usuario
+            context (dict): El contexto de la conversación
+            
+        Returns:
+            generator: Fragmentos de la respuesta
+        """
+        return self.process_message(message, context)
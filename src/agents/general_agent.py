@@ -2,8 +2,9 @@
 Agente general para el chatbot de Alisys.
 Este agente se encarga de manejar consultas generales sobre Alisys y sus servicios.
 """
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 from .base_agent import BaseAgent
+from services.lm_studio import LMStudioClient
 
 class GeneralAgent(BaseAgent):
     """
@@ -11,13 +12,17 @@ class GeneralAgent(BaseAgent):
     Maneja consultas básicas sobre la empresa y sus servicios.
     """
     
-    def __init__(self):
+    def __init__(self, lm_client: Optional[LMStudioClient] = None):
         """
         Inicializa el agente general.
+        
+        Args:
+            lm_client: Cliente de LM Studio compartido (por defecto, uno propio)
         """
         super().__init__(
             name="GeneralAgent",
-            description="Especialista en información general sobre Alisys"
+            description="Especialista en información general sobre Alisys",
+            lm_client=lm_client
         )
     
     def _adjust_confidence(self, base_confidence: float, message: str, context: Dict[str, Any]) -> float:
@@ -5,6 +5,7 @@ cotizaciones para los servicios de Alisys.
 """
 from typing import Dict, List, Any, Optional, Generator
 from .base_agent import BaseAgent
+from services.lm_studio import LMStudioClient
 import logging
 
 logger = logging.getLogger(__name__)
@@ -14,13 +15,17 @@ class SalesAgent(BaseAgent):
     Agente especializado en ventas y cotizaciones.
     """
     
-    def __init__(self):
+    def __init__(self, lm_client: Optional[LMStudioClient] = None):
         """
         Inicializa el agente de ventas.
+        
+        Args:
+            lm_client: Cliente de LM Studio compartido (por defecto, uno propio)
         """
         super().__init__(
             name="SalesAgent",
-            description="Especialista en cotizaciones y precios de servicios"
+            description="Especialista en cotizaciones y precios de servicios",
+            lm_client=lm_client
         )
     
     def _adjust_confidence(self, base_confidence: float, message: str, context: Dict[str, Any]) -> float:
@@ -184,7 +189,7 @@ Historial de conversación:
             formatted_info += f"- {formatted_key}: {value}\n"
         
         return formatted_info 
-
+    
     def can_handle(self, message: str, context: Dict[str, Any]) -> float:
         """
         Determina la confianza del agente para manejar el mensaje.
@@ -252,7 +257,7 @@ Historial de conversación:
                     return 1.0
                     
         return min(confidence, 1.0)
-
+    
     def process(self, message: str, context: Dict[str, Any]) -> Generator[str, None, None]:
         """
         Procesa un mensaje y genera una respuesta relacionada con ventas.
@@ -290,7 +295,7 @@ Historial de conversación:
         # Generar la respuesta
         for response_chunk in self._call_llm(messages, context):
             yield response_chunk
-
+    
     def _format_technical_analysis_for_sales(self, tech_analysis: Dict[str, str]) -> str:
         """
         Formatea el análisis técnico para el agente de ventas.
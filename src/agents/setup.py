@@ -70,17 +70,13 @@ def create_context() -> Dict[str, Any]:
         "interest_level": 0  # 0-10 escala de interés
     }
 
-# Singleton para el gestor de agentes
-_agent_manager = None
-
 def get_agent_manager() -> AgentManager:
     """
-    Obtiene la instancia del gestor de agentes, creándola si no existe.
+    Obtiene el gestor de agentes del proceso: el del Runtime compartido con
+    las rutas web (ver core.runtime), no uno propio.
     
     Returns:
         La instancia del gestor de agentes
     """
-    global _agent_manager
-    if _agent_manager is None:
-        _agent_manager = setup_agent_system()
-    return _agent_manager 
\ No newline at end of file
+    from core.runtime import get_runtime
+    return get_runtime().agent_manager 
\ No newline at end of file
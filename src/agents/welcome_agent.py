@@ -1,9 +1,10 @@
 """
 Agente de bienvenida que saluda y hace preguntas generales.
 """
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 import re
 from .base_agent import BaseAgent
+from services.lm_studio import LMStudioClient
 
 class WelcomeAgent(BaseAgent):
     """
@@ -11,11 +12,12 @@ class WelcomeAgent(BaseAgent):
     Este es el agente por defecto que se activa al inicio de una conversación.
     """
     
-    def __init__(self):
-        """Inicializa el agente de bienvenida."""
+    def __init__(self, lm_client: Optional[LMStudioClient] = None):
+        """Inicializa el agente de bienvenida (lm_client: cliente de LM Studio compartido, opcional)."""
         super().__init__(
             name="WelcomeAgent",
-            description="Agente que saluda y hace preguntas generales para entender las necesidades del usuario"
+            description="Agente que saluda y hace preguntas generales para entender las necesidades del usuario",
+            lm_client=lm_client
         )
         
         # Patrones para detectar saludos
@@ -1,31 +1,39 @@
 """
 Define las rutas específicas para el sistema de agentes del chatbot.
 """
-import json
 import traceback
 import re
-from flask import request, jsonify, Response, stream_with_context, session, render_template, current_app
-from agents.agent_manager import AgentManager
-from agents.general_agent import GeneralAgent
-from agents.sales_agent import SalesAgent
-from agents.engineer_agent import EngineerAgent
-from agents.data_collection_agent import DataCollectionAgent
+import uuid
+from flask import request, jsonify, session, render_template
+from core.runtime import get_runtime
+from api.streaming import StreamTurn, sse_event, stream_response, register_stream, resume_turn
 
-# Inicializar el gestor de agentes y registrar los agentes
-agent_manager = AgentManager()
-agent_manager.register_agent(GeneralAgent())     # Primera prioridad para bienvenida e información general
-agent_manager.register_agent(SalesAgent())       # Alta prioridad para ventas  
-agent_manager.register_agent(EngineerAgent())    # Alta prioridad para consultas técnicas
-agent_manager.register_agent(DataCollectionAgent()) # Última prioridad para recopilar datos
+# Content-Type de las respuestas SSE de los agentes (el de Response(mimetype='text/event-stream'))
+AGENT_STREAM_CONTENT_TYPE = 'text/event-stream; charset=utf-8'
 
 def register_agent_routes(app):
     """Registra las rutas específicas para el sistema de agentes"""
+    # Cada petición obtiene el Runtime con get_runtime(): tras un fork (p. ej. gunicorn
+    # con --preload) el proceso hijo usa el suyo y no los gestores creados en el padre
+    
+    def _get_session_key():
+        """Obtiene (o crea) el identificador de la conversación del navegador"""
+        if 'sid' not in session:
+            session['sid'] = str(uuid.uuid4())
+        return session['sid']
+    
+    def _discard_session_context():
+        """Descarta el contexto en memoria; la siguiente conversación usa otro identificador"""
+        session_key = session.pop('sid', None)
+        if session_key:
+            get_runtime().handle(session_key).discard()
     
     @app.route('/agents')
     def agents_home():
         """Ruta principal para la interfaz que utiliza el sistema de agentes"""
         # Reiniciar el contexto del gestor de agentes
-        agent_manager.reset()
+        get_runtime().agent_manager.reset()
+        _discard_session_context()
         
         # Reiniciar variables de sesión
         session['message_count'] = 0
@@ -46,11 +54,19 @@ def register_agent_routes(app):
         """Endpoint para verificar el estado de la conexión con LM Studio en modo agentes"""
         from services.lm_studio import check_lm_studio_connection
         
-        lm_studio_connected = check_lm_studio_connection()
+        runtime = get_runtime()
+        lm_studio_connected = check_lm_studio_connection(runtime.http)
         
         return jsonify({
             "status": "ok",
-            "lm_studio_connected": lm_studio_connected
+            "lm_studio_connected": lm_studio_connected,
+            "routing_cache": runtime.agent_manager.get_routing_cache_stats(),
+            "persistence": runtime.agent_manager.get_persistence_stats(),
+            "session_cache": runtime.agent_manager.get_session_cache_stats(),
+            "session_backend": runtime.agent_manager.get_session_backend_stats(),
+            "session_locks": runtime.agent_manager.get_session_lock_stats(),
+            "stream_replay": runtime.stream_replay.get_stats(),
+            "documents": runtime.document_store.get_stats()
         })
     
     @app.route('/agent/chat', methods=['POST'])
@@ -59,15 +75,19 @@ def register_agent_routes(app):
         data = request.json
         user_message = data.get('message', '')
         
-        # Crear o actualizar el contexto para los agentes
-        context = {
+        # Contexto vivo de la conversación y estado de la sesión que se le aplica
+        # (process_message lo escribe con el bloqueo de la sesión adquirido)
+        context = get_runtime().handle(_get_session_key()).context
+        updates = {
             'message_count': session.get('message_count', 0),
             'form_shown': session.get('form_shown', False),
             'form_active': session.get('form_active', False),
             'form_completed': session.get('form_completed', False),
             'last_user_message': session.get('last_user_message', ''),
             'current_agent': session.get('current_agent', None),
-            'previous_agent': session.get('previous_agent', None),
+            'previous_agent': session.get('previous_agent', None)
+        }
+        defaults = {
             'user_info': session.get('user_info', {}),
             'project_info': session.get('project_info', {})
         }
@@ -75,7 +95,7 @@ def register_agent_routes(app):
         try:
             # Procesar el mensaje con el gestor de agentes
             response_text = ""
-            for chunk in agent_manager.process_message(user_message, context):
+            for chunk in get_runtime().agent_manager.process_message(user_message, context, updates, defaults):
                 response_text += chunk
             
             # Actualizar la sesión con el contexto actualizado
@@ -107,9 +127,13 @@ def register_agent_routes(app):
                 "response": "Lo siento, ha ocurrido un error al procesar tu mensaje. Por favor, inténtalo de nuevo."
             })
     
-    @app.route('/agent/chat/stream', methods=['GET'])
-    def agent_chat_stream():
-        """Endpoint para chat con agentes (streaming)"""
+    def _prepare_agent_chat_stream():
+        """Prepara el turno de /agent/chat/stream (lo sirven Flask y el servidor ASGI)"""
+        # Reconexión del EventSource: se reanuda el stream original en lugar de reenviar el mensaje
+        last_event_id = request.headers.get('Last-Event-ID')
+        if last_event_id:
+            return resume_turn(last_event_id, session.get('sid'), AGENT_STREAM_CONTENT_TYPE)
+        
         user_message = request.args.get('message', '')
         
         # Verificar si este mensaje es una solicitud de análisis de archivo
@@ -118,18 +142,19 @@ def register_agent_routes(app):
         # Obtener información sobre el agente actual explícitamente enviada desde el cliente
         client_current_agent = request.args.get('current_agent')
         
-        # Verificar si hay contenido de archivo en la sesión
-        file_content = session.get('project_file_content')
+        # Verificar si hay un archivo en la sesión (solo su hash; el texto está en el almacén de documentos)
+        file_hash = session.get('project_file_hash')
         file_name = session.get('project_file_name')
         
-        # Si es una solicitud de análisis y no hay archivo en sesión, extraer el contenido
-        if is_file_analysis and not file_content:
+        # Si es una solicitud de análisis que incluye el contenido (clientes antiguos), guardarlo en el almacén
+        if is_file_analysis and not file_hash:
             # Extraer contenido del archivo
             try:
                 # Separar el contenido del archivo
                 file_marker_index = user_message.find("cargado con el siguiente contenido:")
                 if file_marker_index > 0:
                     file_content = user_message[file_marker_index + len("cargado con el siguiente contenido:"):].strip()
+                    file_hash = get_runtime().document_store.store_text(file_content)
                     
                     # Extraer nombre del archivo si está presente
                     file_name_match = re.search(r"Archivo de proyecto '([^']+)'", user_message)
@@ -139,7 +164,7 @@ def register_agent_routes(app):
                         file_name = "documento_proyecto.txt"
                     
                     # Guardar en sesión
-                    session['project_file_content'] = file_content
+                    session['project_file_hash'] = file_hash
                     session['project_file_name'] = file_name
             except Exception as e:
                 app.logger.error(f"Error al extraer contenido del archivo: {str(e)}")
@@ -156,8 +181,9 @@ def register_agent_routes(app):
             force_engineer = True
             
             # Modificar el mensaje para incluir instrucciones específicas
-            if file_content and file_name:
-                user_message = f"Analiza el siguiente documento de proyecto llamado '{file_name}' y proporciona una estimación detallada del tiempo y recursos necesarios para implementarlo. El documento contiene:\n\n{file_content}\n\nConsideraciones importantes: Menciona tecnologías específicas, identifica posibles desafíos técnicos, estima tiempos de desarrollo, y prepara información que el agente de ventas pueda usar para generar un presupuesto."
+            # (el EngineerAgent lee el documento del almacén por su hash y memoriza su análisis)
+            if file_hash and file_name:
+                user_message = f"Analiza el documento de proyecto llamado '{file_name}' y proporciona una estimación detallada del tiempo y recursos necesarios para implementarlo. Consideraciones importantes: Menciona tecnologías específicas, identifica posibles desafíos técnicos, estima tiempos de desarrollo, y prepara información que el agente de ventas pueda usar para generar un presupuesto."
         
         # Obtener el agente actual de la sesión
         session_agent = session.get('current_agent')
@@ -241,12 +267,13 @@ def register_agent_routes(app):
             app.logger.info(f"Cliente solicitó o se forzó el agente: {client_current_agent}")
         
         previous_agent_name = session.get('previous_agent')
-        user_info = session.get('user_info', {})
-        project_info = session.get('project_info', {})
-        messages = session.get('messages', [])
         
-        # Crear contexto para los agentes
-        context = {
+        # Contexto vivo de la conversación (caché en memoria; el almacén solo se lee si no está)
+        context = get_runtime().handle(_get_session_key()).context
+        
+        # Estado de la petición para los agentes: no se escribe aquí en el contexto,
+        # sino en process_message con el bloqueo de la sesión adquirido
+        updates = {
             'message_count': message_count,
             'form_shown': form_shown,
             'form_active': form_active,
@@ -254,12 +281,15 @@ def register_agent_routes(app):
             'last_user_message': user_message,
             'current_agent': current_agent_name,
             'previous_agent': previous_agent_name,
-            'user_info': user_info,
-            'project_info': project_info,
-            'messages': messages,
+            'project_file_hash': file_hash,
+            'project_file_name': file_name,
             'force_engineer': force_engineer,  # Nuevo parámetro para forzar el agente técnico
             'force_sales': force_sales         # Nuevo parámetro para forzar el agente de ventas
         }
+        defaults = {
+            'user_info': session.get('user_info', {}),
+            'project_info': session.get('project_info', {})
+        }
         
         # Verificar si es un mensaje especial para cambiar de agente
         if user_message.startswith('!cambiar_agente:'):
@@ -271,62 +301,36 @@ def register_agent_routes(app):
                 session['previous_agent'] = current_agent_name
                 session['current_agent'] = agent_id
                 
-                # Actualizar el contexto
-                context['current_agent'] = agent_id
-                context['previous_agent'] = current_agent_name
-                
-                # Si se cambia a SalesAgent, establecer flag
-                if agent_id == 'SalesAgent':
-                    context['force_sales'] = True
-                
                 # Registrar el cambio de agente
                 app.logger.info(f"Cambiando de agente: {previous_agent_name} -> {agent_id}")
                 
-                # Crear contexto para los agentes
-                context = {
-                    'message_count': message_count,
-                    'form_shown': form_shown,
-                    'form_active': form_active,
-                    'form_completed': form_completed,
-                    'last_user_message': user_message,
+                # Actualizar el estado para los agentes (el nuevo agente no se fuerza)
+                updates.update({
                     'current_agent': agent_id,
                     'previous_agent': previous_agent_name,
-                    'user_info': user_info,
-                    'project_info': project_info,
-                    'messages': messages
-                }
+                    'force_engineer': False,
+                    'force_sales': False
+                })
                 
                 # Mensaje de continuación para el nuevo agente
                 continuation_message = "Por favor, continúa la conversación basándote en el contexto anterior."
                 
-                @stream_with_context
-                def agent_change_response():
-                    # Mensaje de confirmación
-                    confirmation = f"Ahora estás hablando con el agente: {agent_id.replace('Agent', '')}"
-                    for char in confirmation:
-                        yield f"data: {json.dumps({'token': char})}\n\n"
-                    
-                    # Procesar un mensaje de continuación con el nuevo agente
-                    try:
-                        # Obtener la respuesta del nuevo agente
-                        for chunk in agent_manager.process_message(continuation_message, context):
-                            # Verificar que el chunk es una cadena de texto
-                            if isinstance(chunk, str):
-                                # Formatear la respuesta para SSE
-                                yield f"data: {json.dumps({'token': chunk})}\n\n"
-                            else:
-                                # Si no es una cadena, continuar
-                                continue
-                    except Exception as e:
-                        current_app.logger.error(f"Error al procesar mensaje de continuación: {str(e)}")
-                    
-                    # Marcar como completado y enviar el nombre del agente
-                    yield f"data: {json.dumps({'done': True, 'agent': agent_id})}\n\n"
+                def continuation_failed(error):
+                    app.logger.error(f"Error al procesar mensaje de continuación: {str(error)}")
+                    return [sse_event({'done': True, 'agent': agent_id})]
                 
-                return Response(agent_change_response(), mimetype='text/event-stream')
+                # Mensaje de confirmación, y después la respuesta del nuevo agente
+                confirmation = f"Ahora estás hablando con el agente: {agent_id.replace('Agent', '')}"
+                return StreamTurn(events=[sse_event({'token': char}) for char in confirmation],
+                                  message=continuation_message, context=context,
+                                  updates=updates, defaults=defaults,
+                                  done=lambda _: {'done': True, 'agent': agent_id},
+                                  fail=continuation_failed, content_type=AGENT_STREAM_CONTENT_TYPE,
+                                  replay=get_runtime().stream_replay.create(_get_session_key()))
             except Exception as e:
                 app.logger.error(f"Error al cambiar de agente: {str(e)}")
-                return Response("data: {}\n\n", mimetype='text/event-stream')
+                return StreamTurn(events=["data: {}\n\n"], content_type=AGENT_STREAM_CONTENT_TYPE,
+                                  replay=get_runtime().stream_replay.create(_get_session_key()))
         
         # Verificar si el mensaje de texto solicita cambiar de agente
         agent_keywords = {
@@ -353,42 +357,29 @@ def register_agent_routes(app):
                 session['previous_agent'] = current_agent_name
                 session['current_agent'] = agent_id
                 
-                # Actualizar el contexto
-                context['current_agent'] = agent_id
-                context['previous_agent'] = current_agent_name
+                # Actualizar el estado para los agentes
+                updates['current_agent'] = agent_id
+                updates['previous_agent'] = current_agent_name
                 
                 # Si se cambia a SalesAgent, establecer flag
                 if agent_id == 'SalesAgent':
-                    context['force_sales'] = True
+                    updates['force_sales'] = True
                 
                 # Registrar el cambio de agente
                 app.logger.info(f"Cambiando de agente por palabra clave: {previous_agent_name} -> {agent_id}")
                 
-                @stream_with_context
-                def keyword_agent_change_response():
-                    # Mensaje de confirmación
-                    confirmation = f"Cambiando al agente: {agent_id.replace('Agent', '')}"
-                    for char in confirmation:
-                        yield f"data: {json.dumps({'token': char})}\n\n"
-                    
-                    # Procesar el mensaje con el gestor de agentes
-                    try:
-                        # Obtener la respuesta del gestor de agentes
-                        for chunk in agent_manager.process_message(user_message, context):
-                            # Verificar que el chunk es una cadena de texto
-                            if isinstance(chunk, str):
-                                # Formatear la respuesta para SSE
-                                yield f"data: {json.dumps({'token': chunk})}\n\n"
-                            else:
-                                # Si no es una cadena, continuar
-                                continue
-                    except Exception as e:
-                        current_app.logger.error(f"Error al procesar mensaje con cambio de agente por palabra clave: {str(e)}")
-                    
-                    # Marcar como completado y enviar el nombre del agente
-                    yield f"data: {json.dumps({'done': True, 'agent': agent_id})}\n\n"
+                def keyword_change_failed(error):
+                    app.logger.error(f"Error al procesar mensaje con cambio de agente por palabra clave: {str(error)}")
+                    return [sse_event({'done': True, 'agent': agent_id})]
                 
-                return Response(keyword_agent_change_response(), mimetype='text/event-stream')
+                # Mensaje de confirmación, y después la respuesta del gestor de agentes
+                confirmation = f"Cambiando al agente: {agent_id.replace('Agent', '')}"
+                return StreamTurn(events=[sse_event({'token': char}) for char in confirmation],
+                                  message=user_message, context=context,
+                                  updates=updates, defaults=defaults,
+                                  done=lambda _: {'done': True, 'agent': agent_id},
+                                  fail=keyword_change_failed, content_type=AGENT_STREAM_CONTENT_TYPE,
+                                  replay=get_runtime().stream_replay.create(_get_session_key()))
         
         # Verificar si es un proyecto de call center con IA
         call_center_ai_keywords = [
@@ -404,77 +395,63 @@ def register_agent_routes(app):
                ('me proyecto' in message_lower) or \
                ('call center' in message_lower and any(kw in message_lower for kw in ['ai', 'ia', 'inteligencia', 'agentes'])):
                 # Forzar el uso del EngineerAgent
-                context['current_agent'] = 'EngineerAgent'
-                context['force_engineer'] = True
+                updates['current_agent'] = 'EngineerAgent'
+                updates['force_engineer'] = True
                 session['current_agent'] = 'EngineerAgent'
                 app.logger.info("Forzando EngineerAgent en el contexto para proyecto de call center con IA")
         
-        # Procesar el mensaje y obtener la respuesta
-        # Capturar el resultado para actualizar la sesión después
-        result_context = {}
+        def response_failed(error):
+            app.logger.error(f"Error al procesar mensaje: {str(error)}")
+            traceback.print_exc()
+            return [sse_event({'error': str(error)})]
         
-        @stream_with_context
-        def generate_response():
-            nonlocal result_context
-            try:
-                # Procesar el mensaje con el gestor de agentes
-                for chunk in agent_manager.process_message(user_message, context):
-                    # Verificar que el chunk es una cadena de texto
-                    if isinstance(chunk, str):
-                        # Formatear la respuesta para SSE
-                        yield f"data: {json.dumps({'token': chunk})}\n\n"
-                    else:
-                        # Si no es una cadena, continuar
-                        continue
-                
-                # Guardar el contexto actualizado para usarlo después
-                result_context = context.copy()
+        def store_result_context(context):
+            # Actualizar la sesión de la petición con el contexto actualizado (se ejecuta
+            # con el contexto de la petición: stream_with_context o StreamingASGIApp._finish)
+            result_context = context.copy()
+            
+            # Asegurar que el agente técnico persista para call center AI
+            if force_engineer or result_context.get('force_engineer', False):
+                result_context['current_agent'] = 'EngineerAgent'
+            
+            # Asegurar que el agente de ventas persista cuando se ha solicitado
+            if force_sales or result_context.get('force_sales', False):
+                result_context['current_agent'] = 'SalesAgent'
                 
-                # Marcar como completado y enviar el nombre del agente
-                agent_id = context.get('current_agent', 'Unknown')
-                yield f"data: {json.dumps({'done': True, 'agent': agent_id})}\n\n"
-            except Exception as e:
-                current_app.logger.error(f"Error al procesar mensaje: {str(e)}")
-                traceback.print_exc()
-                yield f"data: {json.dumps({'error': str(e)})}\n\n"
-        
-        response = Response(generate_response(), mimetype='text/event-stream')
-        
-        # Configurar una función de cierre para actualizar la sesión después de que se complete la respuesta
-        @response.call_on_close
-        def on_close():
-            # Actualizar la sesión con el contexto actualizado
-            if result_context:
-                with app.app_context():
-                    with app.test_request_context():
-                        # Asegurar que el agente técnico persista para call center AI
-                        if force_engineer or result_context.get('force_engineer', False):
-                            result_context['current_agent'] = 'EngineerAgent'
-                        
-                        # Asegurar que el agente de ventas persista cuando se ha solicitado
-                        if force_sales or result_context.get('force_sales', False):
-                            result_context['current_agent'] = 'SalesAgent'
-                            
-                        session['current_agent'] = result_context.get('current_agent')
-                        session['previous_agent'] = result_context.get('previous_agent')
-                        session['user_info'] = result_context.get('user_info', {})
-                        session['project_info'] = result_context.get('project_info', {})
-                        
-                        # Actualizar variables de formulario si fueron modificadas
-                        if 'form_completed' in result_context:
-                            session['form_completed'] = result_context['form_completed']
-                        if 'form_shown' in result_context:
-                            session['form_shown'] = result_context['form_shown']
-                        if 'form_active' in result_context:
-                            session['form_active'] = result_context['form_active']
-        
-        return response
+            session['current_agent'] = result_context.get('current_agent')
+            session['previous_agent'] = result_context.get('previous_agent')
+            session['user_info'] = result_context.get('user_info', {})
+            session['project_info'] = result_context.get('project_info', {})
+            
+            # Actualizar variables de formulario si fueron modificadas
+            if 'form_completed' in result_context:
+                session['form_completed'] = result_context['form_completed']
+            if 'form_shown' in result_context:
+                session['form_shown'] = result_context['form_shown']
+            if 'form_active' in result_context:
+                session['form_active'] = result_context['form_active']
+        
+        # Procesar el mensaje y, al terminar, enviar el nombre del agente y actualizar la sesión
+        # (los eventos llevan id: si la conexión se corta, el navegador reanuda el stream)
+        return StreamTurn(message=user_message, context=context, updates=updates, defaults=defaults,
+                          done=lambda result: {'done': True, 'agent': result.get('current_agent', 'Unknown')},
+                          fail=response_failed, finish=store_result_context,
+                          content_type=AGENT_STREAM_CONTENT_TYPE,
+                          replay=get_runtime().stream_replay.create(_get_session_key()))
+    
+    @app.route('/agent/chat/stream', methods=['GET'])
+    def agent_chat_stream():
+        """Endpoint para chat con agentes (streaming)"""
+        return stream_response(_prepare_agent_chat_stream())
+    
+    register_stream(app, '/agent/chat/stream', _prepare_agent_chat_stream)
     
     @app.route('/agent/reset', methods=['POST'])
     def agent_reset():
         """Endpoint para reiniciar el contexto de los agentes"""
         # Reiniciar el contexto del gestor de agentes
-        agent_manager.reset()
+        get_runtime().agent_manager.reset()
+        _discard_session_context()
         
         # Reiniciar variables de sesión
         session['message_count'] = 0
@@ -1,21 +1,17 @@
 """
 Define las rutas y endpoints de la API del chatbot.
 """
+import io
+import csv
 import json
 import re
 import traceback
-import os
-import tempfile
-from flask import request, jsonify, render_template, Response, stream_with_context, session
+import uuid
+from flask import request, jsonify, render_template, stream_template, Response, stream_with_context, session
 from services.lm_studio import send_chat_request, check_lm_studio_connection
 from utils.alisys_info import get_alisys_info, generate_alisys_info_stream, generate_contact_form_stream
-from data.data_manager import DataManager
-from data.database import get_leads
-from agents.agent_manager import AgentManager
-from agents.general_agent import GeneralAgent
-from agents.sales_agent import SalesAgent
-from agents.engineer_agent import EngineerAgent
-from agents.data_collection_agent import DataCollectionAgent
+from core.runtime import get_runtime
+from api.streaming import StreamTurn, sse_event, stream_response, register_stream
 from datetime import datetime
 
 # Importar librería para procesar PDFs
@@ -26,20 +22,18 @@ except ImportError:
     PDF_SUPPORT = False
     print("PyPDF2 no está instalado. El soporte para PDFs está deshabilitado.")
 
-# Inicializar el gestor de datos
-data_manager = DataManager()
+# Caracteres de la vista previa de un documento subido
+DOCUMENT_PREVIEW_CHARS = 2000
 
-# Inicializar el gestor de agentes
-agent_manager = AgentManager()
-
-# Registrar los agentes disponibles - El orden determina la prioridad
-agent_manager.register_agent(GeneralAgent())     # Primera prioridad para bienvenida e información general
-agent_manager.register_agent(SalesAgent())       # Alta prioridad para ventas
-agent_manager.register_agent(EngineerAgent())    # Alta prioridad para consultas técnicas
-agent_manager.register_agent(DataCollectionAgent()) # Última prioridad para recopilar datos
+# Columnas de la exportación CSV de leads
+LEAD_EXPORT_FIELDS = ['id', 'name', 'email', 'phone', 'company', 'interest', 'message', 'created_at']
 
 def register_routes(app):
     """Registra todas las rutas de la aplicación"""
+    # Importación al registrar las rutas: el módulo de base de datos carga SQLAlchemy
+    from data.database import get_leads_page, iter_leads, get_latest_lead, get_lead_stats
+    # Los gestores (de datos, de agentes...) son los del Runtime del proceso y cada petición
+    # los obtiene con get_runtime(): tras un fork el hijo no usa los creados en el padre
     
     # Configurar la sesión
     app.secret_key = 'alisys_chatbot_secret_key'
@@ -55,12 +49,19 @@ def register_routes(app):
         session['form_completed'] = False
         session['last_user_message'] = ''
         # Reiniciar variables de proyecto y archivo
-        session['project_file_content'] = None
+        session['project_file_hash'] = None
         session['project_file_name'] = None
+        # Las sesiones anteriores al almacén de documentos guardaban el texto completo
+        session.pop('project_file_content', None)
         session['project_estimate'] = None
         
         # Reiniciar el contexto del gestor de agentes
-        agent_manager.reset()
+        get_runtime().agent_manager.reset()
+        
+        # Descartar el contexto en memoria; la siguiente conversación usa otro identificador
+        session_key = session.pop('sid', None)
+        if session_key:
+            get_runtime().handle(session_key).discard()
         
         return render_template('index.html')
     
@@ -94,25 +95,8 @@ def register_routes(app):
             })
         
         try:
-            # Guardar el archivo temporalmente
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as temp:
-                file.save(temp.name)
-                temp_filename = temp.name
-            
-            # Procesar el PDF
-            text = extract_text_from_pdf(temp_filename)
-            
-            # Eliminar el archivo temporal
-            os.unlink(temp_filename)
-            
-            # Añadir el contenido del archivo a la sesión para uso posterior
-            session['project_file_content'] = text
-            session['project_file_name'] = file.filename
-            
-            return jsonify({
-                "success": True,
-                "text": text
-            })
+            # Guardar el documento (el texto solo se extrae si el archivo no se había subido antes)
+            return _store_uploaded_document(file, extract_text_from_pdf)
         except Exception as e:
             print(f"Error al procesar PDF: {str(e)}")
             traceback.print_exc()
@@ -145,17 +129,8 @@ def register_routes(app):
             })
         
         try:
-            # Leer el contenido del archivo
-            text = file.read().decode('utf-8', errors='ignore')
-            
-            # Añadir el contenido del archivo a la sesión para uso posterior
-            session['project_file_content'] = text
-            session['project_file_name'] = file.filename
-            
-            return jsonify({
-                "success": True,
-                "text": text
-            })
+            # Guardar el documento (el texto solo se lee si el archivo no se había subido antes)
+            return _store_uploaded_document(file, read_text_file)
         except Exception as e:
             print(f"Error al procesar TXT: {str(e)}")
             traceback.print_exc()
@@ -194,10 +169,12 @@ def register_routes(app):
     @app.route('/project/info', methods=['GET'])
     def get_project_info():
         """Endpoint para obtener la información del proyecto"""
+        file_hash = session.get('project_file_hash')
         try:
             project_info = {
                 "file_name": session.get('project_file_name'),
-                "file_content": session.get('project_file_content'),
+                "file_hash": file_hash,
+                "file_content": get_runtime().document_store.text(file_hash) if file_hash else None,
                 "estimate": session.get('project_estimate')
             }
             
@@ -213,6 +190,30 @@ def register_routes(app):
                 "error": str(e)
             })
     
+    def read_text_file(file_path):
+        """Lee un archivo de texto (UTF-8, ignorando los bytes no válidos)"""
+        with open(file_path, 'rb') as file:
+            return file.read().decode('utf-8', errors='ignore')
+    
+    def _store_uploaded_document(file, extract):
+        """
+        Guarda un archivo subido en el almacén de documentos y deja en la sesión
+        solo su hash; la respuesta incluye la vista previa del texto.
+        """
+        document_store = get_runtime().document_store
+        document_hash, cached = document_store.store_upload(file.stream, extract)
+        session['project_file_hash'] = document_hash
+        session['project_file_name'] = file.filename
+        
+        preview = document_store.preview(document_hash, DOCUMENT_PREVIEW_CHARS)
+        return jsonify({
+            "success": True,
+            "hash": document_hash,
+            "cached": cached,
+            "preview": preview,
+            "truncated": document_store.size(document_hash) > len(preview.encode('utf-8'))
+        })
+    
     def extract_text_from_pdf(file_path):
         """Extrae texto de un archivo PDF"""
         text = ""
@@ -226,11 +227,15 @@ def register_routes(app):
     @app.route('/health', methods=['GET'])
     def health():
         """Endpoint para verificar el estado de la conexión con LM Studio"""
-        lm_studio_connected = check_lm_studio_connection()
+        runtime = get_runtime()
+        lm_studio_connected = check_lm_studio_connection(runtime.http)
         
         return jsonify({
             "status": "ok",
-            "lm_studio_connected": lm_studio_connected
+            "lm_studio_connected": lm_studio_connected,
+            "persistence": runtime.agent_manager.get_persistence_stats(),
+            "session_cache": runtime.agent_manager.get_session_cache_stats(),
+            "session_backend": runtime.agent_manager.get_session_backend_stats()
         })
     
     def _update_session_state(user_message):
@@ -253,26 +258,15 @@ def register_routes(app):
     
     def _handle_form_response():
         """Maneja la respuesta a un campo del formulario"""
-        def simple_response():
-            yield f"data: {json.dumps({'token': 'Procesando tu respuesta...'})}\n\n"
-            yield f"data: {json.dumps({'done': True})}\n\n"
-        
-        return Response(
-            stream_with_context(simple_response()), 
-            content_type='text/event-stream'
-        )
+        return StreamTurn(events=[sse_event({'token': 'Procesando tu respuesta...'}), sse_event({'done': True})])
     
     def _handle_completed_form():
         """Maneja el caso cuando el formulario ya ha sido completado"""
         # Verificar si hay datos de contacto guardados
-        leads = get_leads()
+        last_lead = get_latest_lead()
         
         # Verificar si hay leads y si el último lead tiene los datos mínimos
-        valid_lead_exists = False
-        if leads and len(leads) > 0:
-            last_lead = leads[-1]
-            if hasattr(last_lead, 'name') and hasattr(last_lead, 'email') and last_lead.name and last_lead.email:
-                valid_lead_exists = True
+        valid_lead_exists = bool(last_lead and last_lead['name'] and last_lead['email'])
         
         # Si no hay leads válidos, probablemente hubo un error o el formulario no se completó realmente
         if not valid_lead_exists:
@@ -283,19 +277,24 @@ def register_routes(app):
             return None
         
         # Responder con un mensaje de despedida
-        def farewell_response():
-            response = "Gracias por tu mensaje. Un representante de Alisys ya ha recibido tus datos y se pondrá en contacto contigo en breve. Si necesitas asistencia inmediata, puedes llamarnos al **+34 910 200 000**."
-            yield f"data: {json.dumps({'token': response})}\n\n"
-            yield f"data: {json.dumps({'done': True})}\n\n"
-        
-        return Response(
-            stream_with_context(farewell_response()), 
-            content_type='text/event-stream'
-        )
+        response = "Gracias por tu mensaje. Un representante de Alisys ya ha recibido tus datos y se pondrá en contacto contigo en breve. Si necesitas asistencia inmediata, puedes llamarnos al **+34 910 200 000**."
+        return StreamTurn(events=[sse_event({'token': response}), sse_event({'done': True})])
     
-    def _build_agent_context():
-        """Construye el contexto para los agentes a partir de la sesión"""
-        return {
+    def _get_session_key():
+        """Obtiene (o crea) el identificador de la conversación del navegador"""
+        if 'sid' not in session:
+            session['sid'] = str(uuid.uuid4())
+        return session['sid']
+    
+    def _agent_turn_state():
+        """
+        Estado de la sesión para el contexto vivo de la conversación. No se escribe
+        aquí: AgentManager.process_message lo aplica con el bloqueo de la sesión.
+        
+        Returns:
+            Tupla (valores que se escriben, valores que solo se escriben si el contexto no tiene uno)
+        """
+        updates = {
             'message_count': session.get('message_count', 0),
             'form_shown': session.get('form_shown', False),
             'form_active': session.get('form_active', False),
@@ -303,51 +302,37 @@ def register_routes(app):
             'last_user_message': session.get('last_user_message', ''),
             'current_agent': session.get('current_agent', None),
             'previous_agent': session.get('previous_agent', None),
-            'user_info': session.get('user_info', {}),
-            'project_info': session.get('project_info', {}),
-            'project_file_content': session.get('project_file_content'),
+            'project_file_hash': session.get('project_file_hash'),
             'project_file_name': session.get('project_file_name'),
             'project_estimate': session.get('project_estimate')
         }
+        defaults = {
+            'user_info': session.get('user_info', {}),
+            'project_info': session.get('project_info', {})
+        }
+        return updates, defaults
     
-    def _process_with_agents(user_message, context):
-        """Procesa el mensaje con el gestor de agentes"""
-        try:
-            # Obtener la respuesta del agente adecuado
-            for chunk in agent_manager.process_message(user_message, context):
-                # Formatear la respuesta para SSE
-                yield f"data: {json.dumps({'token': chunk})}\n\n"
-            
-            # Marcar como completado
-            yield f"data: {json.dumps({'done': True})}\n\n"
-            
-            # Actualizar la sesión con el contexto actualizado
-            session['current_agent'] = context.get('current_agent')
-            session['previous_agent'] = context.get('previous_agent')
-            session['user_info'] = context.get('user_info', {})
-            session['project_info'] = context.get('project_info', {})
-            
-            # Guardar la estimación del proyecto si fue generada
-            if 'project_estimate' in context and context['project_estimate']:
-                session['project_estimate'] = context['project_estimate']
-            
-            # Actualizar variables de formulario si fueron modificadas por los agentes
-            if 'form_completed' in context:
-                session['form_completed'] = context['form_completed']
-            if 'form_shown' in context:
-                session['form_shown'] = context['form_shown']
-            if 'form_active' in context:
-                session['form_active'] = context['form_active']
-            
-        except Exception as e:
-            print(f"Error al procesar mensaje con agentes: {str(e)}")
-            traceback.print_exc()
-            yield f"data: {json.dumps({'token': 'Lo siento, ha ocurrido un error al procesar tu mensaje. Por favor, inténtalo de nuevo.'})}\n\n"
-            yield f"data: {json.dumps({'done': True})}\n\n"
+    def _store_agent_context(context):
+        """Actualiza la sesión con el contexto del turno (después del evento final)"""
+        session['current_agent'] = context.get('current_agent')
+        session['previous_agent'] = context.get('previous_agent')
+        session['user_info'] = context.get('user_info', {})
+        session['project_info'] = context.get('project_info', {})
+        
+        # Guardar la estimación del proyecto si fue generada
+        if 'project_estimate' in context and context['project_estimate']:
+            session['project_estimate'] = context['project_estimate']
+        
+        # Actualizar variables de formulario si fueron modificadas por los agentes
+        if 'form_completed' in context:
+            session['form_completed'] = context['form_completed']
+        if 'form_shown' in context:
+            session['form_shown'] = context['form_shown']
+        if 'form_active' in context:
+            session['form_active'] = context['form_active']
     
-    @app.route('/chat/stream', methods=['GET'])
-    def chat_stream():
-        """Endpoint para streaming de respuestas del chatbot"""
+    def _prepare_chat_stream():
+        """Prepara el turno de /chat/stream (lo sirven Flask y el servidor ASGI)"""
         user_message = request.args.get('message', '')
         
         # Actualizar el estado de la sesión
@@ -363,14 +348,20 @@ def register_routes(app):
             if form_response:
                 return form_response
         
-        # Crear o actualizar el contexto para los agentes
-        context = _build_agent_context()
+        # Contexto vivo de la conversación y estado de la sesión que se le aplica en el turno
+        context = get_runtime().agent_manager.get_session_context(_get_session_key())
+        updates, defaults = _agent_turn_state()
         
         # Usar el sistema de agentes para procesar el mensaje
-        return Response(
-            stream_with_context(_process_with_agents(user_message, context)), 
-            content_type='text/event-stream'
-        )
+        return StreamTurn(message=user_message, context=context, updates=updates, defaults=defaults,
+                          finish=_store_agent_context)
+    
+    @app.route('/chat/stream', methods=['GET'])
+    def chat_stream():
+        """Endpoint para streaming de respuestas del chatbot"""
+        return stream_response(_prepare_chat_stream())
+    
+    register_stream(app, '/chat/stream', _prepare_chat_stream)
     
     @app.route('/chat', methods=['POST'])
     def chat():
@@ -378,7 +369,7 @@ def register_routes(app):
         data = request.json
         user_message = data.get('message', '')
         
-        for response in send_chat_request(user_message, stream=False):
+        for response in send_chat_request(user_message, stream=False, client=get_runtime().lm_client):
             response_data = json.loads(response.replace('data: ', ''))
             if 'error' in response_data:
                 return jsonify({
@@ -497,7 +488,7 @@ def register_routes(app):
                 data['interest'] = 'No especificado'
             
             # Guardar el lead usando el data_manager (que ahora guarda en SQLite también)
-            result = data_manager.save_lead(data)
+            result = get_runtime().data_manager.save_lead(data)
             
             # Registrar en el log para depuración
             print(f"Lead guardado: {data}, resultado: {result}")
@@ -519,9 +510,24 @@ def register_routes(app):
                 "message": f"Error al guardar los datos: {str(e)}"
             })
     
+    def _lead_filters():
+        """Lee los filtros de leads de la petición (since/until en formato ISO)"""
+        since = request.args.get('since')
+        until = request.args.get('until')
+        return {
+            'since': datetime.fromisoformat(since) if since else None,
+            'until': datetime.fromisoformat(until) if until else None,
+            'interest': request.args.get('interest') or None,
+            'company': request.args.get('company') or None
+        }
+    
     @app.route('/admin/leads', methods=['GET'])
     def view_leads():
-        """Endpoint para ver los leads guardados en la base de datos"""
+        """
+        Endpoint para ver los leads guardados en la base de datos, del más reciente
+        al más antiguo y por páginas (limit y cursor). Filtros opcionales: since,
+        until, interest y company. Con format=json devuelve la página en JSON.
+        """
         # Verificar autenticación básica (esto debería mejorarse en producción)
         auth = request.authorization
         if not auth or auth.username != 'admin' or auth.password != 'alisys2024':
@@ -531,45 +537,194 @@ def register_routes(app):
             )
         
         try:
-            # Obtener leads de la base de datos
-            leads = get_leads()
-            
-            # Convertir a formato JSON
-            leads_data = []
-            for lead in leads:
-                leads_data.append({
-                    'id': lead.id,
-                    'name': lead.name,
-                    'email': lead.email,
-                    'phone': lead.phone,
-                    'company': lead.company,
-                    'interest': lead.interest,
-                    'message': lead.message,
-                    'created_at': lead.created_at.isoformat() if lead.created_at else None,
-                    'project_estimate': getattr(lead, 'project_estimate', None),
-                    'project_file_name': getattr(lead, 'project_file_name', None)
-                })
-            
-            # Renderizar plantilla HTML con los leads
-            return render_template('leads.html', leads=leads_data)
+            filters = _lead_filters()
+            leads, next_cursor = get_leads_page(request.args.get('limit', 100, type=int),
+                                                request.args.get('cursor'), **filters)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
         except Exception as e:
             return jsonify({
                 "error": str(e),
                 "message": "Error al obtener los leads de la base de datos."
             })
+        
+        if request.args.get('format') == 'json':
+            return jsonify({"leads": leads, "next_cursor": next_cursor})
+        
+        # Renderizar la plantilla HTML en streaming con los parámetros de la página siguiente
+        query = {key: value for key, value in request.args.items() if key not in ('cursor', 'format') and value}
+        next_query = dict(query, cursor=next_cursor) if next_cursor else None
+        return Response(stream_with_context(stream_template('leads.html', leads=leads, query=query,
+                                                            next_query=next_query)))
+    
+    @app.route('/admin/leads/export', methods=['GET'])
+    def export_leads():
+        """
+        Endpoint para descargar todos los leads (format=json o csv) con los mismos
+        filtros que /admin/leads. Se envían por lotes sin cargarlos todos en memoria.
+        """
+        auth = request.authorization
+        if not auth or auth.username != 'admin' or auth.password != 'alisys2024':
+            return Response(
+                'Autenticación requerida', 401,
+                {'WWW-Authenticate': 'Basic realm="Login Required"'}
+            )
+        
+        try:
+            filters = _lead_filters()
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        export_format = request.args.get('format', 'json')
+        filename = f"leads_alisys_{datetime.now().strftime('%Y-%m-%d')}.{export_format}"
+        
+        def generate_json():
+            yield '['
+            for number, lead in enumerate(iter_leads(**filters)):
+                yield (',' if number else '') + json.dumps(lead, ensure_ascii=False)
+            yield ']'
+        
+        def generate_csv():
+            buffer = io.StringIO()
+            writer = csv.DictWriter(buffer, fieldnames=LEAD_EXPORT_FIELDS, extrasaction='ignore')
+            writer.writeheader()
+            for number, lead in enumerate(iter_leads(**filters), 1):
+                writer.writerow(lead)
+                if number % 1000 == 0:
+                    yield buffer.getvalue()
+                    buffer.seek(0)
+                    buffer.truncate()
+            yield buffer.getvalue()
+        
+        if export_format == 'csv':
+            generator, mimetype = generate_csv(), 'text/csv'
+        elif export_format == 'json':
+            generator, mimetype = generate_json(), 'application/json'
+        else:
+            return jsonify({"error": f"Formato de exportación no soportado: {export_format}"}), 400
+        return Response(stream_with_context(generator), mimetype=mimetype,
+                        headers={'Content-Disposition': f'attachment; filename={filename}'})
+    
+    @app.route('/admin/leads/stats', methods=['GET'])
+    def lead_stats():
+        """
+        Endpoint con las estadísticas de leads calculadas desde los agregados:
+        leads por periodo (bucket=day, week o month) entre since y until (por
+        defecto los últimos 30 días), intereses más frecuentes del rango y
+        total, empresas con más leads y embudo históricos (top = tamaño de los rankings).
+        """
+        auth = request.authorization
+        if not auth or auth.username != 'admin' or auth.password != 'alisys2024':
+            return Response(
+                'Autenticación requerida', 401,
+                {'WWW-Authenticate': 'Basic realm="Login Required"'}
+            )
+        
+        try:
+            return jsonify(get_lead_stats(
+                bucket=request.args.get('bucket', 'day'),
+                since=request.args.get('since') or None,
+                until=request.args.get('until') or None,
+                top=request.args.get('top', 10, type=int)
+            ))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        except Exception as e:
+            return jsonify({
+                "error": str(e),
+                "message": "Error al obtener las estadísticas de leads."
+            }), 500
+    
+    @app.route('/admin/sessions', methods=['GET'])
+    def admin_sessions():
+        """
+        Endpoint para listar las sesiones de conversación desde el índice de metadatos.
+        Filtros opcionales: user_id, agent, lead (true/false), since y until (fecha ISO).
+        Orden: sort (last_saved_at, created_at, message_count) y order (asc/desc).
+        Paginación: limit y offset.
+        """
+        # Verificar autenticación básica
+        auth = request.authorization
+        if not auth or auth.username != 'admin' or auth.password != 'alisys2024':
+            return Response(
+                'Autenticación requerida', 401,
+                {'WWW-Authenticate': 'Basic realm="Login Required"'}
+            )
+        
+        try:
+            lead = request.args.get('lead')
+            since = request.args.get('since')
+            until = request.args.get('until')
+            result = get_runtime().agent_manager.context_manager.query_sessions(
+                user_id=request.args.get('user_id'),
+                agent=request.args.get('agent'),
+                lead=None if lead is None else lead.lower() in ('1', 'true', 'yes', 'si'),
+                since=datetime.fromisoformat(since).timestamp() if since else None,
+                until=datetime.fromisoformat(until).timestamp() if until else None,
+                order_by=request.args.get('sort', 'last_saved_at'),
+                descending=request.args.get('order', 'desc').lower() != 'asc',
+                limit=request.args.get('limit', 50, type=int),
+                offset=request.args.get('offset', 0, type=int)
+            )
+            return jsonify(result)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        except Exception as e:
+            return jsonify({
+                "error": str(e),
+                "message": "Error al consultar el índice de sesiones."
+            }), 500
+    
+    @app.route('/admin/conversations/search', methods=['GET'])
+    def admin_search_conversations():
+        """
+        Endpoint para buscar texto en las conversaciones guardadas (sin acentos ni
+        mayúsculas; frases entre comillas). Devuelve fragmentos con los términos marcados.
+        Filtros opcionales: q, user_id, agent, lead (true/false), since y until (fecha ISO).
+        Orden: sort=relevance (por defecto, actividad más reciente). Paginación: limit y offset.
+        """
+        # Verificar autenticación básica
+        auth = request.authorization
+        if not auth or auth.username != 'admin' or auth.password != 'alisys2024':
+            return Response(
+                'Autenticación requerida', 401,
+                {'WWW-Authenticate': 'Basic realm="Login Required"'}
+            )
+        
+        try:
+            lead = request.args.get('lead')
+            since = request.args.get('since')
+            until = request.args.get('until')
+            result = get_runtime().agent_manager.context_manager.search_conversations(
+                query=request.args.get('q', ''),
+                user_id=request.args.get('user_id'),
+                agent=request.args.get('agent'),
+                lead=None if lead is None else lead.lower() in ('1', 'true', 'yes', 'si'),
+                since=datetime.fromisoformat(since).timestamp() if since else None,
+                until=datetime.fromisoformat(until).timestamp() if until else None,
+                relevance=request.args.get('sort') == 'relevance',
+                limit=request.args.get('limit', 20, type=int),
+                offset=request.args.get('offset', 0, type=int)
+            )
+            return jsonify(result)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        except Exception as e:
+            return jsonify({
+                "error": str(e),
+                "message": "Error al buscar en las conversaciones."
+            }), 500
     
     @app.route('/admin/get-last-lead', methods=['GET'])
     def get_last_lead():
         """Endpoint para obtener el último lead guardado"""
         try:
-            # Obtener leads de la base de datos
-            leads = get_leads()
+            # Obtener el último lead (el más reciente) directamente del índice
+            lead_data = get_latest_lead()
             
-            if not leads:
-                # Si no hay leads, intentar obtener del JSON
-                json_leads = data_manager.get_leads()
-                if json_leads:
-                    last_lead = json_leads[-1]
+            if not lead_data:
+                # Si no hay leads, intentar obtener el último del registro JSON/JSONL (sin recorrerlo)
+                last_lead = get_runtime().data_manager.json_repository.get_latest_lead()
+                if last_lead:
                     return jsonify({
                         "success": True,
                         "lead": {
@@ -588,23 +743,6 @@ def register_routes(app):
                         "message": "No se encontraron leads"
                     })
             
-            # Obtener el último lead (el más reciente)
-            last_lead = leads[-1]
-            
-            # Convertir a formato JSON
-            lead_data = {
-                'id': last_lead.id,
-                'name': last_lead.name,
-                'email': last_lead.email,
-                'phone': last_lead.phone,
-                'company': last_lead.company,
-                'interest': last_lead.interest,
-                'message': last_lead.message,
-                'created_at': last_lead.created_at.isoformat() if last_lead.created_at else None,
-                'project_estimate': getattr(last_lead, 'project_estimate', None),
-                'project_file_name': getattr(last_lead, 'project_file_name', None)
-            }
-            
             return jsonify({
                 "success": True,
                 "lead": lead_data
@@ -619,7 +757,13 @@ def register_routes(app):
     
     @app.route('/admin/project-summaries', methods=['GET'])
     def project_summaries():
-        """Endpoint para ver los resúmenes de proyectos generados"""
+        """
+        Endpoint para ver los resúmenes de proyectos generados, del más reciente al
+        más antiguo o, con q, los que contienen los términos buscados (nombre, email,
+        empresa, interés, tecnologías o texto del resumen); sort=relevance ordena la
+        búsqueda por relevancia. Paginación: limit y offset. Con format=json devuelve
+        la página en JSON.
+        """
         # Verificar autenticación básica
         auth = request.authorization
         if not auth or auth.username != 'admin' or auth.password != 'alisys2024':
@@ -629,107 +773,35 @@ def register_routes(app):
             )
         
         try:
-            # Obtener todos los archivos de resumen de proyectos
-            data_dir = "data"
-            summaries = []
-            
-            # Buscar archivos de resumen en formato TXT
-            for filename in os.listdir(data_dir):
-                if filename.startswith("client_summary_") and filename.endswith(".txt"):
-                    file_path = os.path.join(data_dir, filename)
-                    try:
-                        with open(file_path, 'r', encoding='utf-8') as f:
-                            summary_text = f.read()
-                        
-                        # Extraer el email del nombre del archivo
-                        email = filename.replace("client_summary_", "").replace(".txt", "").replace("_at_", "@")
-                        
-                        # Obtener la fecha de modificación del archivo
-                        modified_time = os.path.getmtime(file_path)
-                        modified_date = datetime.fromtimestamp(modified_time).strftime('%Y-%m-%d %H:%M:%S')
-                        
-                        summaries.append({
-                            'email': email,
-                            'filename': filename,
-                            'modified_date': modified_date,
-                            'summary': summary_text
-                        })
-                    except Exception as e:
-                        print(f"Error al leer el archivo {filename}: {str(e)}")
-            
-            # Buscar archivos de resumen en formato JSON
-            for filename in os.listdir(data_dir):
-                if filename.startswith("client_summary_") and filename.endswith(".json"):
-                    file_path = os.path.join(data_dir, filename)
-                    try:
-                        with open(file_path, 'r', encoding='utf-8') as f:
-                            summary_data = json.load(f)
-                        
-                        # Extraer el email del nombre del archivo
-                        email = filename.replace("client_summary_", "").replace(".json", "").replace("_at_", "@")
-                        
-                        # Obtener la fecha de modificación del archivo
-                        modified_time = os.path.getmtime(file_path)
-                        modified_date = datetime.fromtimestamp(modified_time).strftime('%Y-%m-%d %H:%M:%S')
-                        
-                        # Verificar si ya existe un resumen en formato TXT para este cliente
-                        existing_summary = next((s for s in summaries if s['email'] == email), None)
-                        
-                        if not existing_summary:
-                            # Generar un resumen en texto a partir de los datos JSON
-                            client_info = summary_data.get('client_info', {})
-                            project_info = summary_data.get('project_info', {})
-                            technical_analysis = summary_data.get('technical_analysis', {})
-                            
-                            summary_text = f"""
-RESUMEN DE LEAD - {modified_date}
-
-INFORMACIÓN DEL CLIENTE:
-- Nombre: {client_info.get('name', 'No proporcionado')}
-- Email: {client_info.get('email', 'No proporcionado')}
-- Teléfono: {client_info.get('phone', 'No proporcionado')}
-- Empresa: {client_info.get('company', 'No proporcionada')}
-- Interés: {client_info.get('interest', 'No especificado')}
-
-RESUMEN DEL PROYECTO:
-"""
-                            
-                            # Añadir detalles sobre el archivo subido si existe
-                            if project_info.get('has_uploaded_file'):
-                                summary_text += f"- Cliente subió archivo: {project_info.get('file_name')}\n"
-                            
-                            # Añadir análisis técnico si existe
-                            if technical_analysis:
-                                summary_text += f"""
-ANÁLISIS TÉCNICO:
-- Complejidad: {technical_analysis.get('complejidad', 'No determinada')}
-- Tecnologías recomendadas: {', '.join(technical_analysis.get('tecnologias_recomendadas', ['No determinadas']))}
-- Tiempo estimado: {technical_analysis.get('tiempo_estimado', 'No determinado')}
-- Desarrolladores recomendados: {technical_analysis.get('num_desarrolladores', 'No determinado')}
-- Presupuesto estimado: {technical_analysis.get('costo_total', 'No determinado')} {technical_analysis.get('moneda', 'EUR')}
-"""
-                            
-                            # Añadir resumen de la conversación
-                            if project_info.get('conversation_summary'):
-                                summary_text += f"\nRESUMEN DE LA CONVERSACIÓN:\n{project_info.get('conversation_summary')[:500]}...\n"
-                            
-                            summaries.append({
-                                'email': email,
-                                'filename': filename,
-                                'modified_date': modified_date,
-                                'summary': summary_text,
-                                'json_data': summary_data
-                            })
-                    except Exception as e:
-                        print(f"Error al leer el archivo JSON {filename}: {str(e)}")
-            
-            # Ordenar los resúmenes por fecha de modificación (más reciente primero)
-            summaries.sort(key=lambda x: x['modified_date'], reverse=True)
+            query = request.args.get('q', '').strip()
+            result = get_runtime().data_manager.summary_store.search(
+                query,
+                limit=request.args.get('limit', 50, type=int),
+                offset=request.args.get('offset', 0, type=int),
+                relevance=request.args.get('sort') == 'relevance'
+            )
+            if request.args.get('format') == 'json':
+                return jsonify(result)
             
-            # Renderizar plantilla HTML con los resúmenes
-            return render_template('project_summaries.html', summaries=summaries)
+            # Renderizar plantilla HTML con la página de resúmenes
+            return render_template('project_summaries.html', query=query, **result)
         except Exception as e:
             return jsonify({
                 "error": str(e),
                 "message": "Error al obtener los resúmenes de proyectos."
-            }) 
\ No newline at end of file
+            })
+    
+    @app.route('/admin/project-summaries/<path:email>', methods=['GET'])
+    def project_summary(email):
+        """Endpoint para obtener en JSON el resumen del proyecto de un cliente por su email"""
+        auth = request.authorization
+        if not auth or auth.username != 'admin' or auth.password != 'alisys2024':
+            return Response(
+                'Autenticación requerida', 401,
+                {'WWW-Authenticate': 'Basic realm="Login Required"'}
+            )
+        
+        summary = get_runtime().data_manager.summary_store.get(email)
+        if summary is None:
+            return jsonify({"error": f"No hay resumen para {email}"}), 404
+        return jsonify(summary)
\ No newline at end of file
@@ -0,0 +1,181 @@
+"""
+Sesiones de Flask guardadas en el servidor.
+La cookie solo contiene el identificador de la sesión, firmado con la clave
+secreta de la aplicación; las variables de la sesión (agente actual, datos
+del usuario y del proyecto, archivo adjunto...) se guardan en el almacén de
+sesiones configurado y cualquier proceso puede cargarlas.
+"""
+import secrets
+from typing import Optional
+from flask import session
+from flask.sessions import SessionInterface, SessionMixin
+from itsdangerous import Signer, BadSignature
+from werkzeug.datastructures import CallbackDict
+import logging
+
+from core.config import SESSION_BACKEND
+from services.session_backend import SessionBackend, SessionBackendError, get_session_backend
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+# Espacio de nombres de las sesiones de Flask en el almacén
+SESSION_NAMESPACE = 'session'
+
+class ServerSession(CallbackDict, SessionMixin):
+    """
+    Sesión cuyos datos viven en el almacén de sesiones.
+    """
+    
+    def __init__(self, initial: Optional[dict] = None, sid: Optional[str] = None, new: bool = False):
+        def on_update(self):
+            self.modified = True
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.modified = False
+        # Si sus variables ya están en el almacén (y el navegador tiene la cookie)
+        self.stored = not new
+
+class ServerSessionInterface(SessionInterface):
+    """
+    Interfaz de sesiones de Flask respaldada por un SessionBackend.
+    """
+    
+    def __init__(self, backend: SessionBackend):
+        """
+        Inicializa la interfaz.
+        
+        Args:
+            backend: Almacén de sesiones
+        """
+        self.backend = backend
+    
+    def _get_signer(self, app) -> Optional[Signer]:
+        """Firmante del identificador con la clave secreta de la aplicación"""
+        if not app.secret_key:
+            return None
+        return Signer(app.secret_key, salt='alisys-server-session')
+    
+    def open_session(self, app, request) -> Optional[ServerSession]:
+        """
+        Carga la sesión indicada por la cookie o crea una nueva.
+        
+        Args:
+            app: Aplicación Flask
+            request: Petición en curso
+            
+        Returns:
+            Sesión de la petición (None si la aplicación no tiene clave secreta)
+        """
+        signer = self._get_signer(app)
+        if signer is None:
+            return None
+        
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        if cookie:
+            try:
+                sid = signer.unsign(cookie).decode('utf-8')
+            except BadSignature:
+                logger.warning("Cookie de sesión con firma no válida, se crea una sesión nueva")
+                sid = None
+            if sid:
+                try:
+                    data = self.backend.get(SESSION_NAMESPACE, sid)
+                except (SessionBackendError, ValueError) as e:
+                    # Sin el estado guardado se empieza una sesión nueva para no sobrescribirlo
+                    logger.error(f"Error al cargar la sesión: {str(e)}")
+                    data = None
+                if data is not None:
+                    return ServerSession(data, sid=sid)
+        
+        return ServerSession(sid=secrets.token_urlsafe(32), new=True)
+    
+    def persist(self, session: ServerSession) -> bool:
+        """
+        Escribe las variables de la sesión en el almacén.
+        
+        Args:
+            session: Sesión modificada
+            
+        Returns:
+            True si se guardó
+        """
+        try:
+            self.backend.set(SESSION_NAMESPACE, session.sid, dict(session))
+        except SessionBackendError as e:
+            logger.error(f"Error al guardar la sesión: {str(e)}")
+            return False
+        session.modified = False
+        session.stored = True
+        return True
+    
+    def save_session(self, app, session: ServerSession, response) -> None:
+        """
+        Guarda la sesión modificada y envía la cookie con su identificador.
+        
+        Args:
+            app: Aplicación Flask
+            session: Sesión de la petición
+            response: Respuesta en curso
+        """
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        
+        # Sesión vaciada: se borra del almacén y del navegador
+        if not session:
+            if session.modified:
+                if not session.new:
+                    try:
+                        self.backend.delete(SESSION_NAMESPACE, session.sid)
+                    except SessionBackendError as e:
+                        logger.error(f"Error al eliminar la sesión: {str(e)}")
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+        
+        if session.accessed:
+            response.vary.add('Cookie')
+        
+        if not session.modified:
+            return
+        
+        if not self.persist(session):
+            return
+        
+        if session.new or self.should_set_cookie(app, session):
+            response.set_cookie(
+                name,
+                self._get_signer(app).sign(session.sid.encode('utf-8')).decode('utf-8'),
+                expires=self.get_expiration_time(app, session),
+                httponly=self.get_cookie_httponly(app),
+                domain=domain,
+                path=path,
+                secure=self.get_cookie_secure(app),
+                samesite=self.get_cookie_samesite(app)
+            )
+
+def init_session_interface(app, backend: str = SESSION_BACKEND) -> None:
+    """
+    Instala las sesiones en el servidor salvo con SESSION_BACKEND=cookie.
+    
+    Args:
+        app: Aplicación Flask
+        backend: Almacén configurado
+    """
+    if backend == 'cookie':
+        logger.info("Sesiones de Flask en la cookie firmada")
+        return
+    interface = ServerSessionInterface(get_session_backend())
+    app.session_interface = interface
+    
+    @app.teardown_request
+    def _persist_streamed_session(exc):
+        """
+        Guarda los cambios hechos en la sesión después de enviar las cabeceras.
+        Las respuestas SSE (stream_with_context) actualizan la sesión mientras
+        generan el contenido, cuando save_session ya se ha ejecutado.
+        """
+        current = session._get_current_object()
+        if isinstance(current, ServerSession) and current.modified and current.stored and current:
+            interface.persist(current)
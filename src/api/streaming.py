@@ -0,0 +1,274 @@
+"""
+Respuestas SSE de los turnos de chat (/chat/stream y /agent/chat/stream).
+
+Cada ruta de streaming prepara su turno una sola vez (lee la sesión, elige
+el agente, construye el contexto) y devuelve un StreamTurn. El mismo turno lo
+sirven dos motores con idéntico contrato de eventos:
+
+- Flask (hilos): iter_turn_events consume el AgentManager de forma síncrona;
+- ASGI (asgi.py): iter_turn_events_async espera la respuesta del LLM en el
+  bucle de eventos, sin ocupar un hilo mientras la conexión está abierta.
+
+Las rutas se registran en app.extensions['sse_streams'] para que el servidor
+ASGI encuentre la función que prepara cada turno.
+
+Un turno con búfer de reanudación (replay, ver utils/stream_replay.py) envía
+sus eventos con id y sigue generándose aunque el cliente se desconecte; una
+reconexión con Last-Event-ID se sirve con resume_turn, que sigue ese búfer
+sin volver a procesar el mensaje.
+"""
+import json
+import asyncio
+import threading
+import traceback
+from typing import Dict, Any, List, Optional, Callable, Generator, AsyncGenerator, Awaitable
+from flask import Response, stream_with_context
+import logging
+
+from core.runtime import get_runtime
+from utils.stream_replay import ReplayBuffer, StreamExpired
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+# Clave de las rutas de streaming en app.extensions
+EXTENSION_KEY = 'sse_streams'
+
+# Respuesta a una reconexión que ya no se puede reanudar
+STREAM_EXPIRED_MESSAGE = 'La respuesta anterior ya no está disponible. Por favor, envía de nuevo tu mensaje.'
+
+def sse_event(data: Dict[str, Any]) -> str:
+    """
+    Formatea un evento SSE con datos JSON.
+    
+    Args:
+        data: Datos del evento
+        
+    Returns:
+        Evento SSE (data: ...)
+    """
+    return f"data: {json.dumps(data)}\n\n"
+
+def _default_done(context: Dict[str, Any]) -> Dict[str, Any]:
+    """Evento final por defecto"""
+    return {'done': True}
+
+def _default_fail(error: Exception) -> List[str]:
+    """Eventos de error por defecto: mensaje genérico y fin del turno"""
+    print(f"Error al procesar mensaje con agentes: {str(error)}")
+    traceback.print_exc()
+    return [sse_event({'token': 'Lo siento, ha ocurrido un error al procesar tu mensaje. Por favor, inténtalo de nuevo.'}),
+            sse_event({'done': True})]
+
+class StreamTurn:
+    """
+    Respuesta SSE de una petición de chat.
+    
+    Primero se envían los eventos ya calculados (events). Si hay mensaje, el
+    AgentManager lo procesa con el contexto dado (tras escribir en él updates y
+    defaults con el bloqueo de la sesión adquirido): cada fragmento es un evento
+    {'token': ...} y al terminar se envía done(context) y se ejecuta
+    finish(context) con el contexto de la petición (actualiza la sesión). Si el
+    procesamiento falla, se envían los eventos de fail(error).
+    
+    Con replay, los eventos se numeran y se guardan en el búfer; con
+    resume_after, el turno no procesa nada y solo sigue el búfer a partir de
+    ese evento (reconexión).
+    """
+    __slots__ = ('events', 'message', 'context', 'updates', 'defaults', 'done', 'fail', 'finish', 'content_type',
+                 'replay', 'resume_after')
+    
+    def __init__(self, events: Optional[List[str]] = None, message: Optional[str] = None,
+                 context: Optional[Dict[str, Any]] = None,
+                 updates: Optional[Dict[str, Any]] = None, defaults: Optional[Dict[str, Any]] = None,
+                 done: Callable[[Dict[str, Any]], Dict[str, Any]] = _default_done,
+                 fail: Callable[[Exception], List[str]] = _default_fail,
+                 finish: Optional[Callable[[Dict[str, Any]], None]] = None,
+                 content_type: str = 'text/event-stream',
+                 replay: Optional[ReplayBuffer] = None, resume_after: Optional[int] = None):
+        """
+        Define la respuesta del turno.
+        
+        Args:
+            events: Eventos SSE que se envían antes de la respuesta del agente
+            message: Mensaje para el AgentManager (None si no hay que procesar nada)
+            context: Contexto vivo de la conversación
+            updates: Estado de la petición que se escribe en el contexto (ver AgentManager.process_message)
+            defaults: Valores que solo se escriben si el contexto no tiene uno
+            done: Datos del evento final a partir del contexto
+            fail: Eventos que se envían si el procesamiento falla
+            finish: Actualización de la sesión tras el evento final
+            content_type: Content-Type de la respuesta
+            replay: Búfer de reanudación del stream (None si no se puede reanudar)
+            resume_after: Último evento recibido por el cliente, si es una reconexión
+        """
+        self.events = events or []
+        self.message = message
+        self.context = context
+        self.updates = updates
+        self.defaults = defaults
+        self.done = done
+        self.fail = fail
+        self.finish = finish
+        self.content_type = content_type
+        self.replay = replay
+        self.resume_after = resume_after
+
+def resume_turn(last_event_id: str, owner: Optional[str], content_type: str = 'text/event-stream') -> StreamTurn:
+    """
+    Prepara la respuesta a una reconexión con Last-Event-ID: sigue el stream
+    original (en curso o terminado) sin volver a procesar el mensaje.
+    
+    Args:
+        last_event_id: Valor de la cabecera Last-Event-ID
+        owner: Clave de la sesión de la petición
+        content_type: Content-Type de la respuesta
+        
+    Returns:
+        StreamTurn que sigue el búfer, o un evento de error si ya no se puede reanudar
+    """
+    try:
+        buffer, after = get_runtime().stream_replay.resume(last_event_id, owner)
+    except StreamExpired as e:
+        logger.info(f"Reconexión sin reanudar: {str(e)}")
+        return StreamTurn(events=[sse_event({'error': STREAM_EXPIRED_MESSAGE})], content_type=content_type)
+    return StreamTurn(content_type=content_type, replay=buffer, resume_after=after)
+
+def _drain_events(buffer: ReplayBuffer, events: Generator[str, None, None]) -> None:
+    """Termina en segundo plano la generación de un turno cuyo cliente se desconectó"""
+    try:
+        for event in events:
+            buffer.append(event)
+    finally:
+        buffer.close()
+
+def iter_turn_events(turn: StreamTurn) -> Generator[str, None, None]:
+    """
+    Produce los eventos SSE del turno procesándolo de forma síncrona.
+    
+    Args:
+        turn: Turno preparado por la ruta
+        
+    Returns:
+        Generador de eventos SSE
+    """
+    if turn.replay is None:
+        yield from _iter_events(turn)
+    elif turn.resume_after is not None:
+        try:
+            yield from turn.replay.follow(turn.resume_after)
+        except StreamExpired:
+            yield sse_event({'error': STREAM_EXPIRED_MESSAGE})
+    else:
+        buffer = turn.replay
+        events = _iter_events(turn)
+        handed_off = False
+        try:
+            yield buffer.open()
+            for event in events:
+                yield buffer.append(event)
+        except GeneratorExit:
+            # El cliente se desconectó: la respuesta se termina en otro hilo para poder reanudarla
+            handed_off = True
+            threading.Thread(target=_drain_events, args=(buffer, events), daemon=True).start()
+            raise
+        finally:
+            if not handed_off:
+                buffer.close()
+
+def _iter_events(turn: StreamTurn) -> Generator[str, None, None]:
+    """Eventos SSE del turno, sin ids (ver iter_turn_events)"""
+    yield from turn.events
+    if turn.message is None:
+        return
+    try:
+        for chunk in get_runtime().agent_manager.process_message(turn.message, turn.context, turn.updates,
+                                                                   turn.defaults):
+            if isinstance(chunk, str):
+                yield sse_event({'token': chunk})
+        yield sse_event(turn.done(turn.context))
+        if turn.finish:
+            turn.finish(turn.context)
+    except Exception as e:
+        yield from turn.fail(e)
+
+async def iter_turn_events_async(turn: StreamTurn,
+                                 run_finish: Callable[[Callable[[Dict[str, Any]], None], Dict[str, Any]], Awaitable[None]]
+                                 ) -> AsyncGenerator[str, None]:
+    """
+    Versión asíncrona de iter_turn_events (servidor ASGI).
+    
+    Args:
+        turn: Turno preparado por la ruta
+        run_finish: Ejecuta finish(context) con el contexto de la petición
+        
+    Returns:
+        Generador asíncrono de eventos SSE
+    """
+    if turn.replay is None:
+        async for event in _iter_events_async(turn, run_finish):
+            yield event
+        return
+    after = turn.resume_after
+    if after is None:
+        # La respuesta se genera en su propia tarea: si el cliente se desconecta,
+        # se cancela solo esta conexión y la generación sigue para poder reanudarla
+        opening = turn.replay.open()
+        turn.replay.task = asyncio.ensure_future(_record_events_async(turn, run_finish))
+        yield opening
+        after = 0
+    try:
+        async for event in turn.replay.follow_async(after):
+            yield event
+    except StreamExpired:
+        yield sse_event({'error': STREAM_EXPIRED_MESSAGE})
+
+async def _record_events_async(turn: StreamTurn, run_finish) -> None:
+    """Genera los eventos del turno en su búfer de reanudación (servidor ASGI)"""
+    try:
+        async for event in _iter_events_async(turn, run_finish):
+            turn.replay.append(event)
+    finally:
+        turn.replay.close()
+
+async def _iter_events_async(turn: StreamTurn, run_finish) -> AsyncGenerator[str, None]:
+    """Eventos SSE del turno, sin ids (ver iter_turn_events_async)"""
+    for event in turn.events:
+        yield event
+    if turn.message is None:
+        return
+    try:
+        async for chunk in get_runtime().agent_manager.process_message_async(turn.message, turn.context, turn.updates,
+                                                                               turn.defaults):
+            if isinstance(chunk, str):
+                yield sse_event({'token': chunk})
+        yield sse_event(turn.done(turn.context))
+        if turn.finish:
+            await run_finish(turn.finish, turn.context)
+    except Exception as e:
+        for event in turn.fail(e):
+            yield event
+
+def stream_response(turn: StreamTurn) -> Response:
+    """
+    Respuesta de Flask que envía el turno en streaming.
+    
+    Args:
+        turn: Turno preparado por la ruta
+        
+    Returns:
+        Respuesta SSE
+    """
+    return Response(stream_with_context(iter_turn_events(turn)), content_type=turn.content_type)
+
+def register_stream(app, rule: str, prepare: Callable[[], StreamTurn]) -> None:
+    """
+    Registra la función que prepara los turnos de una ruta de streaming para
+    que el servidor ASGI la sirva de forma nativa.
+    
+    Args:
+        app: Aplicación Flask
+        rule: Ruta (p. ej. '/chat/stream')
+        prepare: Función sin argumentos que lee la petición en curso y devuelve el StreamTurn
+    """
+    app.extensions.setdefault(EXTENSION_KEY, {})[rule] = prepare
@@ -8,6 +8,7 @@ from dotenv import load_dotenv
 # Importar rutas de la API
 from api.routes import register_routes
 from api.agent_routes import register_agent_routes
+from api.session_interface import init_session_interface
 
 # Cargar variables de entorno
 load_dotenv()
@@ -19,6 +20,13 @@ def create_app():
     # Configurar la clave secreta para las sesiones
     app.secret_key = os.getenv('SECRET_KEY', 'alisys_chatbot_secret_key')
     
+    # Crear el motor y el esquema de la base de datos de leads (importar los módulos no lo hace)
+    from data import database
+    database.init_app(app)
+    
+    # Guardar el estado de las sesiones en el servidor si SESSION_BACKEND lo pide (memory o redis)
+    init_session_interface(app)
+    
     # Registrar rutas tradicionales
     register_routes(app)
     
@@ -0,0 +1,224 @@
+"""
+Punto de entrada ASGI de la aplicación del chatbot web.
+
+    uvicorn --factory asgi:create_asgi_app --app-dir src --host 0.0.0.0 --port 8000
+    python src/asgi.py
+
+Las rutas de streaming registradas con api.streaming.register_stream
+(/chat/stream y /agent/chat/stream) se sirven de forma nativa: la sesión se
+lee y el turno se prepara en un hilo del executor, y la respuesta del LLM se
+espera en el bucle de eventos, de modo que un stream abierto no ocupa un hilo.
+El resto de rutas pasan a la aplicación Flask a través de asgiref (WsgiToAsgi).
+
+Requiere asgiref y uvicorn, y httpx para el streaming nativo (sin httpx las
+rutas de streaming también pasan por Flask).
+"""
+import io
+import sys
+import asyncio
+import logging
+
+# Adaptador WSGI del resto de rutas y servidor ASGI
+try:
+    from asgiref.wsgi import WsgiToAsgi
+    ASGI_SUPPORT = True
+except ImportError:
+    ASGI_SUPPORT = False
+    print("asgiref no está instalado. El servidor ASGI está deshabilitado.")
+
+from flask import Response
+from flask.ctx import RequestContext
+from app import create_app
+from api.session_interface import ServerSession
+from api.streaming import EXTENSION_KEY, iter_turn_events_async
+from core.config import HOST, PORT
+from core.runtime import get_runtime
+from services.lm_studio import HTTPX_SUPPORT
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+def build_environ(scope: dict) -> dict:
+    """
+    Construye el entorno WSGI de una petición ASGI sin cuerpo.
+    
+    Args:
+        scope: Scope HTTP de la petición
+        
+    Returns:
+        Entorno WSGI para el contexto de petición de Flask
+    """
+    script_name = scope.get('root_path', '').encode('utf-8').decode('latin-1')
+    path_info = scope['path'].encode('utf-8').decode('latin-1')
+    if script_name and path_info.startswith(script_name):
+        path_info = path_info[len(script_name):]
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': script_name,
+        'PATH_INFO': path_info,
+        'QUERY_STRING': scope.get('query_string', b'').decode('ascii'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(b''),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False
+    }
+    if scope.get('client'):
+        environ['REMOTE_ADDR'] = scope['client'][0]
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            name = f"HTTP_{name}"
+        value = value.decode('latin-1')
+        environ[name] = f"{environ[name]},{value}" if name in environ else value
+    return environ
+
+class StreamingASGIApp:
+    """
+    Aplicación ASGI: streaming nativo para las rutas registradas y Flask
+    (en hilos) para las demás.
+    """
+    
+    def __init__(self, flask_app):
+        """
+        Inicializa la aplicación.
+        
+        Args:
+            flask_app: Aplicación Flask creada con create_app
+        """
+        self.flask_app = flask_app
+        self.wsgi = WsgiToAsgi(flask_app)
+        self.streams = flask_app.extensions.get(EXTENSION_KEY, {}) if HTTPX_SUPPORT else {}
+        if not HTTPX_SUPPORT:
+            logger.warning("httpx no está instalado: las rutas de streaming se sirven con Flask (un hilo por stream)")
+    
+    async def __call__(self, scope, receive, send) -> None:
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http' and scope['method'] == 'GET' and scope['path'] in self.streams:
+            await self._stream(scope, receive, send, self.streams[scope['path']])
+        else:
+            await self.wsgi(scope, receive, send)
+    
+    async def _lifespan(self, receive, send) -> None:
+        """Arranque y parada del servidor: al parar se cierran las conexiones con LM Studio"""
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await get_runtime().aclose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+    
+    def _prepare(self, environ: dict, prepare):
+        """
+        Prepara el turno con el contexto de petición de Flask (en el executor).
+        
+        Returns:
+            Tupla (respuesta con el estado y las cabeceras, turno o None, sesión)
+        """
+        app = self.flask_app
+        ctx = app.request_context(environ)
+        ctx.push()
+        try:
+            turn = None
+            try:
+                response = app.preprocess_request()
+                if response is None:
+                    turn = prepare()
+                    response = Response(content_type=turn.content_type)
+                response = app.make_response(response)
+            except Exception as e:
+                turn = None
+                response = app.make_response(app.handle_exception(e))
+            # Guarda la sesión y añade la cookie antes de enviar las cabeceras
+            response = app.process_response(response)
+            return response, turn, ctx.session
+        finally:
+            ctx.pop()
+    
+    def _finish(self, environ: dict, session, finish, context: dict) -> None:
+        """
+        Ejecuta finish(context) con la misma sesión de la petición (en el executor).
+        
+        Con las sesiones en el servidor (SESSION_BACKEND memory o redis) los
+        cambios se guardan en el almacén de sesiones. Con la sesión en la
+        cookie no se pueden guardar: la cookie se envió con las cabeceras (igual
+        que en el streaming de Flask) y el estado del turno solo queda en el
+        contexto vivo de la conversación.
+        """
+        ctx = RequestContext(self.flask_app, environ, session=session)
+        ctx.push()
+        try:
+            finish(context)
+            if isinstance(session, ServerSession) and session.modified and session:
+                self.flask_app.session_interface.persist(session)
+        finally:
+            ctx.pop()
+    
+    async def _stream(self, scope, receive, send, prepare) -> None:
+        """
+        Sirve una ruta de streaming. Si el cliente se desconecta se cancela el
+        turno (y con él la petición a LM Studio), salvo si es reanudable: ese
+        termina de generarse en su propia tarea y solo se cancela el envío.
+        """
+        loop = asyncio.get_running_loop()
+        environ = build_environ(scope)
+        response, turn, session = await loop.run_in_executor(None, self._prepare, environ, prepare)
+        
+        headers = [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                   for name, value in response.headers.items()
+                   if turn is None or name.lower() != 'content-length']
+        await send({'type': 'http.response.start', 'status': response.status_code, 'headers': headers})
+        if turn is None:
+            await send({'type': 'http.response.body', 'body': response.get_data()})
+            return
+        
+        async def run_finish(finish, context):
+            await loop.run_in_executor(None, self._finish, environ, session, finish, context)
+        
+        async def send_events():
+            async for event in iter_turn_events_async(turn, run_finish):
+                await send({'type': 'http.response.body', 'body': event.encode('utf-8'), 'more_body': True})
+            await send({'type': 'http.response.body', 'body': b''})
+        
+        async def wait_disconnect():
+            while (await receive())['type'] != 'http.disconnect':
+                pass
+        
+        sending = asyncio.ensure_future(send_events())
+        watching = asyncio.ensure_future(wait_disconnect())
+        try:
+            await asyncio.wait({sending, watching}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            # Cancelar el turno libera el bloqueo de la sesión y cierra la petición a LM Studio
+            for task in (sending, watching):
+                task.cancel()
+            await asyncio.gather(sending, watching, return_exceptions=True)
+        if not sending.cancelled() and sending.exception():
+            raise sending.exception()
+
+def create_asgi_app(flask_app=None) -> StreamingASGIApp:
+    """
+    Crea la aplicación ASGI (fábrica para uvicorn --factory).
+    
+    Args:
+        flask_app: Aplicación Flask (por defecto, create_app())
+        
+    Returns:
+        Aplicación ASGI
+    """
+    if not ASGI_SUPPORT:
+        raise RuntimeError("El servidor ASGI requiere asgiref (pip install asgiref uvicorn)")
+    return StreamingASGIApp(flask_app or create_app())
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run('asgi:create_asgi_app', factory=True, host=HOST, port=PORT)
@@ -11,6 +11,8 @@ load_dotenv()
 LM_STUDIO_URL = os.getenv("LM_STUDIO_URL", "http://localhost:1234")
 LM_STUDIO_MODEL = os.getenv("LM_STUDIO_MODEL", "phi-4")
 TIMEOUT = int(os.getenv("TIMEOUT", "30"))
+# Conexiones HTTP con LM Studio que cada proceso mantiene abiertas para reutilizarlas
+LM_STUDIO_POOL_SIZE = int(os.getenv("LM_STUDIO_POOL_SIZE", "32"))
 
 # Configuración del chatbot
 DEFAULT_TEMPERATURE = 0.7
@@ -76,6 +78,113 @@ DEBUG = os.getenv("DEBUG", "True").lower() in ("true", "1", "t")
 PORT = int(os.getenv("PORT", "8000"))
 HOST = os.getenv("HOST", "0.0.0.0")
 
+# Configuración del análisis de sentimiento
+SENTIMENT_WINDOW_SIZE = int(os.getenv("SENTIMENT_WINDOW_SIZE", "5"))
+SENTIMENT_EWMA_ALPHA = float(os.getenv("SENTIMENT_EWMA_ALPHA", "0.5"))
+# Archivo JSONL con los análisis completos por mensaje (vacío = desactivado)
+SENTIMENT_ANALYTICS_FILE = os.getenv("SENTIMENT_ANALYTICS_FILE", "")
+
+# Base de datos SQLite de leads
+# Ruta del archivo (vacío = data/leads_alisys_bot.db en la primera ubicación escribible)
+LEADS_DB_PATH = os.getenv("LEADS_DB_PATH", "")
+# Registrar cada sentencia SQL en la salida estándar (solo para depuración)
+LEADS_DB_ECHO = os.getenv("LEADS_DB_ECHO", "False").lower() in ("true", "1", "t")
+# Milisegundos que una conexión espera a que otra libere el bloqueo de escritura
+LEADS_DB_BUSY_TIMEOUT_MS = int(os.getenv("LEADS_DB_BUSY_TIMEOUT_MS", "5000"))
+# Bytes de la base de datos que se leen mediante E/S mapeada en memoria (0 = desactivado)
+LEADS_DB_MMAP_SIZE = int(os.getenv("LEADS_DB_MMAP_SIZE", str(64 * 1024 * 1024)))
+# Conexiones que se mantienen abiertas en el pool y conexiones extra permitidas en picos
+LEADS_DB_POOL_SIZE = int(os.getenv("LEADS_DB_POOL_SIZE", "10"))
+LEADS_DB_MAX_OVERFLOW = int(os.getenv("LEADS_DB_MAX_OVERFLOW", "20"))
+
+# Copia en archivo de los leads ('jsonl' = registro de solo escritura al final, 'json' = leads.json completo)
+LEADS_FILE_FORMAT = os.getenv("LEADS_FILE_FORMAT", "jsonl")
+# Sincronización del registro JSONL con el disco ('always', 'batch' o 'never')
+LEADS_JSONL_FSYNC = os.getenv("LEADS_JSONL_FSYNC", "batch")
+# Segundos entre sincronizaciones con la política 'batch'
+LEADS_JSONL_FSYNC_INTERVAL = float(os.getenv("LEADS_JSONL_FSYNC_INTERVAL", "1.0"))
+# Tamaño del archivo activo a partir del cual se rota a un segmento (0 = sin rotación)
+LEADS_JSONL_ROTATE_BYTES = int(os.getenv("LEADS_JSONL_ROTATE_BYTES", str(64 * 1024 * 1024)))
+
+# Cola de salida de leads: cada lead se confirma una vez en una cola local duradera y un hilo
+# lo copia por lotes a SQLite y al registro JSONL (False = doble escritura directa)
+LEADS_OUTBOX_ENABLED = os.getenv("LEADS_OUTBOX_ENABLED", "True").lower() in ("true", "1", "t")
+# Leads por lote del despachador
+LEADS_OUTBOX_BATCH_SIZE = int(os.getenv("LEADS_OUTBOX_BATCH_SIZE", "200"))
+# Segundos máximos entre pasadas del despachador (se despierta antes al encolar)
+LEADS_OUTBOX_INTERVAL = float(os.getenv("LEADS_OUTBOX_INTERVAL", "1.0"))
+# Espera máxima entre reintentos de un lead que no se pudo copiar (segundos)
+LEADS_OUTBOX_MAX_BACKOFF = float(os.getenv("LEADS_OUTBOX_MAX_BACKOFF", "300"))
+
+# Resúmenes de proyecto de los leads (SQLite con índice de texto completo)
+# Ruta de la base de datos (vacío = <directorio de datos>/project_summaries.db)
+PROJECT_SUMMARY_DB_PATH = os.getenv("PROJECT_SUMMARY_DB_PATH", "")
+# Escribir también los archivos client_summary_*.txt/json en el directorio de datos
+# (desactivado: el almacén SQLite es la fuente de los resúmenes)
+PROJECT_SUMMARY_FILES = os.getenv("PROJECT_SUMMARY_FILES", "False").lower() in ("true", "1", "t")
+
+# Documentos de proyecto subidos (texto extraído y análisis, por SHA-256 del archivo)
+# Directorio del almacén (vacío = data/documents)
+DOCUMENT_STORE_DIR = os.getenv("DOCUMENT_STORE_DIR", "")
+
+# Persistencia de contextos de conversación ('sqlite' o 'json')
+CONTEXT_STORE_BACKEND = os.getenv("CONTEXT_STORE_BACKEND", "sqlite")
+# Ruta de la base de datos de contextos (vacío = <directorio de contextos>/contexts.db)
+CONTEXT_DB_PATH = os.getenv("CONTEXT_DB_PATH", "")
+# Guardados por sesión que se anotan como deltas antes de compactar (0 = instantánea completa siempre)
+CONTEXT_JOURNAL_COMPACT_EVERY = int(os.getenv("CONTEXT_JOURNAL_COMPACT_EVERY", "20"))
+# Índice de texto completo de las conversaciones guardadas (en la base de datos del índice de sesiones)
+CONVERSATION_SEARCH_ENABLED = os.getenv("CONVERSATION_SEARCH_ENABLED", "True").lower() in ("true", "1", "t")
+
+# Mantenimiento del almacén de contextos (compresión, retención y archivo)
+# Códec de las instantáneas comprimidas ('auto' = zstd si está instalado, si no zlib; 'none' = sin comprimir)
+CONTEXT_COMPRESSION_CODEC = os.getenv("CONTEXT_COMPRESSION_CODEC", "auto")
+# Segundos sin guardados tras los que una instantánea se comprime
+CONTEXT_COMPRESS_IDLE_SECONDS = int(os.getenv("CONTEXT_COMPRESS_IDLE_SECONDS", "3600"))
+# Tamaño máximo del diccionario de compresión entrenado
+CONTEXT_DICTIONARY_SIZE = int(os.getenv("CONTEXT_DICTIONARY_SIZE", "32768"))
+# Instantáneas por sesión que se conservan; las anteriores pasan al archivo
+CONTEXT_RETENTION_KEEP = int(os.getenv("CONTEXT_RETENTION_KEEP", "3"))
+# Días sin guardados tras los que una sesión completa pasa al archivo
+CONTEXT_ARCHIVE_AFTER_DAYS = float(os.getenv("CONTEXT_ARCHIVE_AFTER_DAYS", "30"))
+# Segundos entre pasadas del mantenimiento en segundo plano (0 = desactivado)
+CONTEXT_MAINTENANCE_INTERVAL = int(os.getenv("CONTEXT_MAINTENANCE_INTERVAL", "3600"))
+# Bytes por segundo que puede leer y escribir el mantenimiento (0 = sin límite)
+CONTEXT_MAINTENANCE_MAX_BYTES_PER_SEC = int(os.getenv("CONTEXT_MAINTENANCE_MAX_BYTES_PER_SEC", str(4 * 1024 * 1024)))
+
+# Persistencia diferida de contextos y leads (cola en segundo plano)
+PERSISTENCE_WRITE_BEHIND = os.getenv("PERSISTENCE_WRITE_BEHIND", "True").lower() in ("true", "1", "t")
+PERSISTENCE_QUEUE_SIZE = int(os.getenv("PERSISTENCE_QUEUE_SIZE", "1000"))
+# Segundos que espera una petición si la cola está llena antes de escribir por sí misma
+PERSISTENCE_ENQUEUE_TIMEOUT = float(os.getenv("PERSISTENCE_ENQUEUE_TIMEOUT", "0.5"))
+
+# Caché en memoria de contextos de sesiones activas (LRU por número de sesiones y bytes estimados)
+SESSION_CACHE_MAX_ENTRIES = int(os.getenv("SESSION_CACHE_MAX_ENTRIES", "1000"))
+SESSION_CACHE_MAX_BYTES = int(os.getenv("SESSION_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+# Fragmentos de la tabla de bloqueos por sesión
+SESSION_LOCK_SHARDS = int(os.getenv("SESSION_LOCK_SHARDS", "64"))
+
+# Estado de sesión ('cookie' = sesión firmada de Flask en la cookie, sin estado en el servidor;
+# 'memory' = en el servidor, un proceso; 'redis' = en el servidor, compartido entre procesos y nodos)
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "cookie")
+# Claves que conserva el almacén en memoria (se descartan las menos usadas recientemente)
+SESSION_MEMORY_MAX_ENTRIES = int(os.getenv("SESSION_MEMORY_MAX_ENTRIES", "10000"))
+SESSION_REDIS_URL = os.getenv("SESSION_REDIS_URL", "redis://localhost:6379/0")
+SESSION_REDIS_TIMEOUT = float(os.getenv("SESSION_REDIS_TIMEOUT", "2.0"))
+# Segundos de vida de una sesión desde su última escritura
+SESSION_TTL = int(os.getenv("SESSION_TTL", str(24 * 60 * 60)))
+SESSION_KEY_PREFIX = os.getenv("SESSION_KEY_PREFIX", "alisys:")
+# Tamaño a partir del cual se comprimen los valores guardados
+SESSION_COMPRESS_MIN_BYTES = int(os.getenv("SESSION_COMPRESS_MIN_BYTES", "256"))
+
+# Reanudación de streams SSE con Last-Event-ID (bytes por stream, bytes en total y
+# segundos que se conserva un stream terminado)
+STREAM_REPLAY_MAX_BYTES = int(os.getenv("STREAM_REPLAY_MAX_BYTES", str(256 * 1024)))
+STREAM_REPLAY_TOTAL_BYTES = int(os.getenv("STREAM_REPLAY_TOTAL_BYTES", str(64 * 1024 * 1024)))
+STREAM_REPLAY_TTL = float(os.getenv("STREAM_REPLAY_TTL", "60"))
+# Milisegundos que espera el navegador antes de reconectar un stream cortado
+STREAM_RETRY_MS = int(os.getenv("STREAM_RETRY_MS", "1000"))
+
 # Casos de éxito detallados
 SUCCESS_CASES = {
     "vodafone": {
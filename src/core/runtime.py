@@ -0,0 +1,219 @@
+"""
+Contenedor de los recursos compartidos de un proceso (worker).
+
+Antes cada familia de rutas y cada agente creaba los suyos: gestores de
+agentes y de datos, analizadores de sentimiento con sus índices de léxico y
+clientes de LM Studio que abrían una conexión TCP nueva en cada petición. El
+Runtime los crea una sola vez por proceso y los comparte:
+
+- una sesión HTTP con pool de conexiones hacia LM Studio (y, si httpx está
+  instalado, un cliente asíncrono para las respuestas en streaming del modo ASGI);
+- un cliente de LM Studio (su configuración no cambia entre peticiones);
+- un SentimentAnalyzer con los índices de léxico ya construidos;
+- un DataManager y un AgentManager con todos los agentes registrados;
+- los búferes de reanudación de los streams SSE (Last-Event-ID);
+- el almacén de documentos subidos (texto y análisis por SHA-256);
+- el motor de la base de datos de leads (creado en el primer uso).
+
+Las peticiones no copian nada: obtienen un ConversationHandle, que solo guarda
+la clave de la sesión y una referencia al Runtime.
+
+Si el proceso se bifurca (p. ej. gunicorn con --preload), get_runtime crea un
+Runtime nuevo en el hijo en lugar de compartir sockets y hilos con el padre.
+"""
+import os
+import threading
+from typing import Dict, Any, Optional, Generator, AsyncGenerator
+import logging
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from core.config import LM_STUDIO_POOL_SIZE
+from services.lm_studio import LMStudioClient, HTTPX_SUPPORT
+from utils.sentiment_analyzer import SentimentAnalyzer
+from utils.stream_replay import StreamReplayRegistry
+from data.data_manager import DataManager
+from data.document_store import DocumentStore, get_document_store
+from agents.agent_manager import AgentManager
+from agents.general_agent import GeneralAgent
+from agents.sales_agent import SalesAgent
+from agents.engineer_agent import EngineerAgent
+from agents.data_collection_agent import DataCollectionAgent
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+def create_http_session(pool_size: int = LM_STUDIO_POOL_SIZE) -> requests.Session:
+    """
+    Crea una sesión HTTP que reutiliza las conexiones (keep-alive).
+    
+    Args:
+        pool_size: Conexiones abiertas por servidor que se conservan
+        
+    Returns:
+        Sesión de requests
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(1, pool_size))
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+def create_async_http_client(pool_size: int = LM_STUDIO_POOL_SIZE):
+    """
+    Crea el cliente httpx de las peticiones asíncronas a LM Studio.
+    Cada respuesta en streaming ocupa una conexión mientras dura, así que el
+    número de conexiones no se limita; pool_size solo acota las que se
+    conservan abiertas al terminar.
+    
+    Args:
+        pool_size: Conexiones keep-alive que se conservan
+        
+    Returns:
+        httpx.AsyncClient
+    """
+    import httpx
+    return httpx.AsyncClient(limits=httpx.Limits(max_connections=None,
+                                                 max_keepalive_connections=max(1, pool_size)))
+
+class ConversationHandle:
+    """
+    Acceso de una petición a una conversación. Es ligero: solo guarda la
+    clave de la sesión y el Runtime, y carga el contexto al pedirlo.
+    """
+    __slots__ = ('runtime', 'session_key', '_context')
+    
+    def __init__(self, runtime: 'Runtime', session_key: str):
+        """
+        Inicializa el acceso a la conversación.
+        
+        Args:
+            runtime: Runtime del proceso
+            session_key: Identificador de la sesión del navegador
+        """
+        self.runtime = runtime
+        self.session_key = session_key
+        self._context = None
+    
+    @property
+    def context(self) -> Dict[str, Any]:
+        """Contexto vivo de la conversación (ver AgentManager.get_session_context)"""
+        if self._context is None:
+            self._context = self.runtime.agent_manager.get_session_context(self.session_key)
+        return self._context
+    
+    def process_message(self, message: str) -> Generator[str, None, None]:
+        """
+        Procesa un mensaje en esta conversación.
+        
+        Args:
+            message: Mensaje del usuario
+            
+        Returns:
+            Generador que produce la respuesta del agente
+        """
+        return self.runtime.agent_manager.process_message(message, self.context)
+    
+    def process_message_async(self, message: str) -> AsyncGenerator[str, None]:
+        """
+        Versión asíncrona de process_message.
+        
+        Args:
+            message: Mensaje del usuario
+            
+        Returns:
+            Generador asíncrono que produce la respuesta del agente
+        """
+        return self.runtime.agent_manager.process_message_async(message, self.context)
+    
+    def discard(self) -> None:
+        """
+        Descarta el contexto en memoria de la conversación.
+        """
+        self.runtime.agent_manager.session_cache.invalidate(self.session_key)
+        self._context = None
+
+class Runtime:
+    """
+    Recursos compartidos por todas las peticiones de un proceso.
+    """
+    
+    def __init__(self, http: Optional[requests.Session] = None, data_manager: Optional[DataManager] = None,
+                 document_store: Optional[DocumentStore] = None):
+        """
+        Crea los recursos compartidos y registra los agentes.
+        
+        Args:
+            http: Sesión HTTP hacia LM Studio (por defecto, una con pool de LM_STUDIO_POOL_SIZE)
+            data_manager: Gestor de datos (por defecto, uno nuevo)
+            document_store: Almacén de documentos (por defecto, el de DOCUMENT_STORE_DIR)
+        """
+        self.pid = os.getpid()
+        self.http = http or create_http_session()
+        self.async_http = create_async_http_client() if HTTPX_SUPPORT else None
+        self.lm_client = LMStudioClient(http=self.http, async_http=self.async_http)
+        self.sentiment_analyzer = SentimentAnalyzer()
+        self.data_manager = data_manager or DataManager()
+        self.document_store = document_store or get_document_store()
+        self.agent_manager = AgentManager(sentiment_analyzer=self.sentiment_analyzer)
+        # Registrar los agentes disponibles - El orden determina la prioridad
+        self.agent_manager.register_agent(GeneralAgent(self.lm_client))     # Bienvenida e información general
+        self.agent_manager.register_agent(SalesAgent(self.lm_client))       # Alta prioridad para ventas
+        self.agent_manager.register_agent(EngineerAgent(self.lm_client, self.document_store))  # Alta prioridad para consultas técnicas
+        self.agent_manager.register_agent(DataCollectionAgent(self.data_manager, self.lm_client))  # Recopilar datos
+        self.stream_replay = StreamReplayRegistry()
+        logger.info(f"Runtime inicializado en el proceso {self.pid}")
+    
+    @property
+    def db_engine(self):
+        """Motor de la base de datos de leads (se crea en el primer uso)"""
+        # Importación local: el módulo de base de datos carga SQLAlchemy
+        from data import database
+        return database.get_engine()
+    
+    def handle(self, session_key: str) -> ConversationHandle:
+        """
+        Devuelve el acceso de una petición a su conversación.
+        
+        Args:
+            session_key: Identificador de la sesión del navegador
+            
+        Returns:
+            ConversationHandle de la sesión
+        """
+        return ConversationHandle(self, session_key)
+    
+    def close(self) -> None:
+        """
+        Cierra las conexiones HTTP del pool.
+        """
+        self.http.close()
+    
+    async def aclose(self) -> None:
+        """
+        Cierra también las conexiones del cliente asíncrono (al parar el servidor ASGI).
+        """
+        self.close()
+        if self.async_http is not None:
+            await self.async_http.aclose()
+
+# Runtime del proceso actual
+_runtime: Optional[Runtime] = None
+_runtime_lock = threading.Lock()
+
+def get_runtime() -> Runtime:
+    """
+    Obtiene el Runtime del proceso, creándolo la primera vez (o tras un fork).
+    
+    Returns:
+        Runtime compartido del proceso
+    """
+    global _runtime
+    runtime = _runtime
+    if runtime is not None and runtime.pid == os.getpid():
+        return runtime
+    with _runtime_lock:
+        if _runtime is None or _runtime.pid != os.getpid():
+            _runtime = Runtime()
+        return _runtime
@@ -8,26 +8,53 @@ from datetime import datetime
 from typing import Dict, List, Optional, Any
 from abc import ABC, abstractmethod
 
-# Importar el módulo de base de datos
-# Corregir la importación para que funcione tanto en desarrollo como en producción
-try:
-    # Intentar importación relativa (para desarrollo)
-    from data.database import save_lead as db_save_lead, get_leads as db_get_leads
-except ImportError:
+# Importar el módulo de base de datos en el primer uso: carga SQLAlchemy, que
+# es la mayor parte del tiempo de importación de la aplicación
+def _load_database():
+    """Importa el módulo de base de datos (desarrollo o producción en Docker); None si no está disponible"""
     try:
-        # Intentar importación absoluta (para producción en Docker)
-        from src.data.database import save_lead as db_save_lead, get_leads as db_get_leads
+        # Intentar importación relativa (para desarrollo)
+        from data import database
     except ImportError:
-        # Si ambas fallan, imprimir error detallado
-        print("ERROR DE IMPORTACIÓN: No se pudo importar el módulo de base de datos")
-        traceback.print_exc()
-        # Definir funciones dummy para evitar errores
-        def db_save_lead(data): 
-            print(f"ADVERTENCIA: Usando función dummy para db_save_lead. Datos: {data}")
+        try:
+            # Intentar importación absoluta (para producción en Docker)
+            from src.data import database
+        except ImportError:
+            # Si ambas fallan, imprimir error detallado
+            print("ERROR DE IMPORTACIÓN: No se pudo importar el módulo de base de datos")
+            traceback.print_exc()
             return None
-        def db_get_leads(): 
-            print("ADVERTENCIA: Usando función dummy para db_get_leads")
-            return []
+    return database
+
+def db_save_lead(data):
+    """Guarda un lead con data.database.save_lead"""
+    database = _load_database()
+    if database is None:
+        print(f"ADVERTENCIA: Usando función dummy para db_save_lead. Datos: {data}")
+        return None
+    return database.save_lead(data)
+
+def db_get_leads():
+    """Obtiene los leads con data.database.get_leads"""
+    database = _load_database()
+    if database is None:
+        print("ADVERTENCIA: Usando función dummy para db_get_leads")
+        return []
+    return database.get_leads()
+
+# Importar la configuración y el registro JSONL de leads (desarrollo o producción en Docker)
+try:
+    from core.config import (LEADS_FILE_FORMAT, LEADS_JSONL_FSYNC, LEADS_JSONL_FSYNC_INTERVAL,
+                             LEADS_JSONL_ROTATE_BYTES, LEADS_OUTBOX_ENABLED, PROJECT_SUMMARY_DB_PATH,
+                             PROJECT_SUMMARY_FILES)
+    from data.lead_log import LeadLog
+    from data.summary_store import get_summary_store, DEFAULT_SUMMARY_DB_FILENAME
+except ImportError:
+    from src.core.config import (LEADS_FILE_FORMAT, LEADS_JSONL_FSYNC, LEADS_JSONL_FSYNC_INTERVAL,
+                                 LEADS_JSONL_ROTATE_BYTES, LEADS_OUTBOX_ENABLED, PROJECT_SUMMARY_DB_PATH,
+                                 PROJECT_SUMMARY_FILES)
+    from src.data.lead_log import LeadLog
+    from src.data.summary_store import get_summary_store, DEFAULT_SUMMARY_DB_FILENAME
 
 # Interfaz para el repositorio de datos
 class DataRepository(ABC):
@@ -99,6 +126,10 @@ class JsonFileRepository(DataRepository):
         """Retorna todos los leads guardados en JSON."""
         return self.leads
     
+    def get_latest_lead(self) -> Optional[Dict[str, Any]]:
+        """Retorna el último lead guardado en JSON."""
+        return self.leads[-1] if self.leads else None
+    
     def save_conversation(self, user_id: str, messages: List[Dict[str, Any]]) -> str:
         """Guarda una conversación en un archivo JSON"""
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -131,6 +162,53 @@ class JsonFileRepository(DataRepository):
             print(f"Error al decodificar conversación: {filename}")
             return None
 
+# Implementación de repositorio con registro JSONL de solo escritura al final
+class JsonlFileRepository(JsonFileRepository):
+    """
+    Repositorio que añade cada lead como una línea de leads.jsonl (ver data.lead_log).
+    Guardar un lead no depende del número de leads existentes y las conversaciones
+    se siguen guardando como en JsonFileRepository.
+    """
+    
+    def __init__(self, data_dir: str = "data", leads_filename: str = "leads.jsonl"):
+        """
+        Inicializa el repositorio. Un leads.json existente no se convierte aquí:
+        se convierte una sola vez con python -m data.lead_log convert.
+        """
+        self.data_dir = data_dir
+        os.makedirs(data_dir, exist_ok=True)
+        self.leads_filepath = os.path.join(data_dir, leads_filename)
+        self.log = LeadLog(self.leads_filepath, LEADS_JSONL_FSYNC, LEADS_JSONL_FSYNC_INTERVAL,
+                           LEADS_JSONL_ROTATE_BYTES)
+        print(f"JsonlFileRepository inicializado. Ruta de archivo: {self.leads_filepath}")
+        print(f"Leads cargados: {self.log.count()}")
+    
+    def save_lead(self, lead_data: Dict[str, Any]) -> bool:
+        """Añade un lead al registro JSONL"""
+        try:
+            # Añadir timestamp
+            lead_data['timestamp'] = datetime.now().isoformat()
+            
+            record = self.log.append(lead_data)
+            print(f"Lead guardado en JSONL con id {record['id']}")
+            return True
+        except Exception as e:
+            print(f"Error al guardar el lead en JSONL: {str(e)}")
+            traceback.print_exc()
+            return False
+    
+    def get_leads(self) -> List[Dict[str, Any]]:
+        """Retorna todos los leads del registro JSONL, del más antiguo al más reciente."""
+        return list(self.log.iter_leads())
+    
+    def get_latest_lead(self) -> Optional[Dict[str, Any]]:
+        """Retorna el último lead sin recorrer el registro."""
+        return self.log.latest()
+    
+    def find_leads_by_email(self, email: str) -> List[Dict[str, Any]]:
+        """Retorna los leads de un email usando el índice en memoria."""
+        return self.log.find_by_email(email)
+
 # Implementación de repositorio con almacenamiento en base de datos SQLite
 class SqliteRepository(DataRepository):
     """Repositorio que almacena datos en base de datos SQLite"""
@@ -201,10 +279,43 @@ class DataManager:
     def __init__(self, data_dir: str = "data", filename: str = "leads.json"):
         """Inicializa el gestor de datos con repositorios configurados"""
         # Inicializar repositorios
-        self.json_repository = JsonFileRepository(data_dir, filename)
+        self.json_repository = self._create_file_repository(data_dir, filename)
         self.db_repository = SqliteRepository()
+        # Resúmenes de proyecto (la primera vez se importan los archivos client_summary_* existentes)
+        self.summary_store = get_summary_store(
+            PROJECT_SUMMARY_DB_PATH or os.path.join(data_dir, DEFAULT_SUMMARY_DB_FILENAME), data_dir
+        )
+        self.outbox = None
+        if LEADS_OUTBOX_ENABLED and isinstance(self.json_repository, JsonlFileRepository):
+            try:
+                try:
+                    from services.lead_outbox import get_lead_outbox, DEFAULT_OUTBOX_FILENAME
+                except ImportError:
+                    from src.services.lead_outbox import get_lead_outbox, DEFAULT_OUTBOX_FILENAME
+                self.outbox = get_lead_outbox(os.path.join(data_dir, DEFAULT_OUTBOX_FILENAME),
+                                              self.json_repository.log)
+            except Exception as e:
+                print(f"Error al iniciar la cola de salida de leads, se usará la doble escritura directa: {str(e)}")
+                traceback.print_exc()
         print("DataManager inicializado con múltiples repositorios")
     
+    @staticmethod
+    def _create_file_repository(data_dir: str, filename: str) -> JsonFileRepository:
+        """
+        Crea el repositorio de archivo de LEADS_FILE_FORMAT. Con 'jsonl', si
+        existe un leads.json sin convertir se sigue usando leads.json (y se
+        avisa) para no dividir los leads entre los dos archivos.
+        """
+        if LEADS_FILE_FORMAT != 'jsonl':
+            return JsonFileRepository(data_dir, filename)
+        jsonl_filepath = os.path.join(data_dir, f"{os.path.splitext(filename)[0]}.jsonl")
+        legacy_filepath = os.path.join(data_dir, filename)
+        if os.path.exists(legacy_filepath) and not os.path.exists(jsonl_filepath):
+            print(f"{legacy_filepath} no se ha convertido a JSONL; se sigue usando. Para convertirlo (con src "
+                  f"en PYTHONPATH): python -m data.lead_log convert --source {legacy_filepath} --target {jsonl_filepath}")
+            return JsonFileRepository(data_dir, filename)
+        return JsonlFileRepository(data_dir, os.path.basename(jsonl_filepath))
+    
     def save_lead(self, lead_data: Dict[str, Any]) -> bool:
         """
         Guarda un lead en todos los repositorios disponibles.
@@ -217,6 +328,17 @@ class DataManager:
         """
         print(f"Intentando guardar lead: {lead_data}")
         
+        # Con la cola de salida el lead se confirma una vez y se copia a los dos repositorios en segundo plano
+        if self.outbox is not None:
+            try:
+                lead_data['timestamp'] = datetime.now().isoformat()
+                lead_key, is_new = self.outbox.enqueue(lead_data)
+                print(f"Lead encolado con clave {lead_key[:12]}{'' if is_new else ' (ya estaba en la cola)'}")
+                return True
+            except Exception as e:
+                print(f"Error al encolar el lead, se guarda directamente: {str(e)}")
+                traceback.print_exc()
+        
         # Guardar en JSON
         json_success = self.json_repository.save_lead(lead_data)
         
@@ -240,7 +362,6 @@ class DataManager:
         """
         try:
             # Extraer información relevante del contexto
-            project_file_content = context.get('project_file_content')
             project_file_name = context.get('project_file_name')
             project_estimate = context.get('project_estimate')
             
@@ -304,11 +425,13 @@ ANÁLISIS TÉCNICO:
             else:
                 summary += "- No hay mensajes disponibles para resumir.\n"
             
-            # Guardar el resumen en un archivo JSON por cliente
-            summary_filename = f"client_summary_{lead_data.get('email', '').replace('@', '_at_')}.json"
-            summary_path = os.path.join(self.json_repository.data_dir, summary_filename)
-            with open(summary_path, 'w', encoding='utf-8') as f:
-                json.dump(summary_data, f, ensure_ascii=False, indent=2)
+            # Guardar el resumen en el almacén indexado (y en un archivo JSON por cliente si se configura)
+            self.summary_store.save(lead_data.get('email', ''), summary, summary_data)
+            if PROJECT_SUMMARY_FILES:
+                summary_filename = f"client_summary_{lead_data.get('email', '').replace('@', '_at_')}.json"
+                summary_path = os.path.join(self.json_repository.data_dir, summary_filename)
+                with open(summary_path, 'w', encoding='utf-8') as f:
+                    json.dump(summary_data, f, ensure_ascii=False, indent=2)
             
             return summary
             
@@ -5,16 +5,31 @@ import os
 import sys
 import traceback
 import datetime
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Text
+import logging
+import threading
+from sqlalchemy import create_engine, event, select, and_, or_, inspect, text, Column, Index, Integer, String, DateTime, Text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
-# Imprimir información de depuración
-print("Inicializando módulo de base de datos...")
-print(f"Directorio actual: {os.getcwd()}")
+# Importar la configuración (desarrollo o producción en Docker)
+try:
+    from core.config import (LEADS_DB_PATH, LEADS_DB_ECHO, LEADS_DB_BUSY_TIMEOUT_MS, LEADS_DB_MMAP_SIZE,
+                             LEADS_DB_POOL_SIZE, LEADS_DB_MAX_OVERFLOW)
+except ImportError:
+    from src.core.config import (LEADS_DB_PATH, LEADS_DB_ECHO, LEADS_DB_BUSY_TIMEOUT_MS, LEADS_DB_MMAP_SIZE,
+                                 LEADS_DB_POOL_SIZE, LEADS_DB_MAX_OVERFLOW)
+
+# Agregados de leads para las estadísticas del panel de administración
+try:
+    from data import lead_analytics
+except ImportError:
+    from src.data import lead_analytics
+
+# Configurar logging
+logger = logging.getLogger(__name__)
 
-# Crear la ruta para la base de datos
-# Intentar diferentes rutas para manejar tanto desarrollo como producción
+# Rutas candidatas para la base de datos (desarrollo y producción en Docker)
 possible_paths = [
     # Ruta relativa desde el directorio actual
     os.path.join('data', 'leads_alisys_bot.db'),
@@ -24,43 +39,73 @@ possible_paths = [
     '/app/data/leads_alisys_bot.db'
 ]
 
-# Probar cada ruta y usar la primera que funcione
+# El motor y las tablas se crean en init_db (explícitamente desde init_app o en el
+# primer uso): importar el módulo no toca el sistema de archivos
 DB_PATH = None
-for path in possible_paths:
-    dir_path = os.path.dirname(path)
-    if os.path.exists(dir_path) and os.access(dir_path, os.W_OK):
-        DB_PATH = path
-        print(f"Usando ruta de base de datos: {DB_PATH}")
-        break
-
-if DB_PATH is None:
+DB_DIR = None
+engine = None
+_init_lock = threading.Lock()
+
+def resolve_db_path():
+    """Elige la ruta de la base de datos: LEADS_DB_PATH o la primera ruta candidata escribible.
+    
+    Returns:
+        str: Ruta del archivo de base de datos.
+    """
+    if LEADS_DB_PATH:
+        return LEADS_DB_PATH
+    for path in possible_paths:
+        dir_path = os.path.dirname(path)
+        if os.path.exists(dir_path) and os.access(dir_path, os.W_OK):
+            return path
     # Si ninguna ruta funciona, usar una ruta por defecto
-    DB_PATH = os.path.join('data', 'leads_alisys_bot.db')
-    print(f"ADVERTENCIA: No se encontró una ruta válida. Usando ruta por defecto: {DB_PATH}")
+    logger.warning("No se encontró una ruta válida para la base de datos; se usa data/leads_alisys_bot.db")
+    return os.path.join('data', 'leads_alisys_bot.db')
 
-DB_DIR = os.path.dirname(DB_PATH)
+def create_database_engine(db_path, echo=LEADS_DB_ECHO, busy_timeout_ms=LEADS_DB_BUSY_TIMEOUT_MS,
+                           mmap_size=LEADS_DB_MMAP_SIZE, pool_size=LEADS_DB_POOL_SIZE,
+                           max_overflow=LEADS_DB_MAX_OVERFLOW):
+    """Crea un motor SQLite preparado para varios hilos escribiendo a la vez.
+    
+    Cada conexión nueva del pool se configura con:
+    - journal_mode=WAL: las lecturas no bloquean la escritura ni al revés;
+    - synchronous=NORMAL: en WAL no hay fsync por commit, solo en los checkpoints
+      (un corte de luz puede perder las últimas transacciones, nunca corromper);
+    - busy_timeout: los escritores esperan el bloqueo en lugar de fallar con
+      "database is locked";
+    - mmap_size: las lecturas se sirven desde memoria mapeada.
+    
+    Args:
+        db_path (str): Ruta del archivo de base de datos.
+        echo (bool): Registrar las sentencias SQL.
+        busy_timeout_ms (int): Espera máxima por el bloqueo de escritura.
+        mmap_size (int): Bytes de E/S mapeada en memoria (0 = desactivado).
+        pool_size (int): Conexiones que se mantienen abiertas.
+        max_overflow (int): Conexiones adicionales permitidas en picos.
+        
+    Returns:
+        Engine: El motor de SQLAlchemy.
+    """
+    new_engine = create_engine(
+        f'sqlite:///{db_path}',
+        echo=echo,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        connect_args={'timeout': busy_timeout_ms / 1000, 'check_same_thread': False}
+    )
+    
+    @event.listens_for(new_engine, 'connect')
+    def configure_connection(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={int(busy_timeout_ms)}")
+        cursor.execute(f"PRAGMA mmap_size={int(mmap_size)}")
+        cursor.close()
+    
+    return new_engine
 
-# Asegurarse de que el directorio data existe
-try:
-    if not os.path.exists(DB_DIR):
-        os.makedirs(DB_DIR)
-        print(f"Directorio creado: {DB_DIR}")
-except Exception as e:
-    print(f"Error al crear directorio {DB_DIR}: {str(e)}")
-    traceback.print_exc()
-
-# Crear el motor de la base de datos
-try:
-    print(f"Creando motor de base de datos para: sqlite:///{DB_PATH}")
-    engine = create_engine(f'sqlite:///{DB_PATH}', echo=True)
-    Base = declarative_base()
-except Exception as e:
-    print(f"Error al crear motor de base de datos: {str(e)}")
-    traceback.print_exc()
-    # Crear un motor en memoria como fallback
-    print("Usando base de datos en memoria como fallback")
-    engine = create_engine('sqlite:///:memory:', echo=True)
-    Base = declarative_base()
+Base = declarative_base()
 
 # Definir el modelo de datos para los leads
 class Lead(Base):
@@ -75,21 +120,116 @@ class Lead(Base):
     interest = Column(String(100))
     message = Column(Text)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    # Clave de idempotencia asignada por la cola de salida de leads (None en leads antiguos)
+    lead_key = Column(String(64))
+    
+    # Paginación por clave (más recientes primero) y filtros del panel de administración
+    __table_args__ = (
+        Index('ix_leads_created_at_id', 'created_at', 'id'),
+        Index('ix_leads_email', 'email'),
+        Index('ix_leads_company', 'company'),
+        Index('ix_leads_interest_created_at', 'interest', 'created_at'),
+        Index('ux_leads_lead_key', 'lead_key', unique=True),
+    )
     
     def __repr__(self):
         return f"<Lead(name='{self.name}', email='{self.email}')>"
 
-# Crear las tablas en la base de datos
-try:
-    print("Creando tablas en la base de datos...")
-    Base.metadata.create_all(engine)
-    print("Tablas creadas correctamente")
-except Exception as e:
-    print(f"Error al crear tablas: {str(e)}")
-    traceback.print_exc()
+def _create_schema(new_engine):
+    """Crea las tablas, columnas e índices que falten.
+    
+    Args:
+        new_engine: Motor de la base de datos.
+        
+    Returns:
+        bool: True si los agregados de leads no existían (hay que calcularlos).
+    """
+    Base.metadata.create_all(new_engine)
+    # create_all no añade columnas ni índices nuevos a tablas que ya existían
+    if 'lead_key' not in {column['name'] for column in inspect(new_engine).get_columns('leads')}:
+        with new_engine.begin() as connection:
+            connection.execute(text("ALTER TABLE leads ADD COLUMN lead_key VARCHAR(64)"))
+    for index in Lead.__table__.indexes:
+        index.create(new_engine, checkfirst=True)
+    return lead_analytics.create_rollup_tables(new_engine)
+
+# Sesiones para interactuar con la base de datos (se enlazan al motor en init_db).
+# Las sesiones son baratas (una por llamada); las conexiones salen del pool del
+# motor. Sin expire_on_commit los objetos devueltos no vuelven a consultarse tras el commit.
+Session = sessionmaker(expire_on_commit=False)
+
+def init_db(db_path=None):
+    """Crea el motor y el esquema de la base de datos de leads (solo la primera vez).
+    
+    Args:
+        db_path (str): Ruta de la base de datos (por defecto, resolve_db_path()).
+        
+    Returns:
+        Engine: El motor de SQLAlchemy.
+    """
+    global engine, DB_PATH, DB_DIR
+    if engine is not None:
+        return engine
+    with _init_lock:
+        if engine is not None:
+            return engine
+        path = db_path or resolve_db_path()
+        directory = os.path.dirname(path)
+        try:
+            if directory and not os.path.exists(directory):
+                os.makedirs(directory, exist_ok=True)
+            logger.info(f"Creando motor de base de datos para: sqlite:///{path}")
+            new_engine = create_database_engine(path)
+            rollups_created = _create_schema(new_engine)
+        except Exception as e:
+            logger.error(f"Error al inicializar la base de datos {path}, se usa una en memoria: {str(e)}")
+            traceback.print_exc()
+            new_engine = create_engine('sqlite:///:memory:', echo=LEADS_DB_ECHO)
+            rollups_created = _create_schema(new_engine)
+        Session.configure(bind=new_engine)
+        DB_PATH, DB_DIR = path, directory
+        engine = new_engine
+    # Las bases de datos anteriores a los agregados los calculan una vez
+    if rollups_created:
+        try:
+            logger.info(f"Agregados de leads calculados con {rebuild_lead_rollups()} leads")
+        except Exception as e:
+            logger.error(f"Error al calcular los agregados de leads: {str(e)}")
+            traceback.print_exc()
+    return engine
 
-# Crear una sesión para interactuar con la base de datos
-Session = sessionmaker(bind=engine)
+def get_engine():
+    """Devuelve el motor de la base de datos, inicializándola si hace falta.
+    
+    Returns:
+        Engine: El motor de SQLAlchemy.
+    """
+    return engine if engine is not None else init_db()
+
+def _dispose_engine_after_fork():
+    """Descarta en el proceso hijo las conexiones del pool heredadas del padre.
+    
+    Las sesiones abren conexiones nuevas; las del padre no se cierran (siguen siendo suyas).
+    """
+    if engine is not None:
+        engine.dispose(close=False)
+
+# Tras un fork (p. ej. gunicorn con --preload) el hijo no reutiliza las conexiones del padre
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_dispose_engine_after_fork)
+
+def init_app(app):
+    """Inicializa la base de datos de leads al crear la aplicación Flask.
+    
+    La ruta se toma de app.config['LEADS_DB_PATH'] si está definida.
+    
+    Args:
+        app: Aplicación Flask.
+    """
+    app.extensions['leads_db'] = init_db(app.config.get('LEADS_DB_PATH'))
+
+# SQLite admite un único escritor a la vez
+_write_lock = threading.Lock()
 
 def save_lead(data):
     """Guarda un lead en la base de datos.
@@ -101,6 +241,7 @@ def save_lead(data):
         Lead: El objeto Lead creado.
     """
     print(f"Función save_lead llamada con datos: {data}")
+    get_engine()
     session = Session()
     try:
         # Validar datos mínimos
@@ -113,11 +254,23 @@ def save_lead(data):
             phone=data.get('phone', ''),
             company=data.get('company', ''),
             interest=data.get('interest', ''),
-            message=data.get('message', '')
+            message=data.get('message', ''),
+            created_at=datetime.datetime.utcnow()
         )
         print(f"Objeto Lead creado: {lead}")
         session.add(lead)
-        session.commit()
+        # Un solo escritor por proceso: los hilos esperan en el cerrojo en vez de
+        # reintentar con las esperas crecientes del busy_timeout de SQLite
+        with _write_lock:
+            # Los agregados se actualizan en la misma transacción que el lead
+            lead_analytics.apply_leads(session.connection(), [{
+                'created_at': lead.created_at,
+                'interest': lead.interest,
+                'company': lead.company,
+                'phone': lead.phone,
+                'message': lead.message
+            }])
+            session.commit()
         print(f"Lead guardado con ID: {lead.id}")
         return lead
     except Exception as e:
@@ -135,6 +288,7 @@ def get_leads():
         list: Lista de objetos Lead.
     """
     print("Función get_leads llamada")
+    get_engine()
     session = Session()
     try:
         leads = session.query(Lead).all()
@@ -157,6 +311,7 @@ def get_lead_by_id(lead_id):
         Lead: El objeto Lead encontrado o None.
     """
     print(f"Función get_lead_by_id llamada con ID: {lead_id}")
+    get_engine()
     session = Session()
     try:
         lead = session.query(Lead).filter(Lead.id == lead_id).first()
@@ -167,4 +322,266 @@ def get_lead_by_id(lead_id):
         traceback.print_exc()
         return None
     finally:
-        session.close() 
\ No newline at end of file
+        session.close()
+
+# Columnas que devuelven las consultas paginadas (sin construir objetos ORM)
+LEAD_COLUMNS = (Lead.id, Lead.name, Lead.email, Lead.phone, Lead.company, Lead.interest, Lead.message,
+                Lead.created_at)
+
+# Leads por página como máximo
+MAX_LEADS_PAGE_SIZE = 1000
+
+def lead_to_dict(lead):
+    """Convierte un objeto Lead en diccionario.
+    
+    Args:
+        lead (Lead): Lead de la base de datos.
+        
+    Returns:
+        dict: Datos del lead con created_at en formato ISO.
+    """
+    return {
+        'id': lead.id,
+        'name': lead.name,
+        'email': lead.email,
+        'phone': lead.phone,
+        'company': lead.company,
+        'interest': lead.interest,
+        'message': lead.message,
+        'created_at': lead.created_at.isoformat() if lead.created_at else None,
+        'project_estimate': getattr(lead, 'project_estimate', None),
+        'project_file_name': getattr(lead, 'project_file_name', None)
+    }
+
+def _row_to_dict(row):
+    """Convierte una fila de LEAD_COLUMNS en diccionario (como lead_to_dict, sin getattr).
+    
+    Args:
+        row: Fila con las columnas de LEAD_COLUMNS.
+        
+    Returns:
+        dict: Datos del lead con created_at en formato ISO.
+    """
+    lead_id, name, email, phone, company, interest, message, created_at = row
+    return {
+        'id': lead_id,
+        'name': name,
+        'email': email,
+        'phone': phone,
+        'company': company,
+        'interest': interest,
+        'message': message,
+        'created_at': created_at.isoformat() if created_at else None,
+        'project_estimate': None,
+        'project_file_name': None
+    }
+
+def encode_lead_cursor(lead):
+    """Genera el cursor que apunta a continuación de un lead.
+    
+    Args:
+        lead (dict): Último lead de la página (con 'created_at' e 'id').
+        
+    Returns:
+        str: Cursor opaco para la página siguiente.
+    """
+    return f"{lead['created_at']}~{lead['id']}"
+
+def _decode_lead_cursor(cursor):
+    """Interpreta un cursor de encode_lead_cursor.
+    
+    Args:
+        cursor (str): Cursor recibido.
+        
+    Returns:
+        tuple: (created_at, id) del último lead ya entregado.
+    """
+    try:
+        created_at, lead_id = cursor.rsplit('~', 1)
+        return datetime.datetime.fromisoformat(created_at), int(lead_id)
+    except ValueError:
+        raise ValueError(f"Cursor de paginación no válido: {cursor}")
+
+def _leads_query(cursor=None, since=None, until=None, interest=None, company=None):
+    """Construye la consulta de leads, del más reciente al más antiguo.
+    
+    La posición se indica con un cursor (created_at, id) en lugar de OFFSET,
+    así que cada página es un recorrido corto del índice ix_leads_created_at_id
+    sea cual sea su profundidad.
+    
+    Args:
+        cursor (str): Cursor de la página anterior (None = primera página).
+        since (datetime): Solo leads creados desde este momento.
+        until (datetime): Solo leads creados antes de este momento.
+        interest (str): Solo leads con este interés.
+        company (str): Solo leads de esta empresa.
+        
+    Returns:
+        Select: Consulta ordenada de SQLAlchemy.
+    """
+    query = select(*LEAD_COLUMNS)
+    if cursor:
+        created_at, lead_id = _decode_lead_cursor(cursor)
+        query = query.where(and_(Lead.created_at <= created_at,
+                                 or_(Lead.created_at < created_at, Lead.id < lead_id)))
+    if since is not None:
+        query = query.where(Lead.created_at >= since)
+    if until is not None:
+        query = query.where(Lead.created_at < until)
+    if interest:
+        query = query.where(Lead.interest == interest)
+    if company:
+        query = query.where(Lead.company == company)
+    return query.order_by(Lead.created_at.desc(), Lead.id.desc())
+
+def get_leads_page(limit=50, cursor=None, since=None, until=None, interest=None, company=None):
+    """Obtiene una página de leads, del más reciente al más antiguo.
+    
+    Args:
+        limit (int): Leads por página (máximo MAX_LEADS_PAGE_SIZE).
+        cursor (str): Cursor devuelto por la página anterior.
+        since (datetime): Solo leads creados desde este momento.
+        until (datetime): Solo leads creados antes de este momento.
+        interest (str): Solo leads con este interés.
+        company (str): Solo leads de esta empresa.
+        
+    Returns:
+        tuple: (lista de diccionarios de leads, cursor de la página siguiente o None).
+    """
+    limit = max(1, min(int(limit), MAX_LEADS_PAGE_SIZE))
+    query = _leads_query(cursor, since, until, interest, company).limit(limit + 1)
+    with get_engine().connect() as connection:
+        rows = connection.execute(query).all()
+    leads = [_row_to_dict(row) for row in rows[:limit]]
+    next_cursor = encode_lead_cursor(leads[-1]) if len(rows) > limit else None
+    return leads, next_cursor
+
+def iter_leads(batch_size=MAX_LEADS_PAGE_SIZE, since=None, until=None, interest=None, company=None):
+    """Recorre todos los leads que cumplen los filtros por lotes.
+    
+    Cada lote es una consulta paginada independiente, así que la memoria
+    no crece con el número de leads y no se mantiene abierta una lectura
+    larga mientras se envía la respuesta.
+    
+    Args:
+        batch_size (int): Leads por consulta.
+        since (datetime): Solo leads creados desde este momento.
+        until (datetime): Solo leads creados antes de este momento.
+        interest (str): Solo leads con este interés.
+        company (str): Solo leads de esta empresa.
+        
+    Yields:
+        dict: Datos de cada lead, del más reciente al más antiguo.
+    """
+    cursor = None
+    while True:
+        leads, cursor = get_leads_page(batch_size, cursor, since, until, interest, company)
+        yield from leads
+        if cursor is None:
+            return
+
+def get_latest_lead():
+    """Obtiene el lead más reciente con una sola lectura del índice.
+    
+    Returns:
+        dict: Datos del último lead o None si no hay ninguno.
+    """
+    try:
+        with get_engine().connect() as connection:
+            row = connection.execute(_leads_query().limit(1)).first()
+        return _row_to_dict(row) if row else None
+    except Exception as e:
+        print(f"Error al obtener el último lead: {str(e)}")
+        traceback.print_exc()
+        return None
+
+def save_leads_batch(leads):
+    """Guarda varios leads en una sola transacción de forma idempotente.
+    
+    Los leads cuyo lead_key ya está en la base de datos se ignoran, así que
+    reintentar un lote que se guardó a medias (o entero) no duplica leads.
+    
+    Args:
+        leads (list): Diccionarios con lead_key, name, email y, opcionalmente,
+            phone, company, interest, message y created_at (datetime).
+        
+    Returns:
+        int: Leads insertados.
+    """
+    if not leads:
+        return 0
+    rows = [{
+        'lead_key': lead['lead_key'],
+        'name': lead.get('name', ''),
+        'email': lead.get('email', ''),
+        'phone': lead.get('phone', ''),
+        'company': lead.get('company', ''),
+        'interest': lead.get('interest', ''),
+        'message': lead.get('message', ''),
+        'created_at': lead.get('created_at') or datetime.datetime.utcnow()
+    } for lead in leads]
+    statement = sqlite_insert(Lead).on_conflict_do_nothing(index_elements=['lead_key']).returning(Lead.lead_key)
+    with _write_lock, get_engine().begin() as connection:
+        inserted = set(connection.execute(statement, rows).scalars())
+        # Solo cuentan en los agregados los leads que no estaban ya guardados
+        lead_analytics.apply_leads(connection, [row for row in rows if row['lead_key'] in inserted])
+        return len(inserted)
+
+def iter_lead_keys():
+    """Recorre los lead_key guardados (los leads antiguos sin clave no se incluyen).
+    
+    Yields:
+        str: Clave de cada lead.
+    """
+    with get_engine().connect() as connection:
+        for (lead_key,) in connection.execute(select(Lead.lead_key).where(Lead.lead_key.isnot(None))):
+            yield lead_key
+
+def get_leads_by_keys(lead_keys):
+    """Obtiene los leads con los lead_key indicados.
+    
+    Args:
+        lead_keys (list): Claves buscadas.
+        
+    Returns:
+        list: Diccionarios de los leads encontrados, con su lead_key.
+    """
+    leads = []
+    lead_keys = list(lead_keys)
+    with get_engine().connect() as connection:
+        for start in range(0, len(lead_keys), 500):
+            chunk = lead_keys[start:start + 500]
+            for row in connection.execute(select(*LEAD_COLUMNS, Lead.lead_key).where(Lead.lead_key.in_(chunk))):
+                leads.append(dict(_row_to_dict(row[:-1]), lead_key=row[-1]))
+    return leads
+
+def rebuild_lead_rollups():
+    """Recalcula los agregados de leads con una sola pasada en streaming sobre la tabla.
+    
+    Se hace con el cerrojo de escritura tomado y en una transacción, así que
+    ningún lead nuevo se cuenta dos veces ni se pierde durante la reconstrucción.
+    
+    Returns:
+        int: Leads contados.
+    """
+    columns = (Lead.created_at, Lead.interest, Lead.company, Lead.phone, Lead.message)
+    with _write_lock, get_engine().begin() as connection:
+        rows = connection.execution_options(yield_per=MAX_LEADS_PAGE_SIZE).execute(select(*columns))
+        leads = ({'created_at': created_at, 'interest': interest, 'company': company, 'phone': phone,
+                  'message': message} for created_at, interest, company, phone, message in rows)
+        return lead_analytics.rebuild(connection, leads)
+
+def get_lead_stats(bucket='day', since=None, until=None, top=10):
+    """Obtiene las estadísticas de leads desde los agregados (ver data.lead_analytics).
+    
+    Args:
+        bucket (str): Agrupación temporal ('day', 'week' o 'month').
+        since: Primer día incluido (date, datetime o texto ISO).
+        until: Último día incluido (date, datetime o texto ISO).
+        top (int): Elementos de cada ranking.
+        
+    Returns:
+        dict: Serie temporal, intereses más frecuentes, empresas y embudo.
+    """
+    with get_engine().connect() as connection:
+        return lead_analytics.get_stats(connection, bucket, since, until, top)
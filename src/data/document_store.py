@@ -0,0 +1,277 @@
+"""
+Almacén de documentos de proyecto subidos por los clientes.
+
+Cada documento se identifica por el SHA-256 de los bytes subidos. El texto
+extraído se guarda una sola vez en disco (<raíz>/<2 primeros>/<sha256>.txt,
+UTF-8) y se lee mediante mmap; la sesión solo guarda el hash. Al volver a
+subir el mismo archivo (los clientes suben a menudo el mismo RFP varias
+veces) no se vuelve a extraer el texto: basta con calcular el hash.
+
+Junto al texto se memoriza el análisis del EngineerAgent
+(<sha256>.analysis.json), que es caro (una petición completa al LLM) y solo
+depende del contenido del documento.
+
+Las escrituras son atómicas (archivo temporal y os.replace), así que varios
+procesos pueden compartir el directorio.
+"""
+import os
+import re
+import json
+import mmap
+import hashlib
+import tempfile
+import threading
+from typing import Dict, Any, Optional, Callable, BinaryIO, Tuple
+import logging
+
+from core.config import DOCUMENT_STORE_DIR
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+# Directorio por defecto (relativo al directorio de datos)
+DEFAULT_DOCUMENT_DIR = os.path.join("data", "documents")
+
+# Bloque de lectura de los archivos subidos
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+# Hash de un documento: SHA-256 en hexadecimal
+_DIGEST_RE = re.compile(r'^[0-9a-f]{64}$')
+
+# Almacenes compartidos del proceso (uno por directorio)
+_stores: Dict[str, 'DocumentStore'] = {}
+_stores_lock = threading.Lock()
+
+def is_document_hash(value: Any) -> bool:
+    """
+    Comprueba si un valor es un hash de documento válido.
+    
+    Args:
+        value: Valor recibido (p. ej. de la sesión)
+        
+    Returns:
+        True si es un SHA-256 en hexadecimal
+    """
+    return isinstance(value, str) and _DIGEST_RE.match(value) is not None
+
+class DocumentStore:
+    """
+    Textos extraídos y análisis de documentos, direccionados por contenido.
+    """
+    
+    def __init__(self, root_dir: str):
+        """
+        Inicializa el almacén.
+        
+        Args:
+            root_dir: Directorio del almacén (se crea si no existe)
+        """
+        self.root_dir = root_dir
+        os.makedirs(root_dir, exist_ok=True)
+        self._stats_lock = threading.Lock()
+        self._uploads = 0
+        self._duplicates = 0
+        self._extractions = 0
+        self._analysis_hits = 0
+        self._analysis_misses = 0
+        logger.info(f"DocumentStore inicializado en {root_dir}")
+    
+    def _path(self, digest: str, suffix: str) -> str:
+        """Ruta de un archivo del documento"""
+        if not is_document_hash(digest):
+            raise ValueError(f"Hash de documento no válido: {digest!r}")
+        return os.path.join(self.root_dir, digest[:2], f"{digest}{suffix}")
+    
+    def _write_atomic(self, path: str, data: bytes) -> None:
+        """Escribe un archivo completo de forma atómica"""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as temp:
+                temp.write(data)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+    
+    def _count(self, name: str) -> None:
+        """Incrementa una métrica"""
+        with self._stats_lock:
+            setattr(self, name, getattr(self, name) + 1)
+    
+    def has(self, digest: str) -> bool:
+        """
+        Comprueba si el texto de un documento está en el almacén.
+        
+        Args:
+            digest: Hash del documento
+            
+        Returns:
+            True si existe
+        """
+        return is_document_hash(digest) and os.path.exists(self._path(digest, '.txt'))
+    
+    def store_upload(self, stream: BinaryIO, extract: Callable[[str], str]) -> Tuple[str, bool]:
+        """
+        Guarda un archivo subido: calcula su hash mientras lo copia a un
+        archivo temporal y solo extrae el texto si el documento es nuevo.
+        
+        Args:
+            stream: Contenido del archivo subido
+            extract: Función que extrae el texto a partir de la ruta del archivo
+            
+        Returns:
+            Tupla (hash del documento, True si ya estaba en el almacén)
+        """
+        self._count('_uploads')
+        digest = hashlib.sha256()
+        fd, temp_path = tempfile.mkstemp(dir=self.root_dir, prefix='.upload-')
+        try:
+            with os.fdopen(fd, 'wb') as temp:
+                for chunk in iter(lambda: stream.read(UPLOAD_CHUNK_SIZE), b''):
+                    digest.update(chunk)
+                    temp.write(chunk)
+            document_hash = digest.hexdigest()
+            if self.has(document_hash):
+                self._count('_duplicates')
+                return document_hash, True
+            text = extract(temp_path)
+        finally:
+            os.unlink(temp_path)
+        self._count('_extractions')
+        self._write_atomic(self._path(document_hash, '.txt'), text.encode('utf-8'))
+        return document_hash, False
+    
+    def store_text(self, text: str) -> str:
+        """
+        Guarda un texto ya extraído (p. ej. enviado en el mensaje por un
+        cliente antiguo); su hash es el de sus bytes UTF-8, igual que el de
+        un TXT subido con el mismo contenido.
+        
+        Args:
+            text: Texto del documento
+            
+        Returns:
+            Hash del documento
+        """
+        data = text.encode('utf-8')
+        document_hash = hashlib.sha256(data).hexdigest()
+        if not self.has(document_hash):
+            self._write_atomic(self._path(document_hash, '.txt'), data)
+        return document_hash
+    
+    def text(self, digest: str) -> Optional[str]:
+        """
+        Lee el texto de un documento.
+        
+        Args:
+            digest: Hash del documento
+            
+        Returns:
+            Texto del documento o None si no está en el almacén
+        """
+        return self._read(digest)
+    
+    def preview(self, digest: str, max_chars: int) -> Optional[str]:
+        """
+        Lee el principio del texto de un documento sin cargarlo entero.
+        
+        Args:
+            digest: Hash del documento
+            max_chars: Caracteres que se devuelven como máximo
+            
+        Returns:
+            Principio del texto o None si no está en el almacén
+        """
+        # Cada carácter ocupa como máximo 4 bytes en UTF-8
+        return self._read(digest, max_chars * 4, max_chars)
+    
+    def _read(self, digest: str, max_bytes: Optional[int] = None, max_chars: Optional[int] = None) -> Optional[str]:
+        """Lee (mediante mmap) el texto de un documento o sus primeros max_bytes"""
+        if not is_document_hash(digest):
+            return None
+        try:
+            with open(self._path(digest, '.txt'), 'rb') as f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    return ''
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    data = mapped[:max_bytes] if max_bytes is not None else mapped[:]
+        except FileNotFoundError:
+            return None
+        # Un prefijo puede cortar un carácter multibyte: se descarta
+        text = data.decode('utf-8', errors='ignore' if max_bytes is not None else 'strict')
+        return text[:max_chars] if max_chars is not None else text
+    
+    def size(self, digest: str) -> int:
+        """
+        Devuelve el tamaño en bytes del texto de un documento (0 si no existe).
+        """
+        try:
+            return os.path.getsize(self._path(digest, '.txt'))
+        except (OSError, ValueError):
+            return 0
+    
+    def get_analysis(self, digest: str) -> Optional[Dict[str, Any]]:
+        """
+        Obtiene el análisis memorizado de un documento.
+        
+        Args:
+            digest: Hash del documento
+            
+        Returns:
+            Análisis guardado o None si no se ha analizado
+        """
+        try:
+            with open(self._path(digest, '.analysis.json'), 'r', encoding='utf-8') as f:
+                analysis = json.load(f)
+        except (OSError, ValueError):
+            self._count('_analysis_misses')
+            return None
+        self._count('_analysis_hits')
+        return analysis
+    
+    def put_analysis(self, digest: str, analysis: Dict[str, Any]) -> None:
+        """
+        Memoriza el análisis de un documento.
+        
+        Args:
+            digest: Hash del documento
+            analysis: Análisis (serializable a JSON)
+        """
+        self._write_atomic(self._path(digest, '.analysis.json'),
+                           json.dumps(analysis, ensure_ascii=False).encode('utf-8'))
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Devuelve las métricas del almacén.
+        
+        Returns:
+            Archivos subidos, subidas repetidas (sin extracción), extracciones
+            de texto y aciertos y fallos del análisis memorizado
+        """
+        with self._stats_lock:
+            return {
+                'uploads': self._uploads,
+                'duplicate_uploads': self._duplicates,
+                'extractions': self._extractions,
+                'analysis_hits': self._analysis_hits,
+                'analysis_misses': self._analysis_misses
+            }
+
+def get_document_store(root_dir: Optional[str] = None) -> DocumentStore:
+    """
+    Obtiene el almacén de documentos de un directorio, creándolo si no existe.
+    
+    Args:
+        root_dir: Directorio del almacén (por defecto DOCUMENT_STORE_DIR o data/documents)
+        
+    Returns:
+        DocumentStore compartido del proceso
+    """
+    key = os.path.abspath(root_dir or DOCUMENT_STORE_DIR or DEFAULT_DOCUMENT_DIR)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = DocumentStore(key)
+            _stores[key] = store
+        return store
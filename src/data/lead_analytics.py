@@ -0,0 +1,252 @@
+"""
+Agregados de leads para el panel de administración.
+
+En lugar de recorrer todos los leads en cada consulta se mantienen dos
+tablas de agregados en la base de datos de leads, actualizadas en la misma
+transacción en la que se guarda cada lead:
+
+- lead_rollup_daily: leads por (día, interés);
+- lead_rollup_totals: leads por dimensión y clave ('interest', 'company' y
+  'funnel', con las etapas de FUNNEL_STAGES).
+
+Las estadísticas solo leen estas tablas: su coste depende del número de días
+e intereses consultados, no del número de leads. Las claves de interés y de
+empresa se normalizan (sin espacios en los extremos y en minúsculas).
+
+Reconstrucción desde los leads existentes y consulta (desde el directorio src):
+    python -m data.lead_analytics rebuild
+    python -m data.lead_analytics stats --bucket week --days 90
+"""
+import sys
+import json
+import argparse
+import datetime
+from collections import Counter
+from sqlalchemy import MetaData, Table, Column, Index, Integer, String, inspect, select, func, delete
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+# Etapas del embudo: leads guardados y leads con cada dato adicional
+FUNNEL_STAGES = ('leads', 'con_telefono', 'con_empresa', 'con_mensaje', 'completos')
+
+# Agrupaciones temporales admitidas (expresión SQL sobre la columna day 'YYYY-MM-DD')
+BUCKETS = ('day', 'week', 'month')
+
+# Días consultados por defecto y máximo de elementos en los rankings
+DEFAULT_STATS_DAYS = 30
+MAX_TOP = 100
+
+metadata = MetaData()
+
+daily_rollup = Table(
+    'lead_rollup_daily', metadata,
+    Column('day', String(10), primary_key=True),
+    Column('interest', String(100), primary_key=True),
+    Column('leads', Integer, nullable=False, default=0)
+)
+
+totals_rollup = Table(
+    'lead_rollup_totals', metadata,
+    Column('dimension', String(20), primary_key=True),
+    Column('key', String(100), primary_key=True),
+    Column('leads', Integer, nullable=False, default=0),
+    # Rankings (top-N) sin ordenar toda la dimensión
+    Index('ix_lead_rollup_totals_rank', 'dimension', 'leads')
+)
+
+def create_rollup_tables(engine):
+    """Crea las tablas de agregados si no existen.
+    
+    Args:
+        engine: Motor de la base de datos de leads.
+        
+    Returns:
+        bool: True si las tablas no existían (hay que reconstruirlas).
+    """
+    created = not inspect(engine).has_table('lead_rollup_totals')
+    metadata.create_all(engine)
+    return created
+
+def _normalize(value):
+    """Normaliza una clave de interés o empresa (máximo 100 caracteres)."""
+    return (value or '').strip().lower()[:100]
+
+def _day(created_at):
+    """Día (UTC) de un lead en formato 'YYYY-MM-DD'."""
+    if isinstance(created_at, str):
+        return created_at[:10]
+    return (created_at or datetime.datetime.utcnow()).strftime('%Y-%m-%d')
+
+def count_leads(leads):
+    """Cuenta los leads por cada agregado en una sola pasada.
+    
+    Args:
+        leads (iterable): Diccionarios con created_at, interest, company, phone y message.
+        
+    Returns:
+        tuple: (Counter por (día, interés), Counter por (dimensión, clave)).
+    """
+    daily = Counter()
+    totals = Counter()
+    for lead in leads:
+        interest = _normalize(lead.get('interest'))
+        company = _normalize(lead.get('company'))
+        has_phone = bool((lead.get('phone') or '').strip())
+        has_message = bool((lead.get('message') or '').strip())
+        daily[(_day(lead.get('created_at')), interest)] += 1
+        totals[('interest', interest)] += 1
+        totals[('company', company)] += 1
+        totals[('funnel', 'leads')] += 1
+        if has_phone:
+            totals[('funnel', 'con_telefono')] += 1
+        if company:
+            totals[('funnel', 'con_empresa')] += 1
+        if has_message:
+            totals[('funnel', 'con_mensaje')] += 1
+        if has_phone and company:
+            totals[('funnel', 'completos')] += 1
+    return daily, totals
+
+def apply_leads(connection, leads):
+    """Suma leads recién guardados a los agregados.
+    
+    Debe llamarse en la transacción que guarda los leads para que los
+    agregados no se desvíen si esta se deshace.
+    
+    Args:
+        connection: Conexión de SQLAlchemy con la transacción abierta.
+        leads (list): Leads guardados.
+    """
+    daily, totals = count_leads(leads)
+    if daily:
+        statement = sqlite_insert(daily_rollup)
+        connection.execute(
+            statement.on_conflict_do_update(index_elements=['day', 'interest'],
+                                            set_={'leads': daily_rollup.c.leads + statement.excluded.leads}),
+            [{'day': day, 'interest': interest, 'leads': leads} for (day, interest), leads in daily.items()]
+        )
+    if totals:
+        statement = sqlite_insert(totals_rollup)
+        connection.execute(
+            statement.on_conflict_do_update(index_elements=['dimension', 'key'],
+                                            set_={'leads': totals_rollup.c.leads + statement.excluded.leads}),
+            [{'dimension': dimension, 'key': key, 'leads': leads} for (dimension, key), leads in totals.items()]
+        )
+
+def rebuild(connection, leads):
+    """Recalcula los agregados desde cero con una pasada sobre los leads.
+    
+    Args:
+        connection: Conexión de SQLAlchemy con la transacción abierta.
+        leads (iterable): Todos los leads (puede ser un iterador en streaming).
+        
+    Returns:
+        int: Leads contados.
+    """
+    daily, totals = count_leads(leads)
+    connection.execute(delete(daily_rollup))
+    connection.execute(delete(totals_rollup))
+    if daily:
+        connection.execute(daily_rollup.insert(), [
+            {'day': day, 'interest': interest, 'leads': leads} for (day, interest), leads in daily.items()
+        ])
+    if totals:
+        connection.execute(totals_rollup.insert(), [
+            {'dimension': dimension, 'key': key, 'leads': leads} for (dimension, key), leads in totals.items()
+        ])
+    return totals[('funnel', 'leads')]
+
+def _as_day(value):
+    """Convierte una fecha (date, datetime o texto ISO) en 'YYYY-MM-DD'."""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return datetime.date.fromisoformat(value[:10]).isoformat()
+    return value.strftime('%Y-%m-%d')
+
+def get_stats(connection, bucket='day', since=None, until=None, top=10):
+    """Obtiene las estadísticas de leads a partir de los agregados.
+    
+    Args:
+        connection: Conexión de SQLAlchemy.
+        bucket (str): Agrupación temporal ('day', 'week' o 'month').
+        since: Primer día incluido (por defecto, hace DEFAULT_STATS_DAYS días).
+        until: Último día incluido (por defecto, hoy).
+        top (int): Elementos de cada ranking (máximo MAX_TOP).
+        
+    Returns:
+        dict: Serie temporal e intereses del rango, y total, empresas y
+            embudo históricos.
+            
+    Raises:
+        ValueError: Si la agrupación o las fechas no son válidas.
+    """
+    if bucket not in BUCKETS:
+        raise ValueError(f"bucket debe ser uno de: {', '.join(BUCKETS)}")
+    top = max(1, min(top, MAX_TOP))
+    today = datetime.datetime.utcnow().date()
+    until = _as_day(until) or today.isoformat()
+    since = _as_day(since) or (datetime.date.fromisoformat(until) - datetime.timedelta(days=DEFAULT_STATS_DAYS - 1)).isoformat()
+    if since > until:
+        raise ValueError("since no puede ser posterior a until")
+    
+    if bucket == 'month':
+        period = func.substr(daily_rollup.c.day, 1, 7)
+    elif bucket == 'week':
+        period = func.strftime('%Y-W%W', daily_rollup.c.day)
+    else:
+        period = daily_rollup.c.day
+    in_range = daily_rollup.c.day.between(since, until)
+    series = connection.execute(
+        select(period.label('period'), func.sum(daily_rollup.c.leads))
+        .where(in_range).group_by('period').order_by('period')
+    ).all()
+    interest_total = func.sum(daily_rollup.c.leads).label('total')
+    interests = connection.execute(
+        select(daily_rollup.c.interest, interest_total)
+        .where(in_range).group_by(daily_rollup.c.interest).order_by(interest_total.desc()).limit(top)
+    ).all()
+    companies = connection.execute(
+        select(totals_rollup.c.key, totals_rollup.c.leads)
+        .where(totals_rollup.c.dimension == 'company', totals_rollup.c.key != '')
+        .order_by(totals_rollup.c.leads.desc()).limit(top)
+    ).all()
+    funnel = dict(connection.execute(
+        select(totals_rollup.c.key, totals_rollup.c.leads).where(totals_rollup.c.dimension == 'funnel')
+    ).all())
+    
+    return {
+        'bucket': bucket,
+        'since': since,
+        'until': until,
+        'leads_in_range': sum(leads for _, leads in series),
+        'series': [{'period': period, 'leads': leads} for period, leads in series],
+        'top_interests': [{'interest': interest or None, 'leads': leads} for interest, leads in interests],
+        'total': funnel.get('leads', 0),
+        'top_companies': [{'company': company, 'leads': leads} for company, leads in companies],
+        'funnel': [{'stage': stage, 'leads': funnel.get(stage, 0)} for stage in FUNNEL_STAGES]
+    }
+
+def main():
+    """Punto de entrada de la línea de comandos."""
+    parser = argparse.ArgumentParser(description="Agregados de leads")
+    parser.add_argument('command', choices=['rebuild', 'stats'])
+    parser.add_argument('--bucket', choices=BUCKETS, default='day', help='Agrupación temporal de stats')
+    parser.add_argument('--days', type=int, default=DEFAULT_STATS_DAYS, help='Días consultados por stats')
+    parser.add_argument('--top', type=int, default=10, help='Elementos de cada ranking')
+    args = parser.parse_args()
+    
+    # Importación diferida: database importa este módulo al cargarse
+    try:
+        from data import database
+    except ImportError:
+        from src.data import database
+    
+    if args.command == 'rebuild':
+        print(f"Agregados reconstruidos con {database.rebuild_lead_rollups()} leads")
+    else:
+        since = datetime.datetime.utcnow().date() - datetime.timedelta(days=args.days - 1)
+        print(json.dumps(database.get_lead_stats(args.bucket, since, None, args.top), indent=2, ensure_ascii=False))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,674 @@
+"""
+Registro de leads en formato JSON Lines (un lead por línea, solo se añade al final).
+
+Cada lead nuevo es una única escritura al final del archivo activo, en lugar
+de reescribir todos los leads como hacía leads.json. Un corte a mitad de
+escritura solo puede dejar incompleta la última línea, que se descarta al
+abrir el registro.
+
+- Índice en memoria id -> (segmento, posición) y email -> ids, construido al
+  arrancar recorriendo los archivos una vez (sin decodificar cada línea).
+- Política de fsync: 'always' (cada lead), 'batch' (como mucho uno por
+  intervalo) o 'never' (lo decide el sistema operativo).
+- Rotación: cuando el archivo activo supera el tamaño configurado se
+  renombra de forma atómica a un segmento numerado (leads.000001.jsonl).
+- Compactación: reescribe los segmentos en uno solo sin los leads borrados.
+- Varias instancias (o procesos) pueden compartir el registro: las
+  escrituras se serializan con un cerrojo de archivo y cada instancia lee
+  las líneas que han añadido las demás antes de consultar su índice.
+
+Conversión del leads.json existente y mantenimiento (desde el directorio src):
+    python -m data.lead_log convert --source data/leads.json --target data/leads.jsonl
+    python -m data.lead_log compact --path data/leads.jsonl
+    python -m data.lead_log stats --path data/leads.jsonl
+"""
+import os
+import re
+import sys
+import json
+import time
+import atexit
+import argparse
+import threading
+import contextlib
+from typing import Dict, Any, Optional, List, Iterator, Tuple
+import logging
+
+# Cerrojo de archivo entre procesos (no disponible en Windows)
+try:
+    import fcntl
+    FCNTL_SUPPORT = True
+except ImportError:
+    FCNTL_SUPPORT = False
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+FSYNC_ALWAYS = 'always'
+FSYNC_BATCH = 'batch'
+FSYNC_NEVER = 'never'
+FSYNC_POLICIES = (FSYNC_ALWAYS, FSYNC_BATCH, FSYNC_NEVER)
+
+# Tamaño del archivo activo a partir del cual se rota
+DEFAULT_ROTATE_BYTES = 64 * 1024 * 1024
+
+# Las líneas se escriben con id y email al principio; el índice los lee sin decodificar la línea
+_INDEX_RE = re.compile(rb'^\{"id": (\d+), "email": ("(?:[^"\\]|\\.)*"|null)')
+
+def _segment_number(filename: str, stem: str) -> Optional[int]:
+    """
+    Extrae el número de un segmento rotado ({stem}.000001.jsonl).
+    
+    Args:
+        filename: Nombre del archivo
+        stem: Nombre base del registro
+        
+    Returns:
+        Número del segmento o None si el archivo no es un segmento
+    """
+    prefix = f"{stem}."
+    if not filename.startswith(prefix) or not filename.endswith('.jsonl'):
+        return None
+    number = filename[len(prefix):-len('.jsonl')]
+    return int(number) if number.isdigit() else None
+
+def _fsync_directory(directory: str) -> None:
+    """
+    Persiste en disco los renombrados de un directorio.
+    
+    Args:
+        directory: Directorio modificado
+    """
+    if not hasattr(os, 'O_DIRECTORY'):
+        return
+    fd = os.open(directory or '.', os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def _encode(record: Dict[str, Any]) -> bytes:
+    """
+    Serializa un registro como línea JSON con id y email al principio.
+    
+    Args:
+        record: Lead con 'id'
+        
+    Returns:
+        Línea codificada en UTF-8 terminada en salto de línea
+    """
+    ordered = {'id': record['id'], 'email': record.get('email')}
+    ordered.update((key, value) for key, value in record.items() if key not in ordered)
+    return (json.dumps(ordered, ensure_ascii=False) + '\n').encode('utf-8')
+
+class LeadLog:
+    """
+    Registro de leads de solo escritura al final con índice en memoria.
+    """
+    
+    def __init__(self, path: str, fsync: str = FSYNC_BATCH, fsync_interval: float = 1.0,
+                 rotate_bytes: int = DEFAULT_ROTATE_BYTES):
+        """
+        Abre el registro, descarta una última línea incompleta y construye el índice.
+        
+        Args:
+            path: Archivo activo (por ejemplo data/leads.jsonl)
+            fsync: Política de fsync ('always', 'batch' o 'never')
+            fsync_interval: Segundos entre fsync con la política 'batch'
+            rotate_bytes: Tamaño del archivo activo que provoca la rotación (0 = sin rotación)
+        """
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Política de fsync desconocida: {fsync}")
+        self.path = path
+        self.directory = os.path.dirname(path)
+        filename = os.path.basename(path)
+        self.stem = filename[:-len('.jsonl')] if filename.endswith('.jsonl') else filename
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.rotate_bytes = rotate_bytes
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+        
+        self._lock = threading.RLock()
+        self._fd = None
+        self._dirty = False
+        self._last_fsync = time.monotonic()
+        self._positions: Dict[int, Tuple[str, int]] = {}
+        self._emails: Dict[str, List[int]] = {}
+        self._deleted = set()
+        self._next_id = 1
+        self._active_inode = None
+        self._active_size = 0
+        
+        with self._lock, self._file_lock():
+            self._recover_tail()
+            self._build_index()
+        # Con la política 'batch' la última escritura se sincroniza al salir
+        atexit.register(self.close)
+    
+    @contextlib.contextmanager
+    def _file_lock(self) -> Iterator[None]:
+        """
+        Cerrojo exclusivo entre procesos sobre {path}.lock (el archivo activo se renombra al rotar).
+        """
+        if not FCNTL_SUPPORT:
+            yield
+            return
+        fd = os.open(f"{self.path}.lock", os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+    
+    def segments(self) -> List[str]:
+        """
+        Lista los archivos del registro en orden (segmentos rotados y el activo al final).
+        
+        Returns:
+            Rutas de los archivos existentes
+        """
+        numbered = []
+        for filename in os.listdir(self.directory or '.'):
+            number = _segment_number(filename, self.stem)
+            if number is not None:
+                numbered.append((number, os.path.join(self.directory, filename)))
+        paths = [path for _, path in sorted(numbered)]
+        if os.path.exists(self.path):
+            paths.append(self.path)
+        return paths
+    
+    def _recover_tail(self) -> None:
+        """
+        Trunca el archivo activo tras la última línea completa (escritura interrumpida).
+        """
+        if not os.path.exists(self.path):
+            return
+        size = os.path.getsize(self.path)
+        if size == 0:
+            return
+        with open(self.path, 'rb+') as f:
+            f.seek(size - 1)
+            if f.read(1) == b'\n':
+                return
+            end = size
+            while end > 0:
+                start = max(0, end - 65536)
+                f.seek(start)
+                chunk = f.read(end - start)
+                newline = chunk.rfind(b'\n')
+                if newline >= 0:
+                    end = start + newline + 1
+                    break
+                end = start
+            f.truncate(end)
+            f.flush()
+            os.fsync(f.fileno())
+        logger.warning(f"Descartados {size - end} bytes de una escritura incompleta en {self.path}")
+    
+    def _index_line(self, segment: str, offset: int, line: bytes) -> None:
+        """
+        Añade una línea al índice.
+        
+        Args:
+            segment: Archivo que contiene la línea
+            offset: Posición de la línea en el archivo
+            line: Contenido de la línea
+        """
+        match = _INDEX_RE.match(line)
+        if match:
+            lead_id = int(match.group(1))
+            raw_email = match.group(2)
+            if raw_email == b'null':
+                email = None
+            elif b'\\' in raw_email:
+                email = json.loads(raw_email)
+            else:
+                email = raw_email[1:-1].decode('utf-8')
+        else:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                logger.warning(f"Línea ilegible en {segment}:{offset}")
+                return
+            lead_id = record.get('id')
+            if not isinstance(lead_id, int):
+                logger.warning(f"Línea sin id en {segment}:{offset}")
+                return
+            if record.get('_deleted'):
+                self._forget(lead_id)
+                self._deleted.add(lead_id)
+                self._next_id = max(self._next_id, lead_id + 1)
+                return
+            email = record.get('email')
+        
+        if lead_id in self._positions:
+            # Copia de un lead ya indexado (compactación interrumpida): vale la última
+            self._forget(lead_id)
+        self._positions[lead_id] = (segment, offset)
+        if email:
+            self._emails.setdefault(email.lower(), []).append(lead_id)
+        self._next_id = max(self._next_id, lead_id + 1)
+    
+    def _forget(self, lead_id: int) -> None:
+        """
+        Quita un lead del índice.
+        
+        Args:
+            lead_id: Identificador del lead
+        """
+        position = self._positions.pop(lead_id, None)
+        if position is None:
+            return
+        email = (self._read_at(*position).get('email') or '').lower()
+        ids = self._emails.get(email, [])
+        if lead_id in ids:
+            ids.remove(lead_id)
+            if not ids:
+                del self._emails[email]
+    
+    def _scan(self, segment: str, start: int = 0) -> int:
+        """
+        Indexa las líneas completas de un archivo a partir de una posición.
+        
+        Args:
+            segment: Archivo a recorrer
+            start: Posición inicial
+            
+        Returns:
+            Posición tras la última línea completa
+        """
+        offset = start
+        with open(segment, 'rb') as f:
+            f.seek(start)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    # Otra instancia está escribiendo esta línea; se indexará en la próxima lectura
+                    break
+                self._index_line(segment, offset, line)
+                offset += len(line)
+        return offset
+    
+    def _build_index(self) -> None:
+        """
+        Reconstruye el índice recorriendo todos los archivos del registro.
+        """
+        self._positions = {}
+        self._emails = {}
+        self._deleted = set()
+        self._next_id = 1
+        self._active_inode = None
+        self._active_size = 0
+        for segment in self.segments():
+            end = self._scan(segment)
+            if segment == self.path:
+                self._active_inode = os.stat(segment).st_ino
+                self._active_size = end
+    
+    def _refresh(self) -> None:
+        """
+        Incorpora al índice lo que hayan escrito otras instancias desde la última lectura.
+        """
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            if self._active_size or self._active_inode is not None:
+                self._build_index()
+            return
+        if stat.st_ino != self._active_inode or stat.st_size < self._active_size:
+            # Otra instancia ha rotado o compactado el registro
+            self._build_index()
+        elif stat.st_size > self._active_size:
+            self._active_size = self._scan(self.path, self._active_size)
+    
+    def _open_active(self) -> int:
+        """
+        Devuelve el descriptor de escritura del archivo activo actual.
+        
+        Returns:
+            Descriptor abierto con O_APPEND
+        """
+        if self._fd is not None:
+            try:
+                if os.fstat(self._fd).st_ino == os.stat(self.path).st_ino:
+                    return self._fd
+            except FileNotFoundError:
+                pass
+            os.close(self._fd)
+            self._fd = None
+        self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        self._active_inode = os.fstat(self._fd).st_ino
+        return self._fd
+    
+    def _sync(self, force: bool = False) -> None:
+        """
+        Aplica la política de fsync tras una escritura.
+        
+        Args:
+            force: Sincronizar aunque la política no lo pida todavía
+        """
+        if self._fd is None or not self._dirty:
+            return
+        now = time.monotonic()
+        if force or self.fsync == FSYNC_ALWAYS or \
+                (self.fsync == FSYNC_BATCH and now - self._last_fsync >= self.fsync_interval):
+            os.fsync(self._fd)
+            self._dirty = False
+            self._last_fsync = now
+    
+    def _rotate(self) -> None:
+        """
+        Renombra el archivo activo a un segmento numerado y empieza uno vacío.
+        """
+        self._sync(force=True)
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+        numbers = [_segment_number(os.path.basename(path), self.stem) for path in self.segments()[:-1]]
+        segment = os.path.join(self.directory, f"{self.stem}.{max(numbers, default=0) + 1:06d}.jsonl")
+        os.replace(self.path, segment)
+        _fsync_directory(self.directory)
+        for lead_id, (path, offset) in self._positions.items():
+            if path == self.path:
+                self._positions[lead_id] = (segment, offset)
+        self._active_inode = None
+        self._active_size = 0
+        logger.info(f"Registro de leads rotado a {segment}")
+    
+    def append_many(self, leads: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Añade varios leads con una sola escritura.
+        
+        Args:
+            leads: Datos de los leads (se les asigna un id nuevo)
+            
+        Returns:
+            Registros escritos, con su id
+        """
+        if not leads:
+            return []
+        with self._lock, self._file_lock():
+            self._refresh()
+            records = []
+            lines = []
+            for lead in leads:
+                record = dict(lead, id=self._next_id + len(records))
+                records.append(record)
+                lines.append(_encode(record))
+            data = b''.join(lines)
+            
+            if self.rotate_bytes and self._active_size and self._active_size + len(data) > self.rotate_bytes:
+                self._rotate()
+            fd = self._open_active()
+            offset = self._active_size
+            written = os.write(fd, data)
+            if written != len(data):
+                raise IOError(f"Escritura incompleta en {self.path}: {written} de {len(data)} bytes")
+            self._dirty = True
+            for line in lines:
+                self._index_line(self.path, offset, line)
+                offset += len(line)
+            self._active_size = offset
+            self._sync()
+            return records
+    
+    def append(self, lead: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Añade un lead al final del registro.
+        
+        Args:
+            lead: Datos del lead
+            
+        Returns:
+            Registro escrito, con su id
+        """
+        return self.append_many([lead])[0]
+    
+    def _read_at(self, segment: str, offset: int) -> Optional[Dict[str, Any]]:
+        """
+        Lee el lead que empieza en una posición de un archivo.
+        """
+        with open(segment, 'rb') as f:
+            f.seek(offset)
+            return json.loads(f.readline())
+    
+    def get(self, lead_id: int) -> Optional[Dict[str, Any]]:
+        """
+        Obtiene un lead por su id sin recorrer el registro.
+        
+        Args:
+            lead_id: Identificador del lead
+            
+        Returns:
+            Datos del lead o None si no existe
+        """
+        with self._lock:
+            self._refresh()
+            position = self._positions.get(lead_id)
+            return self._read_at(*position) if position else None
+    
+    def find_by_email(self, email: str) -> List[Dict[str, Any]]:
+        """
+        Obtiene los leads de un email (sin distinguir mayúsculas), del más antiguo al más reciente.
+        
+        Args:
+            email: Email buscado
+            
+        Returns:
+            Lista de leads
+        """
+        with self._lock:
+            self._refresh()
+            return [self._read_at(*self._positions[lead_id]) for lead_id in self._emails.get(email.lower(), [])]
+    
+    def latest(self) -> Optional[Dict[str, Any]]:
+        """
+        Obtiene el lead más reciente.
+        
+        Returns:
+            Datos del lead o None si el registro está vacío
+        """
+        with self._lock:
+            self._refresh()
+            # Los ids crecen con cada escritura: se baja desde el último solo si se borró
+            lead_id = self._next_id - 1
+            while lead_id > 0 and lead_id not in self._positions:
+                lead_id -= 1
+            return self._read_at(*self._positions[lead_id]) if lead_id > 0 else None
+    
+    def count(self) -> int:
+        """
+        Número de leads (sin contar los borrados).
+        """
+        with self._lock:
+            self._refresh()
+            return len(self._positions)
+    
+    def iter_leads(self) -> Iterator[Dict[str, Any]]:
+        """
+        Recorre todos los leads en orden de escritura leyendo los archivos secuencialmente.
+        
+        Returns:
+            Iterador de diccionarios de leads
+        """
+        with self._lock:
+            self._refresh()
+            positions = dict(self._positions)
+        live = set(path for path, _ in positions.values())
+        for segment in [path for path in self.segments() if path in live]:
+            offset = 0
+            with open(segment, 'rb') as f:
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        break
+                    match = _INDEX_RE.match(line)
+                    lead_id = int(match.group(1)) if match else None
+                    if lead_id is None or positions.get(lead_id) == (segment, offset):
+                        record = json.loads(line)
+                        if positions.get(record.get('id')) == (segment, offset):
+                            yield record
+                    offset += len(line)
+    
+    def delete(self, lead_id: int) -> bool:
+        """
+        Borra un lead añadiendo una marca de borrado (se elimina al compactar).
+        
+        Args:
+            lead_id: Identificador del lead
+            
+        Returns:
+            True si el lead existía
+        """
+        with self._lock, self._file_lock():
+            self._refresh()
+            if lead_id not in self._positions:
+                return False
+            line = (json.dumps({'id': lead_id, '_deleted': True}) + '\n').encode('utf-8')
+            fd = self._open_active()
+            os.write(fd, line)
+            self._dirty = True
+            self._index_line(self.path, self._active_size, line)
+            self._active_size += len(line)
+            self._sync()
+            return True
+    
+    def compact(self) -> Dict[str, Any]:
+        """
+        Reescribe el registro en un único segmento con los leads vigentes.
+        
+        El segmento nuevo se escribe en un temporal, se sincroniza y se renombra
+        antes de borrar los archivos anteriores. Si el proceso se interrumpe, las
+        copias duplicadas se resuelven al indexar (vale la última).
+        
+        Returns:
+            Diccionario con los leads conservados y los bytes antes y después
+        """
+        with self._lock, self._file_lock():
+            self._refresh()
+            self._sync(force=True)
+            previous = self.segments()
+            bytes_before = sum(os.path.getsize(path) for path in previous)
+            numbers = [_segment_number(os.path.basename(path), self.stem) for path in previous
+                       if path != self.path]
+            segment = os.path.join(self.directory, f"{self.stem}.{max(numbers, default=0) + 1:06d}.jsonl")
+            temporary = f"{segment}.tmp"
+            kept = 0
+            with open(temporary, 'wb') as f:
+                last_id = 0
+                for record in self.iter_leads():
+                    f.write(_encode(record))
+                    kept += 1
+                    last_id = record['id']
+                if self._next_id - 1 > last_id:
+                    # Se conserva la marca del último id borrado para no reutilizarlo
+                    f.write((json.dumps({'id': self._next_id - 1, '_deleted': True}) + '\n').encode('utf-8'))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temporary, segment)
+            _fsync_directory(self.directory)
+            
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+            for path in previous:
+                if path != self.path:
+                    os.remove(path)
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            _fsync_directory(self.directory)
+            self._build_index()
+            bytes_after = os.path.getsize(segment)
+            logger.info(f"Registro de leads compactado: {kept} leads, {bytes_before} -> {bytes_after} bytes")
+            return {'leads': kept, 'bytes_before': bytes_before, 'bytes_after': bytes_after}
+    
+    def stats(self) -> Dict[str, Any]:
+        """
+        Estadísticas del registro.
+        
+        Returns:
+            Diccionario con leads, borrados, segmentos y bytes
+        """
+        with self._lock:
+            self._refresh()
+            segments = self.segments()
+            return {
+                'leads': len(self._positions),
+                'deleted': len(self._deleted),
+                'emails': len(self._emails),
+                'segments': len(segments),
+                'bytes': sum(os.path.getsize(path) for path in segments),
+                'fsync': self.fsync
+            }
+    
+    def close(self) -> None:
+        """
+        Sincroniza las escrituras pendientes y cierra el archivo activo.
+        """
+        with self._lock:
+            self._sync(force=True)
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+
+def convert_json_leads(source: str, target: str) -> int:
+    """
+    Convierte un leads.json (lista con indentación) en un registro JSONL.
+    
+    El registro se escribe en un temporal que se renombra al terminar, así que
+    una conversión interrumpida no deja un registro a medias.
+    
+    Args:
+        source: Archivo leads.json existente
+        target: Archivo JSONL a crear (no debe existir o debe estar vacío)
+        
+    Returns:
+        Número de leads convertidos
+    """
+    if os.path.exists(target) and os.path.getsize(target) > 0:
+        raise FileExistsError(f"El registro {target} ya existe")
+    with open(source, 'r', encoding='utf-8') as f:
+        leads = json.load(f)
+    if not isinstance(leads, list):
+        raise ValueError(f"{source} no contiene una lista de leads")
+    
+    temporary = f"{target}.tmp"
+    with open(temporary, 'wb') as f:
+        for number, lead in enumerate(leads, 1):
+            f.write(_encode(dict(lead, id=number)))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary, target)
+    _fsync_directory(os.path.dirname(target))
+    logger.info(f"Convertidos {len(leads)} leads de {source} a {target}")
+    return len(leads)
+
+def main() -> int:
+    """
+    Punto de entrada de la línea de comandos.
+    
+    Returns:
+        Código de salida
+    """
+    parser = argparse.ArgumentParser(description="Registro de leads en JSON Lines")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    convert_parser = subparsers.add_parser('convert', help='Convertir leads.json a JSONL')
+    convert_parser.add_argument('--source', default='data/leads.json')
+    convert_parser.add_argument('--target', default='data/leads.jsonl')
+    for command in ('compact', 'stats'):
+        command_parser = subparsers.add_parser(command)
+        command_parser.add_argument('--path', default='data/leads.jsonl')
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.INFO)
+    if args.command == 'convert':
+        print(f"Leads convertidos: {convert_json_leads(args.source, args.target)}")
+        return 0
+    log = LeadLog(args.path)
+    result = log.compact() if args.command == 'compact' else log.stats()
+    log.close()
+    print(json.dumps(result, indent=2))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
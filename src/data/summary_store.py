@@ -0,0 +1,517 @@
+"""
+Almacén de resúmenes de proyecto de los leads.
+
+Cada cliente (email) tiene una fila con su último resumen, los datos del
+cliente y el análisis técnico. Un índice de texto completo (FTS5) sobre el
+resumen, las tecnologías, el interés, el nombre, la empresa y el email
+permite buscar y paginar los resúmenes sin abrir ningún archivo.
+
+Si el SQLite del sistema no incluye FTS5 la búsqueda se hace con LIKE.
+
+Importación de los client_summary_*.txt/json existentes y búsqueda (desde
+el directorio src):
+    python -m data.summary_store import --data-dir data
+    python -m data.summary_store search "centralita python"
+"""
+import os
+import re
+import sys
+import json
+import time
+import sqlite3
+import argparse
+import threading
+from datetime import datetime
+from typing import Dict, Any, Optional, List, Tuple
+import logging
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+# Nombre de la base de datos dentro del directorio de datos
+DEFAULT_SUMMARY_DB_FILENAME = "project_summaries.db"
+
+# Resúmenes por página como máximo
+MAX_PAGE_SIZE = 200
+
+# Prefijo de los archivos de resumen que escriben DataManager y DataCollectionAgent
+SUMMARY_FILE_PREFIX = "client_summary_"
+
+# Campos de los datos del cliente que se leen del texto de un resumen
+_TEXT_FIELDS = {
+    'name': re.compile(r'^- Nombre: (.*)$', re.MULTILINE),
+    'company': re.compile(r'^- Empresa: (.*)$', re.MULTILINE),
+    'interest': re.compile(r'^- Interés: (.*)$', re.MULTILINE),
+    'technologies': re.compile(r'^- Tecnologías recomendadas: (.*)$', re.MULTILINE),
+    'complexity': re.compile(r'^- Complejidad: (.*)$', re.MULTILINE)
+}
+
+# Caracteres que no forman parte de un término de búsqueda
+_QUERY_SPLIT_RE = re.compile(r'[^\w@.\-]+', re.UNICODE)
+
+# Almacenes compartidos del proceso (uno por base de datos)
+_stores: Dict[str, 'SummaryStore'] = {}
+_stores_lock = threading.Lock()
+
+def _fts5_available() -> bool:
+    """
+    Comprueba si el SQLite enlazado incluye FTS5.
+    """
+    try:
+        connection = sqlite3.connect(':memory:')
+        connection.execute("CREATE VIRTUAL TABLE probe USING fts5(text)")
+        connection.close()
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+FTS5_SUPPORT = _fts5_available()
+
+def format_summary_text(summary_data: Dict[str, Any], modified_date: str) -> str:
+    """
+    Genera el texto de un resumen a partir de sus datos JSON (para clientes sin resumen en texto).
+    
+    Args:
+        summary_data: Datos del resumen (client_info, project_info y technical_analysis)
+        modified_date: Fecha que se muestra en la cabecera
+        
+    Returns:
+        Texto del resumen
+    """
+    client_info = summary_data.get('client_info', {})
+    project_info = summary_data.get('project_info', {})
+    technical_analysis = summary_data.get('technical_analysis', {})
+    
+    summary_text = f"""
+RESUMEN DE LEAD - {modified_date}
+
+INFORMACIÓN DEL CLIENTE:
+- Nombre: {client_info.get('name', 'No proporcionado')}
+- Email: {client_info.get('email', 'No proporcionado')}
+- Teléfono: {client_info.get('phone', 'No proporcionado')}
+- Empresa: {client_info.get('company', 'No proporcionada')}
+- Interés: {client_info.get('interest', 'No especificado')}
+
+RESUMEN DEL PROYECTO:
+"""
+    
+    # Añadir detalles sobre el archivo subido si existe
+    if project_info.get('has_uploaded_file'):
+        summary_text += f"- Cliente subió archivo: {project_info.get('file_name')}\n"
+    
+    # Añadir análisis técnico si existe
+    if technical_analysis:
+        summary_text += f"""
+ANÁLISIS TÉCNICO:
+- Complejidad: {technical_analysis.get('complejidad', 'No determinada')}
+- Tecnologías recomendadas: {', '.join(technical_analysis.get('tecnologias_recomendadas', ['No determinadas']))}
+- Tiempo estimado: {technical_analysis.get('tiempo_estimado', 'No determinado')}
+- Desarrolladores recomendados: {technical_analysis.get('num_desarrolladores', 'No determinado')}
+- Presupuesto estimado: {technical_analysis.get('costo_total', 'No determinado')} {technical_analysis.get('moneda', 'EUR')}
+"""
+    
+    # Añadir resumen de la conversación
+    if project_info.get('conversation_summary'):
+        summary_text += f"\nRESUMEN DE LA CONVERSACIÓN:\n{project_info.get('conversation_summary')[:500]}...\n"
+    return summary_text
+
+def _summary_fields(summary_text: str, summary_data: Optional[Dict[str, Any]]) -> Dict[str, str]:
+    """
+    Obtiene los campos indexados de un resumen, de sus datos JSON o de su texto.
+    
+    Args:
+        summary_text: Texto del resumen
+        summary_data: Datos JSON del resumen (si existen)
+        
+    Returns:
+        Diccionario con name, company, interest, technologies y complexity
+    """
+    if summary_data:
+        client_info = summary_data.get('client_info', {})
+        technical_analysis = summary_data.get('technical_analysis') or {}
+        return {
+            'name': client_info.get('name', ''),
+            'company': client_info.get('company', ''),
+            'interest': client_info.get('interest', ''),
+            'technologies': ', '.join(technical_analysis.get('tecnologias_recomendadas', [])),
+            'complexity': technical_analysis.get('complejidad', '')
+        }
+    fields = {}
+    for field, pattern in _TEXT_FIELDS.items():
+        match = pattern.search(summary_text)
+        fields[field] = match.group(1).strip() if match else ''
+    return fields
+
+def _fts_query(search: str) -> str:
+    """
+    Convierte el texto del buscador en una consulta FTS5: todos los términos,
+    cada uno como prefijo y entre comillas (sin operadores del usuario).
+    
+    Args:
+        search: Texto escrito en el buscador
+        
+    Returns:
+        Consulta para MATCH (vacía si no hay términos)
+    """
+    terms = [term for term in _QUERY_SPLIT_RE.split(search) if term]
+    return ' '.join(f'"{term}"*' for term in terms)
+
+class SummaryStore:
+    """
+    Tabla project_summaries en SQLite con su índice de texto completo.
+    """
+    
+    def __init__(self, db_path: str):
+        """
+        Abre el almacén y crea sus tablas si no existen.
+        
+        Args:
+            db_path: Ruta de la base de datos
+        """
+        self.db_path = db_path
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        self.created = self._init_schema()
+    
+    def _get_connection(self) -> sqlite3.Connection:
+        """
+        Obtiene la conexión del hilo actual.
+        
+        Returns:
+            Conexión a la base de datos
+        """
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.db_path, timeout=30)
+            connection.row_factory = sqlite3.Row
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+    
+    def _init_schema(self) -> bool:
+        """
+        Crea la tabla, su índice de orden y la tabla FTS5 con los disparadores que la mantienen.
+        
+        Returns:
+            True si la tabla no existía
+        """
+        connection = self._get_connection()
+        created = connection.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'project_summaries'"
+        ).fetchone() is None
+        with connection:
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS project_summaries (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    email TEXT NOT NULL UNIQUE,
+                    name TEXT,
+                    company TEXT,
+                    interest TEXT,
+                    technologies TEXT,
+                    complexity TEXT,
+                    has_file INTEGER NOT NULL DEFAULT 0,
+                    has_analysis INTEGER NOT NULL DEFAULT 0,
+                    summary TEXT NOT NULL,
+                    data TEXT,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            if FTS5_SUPPORT:
+                # Índice de contenido externo: el texto solo se guarda en project_summaries
+                connection.execute("""
+                    CREATE VIRTUAL TABLE IF NOT EXISTS project_summaries_fts USING fts5(
+                        summary, technologies, interest, name, company, email,
+                        content='project_summaries', content_rowid='id',
+                        tokenize='unicode61 remove_diacritics 2'
+                    )
+                """)
+                columns = "summary, technologies, interest, name, company, email"
+                connection.executescript(f"""
+                    CREATE TRIGGER IF NOT EXISTS project_summaries_ai AFTER INSERT ON project_summaries BEGIN
+                        INSERT INTO project_summaries_fts (rowid, {columns})
+                        VALUES (new.id, new.summary, new.technologies, new.interest, new.name, new.company, new.email);
+                    END;
+                    CREATE TRIGGER IF NOT EXISTS project_summaries_ad AFTER DELETE ON project_summaries BEGIN
+                        INSERT INTO project_summaries_fts (project_summaries_fts, rowid, {columns})
+                        VALUES ('delete', old.id, old.summary, old.technologies, old.interest, old.name, old.company, old.email);
+                    END;
+                    CREATE TRIGGER IF NOT EXISTS project_summaries_au AFTER UPDATE ON project_summaries BEGIN
+                        INSERT INTO project_summaries_fts (project_summaries_fts, rowid, {columns})
+                        VALUES ('delete', old.id, old.summary, old.technologies, old.interest, old.name, old.company, old.email);
+                        INSERT INTO project_summaries_fts (rowid, {columns})
+                        VALUES (new.id, new.summary, new.technologies, new.interest, new.name, new.company, new.email);
+                    END;
+                """)
+        return created
+    
+    def save(self, email: str, summary_text: str, summary_data: Optional[Dict[str, Any]] = None,
+             updated_at: Optional[float] = None) -> None:
+        """
+        Guarda (o sustituye) el resumen de un cliente.
+        
+        Args:
+            email: Email del cliente
+            summary_text: Texto del resumen
+            summary_data: Datos JSON del resumen (client_info, project_info y technical_analysis)
+            updated_at: Momento del resumen (por defecto, ahora)
+        """
+        self.save_many([(email, summary_text, summary_data, updated_at)])
+    
+    def save_many(self, summaries: List[Tuple[str, str, Optional[Dict[str, Any]], Optional[float]]]) -> int:
+        """
+        Guarda varios resúmenes en una transacción.
+        
+        Args:
+            summaries: Tuplas (email, texto, datos JSON, momento)
+            
+        Returns:
+            Resúmenes guardados
+        """
+        rows = []
+        for email, summary_text, summary_data, updated_at in summaries:
+            fields = _summary_fields(summary_text, summary_data)
+            project_info = (summary_data or {}).get('project_info', {})
+            rows.append((
+                email.strip().lower(), fields['name'], fields['company'], fields['interest'],
+                fields['technologies'], fields['complexity'],
+                int(bool(project_info.get('has_uploaded_file')) or 'subió archivo' in summary_text),
+                int(bool(fields['complexity']) or 'ANÁLISIS TÉCNICO' in summary_text),
+                summary_text, json.dumps(summary_data, ensure_ascii=False) if summary_data else None,
+                updated_at or time.time()
+            ))
+        # El id crece con cada guardado: ordenar por id es ordenar por actualización,
+        # también dentro del índice de texto completo (rowid)
+        rows.sort(key=lambda row: row[-1])
+        connection = self._get_connection()
+        with connection:
+            # Un resumen guardado sin datos JSON conserva los que ya tenía
+            for index, row in enumerate(rows):
+                if row[9] is None:
+                    previous = connection.execute(
+                        "SELECT data FROM project_summaries WHERE email = ?", (row[0],)
+                    ).fetchone()
+                    if previous is not None and previous['data']:
+                        rows[index] = row[:9] + (previous['data'],) + row[10:]
+            connection.executemany("DELETE FROM project_summaries WHERE email = ?", [(row[0],) for row in rows])
+            connection.executemany(
+                """
+                INSERT INTO project_summaries (email, name, company, interest, technologies, complexity,
+                                               has_file, has_analysis, summary, data, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                rows
+            )
+        return len(rows)
+    
+    def _to_dict(self, row: sqlite3.Row) -> Dict[str, Any]:
+        """
+        Convierte una fila en el diccionario que usan la plantilla y la API.
+        """
+        summary = {key: row[key] for key in row.keys() if key != 'data'}
+        summary['has_file'] = bool(row['has_file'])
+        summary['has_analysis'] = bool(row['has_analysis'])
+        summary['modified_date'] = datetime.fromtimestamp(row['updated_at']).strftime('%Y-%m-%d %H:%M:%S')
+        summary['json_data'] = json.loads(row['data']) if row['data'] else None
+        return summary
+    
+    def get(self, email: str) -> Optional[Dict[str, Any]]:
+        """
+        Obtiene el resumen de un cliente.
+        
+        Args:
+            email: Email del cliente (sin distinguir mayúsculas)
+            
+        Returns:
+            Resumen o None si no existe
+        """
+        row = self._get_connection().execute(
+            "SELECT * FROM project_summaries WHERE email = ?", (email.strip().lower(),)
+        ).fetchone()
+        return self._to_dict(row) if row else None
+    
+    def search(self, query: Optional[str] = None, limit: int = 50, offset: int = 0,
+               relevance: bool = False) -> Dict[str, Any]:
+        """
+        Lista los resúmenes, del más reciente al más antiguo, opcionalmente solo
+        los que contienen los términos buscados.
+        
+        Args:
+            query: Términos buscados (todos deben aparecer; cada uno vale como prefijo)
+            limit: Resúmenes por página (máximo MAX_PAGE_SIZE)
+            offset: Resúmenes que se saltan
+            relevance: Ordenar la búsqueda por relevancia (BM25, con más peso para
+                nombre, empresa, email, interés y tecnologías). Calcula la puntuación
+                de todas las coincidencias, así que es más lento con búsquedas amplias.
+            
+        Returns:
+            Diccionario con la página de resúmenes, el total que cumple la
+            búsqueda y los parámetros de paginación
+        """
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        offset = max(offset, 0)
+        connection = self._get_connection()
+        match = _fts_query(query or '')
+        
+        if not match:
+            total = connection.execute("SELECT COUNT(*) FROM project_summaries").fetchone()[0]
+            rows = connection.execute(
+                "SELECT * FROM project_summaries ORDER BY id DESC LIMIT ? OFFSET ?",
+                (limit, offset)
+            ).fetchall()
+        elif FTS5_SUPPORT:
+            total = connection.execute(
+                "SELECT COUNT(*) FROM project_summaries_fts WHERE project_summaries_fts MATCH ?", (match,)
+            ).fetchone()[0]
+            if relevance:
+                page = ("SELECT rowid, bm25(project_summaries_fts, 1.0, 4.0, 4.0, 8.0, 8.0, 8.0) AS position "
+                        "FROM project_summaries_fts WHERE project_summaries_fts MATCH ? "
+                        "ORDER BY position, rowid DESC LIMIT ? OFFSET ?")
+                order = "page.position, s.id DESC"
+            else:
+                # El rowid del índice es el id del resumen: en orden descendente la página
+                # sale del índice sin puntuar ni ordenar todas las coincidencias
+                page = ("SELECT rowid FROM project_summaries_fts WHERE project_summaries_fts MATCH ? "
+                        "ORDER BY rowid DESC LIMIT ? OFFSET ?")
+                order = "s.id DESC"
+            rows = connection.execute(
+                f"SELECT s.* FROM ({page}) page JOIN project_summaries s ON s.id = page.rowid ORDER BY {order}",
+                (match, limit, offset)
+            ).fetchall()
+        else:
+            # Sin FTS5: cada término debe aparecer en alguno de los campos
+            terms = [term for term in _QUERY_SPLIT_RE.split(query) if term]
+            condition = ' AND '.join(
+                "(summary || ' ' || COALESCE(technologies, '') || ' ' || email) LIKE ?" for _ in terms
+            )
+            params = [f"%{term}%" for term in terms]
+            total = connection.execute(
+                f"SELECT COUNT(*) FROM project_summaries WHERE {condition}", params
+            ).fetchone()[0]
+            rows = connection.execute(
+                f"SELECT * FROM project_summaries WHERE {condition} ORDER BY id DESC LIMIT ? OFFSET ?",
+                params + [limit, offset]
+            ).fetchall()
+        
+        return {
+            'summaries': [self._to_dict(row) for row in rows],
+            'total': total,
+            'limit': limit,
+            'offset': offset
+        }
+    
+    def count(self) -> int:
+        """
+        Número de resúmenes guardados.
+        """
+        return self._get_connection().execute("SELECT COUNT(*) FROM project_summaries").fetchone()[0]
+    
+    def import_files(self, data_dir: str, batch_size: int = 1000) -> int:
+        """
+        Importa los archivos client_summary_*.txt y client_summary_*.json de un directorio.
+        
+        Si un cliente tiene los dos archivos se usa el texto del .txt y los datos
+        del .json; los clientes con solo .json obtienen el texto de sus datos.
+        
+        Args:
+            data_dir: Directorio con los archivos
+            batch_size: Resúmenes por transacción
+            
+        Returns:
+            Resúmenes importados
+        """
+        # Un recorrido del directorio agrupando los archivos por cliente
+        files: Dict[str, Dict[str, str]] = {}
+        with os.scandir(data_dir) as entries:
+            for entry in entries:
+                name, extension = os.path.splitext(entry.name)
+                if name.startswith(SUMMARY_FILE_PREFIX) and extension in ('.txt', '.json'):
+                    email = name[len(SUMMARY_FILE_PREFIX):].replace('_at_', '@')
+                    files.setdefault(email, {})[extension] = entry.path
+        
+        imported = 0
+        batch = []
+        for email, paths in files.items():
+            try:
+                updated_at = max(os.path.getmtime(path) for path in paths.values())
+                summary_data = None
+                if '.json' in paths:
+                    with open(paths['.json'], 'r', encoding='utf-8') as f:
+                        summary_data = json.load(f)
+                if '.txt' in paths:
+                    with open(paths['.txt'], 'r', encoding='utf-8') as f:
+                        summary_text = f.read()
+                else:
+                    modified_date = datetime.fromtimestamp(updated_at).strftime('%Y-%m-%d %H:%M:%S')
+                    summary_text = format_summary_text(summary_data, modified_date)
+                batch.append((email, summary_text, summary_data, updated_at))
+            except Exception as e:
+                logger.warning(f"No se pudo importar el resumen de {email}: {str(e)}")
+                continue
+            if len(batch) >= batch_size:
+                imported += self.save_many(batch)
+                batch = []
+        if batch:
+            imported += self.save_many(batch)
+        return imported
+
+def get_summary_store(db_path: str, data_dir: Optional[str] = None) -> SummaryStore:
+    """
+    Obtiene el almacén de resúmenes de una base de datos, creándolo si no existe.
+    Si la base de datos es nueva se importan los archivos de resumen de data_dir.
+    
+    Args:
+        db_path: Ruta de la base de datos
+        data_dir: Directorio con los archivos client_summary_* existentes
+        
+    Returns:
+        SummaryStore compartido del proceso
+    """
+    key = os.path.abspath(db_path)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = SummaryStore(db_path)
+            if store.created and data_dir and os.path.isdir(data_dir):
+                try:
+                    logger.info(f"Importados {store.import_files(data_dir)} resúmenes de {data_dir}")
+                except Exception as e:
+                    logger.error(f"Error al importar los resúmenes de {data_dir}: {str(e)}")
+            _stores[key] = store
+        return store
+
+def main() -> int:
+    """
+    Punto de entrada de la línea de comandos.
+    
+    Returns:
+        Código de salida
+    """
+    parser = argparse.ArgumentParser(description="Almacén de resúmenes de proyecto")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    import_parser = subparsers.add_parser('import', help='Importar los archivos client_summary_*')
+    import_parser.add_argument('--data-dir', default='data', help='Directorio con los archivos')
+    import_parser.add_argument('--db', default=None, help='Base de datos (por defecto, en el directorio de datos)')
+    search_parser = subparsers.add_parser('search', help='Buscar resúmenes')
+    search_parser.add_argument('query', nargs='?', default='', help='Términos buscados')
+    search_parser.add_argument('--db', default=os.path.join('data', DEFAULT_SUMMARY_DB_FILENAME))
+    search_parser.add_argument('--limit', type=int, default=10)
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.INFO)
+    if args.command == 'import':
+        store = SummaryStore(args.db or os.path.join(args.data_dir, DEFAULT_SUMMARY_DB_FILENAME))
+        start = time.perf_counter()
+        imported = store.import_files(args.data_dir)
+        print(f"Importados {imported} resúmenes en {time.perf_counter() - start:.2f}s ({store.count()} en total)")
+    else:
+        result = SummaryStore(args.db).search(args.query, args.limit)
+        print(f"{result['total']} resúmenes")
+        for summary in result['summaries']:
+            print(f"{summary['modified_date']}  {summary['email']}  {summary['name']}  {summary['technologies']}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
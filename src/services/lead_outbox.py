@@ -0,0 +1,482 @@
+"""
+Cola de salida (outbox) de leads.
+Cada lead se confirma una sola vez en una cola local duradera (SQLite con
+synchronous=FULL) y un hilo despachador lo copia por lotes a la base de
+datos de leads, en transacciones de varias filas, y al registro JSONL.
+
+- Idempotencia: cada lead tiene un lead_key derivado de sus datos; la cola,
+  la tabla leads y el registro JSONL ignoran las claves repetidas, así que
+  reintentar un lote nunca duplica leads.
+- Reintentos: si un destino falla, los leads del lote siguen en la cola y
+  se reintentan con espera exponencial; cada destino se marca por separado.
+- Reconciliación: compara las claves de los dos destinos y, con --repair,
+  copia a cada uno lo que le falta.
+
+Desde el directorio src:
+    python -m services.lead_outbox stats
+    python -m services.lead_outbox drain
+    python -m services.lead_outbox reconcile --repair
+"""
+import os
+import sys
+import json
+import time
+import atexit
+import sqlite3
+import hashlib
+import argparse
+import datetime
+import threading
+from typing import Dict, Any, Optional, List, Tuple
+import logging
+
+from core.config import (LEADS_OUTBOX_BATCH_SIZE, LEADS_OUTBOX_INTERVAL, LEADS_OUTBOX_MAX_BACKOFF,
+                         LEADS_JSONL_FSYNC, LEADS_JSONL_FSYNC_INTERVAL, LEADS_JSONL_ROTATE_BYTES)
+from data import database
+from data.lead_log import LeadLog
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+# Nombre de la base de datos de la cola dentro del directorio de datos
+DEFAULT_OUTBOX_FILENAME = "lead_outbox.db"
+
+# Tiempo máximo de espera al vaciar la cola durante el cierre (segundos)
+DEFAULT_SHUTDOWN_TIMEOUT = 30.0
+
+# Colas compartidas del proceso (una por base de datos)
+_outboxes: Dict[str, 'LeadOutbox'] = {}
+_outboxes_lock = threading.Lock()
+
+def make_lead_key(lead: Dict[str, Any]) -> str:
+    """
+    Calcula la clave de idempotencia de un lead.
+    
+    Dos envíos con los mismos datos el mismo día (un reintento del formulario
+    o del agente) comparten clave; el mismo cliente otro día es un lead nuevo.
+    
+    Args:
+        lead: Datos del lead
+        
+    Returns:
+        Hash SHA-256 en hexadecimal
+    """
+    day = str(lead.get('timestamp') or datetime.datetime.now().isoformat())[:10]
+    fields = [str(lead.get('email', '')).strip().lower(), day]
+    fields.extend(str(lead.get(field) or '').strip() for field in ('name', 'phone', 'company', 'interest', 'message'))
+    return hashlib.sha256('\x1f'.join(fields).encode('utf-8')).hexdigest()
+
+class LeadOutbox:
+    """
+    Cola duradera de leads con un hilo que los despacha por lotes.
+    """
+    
+    def __init__(self, db_path: str, mirror: LeadLog, batch_size: int = LEADS_OUTBOX_BATCH_SIZE,
+                 interval: float = LEADS_OUTBOX_INTERVAL, max_backoff: float = LEADS_OUTBOX_MAX_BACKOFF,
+                 start: bool = True):
+        """
+        Abre la cola y, si se pide, arranca el despachador.
+        
+        Args:
+            db_path: Base de datos SQLite de la cola
+            mirror: Registro JSONL donde se copian los leads
+            batch_size: Leads por lote
+            interval: Segundos máximos entre pasadas del despachador
+            max_backoff: Espera máxima entre reintentos (segundos)
+            start: Arrancar el hilo despachador
+        """
+        self.pid = os.getpid()
+        self.db_path = db_path
+        self.mirror = mirror
+        self.batch_size = max(batch_size, 1)
+        self.interval = interval
+        self.max_backoff = max_backoff
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        self._wakeup = threading.Event()
+        self._idle = threading.Condition()
+        self._stopping = False
+        self._metrics = {
+            'enqueued': 0,
+            'duplicates': 0,
+            'batches': 0,
+            'sqlite_written': 0,
+            'mirror_written': 0,
+            'failures': 0,
+            'max_batch': 0
+        }
+        self._init_schema()
+        self._thread = None
+        if start:
+            self._thread = threading.Thread(target=self._run, name="lead-outbox", daemon=True)
+            self._thread.start()
+    
+    def _get_connection(self) -> sqlite3.Connection:
+        """
+        Obtiene la conexión del hilo actual.
+        
+        Returns:
+            Conexión a la base de datos de la cola
+        """
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.db_path, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            # Un lead aceptado debe sobrevivir a un corte de luz: fsync en cada commit
+            connection.execute("PRAGMA synchronous=FULL")
+            self._local.connection = connection
+        return connection
+    
+    def _init_schema(self) -> None:
+        """
+        Crea la tabla de la cola si no existe.
+        """
+        connection = self._get_connection()
+        with connection:
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS lead_outbox (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    lead_key TEXT NOT NULL UNIQUE,
+                    payload TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    sqlite_done INTEGER NOT NULL DEFAULT 0,
+                    mirror_done INTEGER NOT NULL DEFAULT 0,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt_at REAL NOT NULL DEFAULT 0,
+                    last_error TEXT
+                )
+            """)
+            connection.execute("CREATE INDEX IF NOT EXISTS idx_lead_outbox_next ON lead_outbox (next_attempt_at, seq)")
+    
+    def enqueue(self, lead: Dict[str, Any]) -> Tuple[str, bool]:
+        """
+        Confirma un lead en la cola (una transacción con fsync) y despierta al despachador.
+        
+        Args:
+            lead: Datos del lead
+            
+        Returns:
+            Tupla (lead_key, False si ya estaba en la cola)
+        """
+        lead = dict(lead)
+        if not lead.get('timestamp'):
+            lead['timestamp'] = datetime.datetime.now().isoformat()
+        lead_key = lead.get('lead_key') or make_lead_key(lead)
+        lead['lead_key'] = lead_key
+        connection = self._get_connection()
+        with connection:
+            inserted = connection.execute(
+                "INSERT OR IGNORE INTO lead_outbox (lead_key, payload, created_at) VALUES (?, ?, ?)",
+                (lead_key, json.dumps(lead, ensure_ascii=False), time.time())
+            ).rowcount
+        self._metrics['enqueued' if inserted else 'duplicates'] += 1
+        self._wakeup.set()
+        return lead_key, bool(inserted)
+    
+    def _run(self) -> None:
+        """
+        Bucle del despachador: vacía la cola y espera a nuevos leads o al intervalo.
+        """
+        while True:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            try:
+                while self.dispatch_once():
+                    pass
+            except Exception as e:
+                logger.error(f"Error en el despachador de leads: {str(e)}")
+            with self._idle:
+                self._idle.notify_all()
+            if self._stopping:
+                return
+    
+    def dispatch_once(self) -> int:
+        """
+        Copia un lote de leads pendientes a SQLite y al registro JSONL.
+        
+        Returns:
+            Leads del lote procesado (0 si no había ninguno listo)
+        """
+        connection = self._get_connection()
+        rows = connection.execute(
+            "SELECT seq, lead_key, payload, created_at, sqlite_done, mirror_done, attempts FROM lead_outbox "
+            "WHERE next_attempt_at <= ? ORDER BY seq LIMIT ?",
+            (time.time(), self.batch_size)
+        ).fetchall()
+        if not rows:
+            return 0
+        self._metrics['batches'] += 1
+        self._metrics['max_batch'] = max(self._metrics['max_batch'], len(rows))
+        
+        leads = {}
+        for seq, lead_key, payload, created_at, _, _, _ in rows:
+            lead = json.loads(payload)
+            lead['created_at'] = datetime.datetime.fromtimestamp(created_at, datetime.timezone.utc).replace(tzinfo=None)
+            leads[seq] = lead
+        
+        failed = {}
+        sqlite_done = self._dispatch_sqlite([leads[row[0]] for row in rows if not row[4]], failed)
+        mirror_done = self._dispatch_mirror([leads[row[0]] for row in rows if not row[5]], failed)
+        
+        with connection:
+            for seq, lead_key, _, _, was_sqlite_done, was_mirror_done, attempts in rows:
+                done_sqlite = was_sqlite_done or lead_key in sqlite_done
+                done_mirror = was_mirror_done or lead_key in mirror_done
+                if done_sqlite and done_mirror:
+                    connection.execute("DELETE FROM lead_outbox WHERE seq = ?", (seq,))
+                    continue
+                delay = min(2 ** attempts, self.max_backoff)
+                connection.execute(
+                    "UPDATE lead_outbox SET sqlite_done = ?, mirror_done = ?, attempts = attempts + 1, "
+                    "next_attempt_at = ?, last_error = ? WHERE seq = ?",
+                    (int(done_sqlite), int(done_mirror), time.time() + delay, failed.get(lead_key), seq)
+                )
+        return len(rows)
+    
+    def _dispatch_sqlite(self, leads: List[Dict[str, Any]], failed: Dict[str, str]) -> set:
+        """
+        Guarda un lote en la base de datos de leads en una transacción.
+        
+        Args:
+            leads: Leads pendientes en SQLite
+            failed: Errores por lead_key (se completa si el lote falla)
+            
+        Returns:
+            Claves que ya están en la base de datos
+        """
+        if not leads:
+            return set()
+        valid = []
+        for lead in leads:
+            if lead.get('name') and lead.get('email'):
+                valid.append(lead)
+            else:
+                # Como en SqliteRepository: sin nombre o email el lead solo se guarda en el archivo
+                logger.warning(f"Lead {lead['lead_key'][:12]} sin nombre o email, no se guarda en SQLite")
+        try:
+            self._metrics['sqlite_written'] += database.save_leads_batch(valid)
+        except Exception as e:
+            self._metrics['failures'] += 1
+            logger.warning(f"No se pudo guardar un lote de {len(valid)} leads en SQLite: {str(e)}")
+            failed.update((lead['lead_key'], f"sqlite: {str(e)}") for lead in leads)
+            return set()
+        return {lead['lead_key'] for lead in leads}
+    
+    def _dispatch_mirror(self, leads: List[Dict[str, Any]], failed: Dict[str, str]) -> set:
+        """
+        Añade un lote al registro JSONL, saltando las claves que ya contiene.
+        
+        Args:
+            leads: Leads pendientes en el registro
+            failed: Errores por lead_key (se completa si el lote falla)
+            
+        Returns:
+            Claves que ya están en el registro
+        """
+        if not leads:
+            return set()
+        try:
+            pending = []
+            for lead in leads:
+                existing = {record.get('lead_key') for record in self.mirror.find_by_email(lead.get('email') or '')}
+                if lead['lead_key'] not in existing:
+                    pending.append({key: value for key, value in lead.items() if key != 'created_at'})
+            self.mirror.append_many(pending)
+            self._metrics['mirror_written'] += len(pending)
+        except Exception as e:
+            self._metrics['failures'] += 1
+            logger.warning(f"No se pudo copiar un lote de {len(leads)} leads al registro JSONL: {str(e)}")
+            for lead in leads:
+                failed[lead['lead_key']] = (failed.get(lead['lead_key'], '') + f" mirror: {str(e)}").strip()
+            return set()
+        return {lead['lead_key'] for lead in leads}
+    
+    def pending(self, ready_only: bool = False) -> int:
+        """
+        Leads que todavía no están en los dos destinos.
+        
+        Args:
+            ready_only: Contar solo los que no están esperando un reintento
+            
+        Returns:
+            Número de leads en la cola
+        """
+        if ready_only:
+            return self._get_connection().execute(
+                "SELECT COUNT(*) FROM lead_outbox WHERE next_attempt_at <= ?", (time.time(),)
+            ).fetchone()[0]
+        return self._get_connection().execute("SELECT COUNT(*) FROM lead_outbox").fetchone()[0]
+    
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Espera a que se despachen los leads listos. Los que esperan un
+        reintento no se esperan.
+        
+        Args:
+            timeout: Segundos máximos de espera (None = sin límite)
+            
+        Returns:
+            True si la cola quedó vacía
+        """
+        if self._thread is None:
+            while self.dispatch_once():
+                pass
+            return self.pending() == 0
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.pending(ready_only=True):
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return False
+            with self._idle:
+                self._wakeup.set()
+                self._idle.wait(min(remaining or self.interval, self.interval))
+        return self.pending() == 0
+    
+    def stop(self, timeout: float = DEFAULT_SHUTDOWN_TIMEOUT) -> bool:
+        """
+        Despacha lo pendiente y detiene el hilo. Lo que no se despache sigue en
+        la cola y se envía al arrancar de nuevo.
+        
+        Args:
+            timeout: Segundos máximos de espera
+            
+        Returns:
+            True si la cola quedó vacía
+        """
+        if self.pid != os.getpid():
+            # Heredada de un fork (atexit del hijo): el despachador es del proceso padre
+            return False
+        drained = self.flush(timeout)
+        self._stopping = True
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return drained
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Estadísticas de la cola.
+        
+        Returns:
+            Contadores del despachador, leads pendientes y reintentos
+        """
+        connection = self._get_connection()
+        pending, retrying = connection.execute(
+            "SELECT COUNT(*), COALESCE(SUM(attempts > 0), 0) FROM lead_outbox"
+        ).fetchone()
+        return dict(self._metrics, pending=pending, retrying=retrying)
+    
+    def reconcile(self, repair: bool = False) -> Dict[str, Any]:
+        """
+        Comprueba que SQLite y el registro JSONL contienen los mismos leads.
+        
+        Solo se comparan los leads con lead_key (los anteriores a la cola no
+        tienen clave) y se excluyen los que siguen pendientes en la cola.
+        
+        Args:
+            repair: Copiar a cada destino los leads que le faltan
+            
+        Returns:
+            Informe con las claves que faltan en cada destino
+        """
+        queued = {row[0] for row in self._get_connection().execute("SELECT lead_key FROM lead_outbox")}
+        sqlite_keys = set(database.iter_lead_keys())
+        mirror_records = {}
+        mirror_without_key = 0
+        for record in self.mirror.iter_leads():
+            if record.get('lead_key'):
+                mirror_records[record['lead_key']] = record
+            else:
+                mirror_without_key += 1
+        missing_in_mirror = sorted(sqlite_keys - set(mirror_records) - queued)
+        missing_in_sqlite = sorted(set(mirror_records) - sqlite_keys - queued)
+        # Los leads sin nombre o email solo existen en el registro (igual que antes de la cola)
+        missing_in_sqlite = [key for key in missing_in_sqlite
+                             if mirror_records[key].get('name') and mirror_records[key].get('email')]
+        
+        report = {
+            'sqlite': len(sqlite_keys),
+            'mirror': len(mirror_records),
+            'mirror_without_key': mirror_without_key,
+            'queued': len(queued),
+            'missing_in_mirror': missing_in_mirror,
+            'missing_in_sqlite': missing_in_sqlite,
+            'consistent': not missing_in_mirror and not missing_in_sqlite,
+            'repaired': 0
+        }
+        if repair and not report['consistent']:
+            to_sqlite = []
+            for key in missing_in_sqlite:
+                record = dict(mirror_records[key])
+                record['created_at'] = (datetime.datetime.fromisoformat(record['timestamp'])
+                                        if record.get('timestamp') else None)
+                to_sqlite.append(record)
+            report['repaired'] += database.save_leads_batch(to_sqlite)
+            fields = ('name', 'email', 'phone', 'company', 'interest', 'message', 'lead_key')
+            to_mirror = [dict({field: lead[field] for field in fields}, timestamp=lead['created_at'])
+                         for lead in database.get_leads_by_keys(missing_in_mirror)]
+            self.mirror.append_many(to_mirror)
+            report['repaired'] += len(to_mirror)
+        return report
+
+def get_lead_outbox(db_path: str, mirror: LeadLog) -> LeadOutbox:
+    """
+    Obtiene la cola de salida de una base de datos, creándola si no existe (o
+    si es de otro proceso: tras un fork el hijo no tiene el hilo despachador,
+    así que abre la cola de nuevo; lo pendiente sigue en la base de datos).
+    Al crearla se registra el vaciado de la cola al terminar el proceso.
+    
+    Args:
+        db_path: Base de datos de la cola
+        mirror: Registro JSONL de leads (solo se usa al crear la cola)
+        
+    Returns:
+        LeadOutbox compartida del proceso
+    """
+    key = os.path.abspath(db_path)
+    with _outboxes_lock:
+        outbox = _outboxes.get(key)
+        if outbox is None or outbox.pid != os.getpid():
+            outbox = LeadOutbox(db_path, mirror)
+            atexit.register(outbox.stop)
+            _outboxes[key] = outbox
+            logger.info(f"Cola de salida de leads activada ({db_path}, {outbox.pending()} pendientes)")
+        return outbox
+
+def main() -> int:
+    """
+    Punto de entrada de la línea de comandos.
+    
+    Returns:
+        Código de salida (1 si la reconciliación encuentra diferencias sin reparar)
+    """
+    parser = argparse.ArgumentParser(description="Cola de salida de leads")
+    parser.add_argument('command', choices=['stats', 'drain', 'reconcile'])
+    parser.add_argument('--data-dir', default='data', help='Directorio de datos')
+    parser.add_argument('--repair', action='store_true', help='Copiar a cada destino lo que le falta')
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.INFO)
+    mirror = LeadLog(os.path.join(args.data_dir, 'leads.jsonl'), LEADS_JSONL_FSYNC, LEADS_JSONL_FSYNC_INTERVAL,
+                     LEADS_JSONL_ROTATE_BYTES)
+    outbox = LeadOutbox(os.path.join(args.data_dir, DEFAULT_OUTBOX_FILENAME), mirror, start=False)
+    if args.command == 'drain':
+        # Los leads en espera de reintento se despachan ya
+        with outbox._get_connection() as connection:
+            connection.execute("UPDATE lead_outbox SET next_attempt_at = 0")
+        outbox.flush()
+        result = outbox.get_stats()
+    elif args.command == 'reconcile':
+        result = outbox.reconcile(args.repair)
+    else:
+        result = outbox.get_stats()
+    mirror.close()
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+    if args.command == 'reconcile' and not result['consistent'] and not args.repair:
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
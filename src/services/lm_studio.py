@@ -3,12 +3,20 @@ Servicio para interactuar con LM Studio.
 """
 import os
 import json
+import contextlib
 import requests
 import traceback
-from typing import Dict, Any, Generator, List, Optional
+from typing import Dict, Any, Generator, AsyncGenerator, List, Optional
 from dotenv import load_dotenv
 from core.config import LM_STUDIO_URL, TIMEOUT, DEFAULT_TEMPERATURE, DEFAULT_MAX_TOKENS, SYSTEM_PROMPT
 
+# Cliente HTTP asíncrono (modo ASGI)
+try:
+    import httpx
+    HTTPX_SUPPORT = True
+except ImportError:
+    HTTPX_SUPPORT = False
+
 # Cargar variables de entorno
 load_dotenv()
 
@@ -17,10 +25,18 @@ class LMStudioClient:
     Cliente para comunicarse con LM Studio y generar respuestas del chatbot.
     """
     
-    def __init__(self):
+    def __init__(self, http: Optional[requests.Session] = None, async_http: Optional['httpx.AsyncClient'] = None):
         """
         Inicializa el cliente de LM Studio.
+        
+        Args:
+            http: Sesión HTTP con el pool de conexiones compartido (por defecto,
+                una conexión nueva por petición)
+            async_http: Cliente httpx con el pool de las peticiones asíncronas
+                (por defecto, uno nuevo por petición)
         """
+        self.http = http or requests
+        self.async_http = async_http
         # Construir la URL correcta
         base_url = os.getenv("LM_STUDIO_URL", "http://localhost:1234")
         # Asegurarse de que la URL tenga el formato correcto
@@ -104,6 +120,29 @@ class LMStudioClient:
             traceback.print_exc()
             yield f"Error: {str(e)}"
     
+    async def generate_stream_async(self, system_prompt: str, user_message: str) -> AsyncGenerator[str, None]:
+        """
+        Versión asíncrona de generate_stream: espera los fragmentos sin ocupar un hilo.
+        
+        Args:
+            system_prompt: Prompt del sistema que define el comportamiento del asistente
+            user_message: Mensaje del usuario
+            
+        Returns:
+            Generador asíncrono que produce la respuesta por fragmentos
+        """
+        try:
+            messages = self._prepare_messages(system_prompt, user_message)
+            async for chunk in self._send_streaming_request_async(messages):
+                yield chunk
+        except httpx.TimeoutException:
+            print("Timeout al conectar con LM Studio")
+            yield "Lo siento, se agotó el tiempo de espera al conectar con el modelo. Por favor, inténtalo de nuevo."
+        except Exception as e:
+            print(f"Error al generar respuesta streaming: {str(e)}")
+            traceback.print_exc()
+            yield f"Error: {str(e)}"
+    
     def _prepare_messages(self, system_prompt: str, user_message: str) -> List[Dict[str, str]]:
         """
         Prepara los mensajes en el formato esperado por la API.
@@ -139,7 +178,7 @@ class LMStudioClient:
             "stream": stream
         }
         
-        response = requests.post(
+        response = self.http.post(
             f"{self.api_url}/chat/completions",
             json=payload,
             headers={"Content-Type": "application/json"},
@@ -169,33 +208,88 @@ class LMStudioClient:
             "stream": True
         }
         
-        response = requests.post(
+        # La respuesta se cierra aunque el generador se abandone a medias (el cliente se
+        # desconectó): si no, la conexión queda ocupada y no vuelve al pool de la sesión
+        with self.http.post(
             f"{self.api_url}/chat/completions",
             json=payload,
             headers={"Content-Type": "application/json"},
             stream=True,
             timeout=self.timeout
-        )
-        
-        if response.status_code != 200:
-            raise Exception(f"Error en la API de LM Studio: {response.status_code}")
-        
-        # Procesar la respuesta en streaming
-        for line in response.iter_lines():
-            if line:
-                line = line.decode('utf-8')
-                if line.startswith('data: '):
-                    line = line[6:]  # Quitar 'data: '
-                    if line == '[DONE]':
+        ) as response:
+            if response.status_code != 200:
+                raise Exception(f"Error en la API de LM Studio: {response.status_code}")
+            
+            # Procesar la respuesta en streaming
+            for line in response.iter_lines():
+                if line:
+                    line = line.decode('utf-8')
+                    if line == 'data: [DONE]':
                         break
-                    try:
-                        data = json.loads(line)
-                        if 'choices' in data and len(data['choices']) > 0:
-                            delta = data['choices'][0].get('delta', {})
-                            if 'content' in delta and delta['content']:
-                                yield delta['content']
-                    except json.JSONDecodeError:
-                        continue
+                    content = self._parse_stream_line(line)
+                    if content:
+                        yield content
+    
+    async def _send_streaming_request_async(self, messages: List[Dict[str, str]]) -> AsyncGenerator[str, None]:
+        """
+        Envía una solicitud en modo streaming con el cliente httpx.
+        
+        Args:
+            messages: Lista de mensajes
+            
+        Returns:
+            Generador asíncrono que produce la respuesta por fragmentos
+        """
+        payload = {
+            "messages": messages,
+            "model": self.model,
+            "max_tokens": self.max_tokens,
+            "temperature": self.temperature,
+            "stream": True
+        }
+        
+        # Sin cliente compartido se abre uno para esta petición
+        async with contextlib.AsyncExitStack() as stack:
+            http = self.async_http or await stack.enter_async_context(httpx.AsyncClient())
+            response = await stack.enter_async_context(http.stream(
+                'POST',
+                f"{self.api_url}/chat/completions",
+                json=payload,
+                headers={"Content-Type": "application/json"},
+                timeout=self.timeout
+            ))
+            
+            if response.status_code != 200:
+                raise Exception(f"Error en la API de LM Studio: {response.status_code}")
+            
+            async for line in response.aiter_lines():
+                if line == 'data: [DONE]':
+                    break
+                content = self._parse_stream_line(line)
+                if content:
+                    yield content
+    
+    def _parse_stream_line(self, line: str) -> Optional[str]:
+        """
+        Extrae el texto de una línea de la respuesta en streaming.
+        
+        Args:
+            line: Línea SSE de la API (data: {...})
+            
+        Returns:
+            Fragmento de texto, o None si la línea no lo contiene
+        """
+        if not line.startswith('data: '):
+            return None
+        try:
+            data = json.loads(line[6:])  # Quitar 'data: '
+        except json.JSONDecodeError:
+            return None
+        if 'choices' in data and len(data['choices']) > 0:
+            delta = data['choices'][0].get('delta', {})
+            if 'content' in delta and delta['content']:
+                return delta['content']
+        return None
     
     def get_default_system_prompt(self) -> str:
         """
@@ -207,8 +301,8 @@ class LMStudioClient:
         return SYSTEM_PROMPT
 
 # Funciones auxiliares para retrocompatibilidad
-def check_lm_studio_connection():
-    """Verifica la conexión con LM Studio"""
+def check_lm_studio_connection(http=None):
+    """Verifica la conexión con LM Studio (http: sesión HTTP compartida, opcional)"""
     try:
         # Usar la misma lógica que en LMStudioClient para construir la URL
         base_url = os.getenv("LM_STUDIO_URL", "http://localhost:1234")
@@ -219,18 +313,19 @@ def check_lm_studio_connection():
             
         print(f"Verificando conexión con LM Studio en: {api_url}/models")
         
-        response = requests.get(f"{api_url}/models", timeout=3)
+        response = (http or requests).get(f"{api_url}/models", timeout=3)
         return response.status_code == 200
     except Exception as e:
         print(f"Error al verificar conexión con LM Studio: {str(e)}")
         return False
 
-def send_chat_request(message, stream=True, temperature=DEFAULT_TEMPERATURE, max_tokens=DEFAULT_MAX_TOKENS):
+def send_chat_request(message, stream=True, temperature=DEFAULT_TEMPERATURE, max_tokens=DEFAULT_MAX_TOKENS,
+                      client=None):
     """
     Envía una solicitud a LM Studio y devuelve la respuesta.
-    Función de compatibilidad con el código antiguo.
+    Función de compatibilidad con el código antiguo (client: cliente compartido, opcional).
     """
-    client = LMStudioClient()
+    client = client or LMStudioClient()
     system_prompt = client.get_default_system_prompt()
     
     if stream:
@@ -0,0 +1,307 @@
+"""
+Persistencia diferida (write-behind) fuera del camino de respuesta.
+Las escrituras de contextos, leads y resúmenes se encolan desde el generador
+SSE y las ejecuta un hilo en segundo plano, de modo que el usuario no espera
+a la E/S de disco antes del evento 'done'.
+
+Las escrituras con la misma clave (por ejemplo, el contexto de una sesión)
+se combinan mientras esperan en la cola: solo se ejecuta la más reciente.
+La cola está acotada; si se llena, quien encola espera un tiempo máximo y,
+si sigue llena, ejecuta la escritura en su propio hilo para no perderla.
+Al terminar el proceso se vacía la cola (atexit).
+
+El trabajador es del proceso que lo crea: tras un fork (p. ej. gunicorn
+--preload) el hijo no tiene su hilo, así que get_persistence_worker crea
+otro; las escrituras pendientes heredadas las completa el proceso padre.
+"""
+import os
+import copy
+import time
+import atexit
+import itertools
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Callable, Hashable
+import logging
+
+from core.config import PERSISTENCE_QUEUE_SIZE, PERSISTENCE_ENQUEUE_TIMEOUT, PERSISTENCE_WRITE_BEHIND
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+# Tiempo máximo de espera al vaciar la cola durante el cierre (segundos)
+DEFAULT_SHUTDOWN_TIMEOUT = 30.0
+
+# Instancia compartida del proceso
+_worker = None
+_worker_lock = threading.Lock()
+
+def snapshot_context(context: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Copia un contexto para persistirlo mientras la conversación sigue.
+    
+    Las listas (mensajes, historiales) solo reciben elementos nuevos, así
+    que basta con copiar la lista; el resto de valores, que pueden
+    modificarse en el sitio (estado de sentimiento, información del
+    usuario), se copian en profundidad.
+    
+    Args:
+        context: Contexto de la conversación
+        
+    Returns:
+        Copia independiente del contexto
+    """
+    return {
+        key: list(value) if isinstance(value, list) else copy.deepcopy(value)
+        for key, value in context.items()
+    }
+
+class PersistenceWorker:
+    """
+    Cola acotada de escrituras con un hilo trabajador.
+    Cada trabajo es una función con sus argumentos y una clave de
+    combinación; los trabajos se ejecutan en orden de llegada.
+    """
+    
+    def __init__(self, max_queue_size: int = PERSISTENCE_QUEUE_SIZE,
+                 enqueue_timeout: float = PERSISTENCE_ENQUEUE_TIMEOUT):
+        """
+        Inicializa el trabajador y arranca su hilo.
+        
+        Args:
+            max_queue_size: Trabajos pendientes como máximo
+            enqueue_timeout: Segundos que espera quien encola si la cola está llena
+                antes de ejecutar la escritura en su propio hilo
+        """
+        self.pid = os.getpid()
+        self.max_queue_size = max(max_queue_size, 1)
+        self.enqueue_timeout = enqueue_timeout
+        self._pending = OrderedDict()
+        self._condition = threading.Condition()
+        self._unique_keys = itertools.count()
+        self._in_flight = 0
+        self._stopping = False
+        self._metrics = {
+            'enqueued': 0,
+            'coalesced': 0,
+            'written': 0,
+            'failed': 0,
+            'inline_writes': 0,
+            'max_queue_depth': 0,
+            'blocked_seconds': 0.0,
+            'write_seconds': 0.0,
+            'max_write_ms': 0.0
+        }
+        self._thread = threading.Thread(target=self._run, name="persistence-worker", daemon=True)
+        self._thread.start()
+    
+    def enqueue(self, key: Optional[Hashable], func: Callable[..., Any], *args: Any) -> bool:
+        """
+        Encola una escritura.
+        
+        Args:
+            key: Clave de combinación; un trabajo pendiente con la misma clave
+                se sustituye por este (None = no se combina)
+            func: Función que realiza la escritura
+            *args: Argumentos de la función (deben ser copias que no cambien)
+            
+        Returns:
+            True si se encoló, False si se ejecutó en el hilo actual
+        """
+        with self._condition:
+            if key is None:
+                key = ('unique', next(self._unique_keys))
+            
+            if key in self._pending:
+                # Se conserva la posición en la cola y se sustituye el contenido
+                self._pending[key] = (func, args)
+                self._metrics['enqueued'] += 1
+                self._metrics['coalesced'] += 1
+                return True
+            
+            if len(self._pending) >= self.max_queue_size and not self._stopping:
+                start = time.perf_counter()
+                self._condition.wait_for(lambda: len(self._pending) < self.max_queue_size,
+                                         timeout=self.enqueue_timeout)
+                self._metrics['blocked_seconds'] += time.perf_counter() - start
+            
+            if len(self._pending) < self.max_queue_size and not self._stopping:
+                self._pending[key] = (func, args)
+                self._metrics['enqueued'] += 1
+                self._metrics['max_queue_depth'] = max(self._metrics['max_queue_depth'], len(self._pending))
+                self._condition.notify_all()
+                return True
+            
+            self._metrics['inline_writes'] += 1
+            stopping = self._stopping
+        
+        if stopping:
+            logger.info("Persistencia diferida detenida, escritura en el hilo actual")
+        else:
+            logger.warning(f"Cola de persistencia llena ({self.max_queue_size}), escritura en el hilo actual")
+        self._execute(func, args)
+        return False
+    
+    def _run(self) -> None:
+        """
+        Bucle del hilo trabajador.
+        """
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._pending or self._stopping)
+                if not self._pending:
+                    return
+                _, (func, args) = self._pending.popitem(last=False)
+                self._in_flight += 1
+                self._condition.notify_all()
+            
+            try:
+                self._execute(func, args)
+            finally:
+                with self._condition:
+                    self._in_flight -= 1
+                    self._condition.notify_all()
+    
+    def _execute(self, func: Callable[..., Any], args: tuple) -> None:
+        """
+        Ejecuta una escritura y registra su duración o su error.
+        
+        Args:
+            func: Función que realiza la escritura
+            args: Argumentos de la función
+        """
+        start = time.perf_counter()
+        try:
+            func(*args)
+            succeeded = True
+        except Exception as e:
+            logger.error(f"Error en escritura diferida {getattr(func, '__qualname__', func)}: {str(e)}")
+            succeeded = False
+        elapsed = time.perf_counter() - start
+        
+        with self._condition:
+            self._metrics['written' if succeeded else 'failed'] += 1
+            self._metrics['write_seconds'] += elapsed
+            self._metrics['max_write_ms'] = max(self._metrics['max_write_ms'], elapsed * 1000)
+    
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Espera a que se completen todas las escrituras pendientes.
+        
+        Args:
+            timeout: Segundos máximos de espera (None = sin límite)
+            
+        Returns:
+            True si la cola quedó vacía, False si se agotó el tiempo
+        """
+        with self._condition:
+            return self._condition.wait_for(lambda: not self._pending and self._in_flight == 0, timeout=timeout)
+    
+    def stop(self, timeout: float = DEFAULT_SHUTDOWN_TIMEOUT) -> bool:
+        """
+        Vacía la cola y detiene el hilo trabajador.
+        
+        Las escrituras encoladas después de llamar a stop se ejecutan en el
+        hilo de quien las encola.
+        
+        Args:
+            timeout: Segundos máximos de espera
+            
+        Returns:
+            True si se completaron todas las escrituras pendientes
+        """
+        if self.pid != os.getpid():
+            # Heredado de un fork (atexit del hijo): el hilo y las escrituras pendientes son del padre
+            return True
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+        self._thread.join(timeout)
+        flushed = self.flush(0)
+        if not flushed:
+            logger.error(f"Persistencia diferida detenida con {len(self._pending)} escrituras pendientes")
+        return flushed
+    
+    def get_metrics(self) -> Dict[str, Any]:
+        """
+        Obtiene las métricas de la cola.
+        
+        Returns:
+            Profundidad actual y máxima, escrituras combinadas, fallidas o
+            ejecutadas en el hilo de la petición, tiempo bloqueado al encolar
+            y duración de las escrituras
+        """
+        with self._condition:
+            metrics = dict(self._metrics)
+            metrics['queue_depth'] = len(self._pending)
+            metrics['in_flight'] = self._in_flight
+        completed = metrics['written'] + metrics['failed']
+        metrics['write_behind'] = True
+        metrics['max_queue_size'] = self.max_queue_size
+        metrics['avg_write_ms'] = round(metrics['write_seconds'] * 1000 / completed, 3) if completed else 0.0
+        metrics['blocked_seconds'] = round(metrics['blocked_seconds'], 3)
+        metrics['write_seconds'] = round(metrics['write_seconds'], 3)
+        metrics['max_write_ms'] = round(metrics['max_write_ms'], 3)
+        return metrics
+
+class InlinePersistence:
+    """
+    Ejecuta las escrituras en el hilo que las solicita (PERSISTENCE_WRITE_BEHIND=false).
+    Expone la misma interfaz que PersistenceWorker.
+    """
+    
+    def __init__(self):
+        """
+        Inicializa los contadores.
+        """
+        self.pid = os.getpid()
+        self._lock = threading.Lock()
+        self._metrics = {'written': 0, 'failed': 0}
+    
+    def enqueue(self, key: Optional[Hashable], func: Callable[..., Any], *args: Any) -> bool:
+        """Ejecuta la escritura inmediatamente"""
+        try:
+            func(*args)
+            succeeded = True
+        except Exception as e:
+            logger.error(f"Error en escritura {getattr(func, '__qualname__', func)}: {str(e)}")
+            succeeded = False
+        with self._lock:
+            self._metrics['written' if succeeded else 'failed'] += 1
+        return False
+    
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """No hay escrituras pendientes"""
+        return True
+    
+    def stop(self, timeout: float = DEFAULT_SHUTDOWN_TIMEOUT) -> bool:
+        """No hay hilo que detener"""
+        return True
+    
+    def get_metrics(self) -> Dict[str, Any]:
+        """Obtiene los contadores de escrituras"""
+        with self._lock:
+            return dict(self._metrics, queue_depth=0, write_behind=False)
+
+def get_persistence_worker():
+    """
+    Obtiene el trabajador de persistencia del proceso, creándolo si no existe
+    (o si es de otro proceso, tras un fork). Al crearlo se registra el vaciado
+    de la cola al terminar el proceso.
+    
+    Returns:
+        PersistenceWorker, o InlinePersistence si la escritura diferida está desactivada
+    """
+    global _worker
+    worker = _worker
+    if worker is not None and worker.pid == os.getpid():
+        return worker
+    with _worker_lock:
+        if _worker is None or _worker.pid != os.getpid():
+            if PERSISTENCE_WRITE_BEHIND:
+                _worker = PersistenceWorker()
+                atexit.register(_worker.stop)
+                logger.info(f"Persistencia diferida activada (cola de {_worker.max_queue_size} escrituras)")
+            else:
+                _worker = InlinePersistence()
+        return _worker
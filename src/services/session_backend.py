@@ -0,0 +1,552 @@
+"""
+Almacenes del estado de sesión compartido entre procesos.
+El estado de cada sesión web (variables de la sesión de Flask y contexto
+vivo de la conversación) se guarda en el servidor bajo su identificador, de
+modo que la cookie solo transporta ese identificador y cualquier proceso o
+nodo detrás del balanceador puede atender cualquier petición.
+
+Implementaciones:
+- memory: diccionario del proceso con caducidad y límite de claves (un único proceso)
+- redis: servidor clave-valor compatible con el protocolo RESP (Redis,
+  Valkey, KeyDB...), con un cliente mínimo sobre sockets de la biblioteca
+  estándar y un pool de conexiones
+
+Los valores se serializan como JSON compacto y se comprimen con zlib a
+partir de cierto tamaño; el primer byte indica el formato.
+"""
+import os
+import json
+import time
+import zlib
+import socket
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Dict, Any, Optional, List, Tuple, Union
+from urllib.parse import urlparse, unquote
+import logging
+
+from core.config import (
+    SESSION_BACKEND, SESSION_REDIS_URL, SESSION_REDIS_TIMEOUT, SESSION_TTL,
+    SESSION_KEY_PREFIX, SESSION_COMPRESS_MIN_BYTES, SESSION_MEMORY_MAX_ENTRIES
+)
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+# Primer byte de los valores serializados
+FORMAT_JSON = b'j'
+FORMAT_ZLIB = b'z'
+
+# Nivel de compresión zlib (rápido; los valores son pequeños)
+DEFAULT_COMPRESSION_LEVEL = 6
+
+# Conexiones inactivas que conserva el pool del cliente RESP
+DEFAULT_POOL_SIZE = 16
+
+# Instancia compartida del proceso
+_backend = None
+_backend_lock = threading.Lock()
+
+class SessionBackendError(Exception):
+    """Error de comunicación con el almacén de sesiones"""
+    pass
+
+def encode_payload(data: Dict[str, Any], compress_min_bytes: int = SESSION_COMPRESS_MIN_BYTES) -> Tuple[bytes, int]:
+    """
+    Serializa un diccionario en formato binario compacto.
+    
+    Args:
+        data: Datos de la sesión o contexto (estructuras JSON)
+        compress_min_bytes: Tamaño a partir del cual se comprime
+        
+    Returns:
+        Tupla (bytes con el formato en el primer byte, tamaño del JSON sin comprimir)
+    """
+    raw = json.dumps(data, ensure_ascii=False, separators=(',', ':'), default=str).encode('utf-8')
+    if len(raw) >= compress_min_bytes:
+        compressed = zlib.compress(raw, DEFAULT_COMPRESSION_LEVEL)
+        if len(compressed) < len(raw):
+            return FORMAT_ZLIB + compressed, len(raw)
+    return FORMAT_JSON + raw, len(raw)
+
+def decode_payload(payload: bytes) -> Dict[str, Any]:
+    """
+    Deserializa un valor creado con encode_payload.
+    
+    Args:
+        payload: Bytes almacenados
+        
+    Returns:
+        Diccionario original
+    """
+    marker, body = payload[:1], payload[1:]
+    if marker == FORMAT_ZLIB:
+        body = zlib.decompress(body)
+    elif marker != FORMAT_JSON:
+        raise ValueError(f"Formato de sesión desconocido: {marker!r}")
+    return json.loads(body.decode('utf-8'))
+
+class SessionBackend(ABC):
+    """
+    Interfaz de los almacenes de sesión.
+    Las claves se agrupan por espacio de nombres ('session' para el estado
+    de Flask, 'context' para los contextos de conversación).
+    """
+    
+    # True si el almacén es visible desde otros procesos
+    shared = False
+    
+    def __init__(self, ttl: int = SESSION_TTL, prefix: str = SESSION_KEY_PREFIX):
+        """
+        Inicializa los contadores comunes.
+        
+        Args:
+            ttl: Segundos de vida de cada valor desde su última escritura
+            prefix: Prefijo de todas las claves
+        """
+        self.pid = os.getpid()
+        self.ttl = ttl
+        self.prefix = prefix
+        self._stats_lock = threading.Lock()
+        self._stats = {'gets': 0, 'hits': 0, 'sets': 0, 'deletes': 0, 'errors': 0,
+                       'raw_bytes': 0, 'stored_bytes': 0}
+    
+    def make_key(self, namespace: str, key: str) -> str:
+        """
+        Construye la clave completa de un valor.
+        
+        Args:
+            namespace: Espacio de nombres
+            key: Identificador dentro del espacio
+            
+        Returns:
+            Clave con prefijo
+        """
+        return f"{self.prefix}{namespace}:{key}"
+    
+    def get(self, namespace: str, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Obtiene un valor.
+        
+        Args:
+            namespace: Espacio de nombres
+            key: Identificador
+            
+        Returns:
+            Diccionario almacenado o None si no existe o ha caducado
+        """
+        try:
+            payload = self._get(self.make_key(namespace, key))
+        except Exception:
+            self._count('errors')
+            raise
+        self._count('gets')
+        if payload is None:
+            return None
+        self._count('hits')
+        return decode_payload(payload)
+    
+    def set(self, namespace: str, key: str, data: Dict[str, Any], ttl: Optional[int] = None) -> None:
+        """
+        Guarda un valor (sustituye el anterior y renueva su caducidad).
+        
+        Args:
+            namespace: Espacio de nombres
+            key: Identificador
+            data: Diccionario a guardar
+            ttl: Segundos de vida (por defecto, el del almacén)
+        """
+        payload, raw_size = encode_payload(data)
+        try:
+            self._set(self.make_key(namespace, key), payload, ttl or self.ttl)
+        except Exception:
+            self._count('errors')
+            raise
+        with self._stats_lock:
+            self._stats['sets'] += 1
+            self._stats['stored_bytes'] += len(payload)
+            self._stats['raw_bytes'] += raw_size
+    
+    def delete(self, namespace: str, key: str) -> None:
+        """
+        Elimina un valor.
+        
+        Args:
+            namespace: Espacio de nombres
+            key: Identificador
+        """
+        try:
+            self._delete(self.make_key(namespace, key))
+        except Exception:
+            self._count('errors')
+            raise
+        self._count('deletes')
+    
+    def _count(self, name: str) -> None:
+        """Incrementa un contador"""
+        with self._stats_lock:
+            self._stats[name] += 1
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Devuelve las métricas del almacén.
+        
+        Returns:
+            Lecturas, aciertos, escrituras, borrados, errores y bytes
+            escritos antes y después de comprimir
+        """
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats['backend'] = self.name
+        stats['shared'] = self.shared
+        stats['compression_ratio'] = round(stats['stored_bytes'] / stats['raw_bytes'], 3) if stats['raw_bytes'] else 1.0
+        return stats
+    
+    @property
+    @abstractmethod
+    def name(self) -> str:
+        """Nombre del almacén"""
+        pass
+    
+    @abstractmethod
+    def _get(self, full_key: str) -> Optional[bytes]:
+        """Lee los bytes de una clave"""
+        pass
+    
+    @abstractmethod
+    def _set(self, full_key: str, payload: bytes, ttl: int) -> None:
+        """Escribe los bytes de una clave con caducidad"""
+        pass
+    
+    @abstractmethod
+    def _delete(self, full_key: str) -> None:
+        """Elimina una clave"""
+        pass
+    
+    def close(self) -> None:
+        """Libera los recursos del almacén"""
+        pass
+
+class MemorySessionBackend(SessionBackend):
+    """
+    Almacén en memoria del proceso.
+    Solo sirve para un único proceso; las claves caducadas se eliminan al
+    leerlas y en barridos periódicos durante las escrituras, y por encima de
+    max_entries se descartan las menos usadas recientemente (LRU).
+    """
+    
+    name = 'memory'
+    
+    # Escrituras entre barridos de claves caducadas
+    PURGE_EVERY = 1000
+    
+    def __init__(self, ttl: int = SESSION_TTL, prefix: str = SESSION_KEY_PREFIX,
+                 max_entries: int = SESSION_MEMORY_MAX_ENTRIES):
+        """
+        Inicializa el almacén.
+        
+        Args:
+            ttl: Segundos de vida de cada valor
+            prefix: Prefijo de las claves
+            max_entries: Claves que se conservan como máximo
+        """
+        super().__init__(ttl, prefix)
+        self.max_entries = max(max_entries, 1)
+        self._values = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes_since_purge = 0
+        self._evictions = 0
+    
+    def _get(self, full_key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._values.get(full_key)
+            if entry is None:
+                return None
+            if entry[1] <= time.monotonic():
+                del self._values[full_key]
+                return None
+            self._values.move_to_end(full_key)
+            return entry[0]
+    
+    def _set(self, full_key: str, payload: bytes, ttl: int) -> None:
+        with self._lock:
+            self._values[full_key] = (payload, time.monotonic() + ttl)
+            self._values.move_to_end(full_key)
+            while len(self._values) > self.max_entries:
+                self._values.popitem(last=False)
+                self._evictions += 1
+            self._writes_since_purge += 1
+            if self._writes_since_purge >= self.PURGE_EVERY:
+                self._writes_since_purge = 0
+                now = time.monotonic()
+                for key in [key for key, (_, expires) in self._values.items() if expires <= now]:
+                    del self._values[key]
+    
+    def _delete(self, full_key: str) -> None:
+        with self._lock:
+            self._values.pop(full_key, None)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        stats = super().get_stats()
+        with self._lock:
+            stats['keys'] = len(self._values)
+            stats['max_entries'] = self.max_entries
+            stats['evictions'] = self._evictions
+        return stats
+
+class RespClient:
+    """
+    Cliente mínimo del protocolo RESP2 con pool de conexiones.
+    Cada comando toma una conexión del pool, envía la petición, lee una
+    respuesta y devuelve la conexión; si la conexión falla se reintenta
+    una vez con una nueva.
+    """
+    
+    def __init__(self, url: str = SESSION_REDIS_URL, timeout: float = SESSION_REDIS_TIMEOUT,
+                 pool_size: int = DEFAULT_POOL_SIZE):
+        """
+        Inicializa el cliente (las conexiones se abren bajo demanda).
+        
+        Args:
+            url: redis://[:contraseña@]host[:puerto][/base de datos]
+            timeout: Segundos máximos de conexión y de espera de respuesta
+            pool_size: Conexiones inactivas que se conservan
+        """
+        parsed = urlparse(url)
+        if parsed.scheme not in ('redis', ''):
+            raise ValueError(f"Esquema no soportado en SESSION_REDIS_URL: {parsed.scheme}")
+        self.host = parsed.hostname or 'localhost'
+        self.port = parsed.port or 6379
+        self.password = unquote(parsed.password) if parsed.password else None
+        self.username = unquote(parsed.username) if parsed.username else None
+        self.db = int(parsed.path.lstrip('/') or 0)
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self._pool = []
+        self._pool_lock = threading.Lock()
+    
+    def _connect(self) -> tuple:
+        """
+        Abre una conexión y la autentica.
+        
+        Returns:
+            Tupla (socket, lector con búfer)
+        """
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        connection = (sock, sock.makefile('rb'))
+        try:
+            if self.password:
+                credentials = [self.username, self.password] if self.username else [self.password]
+                self._send(connection, 'AUTH', *credentials)
+            if self.db:
+                self._send(connection, 'SELECT', self.db)
+        except Exception:
+            self._close(connection)
+            raise
+        return connection
+    
+    @staticmethod
+    def _close(connection: tuple) -> None:
+        """Cierra una conexión sin propagar errores"""
+        for resource in reversed(connection):
+            try:
+                resource.close()
+            except OSError:
+                pass
+    
+    @staticmethod
+    def _pack(args: tuple) -> bytes:
+        """
+        Codifica un comando como array de cadenas RESP.
+        
+        Args:
+            args: Nombre del comando y argumentos
+            
+        Returns:
+            Bytes de la petición
+        """
+        parts = [b'*%d\r\n' % len(args)]
+        for arg in args:
+            if isinstance(arg, bytes):
+                data = arg
+            else:
+                data = str(arg).encode('utf-8')
+            parts.append(b'$%d\r\n' % len(data))
+            parts.append(data)
+            parts.append(b'\r\n')
+        return b''.join(parts)
+    
+    def _read_reply(self, reader: Any) -> Union[bytes, int, List[Any], None]:
+        """
+        Lee una respuesta RESP.
+        
+        Args:
+            reader: Lector con búfer de la conexión
+            
+        Returns:
+            Cadena (bytes), entero, lista o None
+        """
+        line = reader.readline()
+        if not line.endswith(b'\r\n'):
+            raise ConnectionError("Conexión cerrada por el servidor de sesiones")
+        kind, body = line[:1], line[1:-2]
+        if kind == b'+':
+            return body
+        if kind == b'-':
+            raise SessionBackendError(body.decode('utf-8', errors='replace'))
+        if kind == b':':
+            return int(body)
+        if kind == b'$':
+            length = int(body)
+            if length < 0:
+                return None
+            data = reader.read(length + 2)
+            if len(data) != length + 2:
+                raise ConnectionError("Respuesta incompleta del servidor de sesiones")
+            return data[:-2]
+        if kind == b'*':
+            length = int(body)
+            if length < 0:
+                return None
+            return [self._read_reply(reader) for _ in range(length)]
+        raise SessionBackendError(f"Respuesta RESP no válida: {line[:40]!r}")
+    
+    def _send(self, connection: tuple, *args: Any) -> Any:
+        """Envía un comando por una conexión y lee su respuesta"""
+        connection[0].sendall(self._pack(args))
+        return self._read_reply(connection[1])
+    
+    def execute(self, *args: Any) -> Any:
+        """
+        Ejecuta un comando.
+        
+        Args:
+            *args: Nombre del comando y argumentos
+            
+        Returns:
+            Respuesta del servidor
+        """
+        for attempt in range(2):
+            with self._pool_lock:
+                # El reintento usa siempre una conexión nueva
+                connection = self._pool.pop() if self._pool and attempt == 0 else None
+            reused = connection is not None
+            try:
+                if connection is None:
+                    connection = self._connect()
+                reply = self._send(connection, *args)
+            except SessionBackendError:
+                # Error del comando: la conexión sigue siendo válida
+                self._release(connection)
+                raise
+            except (OSError, ConnectionError) as e:
+                if connection is not None:
+                    self._close(connection)
+                # Una conexión reutilizada pudo cerrarse por inactividad
+                if reused and attempt == 0:
+                    continue
+                raise SessionBackendError(f"No se pudo contactar con {self.host}:{self.port}: {str(e)}") from e
+            self._release(connection)
+            return reply
+    
+    def _release(self, connection: tuple) -> None:
+        """Devuelve una conexión al pool o la cierra si está lleno"""
+        with self._pool_lock:
+            if len(self._pool) < self.pool_size:
+                self._pool.append(connection)
+                return
+        self._close(connection)
+    
+    def close(self) -> None:
+        """Cierra las conexiones del pool"""
+        with self._pool_lock:
+            connections, self._pool = self._pool, []
+        for connection in connections:
+            self._close(connection)
+
+class RedisSessionBackend(SessionBackend):
+    """
+    Almacén en un servidor clave-valor RESP compartido por todos los procesos.
+    """
+    
+    name = 'redis'
+    shared = True
+    
+    def __init__(self, url: str = SESSION_REDIS_URL, ttl: int = SESSION_TTL,
+                 prefix: str = SESSION_KEY_PREFIX, client: Optional[RespClient] = None):
+        """
+        Inicializa el almacén.
+        
+        Args:
+            url: URL del servidor (ver RespClient)
+            ttl: Segundos de vida de cada valor
+            prefix: Prefijo de las claves
+            client: Cliente RESP ya creado (opcional)
+        """
+        super().__init__(ttl, prefix)
+        self.client = client or RespClient(url)
+    
+    def _get(self, full_key: str) -> Optional[bytes]:
+        return self.client.execute('GET', full_key)
+    
+    def _set(self, full_key: str, payload: bytes, ttl: int) -> None:
+        self.client.execute('SET', full_key, payload, 'EX', ttl)
+    
+    def _delete(self, full_key: str) -> None:
+        self.client.execute('DEL', full_key)
+    
+    def ping(self) -> bool:
+        """
+        Comprueba la conexión con el servidor.
+        
+        Returns:
+            True si responde
+        """
+        try:
+            return self.client.execute('PING') == b'PONG'
+        except SessionBackendError as e:
+            logger.error(f"Servidor de sesiones no disponible: {str(e)}")
+            return False
+    
+    def get_stats(self) -> Dict[str, Any]:
+        stats = super().get_stats()
+        stats['server'] = f"{self.client.host}:{self.client.port}/{self.client.db}"
+        return stats
+    
+    def close(self) -> None:
+        self.client.close()
+
+def create_session_backend(backend: str = SESSION_BACKEND) -> SessionBackend:
+    """
+    Crea el almacén de sesiones configurado.
+    
+    Args:
+        backend: 'redis' para el servidor compartido; cualquier otro valor
+            ('memory', 'cookie') usa la memoria del proceso
+            
+    Returns:
+        Almacén de sesiones
+    """
+    if backend == 'redis':
+        logger.info(f"Sesiones en el servidor compartido {SESSION_REDIS_URL}")
+        return RedisSessionBackend()
+    return MemorySessionBackend()
+
+def get_session_backend() -> SessionBackend:
+    """
+    Obtiene el almacén de sesiones del proceso, creándolo si no existe (o
+    tras un fork: el hijo no comparte las conexiones del pool del padre).
+    
+    Returns:
+        Almacén de sesiones configurado en SESSION_BACKEND
+    """
+    global _backend
+    backend = _backend
+    if backend is not None and backend.pid == os.getpid():
+        return backend
+    with _backend_lock:
+        if _backend is None or _backend.pid != os.getpid():
+            _backend = create_session_backend()
+        return _backend
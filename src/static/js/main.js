@@ -15,6 +15,8 @@ let formFields = [
 
 // Añadir variables globales para nuevas funcionalidades
 let currentAgent = "GeneralAgent";
+// Reconexiones seguidas sin eventos antes de dar por perdido un stream de agentes
+const MAX_STREAM_RECONNECTS = 3;
 let recognition = null;
 let isListening = false;
 let suggestedQuestionsPool = {
@@ -45,7 +47,7 @@ let suggestedQuestionsPool = {
 };
 
 // Añadir variables globales para manejar archivos
-let uploadedFileContent = null;
+let uploadedFileHash = null;
 let uploadedFileName = null;
 let lastFileUploadTime = null;
 
@@ -150,65 +152,39 @@ function setupFileUpload() {
             // Mostrar mensaje de carga
             addUserMessage(`Subiendo archivo: ${file.name}`);
             
-            const reader = new FileReader();
+            // Enviar el archivo al servidor (PDF o TXT); solo vuelve la vista previa del texto
+            processProjectFile(file, file.type === 'application/pdf' ? '/process-pdf' : '/process-txt');
             
-            reader.onload = function(e) {
-                // Si es un PDF, enviar al servidor para procesarlo
-                if (file.type === 'application/pdf') {
-                    processPdfFile(file);
-                } else {
-                    // Si es un TXT, procesar directamente
-                    uploadedFileContent = e.target.result;
-                    uploadedFileName = file.name;
-                    lastFileUploadTime = Date.now();
-                    
-                    // Enviar el contenido del archivo al agente técnico
-                    sendFileContent(uploadedFileContent, uploadedFileName);
-                }
-                
-                // Resetear el formulario
-                document.getElementById('file-upload-form').reset();
-                fileNameDisplay.textContent = "Ningún archivo seleccionado";
-                uploadButton.disabled = true;
-            };
-            
-            reader.onerror = function() {
-                addBotMessage("❌ Error al leer el archivo. Por favor, inténtalo de nuevo.", "EngineerAgent");
-            };
-            
-            // Leer el archivo como texto
-            if (file.type === 'text/plain') {
-                reader.readAsText(file);
-            } else {
-                // Para PDFs, leer como ArrayBuffer
-                reader.readAsArrayBuffer(file);
-            }
+            // Resetear el formulario
+            document.getElementById('file-upload-form').reset();
+            fileNameDisplay.textContent = "Ningún archivo seleccionado";
+            uploadButton.disabled = true;
         }
     });
 }
 
-// Función para procesar archivos PDF
-function processPdfFile(file) {
+// Función para procesar archivos de proyecto (el texto se queda en el servidor, identificado por su hash)
+function processProjectFile(file, url) {
     // Crear un FormData para enviar el archivo
     const formData = new FormData();
     formData.append('file', file);
     
     // Enviar el archivo al servidor
-    fetch('/process-pdf', {
+    fetch(url, {
         method: 'POST',
         body: formData
     })
     .then(response => response.json())
     .then(data => {
         if (data.success) {
-            uploadedFileContent = data.text;
+            uploadedFileHash = data.hash;
             uploadedFileName = file.name;
             lastFileUploadTime = Date.now();
             
-            // Enviar el contenido del archivo al agente técnico
-            sendFileContent(uploadedFileContent, uploadedFileName);
+            // Pedir el análisis al agente técnico
+            sendFileContent(data.preview, uploadedFileName, data.truncated);
         } else {
-            addBotMessage(`❌ Error al procesar el PDF: ${data.error}`, "EngineerAgent");
+            addBotMessage(`❌ Error al procesar el archivo: ${data.error}`, "EngineerAgent");
         }
     })
     .catch(error => {
@@ -217,10 +193,10 @@ function processPdfFile(file) {
     });
 }
 
-// Función para enviar el contenido del archivo al agente técnico
-function sendFileContent(content, filename) {
-    // Limitar a los primeros 2000 caracteres para la visualización
-    const previewContent = content.length > 2000 ? content.substring(0, 2000) + "... [contenido truncado]" : content;
+// Función para pedir al agente técnico el análisis del archivo subido
+function sendFileContent(preview, filename, truncated) {
+    // El servidor solo devuelve los primeros caracteres para la visualización
+    const previewContent = truncated ? preview + "... [contenido truncado]" : preview;
     
     // Mostrar vista previa del archivo
     addBotMessage(`📄 Archivo recibido: **${filename}**\n\n` +
@@ -228,8 +204,8 @@ function sendFileContent(content, filename) {
                  "```\n" + previewContent + "\n```\n\n" +
                  "Procesando el archivo para hacer una estimación detallada...", "EngineerAgent");
     
-    // Enviar el contenido al agente para análisis
-    const message = `ANALYSIS_REQUEST: Archivo de proyecto '${filename}' cargado con el siguiente contenido:\n\n${content}`;
+    // Pedir el análisis: el servidor ya tiene el documento en la sesión (por su hash)
+    const message = `ANALYSIS_REQUEST: Archivo de proyecto '${filename}' cargado.`;
     sendMessage(message, true); // true para ocultar el mensaje del usuario
 }
 
@@ -606,8 +582,10 @@ function sendMessage(customMessage = null, hidden = false) {
     // Usar streaming para la respuesta
     const eventSource = new EventSource(streamUrl);
     let fullResponse = '';
+    let reconnects = 0;
     
     eventSource.onmessage = function(event) {
+        reconnects = 0;
         const data = JSON.parse(event.data);
         
         if (data.done) {
@@ -728,6 +706,13 @@ function sendMessage(customMessage = null, hidden = false) {
     };
     
     eventSource.onerror = function() {
+        // En modo agentes el navegador reconecta con Last-Event-ID y el servidor
+        // continúa la misma respuesta, sin volver a enviar el mensaje
+        if (useAgents && eventSource.readyState === EventSource.CONNECTING && reconnects < MAX_STREAM_RECONNECTS) {
+            reconnects++;
+            document.getElementById('status').textContent = 'Reconectando...';
+            return;
+        }
         eventSource.close();
         removeTypingIndicator();
         document.getElementById('thinking').style.display = 'none';
@@ -990,8 +975,10 @@ function sendChatRequest(message) {
     // Usar streaming para la respuesta
     const eventSource = new EventSource(streamUrl);
     let fullResponse = '';
+    let reconnects = 0;
     
     eventSource.onmessage = function(event) {
+        reconnects = 0;
         const data = JSON.parse(event.data);
         
         if (data.done) {
@@ -1051,6 +1038,13 @@ function sendChatRequest(message) {
     };
     
     eventSource.onerror = function() {
+        // En modo agentes el navegador reconecta con Last-Event-ID y el servidor
+        // continúa la misma respuesta, sin volver a enviar el mensaje
+        if (useAgents && eventSource.readyState === EventSource.CONNECTING && reconnects < MAX_STREAM_RECONNECTS) {
+            reconnects++;
+            document.getElementById('status').textContent = 'Reconectando...';
+            return;
+        }
         eventSource.close();
         if (messageContent.textContent === '') {
             messageContent.textContent = 'Error: No se pudo conectar con el servidor.';
@@ -0,0 +1,646 @@
+"""
+Mantenimiento del almacén de contextos de conversación.
+Sin mantenimiento el almacén crece indefinidamente: una instantánea por
+sesión y arranque del proceso en SQLite (o por guardado con el diario
+desactivado) y un archivo JSON con sangría por turno en el almacén JSON.
+
+Cada pasada aplica, con la E/S limitada a un número de bytes por segundo:
+
+1. Diccionario: entrena un diccionario de compresión con las instantáneas
+   más recientes (forma típica de los contextos) si no hay uno reciente.
+2. Retención: conserva las últimas N instantáneas de cada sesión; las
+   anteriores, y las sesiones completas sin guardados desde hace X días,
+   se agrupan por sesión en el archivo comprimido. Las cargas de un
+   usuario sin instantáneas vivas recurren al archivo.
+3. Compresión: las instantáneas sin guardados recientes se comprimen con
+   el diccionario, integrando antes su diario de deltas.
+
+Cada pasada devuelve un informe con el espacio recuperado y el impacto en
+el tiempo de carga (decodificar el JSON frente a descomprimir y decodificar).
+
+Ejecución manual (desde el directorio src):
+    python -m utils.context_maintenance --storage-dir storage/contexts --vacuum
+"""
+import os
+import sys
+import gzip
+import json
+import time
+import atexit
+import argparse
+import threading
+from typing import Dict, Any, Optional, Tuple
+import logging
+
+from core.config import (
+    CONTEXT_STORE_BACKEND, CONTEXT_DB_PATH, CONTEXT_COMPRESSION_CODEC, CONTEXT_COMPRESS_IDLE_SECONDS,
+    CONTEXT_DICTIONARY_SIZE, CONTEXT_RETENTION_KEEP, CONTEXT_ARCHIVE_AFTER_DAYS,
+    CONTEXT_MAINTENANCE_INTERVAL, CONTEXT_MAINTENANCE_MAX_BYTES_PER_SEC
+)
+from utils.context_store import (
+    ContextStore, SqliteContextStore, JsonFileContextStore, create_context_store,
+    apply_context_delta, parse_snapshot_filename, _dumps
+)
+from utils.snapshot_codec import CODEC_ZLIB, resolve_codec, train_dictionary
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+# Instantáneas que se leen para entrenar el diccionario
+DEFAULT_DICTIONARY_SAMPLES = 100
+
+# Muestras mínimas para entrenar un diccionario útil
+MIN_DICTIONARY_SAMPLES = 10
+
+# Antigüedad a partir de la cual se vuelve a entrenar el diccionario (segundos)
+DICTIONARY_MAX_AGE = 7 * 24 * 60 * 60
+
+# Instantáneas que se procesan por consulta
+DEFAULT_BATCH_SIZE = 100
+
+# Trabajadores en segundo plano por almacén (ruta de la base de datos o directorio)
+_workers = {}
+_workers_lock = threading.Lock()
+
+class _ConcurrentUpdate(Exception):
+    """Una instantánea cambió mientras se procesaba; se deshace su transacción"""
+    pass
+
+class IoThrottle:
+    """
+    Limita el ritmo de E/S del mantenimiento: tras cada operación espera lo
+    necesario para que el total de bytes leídos y escritos no supere el
+    límite por segundo desde el inicio de la pasada.
+    """
+    
+    def __init__(self, max_bytes_per_second: int, stop_event: Optional[threading.Event] = None):
+        """
+        Inicializa el limitador.
+        
+        Args:
+            max_bytes_per_second: Bytes por segundo permitidos (0 = sin límite)
+            stop_event: Evento que interrumpe las esperas al detener el proceso
+        """
+        self.max_bytes_per_second = max_bytes_per_second
+        self.stop_event = stop_event
+        self.start = time.monotonic()
+        self.bytes = 0
+        self.slept = 0.0
+    
+    def consume(self, nbytes: int) -> None:
+        """
+        Registra bytes procesados y espera si se supera el ritmo permitido.
+        
+        Args:
+            nbytes: Bytes leídos o escritos
+        """
+        self.bytes += nbytes
+        if self.max_bytes_per_second <= 0:
+            return
+        delay = self.bytes / self.max_bytes_per_second - (time.monotonic() - self.start)
+        if delay > 0:
+            if self.stop_event is not None:
+                self.stop_event.wait(delay)
+            else:
+                time.sleep(delay)
+            self.slept += delay
+
+def _new_report() -> Dict[str, Any]:
+    """Crea el informe vacío de una pasada"""
+    return {
+        'snapshots_archived': 0,
+        'sessions_archived': 0,
+        'snapshots_compressed': 0,
+        'skipped_concurrent': 0,
+        'dictionary_trained': False,
+        'bytes_before': 0,
+        'bytes_after': 0,
+        'bytes_reclaimed': 0,
+        'load_ms_uncompressed': 0.0,
+        'load_ms_compressed': 0.0,
+        'io_bytes': 0,
+        'throttled_seconds': 0.0,
+        'elapsed_seconds': 0.0
+    }
+
+class SqliteContextMaintenance:
+    """
+    Mantenimiento de un SqliteContextStore: diccionario, retención y compresión.
+    """
+    
+    def __init__(self, store: SqliteContextStore, codec: str = CONTEXT_COMPRESSION_CODEC,
+                 keep: int = CONTEXT_RETENTION_KEEP, archive_after_days: float = CONTEXT_ARCHIVE_AFTER_DAYS,
+                 compress_idle_seconds: int = CONTEXT_COMPRESS_IDLE_SECONDS,
+                 max_bytes_per_second: int = CONTEXT_MAINTENANCE_MAX_BYTES_PER_SEC,
+                 dictionary_size: int = CONTEXT_DICTIONARY_SIZE, batch_size: int = DEFAULT_BATCH_SIZE):
+        """
+        Inicializa el mantenimiento.
+        
+        Args:
+            store: Almacén SQLite
+            codec: Códec configurado ('auto', 'zstd', 'zlib' o 'none')
+            keep: Instantáneas por sesión que se conservan (mínimo 1)
+            archive_after_days: Días sin guardados tras los que se archiva la sesión completa
+            compress_idle_seconds: Segundos sin guardados tras los que se comprime una instantánea
+            max_bytes_per_second: Límite de E/S (0 = sin límite)
+            dictionary_size: Tamaño máximo del diccionario entrenado
+            batch_size: Instantáneas por consulta
+        """
+        self.store = store
+        self.codec = resolve_codec(codec)
+        self.keep = max(keep, 1)
+        self.archive_after_days = archive_after_days
+        self.compress_idle_seconds = compress_idle_seconds
+        self.max_bytes_per_second = max_bytes_per_second
+        self.dictionary_size = dictionary_size
+        self.batch_size = batch_size
+    
+    def measure_storage(self) -> int:
+        """
+        Mide los bytes de datos del almacén (instantáneas, diario y archivo).
+        
+        Returns:
+            Bytes ocupados por los contenidos
+        """
+        connection = self.store._get_connection()
+        total = 0
+        for table, column in (('context_snapshots', 'data'), ('context_journal', 'delta'),
+                              ('context_archive', 'data')):
+            total += connection.execute(
+                f"SELECT COALESCE(SUM(LENGTH(CAST({column} AS BLOB))), 0) FROM {table}"
+            ).fetchone()[0]
+        return total
+    
+    def run(self, stop_event: Optional[threading.Event] = None) -> Dict[str, Any]:
+        """
+        Ejecuta una pasada completa de mantenimiento.
+        
+        Args:
+            stop_event: Evento que interrumpe la pasada al detener el proceso
+            
+        Returns:
+            Informe de la pasada
+        """
+        start = time.perf_counter()
+        report = _new_report()
+        throttle = IoThrottle(self.max_bytes_per_second, stop_event)
+        report['bytes_before'] = self.measure_storage()
+        
+        dict_id = self._ensure_dictionary(report, throttle) if self.codec else None
+        self._apply_retention(report, throttle, dict_id, stop_event)
+        if self.codec:
+            self._compress_idle(report, throttle, dict_id, stop_event)
+        
+        report['bytes_after'] = self.measure_storage()
+        report['bytes_reclaimed'] = report['bytes_before'] - report['bytes_after']
+        report['io_bytes'] = throttle.bytes
+        report['throttled_seconds'] = round(throttle.slept, 3)
+        report['elapsed_seconds'] = round(time.perf_counter() - start, 3)
+        return report
+    
+    def _ensure_dictionary(self, report: Dict[str, Any], throttle: IoThrottle) -> Optional[int]:
+        """
+        Devuelve el diccionario vigente del códec, entrenando uno nuevo con las
+        instantáneas más recientes si no existe o es antiguo.
+        
+        Args:
+            report: Informe de la pasada (se actualiza)
+            throttle: Limitador de E/S
+            
+        Returns:
+            Identificador del diccionario o None si aún no hay muestras suficientes
+        """
+        connection = self.store._get_connection()
+        current = connection.execute(
+            "SELECT id, created_at FROM context_dictionaries WHERE codec = ? ORDER BY id DESC LIMIT 1",
+            (self.codec,)
+        ).fetchone()
+        if current is not None and time.time() - current[1] < DICTIONARY_MAX_AGE:
+            return current[0]
+        
+        samples = []
+        rows = connection.execute(
+            "SELECT id, data, codec, dict_id FROM context_snapshots ORDER BY saved_at DESC LIMIT ?",
+            (DEFAULT_DICTIONARY_SAMPLES,)
+        ).fetchall()
+        for row in rows:
+            sample = _dumps(self.store._reconstruct(connection, *row)).encode('utf-8')
+            throttle.consume(len(sample))
+            samples.append(sample)
+        if len(samples) < MIN_DICTIONARY_SAMPLES:
+            return current[0] if current else None
+        
+        dictionary = train_dictionary(self.codec, samples, self.dictionary_size)
+        with connection:
+            cursor = connection.execute(
+                "INSERT INTO context_dictionaries (codec, data, sample_count, created_at) VALUES (?, ?, ?, ?)",
+                (self.codec, dictionary, len(samples), time.time())
+            )
+        report['dictionary_trained'] = True
+        report['dictionary_bytes'] = len(dictionary)
+        logger.info(f"Diccionario {self.codec} de {len(dictionary)} bytes entrenado con {len(samples)} instantáneas")
+        return cursor.lastrowid
+    
+    def _apply_retention(self, report: Dict[str, Any], throttle: IoThrottle, dict_id: Optional[int],
+                         stop_event: Optional[threading.Event]) -> None:
+        """
+        Mueve al archivo las instantáneas que exceden la retención.
+        
+        Args:
+            report: Informe de la pasada (se actualiza)
+            throttle: Limitador de E/S
+            dict_id: Diccionario vigente
+            stop_event: Evento de parada
+        """
+        connection = self.store._get_connection()
+        cutoff = time.time() - self.archive_after_days * 24 * 60 * 60
+        groups = connection.execute(
+            "SELECT user_id, session_id, MAX(saved_at) FROM context_snapshots GROUP BY user_id, session_id "
+            "HAVING COUNT(*) > ? OR MAX(saved_at) < ?",
+            (self.keep, cutoff)
+        ).fetchall()
+        archive_codec = self.store.get_codec(self.codec or CODEC_ZLIB, dict_id if self.codec else None)
+        
+        for user_id, session_id, last_saved_at in groups:
+            if stop_event is not None and stop_event.is_set():
+                return
+            rows = connection.execute(
+                "SELECT id, snapshot_id, saved_at, data, codec, dict_id FROM context_snapshots "
+                "WHERE user_id = ? AND session_id IS ? ORDER BY saved_at DESC, id DESC",
+                (user_id, session_id)
+            ).fetchall()
+            whole_session = last_saved_at < cutoff
+            retired = rows if whole_session else rows[self.keep:]
+            if not retired:
+                continue
+            
+            records = []
+            read_bytes = 0
+            for rowid, snapshot_id, saved_at, data, codec, row_dict_id in retired:
+                read_bytes += len(data)
+                context = self.store._reconstruct(connection, rowid, data, codec, row_dict_id)
+                records.append({'snapshot_id': snapshot_id, 'saved_at': saved_at, 'context': context})
+            payload = archive_codec.compress(_dumps(records).encode('utf-8'))
+            
+            try:
+                with connection:
+                    connection.execute(
+                        "INSERT INTO context_archive (user_id, session_id, archived_at, first_saved_at, "
+                        "last_saved_at, snapshot_count, codec, dict_id, data) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        (user_id, session_id, time.time(), retired[-1][2], retired[0][2], len(retired),
+                         archive_codec.codec, dict_id if self.codec else None, payload)
+                    )
+                    for rowid, _, saved_at, _, _, _ in retired:
+                        connection.execute("DELETE FROM context_journal WHERE snapshot_rowid = ?", (rowid,))
+                        cursor = connection.execute(
+                            "DELETE FROM context_snapshots WHERE id = ? AND saved_at = ?", (rowid, saved_at)
+                        )
+                        if cursor.rowcount == 0:
+                            raise _ConcurrentUpdate()
+            except _ConcurrentUpdate:
+                report['skipped_concurrent'] += 1
+                continue
+            
+            self.store.forget_snapshots(row[0] for row in retired)
+            report['snapshots_archived'] += len(retired)
+            report['sessions_archived'] += 1 if whole_session else 0
+            throttle.consume(read_bytes + len(payload))
+    
+    def _compress_idle(self, report: Dict[str, Any], throttle: IoThrottle, dict_id: Optional[int],
+                       stop_event: Optional[threading.Event]) -> None:
+        """
+        Comprime las instantáneas sin guardados recientes integrando su diario.
+        
+        Args:
+            report: Informe de la pasada (se actualiza)
+            throttle: Limitador de E/S
+            dict_id: Diccionario vigente
+            stop_event: Evento de parada
+        """
+        connection = self.store._get_connection()
+        codec = self.store.get_codec(self.codec, dict_id)
+        threshold = time.time() - self.compress_idle_seconds
+        uncompressed_seconds = 0.0
+        compressed_seconds = 0.0
+        last_id = 0
+        
+        while stop_event is None or not stop_event.is_set():
+            rows = connection.execute(
+                "SELECT id, saved_at, data FROM context_snapshots WHERE codec IS NULL AND saved_at < ? AND id > ? "
+                "ORDER BY id LIMIT ?",
+                (threshold, last_id, self.batch_size)
+            ).fetchall()
+            if not rows:
+                break
+            
+            for rowid, saved_at, data in rows:
+                last_id = rowid
+                journal = connection.execute(
+                    "SELECT id, delta FROM context_journal WHERE snapshot_rowid = ? ORDER BY id", (rowid,)
+                ).fetchall()
+                
+                load_start = time.perf_counter()
+                context = json.loads(data)
+                for _, delta in journal:
+                    apply_context_delta(context, json.loads(delta))
+                uncompressed_seconds += time.perf_counter() - load_start
+                
+                compressed = codec.compress(_dumps(context).encode('utf-8'))
+                load_start = time.perf_counter()
+                json.loads(codec.decompress(compressed))
+                compressed_seconds += time.perf_counter() - load_start
+                
+                with connection:
+                    cursor = connection.execute(
+                        "UPDATE context_snapshots SET data = ?, codec = ?, dict_id = ? "
+                        "WHERE id = ? AND saved_at = ? AND codec IS NULL",
+                        (compressed, codec.codec, dict_id, rowid, saved_at)
+                    )
+                    if cursor.rowcount == 0:
+                        # Se guardó durante la compresión; se comprimirá en otra pasada
+                        report['skipped_concurrent'] += 1
+                        continue
+                    if journal:
+                        # Solo se borran los deltas integrados; los posteriores siguen aplicándose
+                        connection.execute(
+                            "DELETE FROM context_journal WHERE snapshot_rowid = ? AND id <= ?",
+                            (rowid, journal[-1][0])
+                        )
+                report['snapshots_compressed'] += 1
+                throttle.consume(len(data) + sum(len(delta) for _, delta in journal) + len(compressed))
+        
+        if report['snapshots_compressed']:
+            report['load_ms_uncompressed'] = round(uncompressed_seconds * 1000 / report['snapshots_compressed'], 3)
+            report['load_ms_compressed'] = round(compressed_seconds * 1000 / report['snapshots_compressed'], 3)
+    
+    def vacuum(self) -> Tuple[int, int]:
+        """
+        Reconstruye el archivo de la base de datos para devolver al sistema
+        el espacio liberado (bloquea el almacén mientras dura).
+        
+        Returns:
+            Tupla (bytes del archivo antes, bytes después)
+        """
+        before = _database_file_size(self.store.db_path)
+        connection = self.store._get_connection()
+        connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        connection.execute("VACUUM")
+        connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        return before, _database_file_size(self.store.db_path)
+
+class JsonContextMaintenance:
+    """
+    Mantenimiento de un JsonFileContextStore: retención por usuario.
+    Los nombres de archivo no incluyen la sesión, así que las instantáneas
+    se agrupan por usuario; las retiradas se añaden al archivo JSONL
+    comprimido con gzip del usuario (ver JsonFileContextStore.get_archive_path).
+    """
+    
+    def __init__(self, store: JsonFileContextStore, keep: int = CONTEXT_RETENTION_KEEP,
+                 archive_after_days: float = CONTEXT_ARCHIVE_AFTER_DAYS,
+                 max_bytes_per_second: int = CONTEXT_MAINTENANCE_MAX_BYTES_PER_SEC):
+        """
+        Inicializa el mantenimiento.
+        
+        Args:
+            store: Almacén de archivos JSON
+            keep: Archivos por usuario que se conservan (mínimo 1)
+            archive_after_days: Días sin guardados tras los que se archiva el usuario completo
+            max_bytes_per_second: Límite de E/S (0 = sin límite)
+        """
+        self.store = store
+        self.keep = max(keep, 1)
+        self.archive_after_days = archive_after_days
+        self.max_bytes_per_second = max_bytes_per_second
+    
+    def measure_storage(self) -> int:
+        """
+        Mide los bytes de los archivos de contexto y de los archivos de instantáneas.
+        
+        Returns:
+            Bytes ocupados
+        """
+        total = 0
+        for directory in (self.store.storage_dir, os.path.dirname(self.store.get_archive_path(''))):
+            if not os.path.isdir(directory):
+                continue
+            with os.scandir(directory) as entries:
+                total += sum(entry.stat().st_size for entry in entries if entry.is_file())
+        return total
+    
+    def run(self, stop_event: Optional[threading.Event] = None) -> Dict[str, Any]:
+        """
+        Ejecuta una pasada de retención.
+        
+        Args:
+            stop_event: Evento que interrumpe la pasada al detener el proceso
+            
+        Returns:
+            Informe de la pasada
+        """
+        start = time.perf_counter()
+        report = _new_report()
+        throttle = IoThrottle(self.max_bytes_per_second, stop_event)
+        report['bytes_before'] = self.measure_storage()
+        cutoff = time.time() - self.archive_after_days * 24 * 60 * 60
+        
+        by_user = {}
+        with os.scandir(self.store.storage_dir) as entries:
+            for entry in entries:
+                parsed = parse_snapshot_filename(entry.name)
+                if parsed and entry.is_file():
+                    by_user.setdefault(parsed[0], []).append((parsed[1], entry.name, entry.path))
+        
+        for user_id, files in by_user.items():
+            if stop_event is not None and stop_event.is_set():
+                break
+            files.sort(reverse=True)
+            whole_user = files[0][0] < cutoff
+            retired = files if whole_user else files[self.keep:]
+            if not retired:
+                continue
+            
+            archive_path = self.store.get_archive_path(user_id)
+            os.makedirs(os.path.dirname(archive_path), exist_ok=True)
+            read_bytes = 0
+            archived = []
+            # Cada pasada añade un miembro gzip; gzip.open lee todos los miembros seguidos
+            with gzip.open(archive_path, 'at', encoding='utf-8') as archive:
+                for timestamp, filename, file_path in sorted(retired):
+                    try:
+                        with open(file_path, 'r', encoding='utf-8') as f:
+                            context = json.load(f)
+                    except Exception as e:
+                        logger.warning(f"Contexto ilegible {file_path}: {str(e)}")
+                        continue
+                    read_bytes += os.path.getsize(file_path)
+                    archive.write(_dumps({'snapshot_id': filename, 'saved_at': timestamp, 'context': context}) + '\n')
+                    archived.append(file_path)
+            # Los archivos solo se eliminan cuando el archivo gzip está cerrado
+            for file_path in archived:
+                os.remove(file_path)
+            
+            report['snapshots_archived'] += len(archived)
+            report['sessions_archived'] += 1 if whole_user else 0
+            throttle.consume(read_bytes)
+        
+        report['bytes_after'] = self.measure_storage()
+        report['bytes_reclaimed'] = report['bytes_before'] - report['bytes_after']
+        report['io_bytes'] = throttle.bytes
+        report['throttled_seconds'] = round(throttle.slept, 3)
+        report['elapsed_seconds'] = round(time.perf_counter() - start, 3)
+        return report
+
+def _database_file_size(db_path: str) -> int:
+    """Tamaño en disco de la base de datos y su WAL"""
+    return sum(os.path.getsize(path) for path in (db_path, db_path + '-wal') if os.path.exists(path))
+
+def create_maintenance(store: ContextStore):
+    """
+    Crea el mantenimiento adecuado para un almacén.
+    
+    Args:
+        store: Almacén de contextos
+        
+    Returns:
+        SqliteContextMaintenance o JsonContextMaintenance
+    """
+    if isinstance(store, SqliteContextStore):
+        return SqliteContextMaintenance(store)
+    if isinstance(store, JsonFileContextStore):
+        return JsonContextMaintenance(store)
+    raise TypeError(f"Almacén de contextos sin mantenimiento: {type(store).__name__}")
+
+def format_report(report: Dict[str, Any]) -> str:
+    """
+    Resume un informe de mantenimiento en una línea.
+    
+    Args:
+        report: Informe devuelto por run()
+        
+    Returns:
+        Texto del resumen
+    """
+    summary = (f"{report['snapshots_archived']} instantáneas archivadas ({report['sessions_archived']} sesiones), "
+               f"{report['snapshots_compressed']} comprimidas, "
+               f"{report['bytes_reclaimed'] / 1e6:.2f} MB recuperados "
+               f"({report['bytes_before'] / 1e6:.2f} -> {report['bytes_after'] / 1e6:.2f} MB)")
+    if report['snapshots_compressed']:
+        summary += (f", carga {report['load_ms_uncompressed']:.2f} -> {report['load_ms_compressed']:.2f} ms "
+                    f"por instantánea")
+    return summary + f", {report['elapsed_seconds']:.1f}s ({report['throttled_seconds']:.1f}s de espera por el límite de E/S)"
+
+class ContextMaintenanceWorker:
+    """
+    Hilo que ejecuta el mantenimiento de un almacén periódicamente.
+    La primera pasada se ejecuta tras un intervalo completo, para no
+    añadir E/S al arranque del proceso.
+    """
+    
+    def __init__(self, maintenance: Any, interval: int):
+        """
+        Inicializa el trabajador y arranca su hilo.
+        
+        Args:
+            maintenance: SqliteContextMaintenance o JsonContextMaintenance
+            interval: Segundos entre pasadas
+        """
+        self.pid = os.getpid()
+        self.maintenance = maintenance
+        self.interval = interval
+        self.last_report = None
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="context-maintenance", daemon=True)
+        self._thread.start()
+    
+    def _run(self) -> None:
+        """Bucle del hilo"""
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.last_report = self.maintenance.run(self._stop_event)
+                logger.info(f"Mantenimiento de contextos: {format_report(self.last_report)}")
+            except Exception as e:
+                logger.error(f"Error en el mantenimiento de contextos: {str(e)}")
+    
+    def stop(self, timeout: float = 5.0) -> None:
+        """
+        Detiene el hilo (interrumpe la pasada en curso entre dos instantáneas).
+        
+        Args:
+            timeout: Segundos máximos de espera
+        """
+        if self.pid != os.getpid():
+            # Heredado de un fork (atexit del hijo): el hilo es del proceso padre
+            return
+        self._stop_event.set()
+        self._thread.join(timeout)
+
+def start_context_maintenance(store: ContextStore,
+                              interval: int = CONTEXT_MAINTENANCE_INTERVAL) -> Optional[ContextMaintenanceWorker]:
+    """
+    Arranca el mantenimiento en segundo plano de un almacén, una sola vez por
+    base de datos o directorio aunque varios gestores compartan el almacén
+    (y de nuevo en el hijo de un fork, que no hereda el hilo).
+    
+    Args:
+        store: Almacén de contextos
+        interval: Segundos entre pasadas (0 = desactivado)
+        
+    Returns:
+        Trabajador del almacén o None si el mantenimiento está desactivado
+    """
+    if interval <= 0:
+        return None
+    location = store.db_path if isinstance(store, SqliteContextStore) else getattr(store, 'storage_dir', None)
+    if location is None:
+        return None
+    key = os.path.abspath(location)
+    with _workers_lock:
+        worker = _workers.get(key)
+        if worker is None or worker.pid != os.getpid():
+            worker = ContextMaintenanceWorker(create_maintenance(store), interval)
+            atexit.register(worker.stop)
+            _workers[key] = worker
+        return worker
+
+def main() -> int:
+    """
+    Punto de entrada de la línea de comandos.
+    
+    Returns:
+        Código de salida
+    """
+    parser = argparse.ArgumentParser(description="Mantenimiento del almacén de contextos")
+    parser.add_argument('--storage-dir', default='storage/contexts', help='Directorio de contextos')
+    parser.add_argument('--backend', default=CONTEXT_STORE_BACKEND, choices=['sqlite', 'json'],
+                        help='Tipo de almacén')
+    parser.add_argument('--db', default=CONTEXT_DB_PATH or None, help='Base de datos SQLite')
+    parser.add_argument('--keep', type=int, default=CONTEXT_RETENTION_KEEP, help='Instantáneas por sesión')
+    parser.add_argument('--archive-after-days', type=float, default=CONTEXT_ARCHIVE_AFTER_DAYS,
+                        help='Días sin guardados para archivar una sesión completa')
+    parser.add_argument('--idle-seconds', type=int, default=CONTEXT_COMPRESS_IDLE_SECONDS,
+                        help='Segundos sin guardados para comprimir una instantánea')
+    parser.add_argument('--max-mb-per-second', type=float, default=CONTEXT_MAINTENANCE_MAX_BYTES_PER_SEC / 1e6,
+                        help='Límite de E/S en MB/s (0 = sin límite)')
+    parser.add_argument('--vacuum', action='store_true', help='Compactar el archivo SQLite al terminar')
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.INFO)
+    store = create_context_store(args.backend, args.storage_dir, args.db, compact_every=0)
+    max_bytes_per_second = int(args.max_mb_per_second * 1e6)
+    if isinstance(store, SqliteContextStore):
+        maintenance = SqliteContextMaintenance(store, keep=args.keep, archive_after_days=args.archive_after_days,
+                                               compress_idle_seconds=args.idle_seconds,
+                                               max_bytes_per_second=max_bytes_per_second)
+    else:
+        maintenance = JsonContextMaintenance(store, args.keep, args.archive_after_days, max_bytes_per_second)
+    
+    report = maintenance.run()
+    print(format_report(report))
+    if args.vacuum and isinstance(maintenance, SqliteContextMaintenance):
+        before, after = maintenance.vacuum()
+        print(f"Archivo de la base de datos: {before / 1e6:.2f} -> {after / 1e6:.2f} MB")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
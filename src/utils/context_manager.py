@@ -3,13 +3,18 @@ Módulo para persistencia de contexto en conversaciones.
 Permite guardar y cargar el estado de las conversaciones para mantener
 continuidad en sesiones largas o interrumpidas.
 """
-import json
 import os
-import time
 from datetime import datetime
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Iterator, Tuple
 import logging
 
+from core.config import (CONTEXT_STORE_BACKEND, CONTEXT_DB_PATH, CONTEXT_JOURNAL_COMPACT_EVERY,
+                         CONVERSATION_SEARCH_ENABLED)
+from utils.context_store import ContextStore, create_context_store
+from utils.context_maintenance import start_context_maintenance
+from utils.session_index import SessionIndex, DEFAULT_SESSION_INDEX_FILENAME
+from utils.conversation_search import ConversationSearchIndex
+
 # Configurar logging
 logger = logging.getLogger(__name__)
 
@@ -17,17 +22,29 @@ class ContextPersistenceManager:
     """
     Gestor de persistencia para contextos de conversación.
     Permite guardar y recuperar contextos completos de conversación.
+    El almacenamiento se delega en un ContextStore (SQLite indexado por
+    defecto, o archivos JSON con CONTEXT_STORE_BACKEND=json).
     """
     
-    def __init__(self, storage_dir: str = "storage/contexts"):
+    def __init__(self, storage_dir: str = "storage/contexts", store: Optional[ContextStore] = None):
         """
         Inicializa el gestor de persistencia.
         
         Args:
             storage_dir: Directorio para almacenar los archivos de contexto
+            store: Almacén de contextos (por defecto, el configurado en CONTEXT_STORE_BACKEND)
         """
         self.storage_dir = storage_dir
         self._ensure_storage_dir_exists()
+        self.store = store or create_context_store(CONTEXT_STORE_BACKEND, storage_dir, CONTEXT_DB_PATH or None,
+                                                    CONTEXT_JOURNAL_COMPACT_EVERY)
+        # Compresión, retención y archivo periódicos del almacén (uno por base de datos o directorio)
+        self.maintenance = start_context_maintenance(self.store)
+        # Índice de metadatos por sesión (en la misma base de datos si el almacén es SQLite)
+        self.index = SessionIndex(getattr(self.store, 'db_path', None)
+                                  or os.path.join(storage_dir, DEFAULT_SESSION_INDEX_FILENAME))
+        # Búsqueda de texto completo en las conversaciones (misma base de datos que el índice)
+        self.search_index = ConversationSearchIndex(self.index.db_path) if CONVERSATION_SEARCH_ENABLED else None
     
     def _ensure_storage_dir_exists(self) -> None:
         """
@@ -58,20 +75,27 @@ class ContextPersistenceManager:
                 "version": "1.0"
             }
             
-            # Generar nombre de archivo basado en el ID de usuario
-            filename = f"{user_id}_{int(time.time())}.json"
-            file_path = os.path.join(self.storage_dir, filename)
-            
-            # Guardar como JSON
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(context_to_save, f, ensure_ascii=False, indent=2)
+            snapshot_id = self.store.save(user_id, context_to_save)
             
-            logger.info(f"Contexto guardado para usuario {user_id} en {file_path}")
-            return True
+            logger.info(f"Contexto guardado para usuario {user_id} ({snapshot_id})")
             
         except Exception as e:
             logger.error(f"Error al guardar contexto para usuario {user_id}: {str(e)}")
             return False
+        
+        try:
+            self.index.record(user_id, snapshot_id, context_to_save)
+        except Exception as e:
+            # El contexto ya está guardado; el índice se puede reconstruir con rebuild
+            logger.warning(f"No se pudo actualizar el índice de sesiones para {user_id}: {str(e)}")
+        
+        if self.search_index is not None:
+            try:
+                self.search_index.record(user_id, snapshot_id, context_to_save)
+            except Exception as e:
+                # Se puede reconstruir con python -m utils.conversation_search rebuild
+                logger.warning(f"No se pudo actualizar la búsqueda de conversaciones para {user_id}: {str(e)}")
+        return True
     
     def load_context(self, user_id: str) -> Optional[Dict[str, Any]]:
         """
@@ -84,27 +108,14 @@ class ContextPersistenceManager:
             Contexto cargado o None si no se encuentra
         """
         try:
-            # Buscar todos los archivos de contexto para este usuario
-            user_files = []
-            for filename in os.listdir(self.storage_dir):
-                if filename.startswith(f"{user_id}_") and filename.endswith(".json"):
-                    file_path = os.path.join(self.storage_dir, filename)
-                    user_files.append((file_path, os.path.getmtime(file_path)))
-            
-            # Si no hay archivos, retornar None
-            if not user_files:
+            context = self.store.load_latest(user_id)
+            
+            # Si no hay contextos, retornar None
+            if context is None:
                 logger.info(f"No se encontraron contextos guardados para usuario {user_id}")
                 return None
             
-            # Ordenar por fecha de modificación (más reciente primero)
-            user_files.sort(key=lambda x: x[1], reverse=True)
-            latest_file = user_files[0][0]
-            
-            # Cargar el archivo JSON
-            with open(latest_file, 'r', encoding='utf-8') as f:
-                context = json.load(f)
-            
-            logger.info(f"Contexto cargado para usuario {user_id} desde {latest_file}")
+            logger.info(f"Contexto cargado para usuario {user_id}")
             return context
             
         except Exception as e:
@@ -119,64 +130,102 @@ class ContextPersistenceManager:
             user_id: Identificador único del usuario
             
         Returns:
-            Lista de metadatos de sesiones disponibles
+            Lista de metadatos de sesiones disponibles (más reciente primero)
         """
-        sessions = []
         try:
-            for filename in os.listdir(self.storage_dir):
-                if filename.startswith(f"{user_id}_") and filename.endswith(".json"):
-                    file_path = os.path.join(self.storage_dir, filename)
-                    
-                    # Extraer timestamp del nombre de archivo
-                    timestamp = int(filename.split('_')[1].split('.')[0])
-                    
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        context = json.load(f)
-                        
-                    # Extraer información relevante
-                    metadata = context.get("_persistence_metadata", {})
-                    message_count = context.get("message_count", 0)
-                    
-                    sessions.append({
-                        "session_id": filename,
-                        "timestamp": timestamp,
-                        "datetime": datetime.fromtimestamp(timestamp).isoformat(),
-                        "message_count": message_count,
-                        "last_saved": metadata.get("last_saved", "Unknown"),
-                        "file_path": file_path
-                    })
-            
-            # Ordenar por fecha (más reciente primero)
-            sessions.sort(key=lambda x: x["timestamp"], reverse=True)
-            
+            return self.store.list_sessions(user_id)
         except Exception as e:
             logger.error(f"Error al listar sesiones para usuario {user_id}: {str(e)}")
+            return []
+    
+    def query_sessions(self, user_id: Optional[str] = None, agent: Optional[str] = None,
+                       lead: Optional[bool] = None, since: Optional[float] = None,
+                       until: Optional[float] = None, order_by: str = 'last_saved_at',
+                       descending: bool = True, limit: int = 50, offset: int = 0) -> Dict[str, Any]:
+        """
+        Lista sesiones de todos los usuarios a partir del índice de metadatos,
+        sin cargar ningún contexto.
+        
+        Args:
+            user_id: Solo las sesiones de este usuario
+            agent: Solo las sesiones cuyo último agente es este
+            lead: Solo las sesiones con (True) o sin (False) lead capturado
+            since: Último guardado posterior o igual a este momento (epoch)
+            until: Último guardado anterior a este momento (epoch)
+            order_by: 'last_saved_at', 'created_at' o 'message_count'
+            descending: Orden descendente
+            limit: Sesiones por página
+            offset: Sesiones que se saltan
+            
+        Returns:
+            Diccionario con las sesiones de la página y el total
+        """
+        return self.index.query(user_id, agent, lead, since, until, order_by, descending, limit, offset)
+    
+    def search_conversations(self, query: Optional[str] = None, user_id: Optional[str] = None,
+                             agent: Optional[str] = None, lead: Optional[bool] = None,
+                             since: Optional[float] = None, until: Optional[float] = None,
+                             relevance: bool = False, limit: int = 20, offset: int = 0) -> Dict[str, Any]:
+        """
+        Busca texto en las conversaciones guardadas (ver ConversationSearchIndex.search).
         
-        return sessions
+        Args:
+            query: Términos buscados, sin acentos ni mayúsculas; frases entre comillas
+            user_id: Solo las conversaciones de este usuario
+            agent: Solo las conversaciones en las que participó este agente
+            lead: Solo las conversaciones con (True) o sin (False) lead capturado
+            since: Última actividad posterior o igual a este momento (epoch)
+            until: Inicio anterior a este momento (epoch)
+            relevance: Ordenar por relevancia en lugar de por actividad reciente
+            limit: Conversaciones por página
+            offset: Conversaciones que se saltan
+            
+        Returns:
+            Diccionario con las conversaciones de la página, sus fragmentos y has_more
+            
+        Raises:
+            RuntimeError: Si la búsqueda está desactivada
+        """
+        if self.search_index is None:
+            raise RuntimeError("La búsqueda de conversaciones está desactivada (CONVERSATION_SEARCH_ENABLED)")
+        return self.search_index.search(query, user_id, agent, lead, since, until, relevance, limit, offset)
+    
+    def iter_latest_contexts(self) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """
+        Recorre el contexto más reciente de cada sesión almacenada.
+        
+        Cada guardado genera una instantánea nueva con la conversación
+        completa, por lo que solo se devuelve la última de cada par
+        (usuario, session_id). Los contextos se cargan de uno en uno.
+        
+        Returns:
+            Iterador de tuplas (timestamp del guardado, contexto)
+        """
+        try:
+            yield from self.store.iter_latest()
+        except Exception as e:
+            logger.error(f"Error al recorrer contextos almacenados: {str(e)}")
     
     def delete_context(self, session_id: str) -> bool:
         """
-        Elimina un archivo de contexto específico.
+        Elimina una instantánea de contexto específica.
         
         Args:
-            session_id: ID de la sesión a eliminar (nombre del archivo)
+            session_id: ID de la sesión a eliminar (el devuelto por list_user_sessions)
             
         Returns:
             True si se eliminó correctamente, False en caso contrario
         """
         try:
-            file_path = os.path.join(self.storage_dir, session_id)
-            
-            # Verificar que el archivo existe
-            if not os.path.exists(file_path):
-                logger.warning(f"Archivo de contexto no encontrado: {file_path}")
+            if not self.store.delete(session_id):
                 return False
+            self.index.forget_snapshot(session_id)
+            if self.search_index is not None:
+                self.search_index.forget_snapshot(session_id)
             
-            # Eliminar archivo
-            os.remove(file_path)
-            logger.info(f"Contexto eliminado: {file_path}")
+            logger.info(f"Contexto eliminado: {session_id}")
             return True
             
         except Exception as e:
             logger.error(f"Error al eliminar contexto {session_id}: {str(e)}")
-            return False 
\ No newline at end of file
+            return False
\ No newline at end of file
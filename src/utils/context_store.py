@@ -0,0 +1,1001 @@
+"""
+Backends de almacenamiento para los contextos de conversación.
+Define la interfaz que usa ContextPersistenceManager y dos implementaciones:
+archivos JSON en un directorio (formato original) y SQLite con un índice
+por (user_id, saved_at) para que reanudar una sesión no dependa del número
+total de instantáneas guardadas.
+
+El almacén SQLite mantiene además un diario de solo anexado por sesión: cada
+guardado registra únicamente los mensajes nuevos y las claves modificadas, y
+cada cierto número de turnos el diario se compacta en la instantánea.
+
+Las instantáneas inactivas pueden estar comprimidas con un diccionario
+entrenado y las antiguas agrupadas en un archivo comprimido (ver
+utils.context_maintenance); al cargar se descomprimen de forma transparente.
+
+Migración de archivos JSON existentes (desde el directorio src):
+    python -m utils.context_store migrate --source storage/contexts
+"""
+import os
+import sys
+import gzip
+import json
+import time
+import sqlite3
+import hashlib
+import argparse
+import threading
+from collections import OrderedDict
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Dict, Any, Optional, List, Iterator, Iterable, Tuple
+import logging
+
+from utils.snapshot_codec import SnapshotCodec
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+# Nombre por defecto de la base de datos dentro del directorio de contextos
+DEFAULT_CONTEXT_DB_FILENAME = "contexts.db"
+
+# Instantáneas por transacción en importaciones masivas
+DEFAULT_IMPORT_BATCH_SIZE = 1000
+
+# Deltas del diario de una sesión antes de compactarlo en su instantánea
+DEFAULT_JOURNAL_COMPACT_EVERY = 20
+
+# Sesiones cuyo último estado guardado se recuerda para calcular deltas
+DEFAULT_JOURNAL_TRACKED_SESSIONS = 10000
+
+# Subdirectorio con los archivos de instantáneas antiguas del almacén JSON
+JSON_ARCHIVE_DIRNAME = "archive"
+
+def parse_snapshot_filename(filename: str) -> Optional[Tuple[str, int]]:
+    """
+    Extrae el usuario y el timestamp de un archivo "{user_id}_{timestamp}.json".
+    
+    Args:
+        filename: Nombre del archivo
+        
+    Returns:
+        Tupla (user_id, timestamp) o None si el nombre no tiene ese formato
+    """
+    if not filename.endswith(".json"):
+        return None
+    user_id, _, raw_timestamp = filename[:-len(".json")].rpartition('_')
+    if not user_id or not raw_timestamp.isdigit():
+        return None
+    return user_id, int(raw_timestamp)
+
+def _dumps(value: Any) -> str:
+    """Serializa un valor en JSON compacto"""
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+
+def _hash(data: bytes) -> bytes:
+    """Huella de 16 bytes de un bloque de datos"""
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+def _digest(value: Any) -> bytes:
+    """Huella de 16 bytes del JSON compacto de un valor"""
+    return _hash(_dumps(value).encode('utf-8'))
+
+def _fingerprint_list(value: List[Any]) -> Tuple:
+    """
+    Resume una lista por su longitud y la huella de su JSON completo.
+    
+    La huella cubre el JSON sin el corchete de cierre, de modo que al
+    añadir elementos el JSON anterior es un prefijo del nuevo (seguido de
+    una coma) y basta con comparar la huella de ese prefijo.
+    
+    Args:
+        value: Lista a resumir
+        
+    Returns:
+        Tupla (resumen, JSON sin el cierre); el resumen es
+        ('list', elementos, bytes del JSON sin el cierre, huella)
+    """
+    body = _dumps(value).encode('utf-8')[:-1]
+    return ('list', len(value), len(body), _hash(body)), body
+
+def _fingerprint_value(value: Any) -> Tuple:
+    """
+    Resume un valor de nivel superior del contexto para detectar cambios.
+    
+    Args:
+        value: Valor a resumir
+        
+    Returns:
+        Resumen de la lista (ver _fingerprint_list) o ('value', huella)
+    """
+    if isinstance(value, list):
+        return _fingerprint_list(value)[0]
+    return ('value', _digest(value))
+
+def fingerprint_context(context: Dict[str, Any]) -> Dict[str, Tuple]:
+    """
+    Calcula el resumen de cada clave de un contexto.
+    
+    Args:
+        context: Contexto de conversación
+        
+    Returns:
+        Diccionario clave -> resumen
+    """
+    return {key: _fingerprint_value(value) for key, value in context.items()}
+
+def compute_context_delta(fingerprint: Dict[str, Tuple],
+                          context: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Tuple]]:
+    """
+    Calcula los cambios de un contexto respecto al último estado guardado.
+    
+    Las listas (mensajes, historiales) se tratan como de solo anexado: si su
+    longitud no ha disminuido y los elementos que ya tenían no han cambiado
+    (la huella del prefijo coincide con la guardada), solo se registran los
+    elementos nuevos. En cualquier otro caso, incluida la edición de un
+    elemento anterior, la clave se registra completa.
+    
+    Args:
+        fingerprint: Resumen del último estado guardado (ver fingerprint_context)
+        context: Contexto actual
+        
+    Returns:
+        Tupla (delta, resumen del contexto actual). El delta puede contener
+        'set' (claves con su valor completo), 'append' (elementos añadidos a
+        listas) y 'unset' (claves eliminadas).
+    """
+    delta = {}
+    current_fingerprint = {}
+    for key, value in context.items():
+        previous = fingerprint.get(key)
+        if isinstance(value, list):
+            current, body = _fingerprint_list(value)
+            if previous and previous[0] == 'list' and len(value) >= previous[1]:
+                previous_length, previous_bytes = previous[1], previous[2]
+                if previous_length == len(value):
+                    unchanged = current == previous
+                else:
+                    # Los elementos anteriores no cambiaron si su JSON es un prefijo del actual
+                    unchanged = (
+                        (previous_length == 0 or body[previous_bytes:previous_bytes + 1] == b',')
+                        and _hash(body[:previous_bytes]) == previous[3]
+                    )
+                if unchanged:
+                    if len(value) > previous_length:
+                        delta.setdefault('append', {})[key] = value[previous_length:]
+                    current_fingerprint[key] = current
+                    continue
+            delta.setdefault('set', {})[key] = value
+        else:
+            current = ('value', _digest(value))
+            if current != previous:
+                delta.setdefault('set', {})[key] = value
+        current_fingerprint[key] = current
+    
+    removed = [key for key in fingerprint if key not in context]
+    if removed:
+        delta['unset'] = removed
+    return delta, current_fingerprint
+
+def apply_context_delta(context: Dict[str, Any], delta: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Aplica un delta del diario sobre un contexto.
+    
+    Args:
+        context: Contexto reconstruido hasta el delta anterior (se modifica)
+        delta: Delta generado por compute_context_delta
+        
+    Returns:
+        El mismo contexto actualizado
+    """
+    context.update(delta.get('set', {}))
+    for key, items in delta.get('append', {}).items():
+        context.setdefault(key, []).extend(items)
+    for key in delta.get('unset', []):
+        context.pop(key, None)
+    return context
+
+class ContextStore(ABC):
+    """Interfaz para almacenes de instantáneas de contexto"""
+    
+    @abstractmethod
+    def save(self, user_id: str, context: Dict[str, Any]) -> str:
+        """Guarda una instantánea y devuelve su identificador"""
+        pass
+    
+    @abstractmethod
+    def load_latest(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """Carga la instantánea más reciente de un usuario"""
+        pass
+    
+    @abstractmethod
+    def list_sessions(self, user_id: str) -> List[Dict[str, Any]]:
+        """Lista los metadatos de las instantáneas de un usuario (más reciente primero)"""
+        pass
+    
+    @abstractmethod
+    def delete(self, snapshot_id: str) -> bool:
+        """Elimina una instantánea por su identificador"""
+        pass
+    
+    @abstractmethod
+    def iter_latest(self) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """Recorre la instantánea más reciente de cada sesión"""
+        pass
+
+class JsonFileContextStore(ContextStore):
+    """Almacén que guarda cada instantánea en un archivo JSON"""
+    
+    def __init__(self, storage_dir: str):
+        """
+        Inicializa el almacén.
+        
+        Args:
+            storage_dir: Directorio de los archivos de contexto
+        """
+        self.storage_dir = storage_dir
+        os.makedirs(storage_dir, exist_ok=True)
+    
+    def save(self, user_id: str, context: Dict[str, Any]) -> str:
+        """Guarda el contexto en un archivo nuevo con marca de tiempo"""
+        filename = f"{user_id}_{int(time.time())}.json"
+        file_path = os.path.join(self.storage_dir, filename)
+        with open(file_path, 'w', encoding='utf-8') as f:
+            json.dump(context, f, ensure_ascii=False, indent=2)
+        return filename
+    
+    def load_latest(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Busca el archivo más reciente del usuario recorriendo el directorio;
+        si no queda ninguno, recupera la última instantánea archivada.
+        """
+        user_files = []
+        for filename in os.listdir(self.storage_dir):
+            if filename.startswith(f"{user_id}_") and filename.endswith(".json"):
+                file_path = os.path.join(self.storage_dir, filename)
+                user_files.append((file_path, os.path.getmtime(file_path)))
+        
+        if not user_files:
+            return self.load_archived(user_id)
+        
+        # Ordenar por fecha de modificación (más reciente primero)
+        user_files.sort(key=lambda x: x[1], reverse=True)
+        with open(user_files[0][0], 'r', encoding='utf-8') as f:
+            return json.load(f)
+    
+    def list_sessions(self, user_id: str) -> List[Dict[str, Any]]:
+        """Lee todos los archivos del usuario para extraer sus metadatos"""
+        sessions = []
+        for filename in os.listdir(self.storage_dir):
+            if filename.startswith(f"{user_id}_") and filename.endswith(".json"):
+                parsed = parse_snapshot_filename(filename)
+                if not parsed:
+                    continue
+                file_path = os.path.join(self.storage_dir, filename)
+                with open(file_path, 'r', encoding='utf-8') as f:
+                    context = json.load(f)
+                
+                metadata = context.get("_persistence_metadata", {})
+                sessions.append({
+                    "session_id": filename,
+                    "timestamp": parsed[1],
+                    "datetime": datetime.fromtimestamp(parsed[1]).isoformat(),
+                    "message_count": context.get("message_count", 0),
+                    "last_saved": metadata.get("last_saved", "Unknown"),
+                    "file_path": file_path
+                })
+        
+        sessions.sort(key=lambda x: x["timestamp"], reverse=True)
+        return sessions
+    
+    def delete(self, snapshot_id: str) -> bool:
+        """Elimina el archivo de la instantánea"""
+        file_path = os.path.join(self.storage_dir, snapshot_id)
+        if not os.path.exists(file_path):
+            logger.warning(f"Archivo de contexto no encontrado: {file_path}")
+            return False
+        os.remove(file_path)
+        return True
+    
+    def get_archive_path(self, user_id: str) -> str:
+        """
+        Ruta del archivo de instantáneas antiguas de un usuario.
+        
+        Args:
+            user_id: Identificador del usuario
+            
+        Returns:
+            Ruta del archivo JSONL comprimido con gzip
+        """
+        return os.path.join(self.storage_dir, JSON_ARCHIVE_DIRNAME, f"{user_id}.jsonl.gz")
+    
+    def load_archived(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Carga la instantánea archivada más reciente de un usuario.
+        
+        Args:
+            user_id: Identificador del usuario
+            
+        Returns:
+            Contexto o None si el usuario no tiene instantáneas archivadas
+        """
+        archive_path = self.get_archive_path(user_id)
+        if not os.path.exists(archive_path):
+            return None
+        latest = None
+        with gzip.open(archive_path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                record = json.loads(line)
+                if latest is None or record['saved_at'] >= latest['saved_at']:
+                    latest = record
+        return latest['context'] if latest else None
+    
+    def iter_latest(self) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """
+        Cada guardado genera un archivo con la conversación completa, así que
+        solo se devuelve el último de cada par (usuario, session_id). En
+        memoria solo se mantiene la ruta de ese archivo por sesión.
+        """
+        latest = {}
+        for filename in os.listdir(self.storage_dir):
+            parsed = parse_snapshot_filename(filename)
+            if not parsed:
+                continue
+            
+            file_path = os.path.join(self.storage_dir, filename)
+            try:
+                with open(file_path, 'r', encoding='utf-8') as f:
+                    session_id = json.load(f).get("session_id")
+            except Exception as e:
+                logger.warning(f"Contexto ilegible {file_path}: {str(e)}")
+                continue
+            
+            key = (parsed[0], session_id)
+            if key not in latest or parsed[1] >= latest[key][0]:
+                latest[key] = (parsed[1], file_path)
+        
+        for timestamp, file_path in latest.values():
+            try:
+                with open(file_path, 'r', encoding='utf-8') as f:
+                    context = json.load(f)
+            except Exception as e:
+                logger.warning(f"Contexto ilegible {file_path}: {str(e)}")
+                continue
+            yield timestamp, context
+
+class SqliteContextStore(ContextStore):
+    """
+    Almacén de instantáneas en SQLite.
+    Las consultas por usuario usan el índice (user_id, saved_at) y los
+    metadatos de listado están en columnas propias, por lo que no es
+    necesario leer ni decodificar los contextos para listarlos.
+    
+    Cada sesión tiene una instantánea base y un diario (context_journal) con
+    los deltas de los guardados posteriores. Al cargar se aplica el diario
+    sobre la base; al alcanzar compact_every deltas, o cuando el diario
+    ocupa más que la base, se reescribe la instantánea y se vacía el diario.
+    
+    El último estado guardado de cada sesión (el resumen con el que se
+    calculan los deltas) se recuerda en memoria por proceso, pero cada
+    escritura lo valida contra la columna revision de la instantánea, que
+    se incrementa en cada delta y compactación. Si otro proceso escribió
+    en la sesión desde el último guardado de este, el delta no se añade y
+    se compacta con el contexto completo.
+    
+    La columna codec indica si la instantánea está comprimida (NULL = JSON
+    sin comprimir) y dict_id el diccionario de context_dictionaries con el
+    que se comprimió. context_archive guarda, comprimidas por sesión, las
+    instantáneas retiradas por la política de retención.
+    """
+    
+    def __init__(self, db_path: str, compact_every: int = DEFAULT_JOURNAL_COMPACT_EVERY,
+                 tracked_sessions: int = DEFAULT_JOURNAL_TRACKED_SESSIONS):
+        """
+        Inicializa el almacén y crea el esquema si no existe.
+        
+        Args:
+            db_path: Ruta del archivo de base de datos
+            compact_every: Deltas por sesión antes de compactar (0 = sin diario,
+                cada guardado inserta una instantánea completa)
+            tracked_sessions: Sesiones cuyo último estado se recuerda en memoria;
+                el primer guardado de una sesión no recordada crea una instantánea
+        """
+        self.db_path = db_path
+        self.compact_every = compact_every
+        self.tracked_sessions = tracked_sessions
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        self._journal_lock = threading.Lock()
+        self._journal_heads = OrderedDict()
+        self._codecs = {}
+        self._codecs_lock = threading.Lock()
+        self.stats = {'snapshots': 0, 'deltas': 0, 'compactions': 0, 'bytes_written': 0}
+        self._init_schema()
+    
+    def _get_connection(self) -> sqlite3.Connection:
+        """
+        Obtiene la conexión del hilo actual (sqlite3 no comparte conexiones entre hilos).
+        
+        Returns:
+            Conexión a la base de datos
+        """
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.db_path, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+    
+    def _init_schema(self) -> None:
+        """
+        Crea las tablas de instantáneas y del diario, y sus índices.
+        """
+        connection = self._get_connection()
+        with connection:
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS context_snapshots (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    snapshot_id TEXT NOT NULL UNIQUE,
+                    user_id TEXT NOT NULL,
+                    session_id TEXT,
+                    saved_at REAL NOT NULL,
+                    message_count INTEGER NOT NULL DEFAULT 0,
+                    last_saved TEXT,
+                    data TEXT NOT NULL
+                )
+            """)
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS idx_context_snapshots_user_saved "
+                "ON context_snapshots (user_id, saved_at)"
+            )
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS context_journal (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    snapshot_rowid INTEGER NOT NULL,
+                    saved_at REAL NOT NULL,
+                    delta TEXT NOT NULL
+                )
+            """)
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS idx_context_journal_snapshot "
+                "ON context_journal (snapshot_rowid, id)"
+            )
+            columns = {row[1] for row in connection.execute("PRAGMA table_info(context_snapshots)")}
+            if 'codec' not in columns:
+                connection.execute("ALTER TABLE context_snapshots ADD COLUMN codec TEXT")
+                connection.execute("ALTER TABLE context_snapshots ADD COLUMN dict_id INTEGER")
+            if 'revision' not in columns:
+                connection.execute(
+                    "ALTER TABLE context_snapshots ADD COLUMN revision INTEGER NOT NULL DEFAULT 0"
+                )
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS context_dictionaries (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    codec TEXT NOT NULL,
+                    data BLOB NOT NULL,
+                    sample_count INTEGER NOT NULL,
+                    created_at REAL NOT NULL
+                )
+            """)
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS context_archive (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id TEXT NOT NULL,
+                    session_id TEXT,
+                    archived_at REAL NOT NULL,
+                    first_saved_at REAL NOT NULL,
+                    last_saved_at REAL NOT NULL,
+                    snapshot_count INTEGER NOT NULL,
+                    codec TEXT NOT NULL,
+                    dict_id INTEGER,
+                    data BLOB NOT NULL
+                )
+            """)
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS idx_context_archive_user "
+                "ON context_archive (user_id, last_saved_at)"
+            )
+    
+    @staticmethod
+    def _row_values(snapshot_id: str, user_id: str, saved_at: float, context: Dict[str, Any]) -> Tuple:
+        """
+        Prepara los valores de una fila a partir de un contexto.
+        
+        Args:
+            snapshot_id: Identificador público de la instantánea
+            user_id: Identificador del usuario
+            saved_at: Momento del guardado (segundos desde epoch)
+            context: Contexto a almacenar
+            
+        Returns:
+            Tupla con los valores de las columnas
+        """
+        metadata = context.get("_persistence_metadata") or {}
+        return (
+            snapshot_id,
+            user_id,
+            context.get("session_id"),
+            saved_at,
+            context.get("message_count", 0),
+            metadata.get("last_saved"),
+            _dumps(context)
+        )
+    
+    def save(self, user_id: str, context: Dict[str, Any]) -> str:
+        """
+        Guarda el contexto como delta en el diario de su sesión o, si la sesión
+        no tiene instantánea base en este proceso, como instantánea nueva.
+        """
+        saved_at = time.time()
+        key = (user_id, context.get("session_id"))
+        connection = self._get_connection()
+        
+        # Un único guardado a la vez: cada delta se calcula sobre el anterior
+        with self._journal_lock:
+            head = self._journal_heads.get(key) if self.compact_every > 0 else None
+            if head is not None:
+                self._journal_heads.move_to_end(key)
+                if head['deltas'] >= self.compact_every or head['journal_bytes'] > head['snapshot_bytes']:
+                    if self._compact(connection, head, saved_at, context):
+                        return head['snapshot_id']
+                else:
+                    delta, fingerprint = compute_context_delta(head['fingerprint'], context)
+                    if self._append_delta(connection, head, saved_at, context, delta):
+                        head['fingerprint'] = fingerprint
+                        return head['snapshot_id']
+                    # Otro proceso escribió en la sesión: el delta partiría de un estado desactualizado
+                    if self._compact(connection, head, saved_at, context):
+                        return head['snapshot_id']
+                # La instantánea base ya no existe (por ejemplo, se eliminó)
+                del self._journal_heads[key]
+            
+            return self._insert_snapshot(connection, key, user_id, saved_at, context)
+    
+    def _insert_snapshot(self, connection: sqlite3.Connection, key: Tuple[str, Optional[str]],
+                         user_id: str, saved_at: float, context: Dict[str, Any]) -> str:
+        """
+        Inserta una instantánea completa y la registra como base del diario.
+        
+        Args:
+            connection: Conexión del hilo actual
+            key: Clave (user_id, session_id) de la sesión
+            user_id: Identificador del usuario
+            saved_at: Momento del guardado
+            context: Contexto a guardar
+            
+        Returns:
+            Identificador de la instantánea
+        """
+        snapshot_id = f"{user_id}_{time.time_ns()}"
+        values = self._row_values(snapshot_id, user_id, saved_at, context)
+        with connection:
+            cursor = connection.execute(
+                "INSERT INTO context_snapshots "
+                "(snapshot_id, user_id, session_id, saved_at, message_count, last_saved, data) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                values
+            )
+        self.stats['snapshots'] += 1
+        self.stats['bytes_written'] += len(values[-1].encode('utf-8'))
+        
+        if self.compact_every > 0:
+            self._journal_heads[key] = {
+                'rowid': cursor.lastrowid,
+                'snapshot_id': snapshot_id,
+                'fingerprint': fingerprint_context(context),
+                'revision': 0,
+                'deltas': 0,
+                'journal_bytes': 0,
+                'snapshot_bytes': len(values[-1])
+            }
+            while len(self._journal_heads) > self.tracked_sessions:
+                self._journal_heads.popitem(last=False)
+        return snapshot_id
+    
+    def _append_delta(self, connection: sqlite3.Connection, head: Dict[str, Any],
+                      saved_at: float, context: Dict[str, Any], delta: Dict[str, Any]) -> bool:
+        """
+        Añade un delta al diario y actualiza los metadatos de la instantánea base.
+        
+        Args:
+            connection: Conexión del hilo actual
+            head: Estado en memoria de la sesión
+            saved_at: Momento del guardado
+            context: Contexto completo (para los metadatos de listado)
+            delta: Cambios respecto al guardado anterior
+            
+        Returns:
+            True si se registró, False si la instantánea base ya no existe o
+            su revisión no es la del último guardado de este proceso
+        """
+        serialized = _dumps(delta)
+        metadata = context.get("_persistence_metadata") or {}
+        with connection:
+            cursor = connection.execute(
+                "UPDATE context_snapshots SET saved_at = ?, message_count = ?, last_saved = ?, "
+                "revision = revision + 1 WHERE id = ? AND revision = ?",
+                (saved_at, context.get("message_count", 0), metadata.get("last_saved"),
+                 head['rowid'], head['revision'])
+            )
+            if cursor.rowcount == 0:
+                return False
+            connection.execute(
+                "INSERT INTO context_journal (snapshot_rowid, saved_at, delta) VALUES (?, ?, ?)",
+                (head['rowid'], saved_at, serialized)
+            )
+        head['revision'] += 1
+        head['deltas'] += 1
+        head['journal_bytes'] += len(serialized)
+        self.stats['deltas'] += 1
+        self.stats['bytes_written'] += len(serialized.encode('utf-8'))
+        return True
+    
+    def _compact(self, connection: sqlite3.Connection, head: Dict[str, Any],
+                 saved_at: float, context: Dict[str, Any]) -> bool:
+        """
+        Reescribe la instantánea base con el contexto completo y vacía el diario.
+        
+        Args:
+            connection: Conexión del hilo actual
+            head: Estado en memoria de la sesión
+            saved_at: Momento del guardado
+            context: Contexto completo
+            
+        Returns:
+            True si se compactó, False si la instantánea base ya no existe
+        """
+        values = self._row_values(head['snapshot_id'], "", saved_at, context)
+        with connection:
+            cursor = connection.execute(
+                "UPDATE context_snapshots SET saved_at = ?, message_count = ?, last_saved = ?, data = ?, "
+                "codec = NULL, dict_id = NULL, revision = revision + 1 WHERE id = ?",
+                values[3:] + (head['rowid'],)
+            )
+            if cursor.rowcount == 0:
+                return False
+            connection.execute("DELETE FROM context_journal WHERE snapshot_rowid = ?", (head['rowid'],))
+            revision = connection.execute(
+                "SELECT revision FROM context_snapshots WHERE id = ?", (head['rowid'],)
+            ).fetchone()[0]
+        head.update({
+            'fingerprint': fingerprint_context(context),
+            'revision': revision,
+            'deltas': 0,
+            'journal_bytes': 0,
+            'snapshot_bytes': len(values[-1])
+        })
+        self.stats['compactions'] += 1
+        self.stats['bytes_written'] += len(values[-1].encode('utf-8'))
+        return True
+    
+    def get_codec(self, codec: str, dict_id: Optional[int]) -> SnapshotCodec:
+        """
+        Obtiene (y guarda en memoria) el códec de un diccionario.
+        
+        Args:
+            codec: Nombre del códec
+            dict_id: Identificador del diccionario (None = sin diccionario)
+            
+        Returns:
+            Códec listo para comprimir y descomprimir
+        """
+        key = (codec, dict_id)
+        with self._codecs_lock:
+            cached = self._codecs.get(key)
+        if cached is not None:
+            return cached
+        
+        dictionary = b''
+        if dict_id is not None:
+            row = self._get_connection().execute(
+                "SELECT data FROM context_dictionaries WHERE id = ?", (dict_id,)
+            ).fetchone()
+            if row is None:
+                raise ValueError(f"Diccionario de compresión {dict_id} no encontrado")
+            dictionary = bytes(row[0])
+        snapshot_codec = SnapshotCodec(codec, dictionary)
+        with self._codecs_lock:
+            self._codecs[key] = snapshot_codec
+        return snapshot_codec
+    
+    def decode_data(self, data: Any, codec: Optional[str] = None, dict_id: Optional[int] = None) -> Any:
+        """
+        Decodifica el contenido de una instantánea o de un archivo de instantáneas.
+        
+        Args:
+            data: JSON (texto) o bytes comprimidos
+            codec: Códec de compresión (None = JSON sin comprimir)
+            dict_id: Diccionario usado al comprimir
+            
+        Returns:
+            Valor JSON decodificado
+        """
+        if codec is None:
+            return json.loads(data)
+        return json.loads(self.get_codec(codec, dict_id).decompress(bytes(data)).decode('utf-8'))
+    
+    def _reconstruct(self, connection: sqlite3.Connection, rowid: int, data: Any,
+                     codec: Optional[str] = None, dict_id: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Reconstruye el contexto aplicando el diario sobre la instantánea base.
+        
+        Args:
+            connection: Conexión del hilo actual
+            rowid: Identificador interno de la instantánea
+            data: Contenido de la instantánea (JSON o comprimido)
+            codec: Códec de compresión de la instantánea
+            dict_id: Diccionario usado al comprimir
+            
+        Returns:
+            Contexto en el estado del último guardado
+        """
+        context = self.decode_data(data, codec, dict_id)
+        for (delta,) in connection.execute(
+            "SELECT delta FROM context_journal WHERE snapshot_rowid = ? ORDER BY id", (rowid,)
+        ):
+            apply_context_delta(context, json.loads(delta))
+        return context
+    
+    def get_stats(self) -> Dict[str, int]:
+        """
+        Obtiene los contadores de escritura de este proceso.
+        
+        Returns:
+            Instantáneas, deltas, compactaciones y bytes de datos escritos
+        """
+        return dict(self.stats)
+    
+    def load_latest(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Obtiene la instantánea más reciente usando el índice y aplica su diario;
+        si el usuario solo tiene instantáneas archivadas, recupera la última.
+        """
+        connection = self._get_connection()
+        row = connection.execute(
+            "SELECT id, data, codec, dict_id FROM context_snapshots WHERE user_id = ? "
+            "ORDER BY saved_at DESC, id DESC LIMIT 1",
+            (user_id,)
+        ).fetchone()
+        if row is None:
+            return self.load_archived(user_id)
+        return self._reconstruct(connection, *row)
+    
+    def load_archived(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Carga la instantánea archivada más reciente de un usuario.
+        
+        Args:
+            user_id: Identificador del usuario
+            
+        Returns:
+            Contexto o None si el usuario no tiene instantáneas archivadas
+        """
+        row = self._get_connection().execute(
+            "SELECT data, codec, dict_id FROM context_archive WHERE user_id = ? "
+            "ORDER BY last_saved_at DESC, id DESC LIMIT 1",
+            (user_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        snapshots = self.decode_data(*row)
+        return max(snapshots, key=lambda snapshot: snapshot['saved_at'])['context']
+    
+    def list_sessions(self, user_id: str) -> List[Dict[str, Any]]:
+        """Lista los metadatos sin leer los contextos"""
+        rows = self._get_connection().execute(
+            "SELECT snapshot_id, saved_at, message_count, last_saved FROM context_snapshots "
+            "WHERE user_id = ? ORDER BY saved_at DESC, id DESC",
+            (user_id,)
+        ).fetchall()
+        return [
+            {
+                "session_id": snapshot_id,
+                "timestamp": int(saved_at),
+                "datetime": datetime.fromtimestamp(saved_at).isoformat(),
+                "message_count": message_count,
+                "last_saved": last_saved or "Unknown",
+                "file_path": self.db_path
+            }
+            for snapshot_id, saved_at, message_count, last_saved in rows
+        ]
+    
+    def delete(self, snapshot_id: str) -> bool:
+        """Elimina una instantánea y su diario por su identificador"""
+        connection = self._get_connection()
+        row = connection.execute(
+            "SELECT id FROM context_snapshots WHERE snapshot_id = ?", (snapshot_id,)
+        ).fetchone()
+        if row is None:
+            logger.warning(f"Instantánea de contexto no encontrada: {snapshot_id}")
+            return False
+        with self._journal_lock:
+            with connection:
+                connection.execute("DELETE FROM context_journal WHERE snapshot_rowid = ?", row)
+                connection.execute("DELETE FROM context_snapshots WHERE id = ?", row)
+        self.forget_snapshots([row[0]])
+        return True
+    
+    def forget_snapshots(self, rowids: Iterable[int]) -> None:
+        """
+        Olvida el estado del diario de instantáneas eliminadas o archivadas;
+        el siguiente guardado de esas sesiones crea una instantánea nueva.
+        
+        Args:
+            rowids: Identificadores internos de las instantáneas
+        """
+        rowids = set(rowids)
+        with self._journal_lock:
+            for key in [key for key, head in self._journal_heads.items() if head['rowid'] in rowids]:
+                del self._journal_heads[key]
+    
+    def has_snapshot(self, snapshot_id: str) -> bool:
+        """Indica si existe una instantánea con ese identificador"""
+        row = self._get_connection().execute(
+            "SELECT 1 FROM context_snapshots WHERE snapshot_id = ?", (snapshot_id,)
+        ).fetchone()
+        return row is not None
+    
+    def iter_latest(self) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """Recorre la última instantánea de cada (usuario, session_id) con un cursor"""
+        # SQLite devuelve las columnas de la fila con el MAX() del grupo
+        connection = self._get_connection()
+        cursor = connection.execute(
+            "SELECT MAX(saved_at), id, data, codec, dict_id FROM context_snapshots GROUP BY user_id, session_id"
+        )
+        for saved_at, rowid, data, codec, dict_id in cursor:
+            yield int(saved_at), self._reconstruct(connection, rowid, data, codec, dict_id)
+    
+    def import_snapshots(self, records: Iterable[Tuple[str, str, float, Dict[str, Any]]],
+                         batch_size: int = DEFAULT_IMPORT_BATCH_SIZE) -> int:
+        """
+        Importa instantáneas en lotes, ignorando las que ya existen.
+        
+        Args:
+            records: Tuplas (snapshot_id, user_id, saved_at, contexto)
+            batch_size: Instantáneas por transacción
+            
+        Returns:
+            Número de instantáneas insertadas
+        """
+        connection = self._get_connection()
+        inserted = 0
+        batch = []
+        
+        def flush() -> int:
+            with connection:
+                before = connection.total_changes
+                connection.executemany(
+                    "INSERT OR IGNORE INTO context_snapshots "
+                    "(snapshot_id, user_id, session_id, saved_at, message_count, last_saved, data) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    batch
+                )
+                return connection.total_changes - before
+        
+        for snapshot_id, user_id, saved_at, context in records:
+            batch.append(self._row_values(snapshot_id, user_id, saved_at, context))
+            if len(batch) >= batch_size:
+                inserted += flush()
+                batch = []
+        if batch:
+            inserted += flush()
+        return inserted
+
+def create_context_store(backend: str, storage_dir: str, db_path: Optional[str] = None,
+                         compact_every: int = DEFAULT_JOURNAL_COMPACT_EVERY) -> ContextStore:
+    """
+    Crea el almacén de contextos configurado.
+    
+    Args:
+        backend: 'sqlite' o 'json'
+        storage_dir: Directorio de contextos
+        db_path: Ruta de la base de datos SQLite (por defecto, dentro de storage_dir)
+        compact_every: Deltas del diario por sesión antes de compactar (solo sqlite)
+        
+    Returns:
+        Instancia del almacén
+    """
+    if backend == 'json':
+        return JsonFileContextStore(storage_dir)
+    if backend != 'sqlite':
+        logger.warning(f"Backend de contextos desconocido '{backend}', usando sqlite")
+    return SqliteContextStore(db_path or os.path.join(storage_dir, DEFAULT_CONTEXT_DB_FILENAME), compact_every)
+
+def iter_json_snapshots(source_dir: str, stats: Dict[str, int]) -> Iterator[Tuple[str, str, float, Dict[str, Any]]]:
+    """
+    Recorre los archivos de contexto JSON de un directorio.
+    
+    El momento del guardado se toma del nombre del archivo; si la fecha de
+    modificación cae en el mismo segundo se usa esta para conservar el orden
+    entre guardados de un mismo segundo.
+    
+    Args:
+        source_dir: Directorio con archivos "{user_id}_{timestamp}.json"
+        stats: Contadores de archivos leídos y errores (se actualiza)
+        
+    Returns:
+        Iterador de tuplas (snapshot_id, user_id, saved_at, contexto)
+    """
+    with os.scandir(source_dir) as entries:
+        for entry in entries:
+            parsed = parse_snapshot_filename(entry.name)
+            if not parsed or not entry.is_file():
+                continue
+            user_id, timestamp = parsed
+            try:
+                with open(entry.path, 'r', encoding='utf-8') as f:
+                    context = json.load(f)
+            except Exception as e:
+                logger.warning(f"Contexto ilegible {entry.path}: {str(e)}")
+                stats['errors'] += 1
+                continue
+            
+            modified = entry.stat().st_mtime
+            saved_at = modified if int(modified) == timestamp else float(timestamp)
+            stats['files'] += 1
+            yield entry.name, user_id, saved_at, context
+
+def migrate_json_contexts(source_dir: str, store: SqliteContextStore,
+                          batch_size: int = DEFAULT_IMPORT_BATCH_SIZE) -> Dict[str, int]:
+    """
+    Migra los archivos de contexto JSON a un almacén SQLite.
+    Los identificadores de instantánea conservan el nombre del archivo, por
+    lo que la migración se puede repetir sin duplicar datos.
+    
+    Args:
+        source_dir: Directorio con los archivos JSON
+        store: Almacén SQLite de destino
+        batch_size: Instantáneas por transacción
+        
+    Returns:
+        Estadísticas de la migración (archivos, importados, errores)
+    """
+    stats = {'files': 0, 'imported': 0, 'errors': 0}
+    stats['imported'] = store.import_snapshots(iter_json_snapshots(source_dir, stats), batch_size)
+    return stats
+
+def main() -> int:
+    """
+    Punto de entrada de la línea de comandos.
+    
+    Returns:
+        Código de salida
+    """
+    parser = argparse.ArgumentParser(description="Herramientas del almacén de contextos")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    
+    migrate_parser = subparsers.add_parser('migrate', help='Migrar archivos JSON de contexto a SQLite')
+    migrate_parser.add_argument('--source', default='storage/contexts', help='Directorio con los archivos JSON')
+    migrate_parser.add_argument('--db', help='Base de datos de destino (por defecto, <source>/contexts.db)')
+    migrate_parser.add_argument('--batch-size', type=int, default=DEFAULT_IMPORT_BATCH_SIZE,
+                                help='Instantáneas por transacción')
+    migrate_parser.add_argument('--remove-source', action='store_true',
+                                help='Eliminar los archivos JSON migrados')
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.INFO)
+    
+    db_path = args.db or os.path.join(args.source, DEFAULT_CONTEXT_DB_FILENAME)
+    store = SqliteContextStore(db_path)
+    start = time.perf_counter()
+    stats = migrate_json_contexts(args.source, store, args.batch_size)
+    elapsed = time.perf_counter() - start
+    print(f"Archivos leídos: {stats['files']} | importados: {stats['imported']} | "
+          f"errores: {stats['errors']} | {elapsed:.1f}s -> {db_path}")
+    
+    if args.remove_source:
+        removed = 0
+        with os.scandir(args.source) as entries:
+            for entry in entries:
+                # Solo se eliminan los archivos que constan en la base de datos
+                if parse_snapshot_filename(entry.name) and store.has_snapshot(entry.name):
+                    os.remove(entry.path)
+                    removed += 1
+        print(f"Archivos JSON eliminados: {removed}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
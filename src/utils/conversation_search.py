@@ -0,0 +1,613 @@
+"""
+Índice de búsqueda de texto completo sobre las conversaciones guardadas.
+Cada mensaje es una fila FTS5 con su texto normalizado con
+intent_classifier.normalize_text (minúsculas y sin acentos); una búsqueda
+encuentra las conversaciones (usuario, session_id) que contienen todos los
+términos aunque aparezcan en mensajes distintos.
+
+El índice se actualiza en cada guardado de contexto de forma incremental:
+solo se indexan los mensajes añadidos desde el guardado anterior (la tabla
+de conversaciones guarda cuántos hay indexados y el resumen del último), así
+que el coste de un guardado no depende de la longitud de la conversación.
+Solo si el historial se ha reescrito (p. ej. se vació) se reindexa entera.
+Cada conversación con mensajes nuevos recibe el siguiente número de
+actividad, de modo que una página de resultados en orden de última
+actividad sale del índice sin ordenar todas las coincidencias. Opcionalmente
+se ordena por relevancia (BM25) entre las coincidencias más recientes.
+
+Desde el directorio src:
+    python -m utils.conversation_search rebuild --storage-dir storage/contexts
+    python -m utils.conversation_search search '"cloud contact center" presupuesto' --lead yes
+"""
+import os
+import re
+import sys
+import json
+import time
+import sqlite3
+import hashlib
+import argparse
+import threading
+from datetime import datetime
+from typing import Dict, Any, Optional, List, Tuple, Iterator
+import logging
+
+from utils.intent_classifier import normalize_text
+from utils.session_index import lead_captured
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+# Conversaciones por página como máximo
+MAX_PAGE_SIZE = 100
+
+# Coincidencias más recientes que se ordenan por relevancia
+RELEVANCE_CANDIDATES = 5000
+
+# Fragmentos por conversación y caracteres de contexto alrededor del primer término
+SNIPPETS_PER_CONVERSATION = 2
+SNIPPET_CONTEXT_CHARS = 80
+
+# Marcas de los términos encontrados en los fragmentos
+HIGHLIGHT_START = "«"
+HIGHLIGHT_END = "»"
+
+# Frases entre comillas y separadores de términos en las búsquedas
+_PHRASE_RE = re.compile(r'"([^"]*)"')
+_TERM_SPLIT_RE = re.compile(r'[^\w]+', re.UNICODE)
+
+# El identificador de un mensaje es (conversación << POSITION_BITS) | posición, así que
+# los mensajes de una conversación ocupan un intervalo contiguo de rowid en el índice FTS5
+POSITION_BITS = 24
+_POSITION_MASK = (1 << POSITION_BITS) - 1
+
+# Conversaciones con algún mensaje que contiene un término (un subconjunto por término)
+_TERM_CONDITION = (f"c.id IN (SELECT rowid >> {POSITION_BITS} FROM conversation_search_fts "
+                   f"WHERE conversation_search_fts MATCH ?)")
+
+def _message_rows(messages: List[Any]) -> List[List[Optional[str]]]:
+    """
+    Extrae (rol, agente, texto) de mensajes de un contexto.
+    
+    El agente de un mensaje del usuario es el que respondió a ese turno (None
+    si aún no hay respuesta entre los mensajes recibidos).
+    
+    Args:
+        messages: Mensajes de la conversación (o los añadidos al final)
+        
+    Returns:
+        Lista de [rol, agente, texto]
+    """
+    rows = []
+    agent = None
+    for message in reversed(messages):
+        agent = message.get('agent') or agent
+        rows.append([message.get('role'), agent, str(message.get('content') or '')])
+    rows.reverse()
+    return rows
+
+def _message_digest(message: Dict[str, Any]) -> str:
+    """
+    Resumen de un mensaje para comprobar que el historial indexado no ha cambiado.
+    """
+    payload = json.dumps([message.get('role'), str(message.get('content') or '')], ensure_ascii=False)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+def parse_query(query: str) -> Tuple[List[str], Optional[re.Pattern]]:
+    """
+    Convierte el texto buscado en consultas FTS5 (una por término o frase) y
+    en el patrón que marca los términos en los fragmentos.
+    
+    Las frases entre comillas deben aparecer seguidas; el resto de términos
+    valen como prefijo ("presupuest" encuentra "presupuestos"). Todos deben
+    aparecer en la conversación. Los operadores de FTS5 no se interpretan.
+    
+    Args:
+        query: Texto buscado
+        
+    Returns:
+        Tupla (consultas para MATCH, patrón sobre texto normalizado); vacía y None sin términos
+    """
+    normalized = normalize_text(query or '')
+    parts = []
+    patterns = []
+    for phrase in _PHRASE_RE.findall(normalized):
+        words = [word for word in _TERM_SPLIT_RE.split(phrase) if word]
+        if words:
+            parts.append('"' + ' '.join(words) + '"')
+            patterns.append(r'\W+'.join(re.escape(word) for word in words) + r'(?!\w)')
+    for term in _TERM_SPLIT_RE.split(_PHRASE_RE.sub(' ', normalized)):
+        if term:
+            parts.append(f'"{term}"*')
+            patterns.append(re.escape(term) + r'\w*')
+    if not parts:
+        return [], None
+    return parts, re.compile(r'(?<!\w)(?:' + '|'.join(patterns) + ')')
+
+def _snippet(text: str, pattern: re.Pattern) -> Optional[str]:
+    """
+    Fragmento de un mensaje alrededor de los términos encontrados, con los términos marcados.
+    
+    Args:
+        text: Texto original del mensaje
+        pattern: Patrón de parse_query
+        
+    Returns:
+        Fragmento o None si el mensaje no contiene ningún término
+    """
+    normalized = normalize_text(text)
+    matches = list(pattern.finditer(normalized))
+    if not matches:
+        return None
+    # normalize_text conserva la longitud de los textos en forma NFC; si no, se muestra normalizado
+    source = text if len(normalized) == len(text) else normalized
+    start = max(0, matches[0].start() - SNIPPET_CONTEXT_CHARS)
+    end = min(len(source), matches[0].end() + SNIPPET_CONTEXT_CHARS)
+    pieces = ['…' if start > 0 else '']
+    position = start
+    for match in matches:
+        if match.start() < position or match.end() > end:
+            continue
+        pieces.append(source[position:match.start()])
+        pieces.append(HIGHLIGHT_START + source[match.start():match.end()] + HIGHLIGHT_END)
+        position = match.end()
+    pieces.append(source[position:end])
+    pieces.append('…' if end < len(source) else '')
+    return ''.join(pieces)
+
+class ConversationSearchIndex:
+    """
+    Tabla conversation_search (una fila por sesión), sus mensajes y el índice
+    FTS5 sin contenido de los mensajes.
+    """
+    
+    def __init__(self, db_path: str):
+        """
+        Inicializa el índice y crea sus tablas si no existen.
+        
+        Args:
+            db_path: Ruta de la base de datos (puede ser la del almacén de contextos)
+        """
+        self.db_path = db_path
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        # Los guardados de una misma sesión pueden llegar desde varios hilos
+        self._write_lock = threading.Lock()
+        self._init_schema()
+    
+    def _get_connection(self) -> sqlite3.Connection:
+        """
+        Obtiene la conexión del hilo actual.
+        
+        Returns:
+            Conexión a la base de datos
+        """
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.db_path, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+    
+    def _init_schema(self) -> None:
+        """
+        Crea las tablas de conversaciones y mensajes, sus índices y la tabla
+        FTS5, convirtiendo antes el formato anterior (un documento por conversación).
+        """
+        connection = self._get_connection()
+        with connection:
+            columns = {row[1] for row in connection.execute("PRAGMA table_info(conversation_search)")}
+            legacy = None
+            if 'messages' in columns:
+                legacy = connection.execute(
+                    "SELECT user_id, session_id, snapshot_id, agents, lead_captured, first_at, last_at, messages "
+                    "FROM conversation_search ORDER BY id"
+                ).fetchall()
+                connection.execute("DROP TABLE conversation_search_fts")
+                connection.execute("DROP TABLE conversation_search")
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS conversation_search (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id TEXT NOT NULL,
+                    session_id TEXT NOT NULL DEFAULT '',
+                    snapshot_id TEXT,
+                    agents TEXT NOT NULL DEFAULT ',',
+                    lead_captured INTEGER NOT NULL DEFAULT 0,
+                    message_count INTEGER NOT NULL DEFAULT 0,
+                    last_digest TEXT,
+                    activity INTEGER NOT NULL,
+                    first_at REAL NOT NULL,
+                    last_at REAL NOT NULL,
+                    UNIQUE (user_id, session_id)
+                )
+            """)
+            connection.execute("CREATE INDEX IF NOT EXISTS idx_conversation_search_snapshot "
+                               "ON conversation_search (snapshot_id)")
+            connection.execute("CREATE INDEX IF NOT EXISTS idx_conversation_search_activity "
+                               "ON conversation_search (activity)")
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS conversation_search_messages (
+                    id INTEGER PRIMARY KEY,
+                    role TEXT,
+                    agent TEXT,
+                    text TEXT NOT NULL
+                )
+            """)
+            # Sin contenido: el texto original solo se guarda en conversation_search_messages
+            # y el normalizado se recalcula para borrar un mensaje del índice
+            connection.execute("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS conversation_search_fts USING fts5(
+                    body, content='', tokenize='unicode61 remove_diacritics 0'
+                )
+            """)
+            if legacy:
+                self._import_legacy(connection, legacy)
+    
+    def _import_legacy(self, connection: sqlite3.Connection, legacy: List[tuple]) -> None:
+        """
+        Indexa las conversaciones del formato anterior, conservando su orden de actividad.
+        """
+        for activity, (user_id, session_id, snapshot_id, agents, captured, first_at, last_at,
+                       messages_json) in enumerate(legacy, 1):
+            rows = json.loads(messages_json)
+            conversation_id = connection.execute(
+                """
+                INSERT INTO conversation_search (user_id, session_id, snapshot_id, agents, lead_captured,
+                                                 message_count, last_digest, activity, first_at, last_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (user_id, session_id, snapshot_id, agents, captured, len(rows),
+                 _message_digest({'role': rows[-1][0], 'content': rows[-1][2]}) if rows else None,
+                 activity, first_at, last_at)
+            ).lastrowid
+            self._insert_messages(connection, conversation_id, 0, rows)
+        logger.info(f"Índice de conversaciones convertido a un documento por mensaje ({len(legacy)} conversaciones)")
+    
+    def _insert_messages(self, connection: sqlite3.Connection, conversation_id: int, start: int,
+                         rows: List[List[Optional[str]]]) -> None:
+        """
+        Añade mensajes a una conversación y al índice FTS5.
+        """
+        first_id = conversation_id << POSITION_BITS
+        messages = [(first_id | position, role, agent, text)
+                    for position, (role, agent, text) in enumerate(rows, start) if position <= _POSITION_MASK]
+        connection.executemany("INSERT INTO conversation_search_messages (id, role, agent, text) VALUES (?, ?, ?, ?)",
+                               messages)
+        connection.executemany("INSERT INTO conversation_search_fts (rowid, body) VALUES (?, ?)",
+                               [(message_id, normalize_text(text)) for message_id, _, _, text in messages if text])
+    
+    def _remove_messages(self, connection: sqlite3.Connection, conversation_id: int) -> None:
+        """
+        Elimina los mensajes de una conversación de la tabla y del índice FTS5.
+        """
+        first_id = conversation_id << POSITION_BITS
+        messages = connection.execute(
+            "SELECT id, text FROM conversation_search_messages WHERE id BETWEEN ? AND ?",
+            (first_id, first_id | _POSITION_MASK)
+        ).fetchall()
+        connection.executemany(
+            "INSERT INTO conversation_search_fts (conversation_search_fts, rowid, body) VALUES ('delete', ?, ?)",
+            [(message_id, normalize_text(text)) for message_id, text in messages if text]
+        )
+        connection.execute("DELETE FROM conversation_search_messages WHERE id BETWEEN ? AND ?",
+                           (first_id, first_id | _POSITION_MASK))
+    
+    def _remove(self, connection: sqlite3.Connection, conversation_id: int) -> None:
+        """
+        Elimina una conversación de la tabla y del índice FTS5.
+        """
+        self._remove_messages(connection, conversation_id)
+        connection.execute("DELETE FROM conversation_search WHERE id = ?", (conversation_id,))
+    
+    def record(self, user_id: str, snapshot_id: Optional[str], context: Dict[str, Any],
+               saved_at: Optional[float] = None) -> bool:
+        """
+        Indexa un guardado de contexto: solo los mensajes añadidos desde el
+        guardado anterior. Si no hay mensajes nuevos solo se actualizan los metadatos.
+        
+        Args:
+            user_id: Identificador del usuario
+            snapshot_id: Instantánea donde se guardó el contexto
+            context: Contexto guardado
+            saved_at: Momento del guardado (por defecto, ahora)
+            
+        Returns:
+            True si se indexaron mensajes de la conversación
+        """
+        saved_at = saved_at or time.time()
+        session_id = context.get('session_id') or ''
+        messages = [message for message in context.get('messages') or [] if isinstance(message, dict)]
+        last_digest = _message_digest(messages[-1]) if messages else None
+        captured = int(lead_captured(context))
+        connection = self._get_connection()
+        with self._write_lock, connection:
+            existing = connection.execute(
+                "SELECT id, message_count, last_digest, first_at, agents FROM conversation_search "
+                "WHERE user_id = ? AND session_id = ?",
+                (user_id, session_id)
+            ).fetchone()
+            if existing is not None and existing[1] == len(messages) and existing[2] == last_digest:
+                connection.execute(
+                    "UPDATE conversation_search SET snapshot_id = COALESCE(?, snapshot_id), "
+                    "lead_captured = MAX(lead_captured, ?) WHERE id = ?",
+                    (snapshot_id, captured, existing[0])
+                )
+                return False
+            if not messages:
+                if existing is not None:
+                    self._remove(connection, existing[0])
+                return False
+            
+            # Mensajes nuevos: los posteriores a los indexados, si el último indexado sigue en su sitio
+            start = 0
+            agents = set()
+            if existing is not None:
+                conversation_id, indexed, indexed_digest = existing[0], existing[1], existing[2]
+                agents.update(agent for agent in existing[4].split(',') if agent)
+                if 0 < indexed < len(messages) and _message_digest(messages[indexed - 1]) == indexed_digest:
+                    start = indexed
+                else:
+                    self._remove_messages(connection, conversation_id)
+            rows = _message_rows(messages[start:])
+            agents.update(agent for _, agent, _ in rows if agent)
+            if context.get('current_agent'):
+                agents.add(context['current_agent'])
+            agents_column = ',' + ','.join(sorted(agents)) + ','
+            activity = connection.execute(
+                "SELECT COALESCE(MAX(activity), 0) + 1 FROM conversation_search"
+            ).fetchone()[0]
+            
+            if existing is None:
+                conversation_id = connection.execute(
+                    """
+                    INSERT INTO conversation_search (user_id, session_id, snapshot_id, agents, lead_captured,
+                                                     message_count, last_digest, activity, first_at, last_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    """,
+                    (user_id, session_id, snapshot_id, agents_column, captured, len(messages), last_digest,
+                     activity, saved_at, saved_at)
+                ).lastrowid
+            else:
+                connection.execute(
+                    """
+                    UPDATE conversation_search SET snapshot_id = COALESCE(?, snapshot_id), agents = ?,
+                        lead_captured = ?, message_count = ?, last_digest = ?, activity = ?,
+                        first_at = MIN(first_at, ?), last_at = ?
+                    WHERE id = ?
+                    """,
+                    (snapshot_id, agents_column, captured, len(messages), last_digest, activity,
+                     saved_at, saved_at, conversation_id)
+                )
+                if start and rows[0][1]:
+                    # Los últimos mensajes del usuario indexados sin respuesta reciben el agente que respondió
+                    pending = []
+                    first_id = conversation_id << POSITION_BITS
+                    for message_id, agent in connection.execute(
+                        "SELECT id, agent FROM conversation_search_messages WHERE id BETWEEN ? AND ? "
+                        "ORDER BY id DESC", (first_id, first_id | _POSITION_MASK)
+                    ):
+                        if agent:
+                            break
+                        pending.append((rows[0][1], message_id))
+                    connection.executemany("UPDATE conversation_search_messages SET agent = ? WHERE id = ?", pending)
+            self._insert_messages(connection, conversation_id, start, rows)
+        return True
+    
+    def forget_snapshot(self, snapshot_id: str) -> int:
+        """
+        Elimina las conversaciones cuya última instantánea se ha borrado.
+        
+        Args:
+            snapshot_id: Identificador de la instantánea eliminada
+            
+        Returns:
+            Conversaciones eliminadas
+        """
+        connection = self._get_connection()
+        with self._write_lock, connection:
+            rows = connection.execute(
+                "SELECT id FROM conversation_search WHERE snapshot_id = ?", (snapshot_id,)
+            ).fetchall()
+            for (conversation_id,) in rows:
+                self._remove(connection, conversation_id)
+        return len(rows)
+    
+    def search(self, query: Optional[str] = None, user_id: Optional[str] = None, agent: Optional[str] = None,
+               lead: Optional[bool] = None, since: Optional[float] = None, until: Optional[float] = None,
+               relevance: bool = False, limit: int = 20, offset: int = 0) -> Dict[str, Any]:
+        """
+        Busca conversaciones, de la más reciente a la más antigua o por relevancia.
+        
+        Args:
+            query: Términos buscados (ver parse_query); sin términos se listan las conversaciones
+            user_id: Solo las conversaciones de este usuario
+            agent: Solo las conversaciones en las que participó este agente
+            lead: Solo las conversaciones con (True) o sin (False) lead capturado
+            since: Última actividad posterior o igual a este momento (epoch)
+            until: Inicio anterior a este momento (epoch)
+            relevance: Ordenar por BM25 entre las RELEVANCE_CANDIDATES coincidencias más recientes
+            limit: Conversaciones por página (máximo MAX_PAGE_SIZE)
+            offset: Conversaciones que se saltan
+            
+        Returns:
+            Diccionario con las conversaciones de la página (con fragmentos de los
+            mensajes que contienen los términos), has_more y los parámetros de paginación
+        """
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        offset = max(offset, 0)
+        parts, pattern = parse_query(query or '')
+        
+        conditions = []
+        params: List[Any] = []
+        for part in parts:
+            conditions.append(_TERM_CONDITION)
+            params.append(part)
+        if user_id is not None:
+            conditions.append("c.user_id = ?")
+            params.append(user_id)
+        if agent is not None:
+            conditions.append("c.agents LIKE ?")
+            params.append(f"%,{agent},%")
+        if lead is not None:
+            conditions.append("c.lead_captured = ?")
+            params.append(int(lead))
+        if since is not None:
+            conditions.append("c.last_at >= ?")
+            params.append(since)
+        if until is not None:
+            conditions.append("c.first_at < ?")
+            params.append(until)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        
+        columns = ("c.id, c.user_id, c.session_id, c.agents, c.lead_captured, c.message_count, "
+                   "c.first_at, c.last_at")
+        if parts and relevance:
+            # BM25 (la suma de las puntuaciones de sus mensajes) solo se calcula para las
+            # RELEVANCE_CANDIDATES coincidencias más recientes: con términos muy frecuentes
+            # puntuarlas todas no cabe en el tiempo de una petición. LIMIT -1 evita que la
+            # consulta de puntuaciones se funda con la agregación (bm25 no admite GROUP BY)
+            sql = (f"WITH candidates AS (SELECT c.id, c.activity FROM conversation_search c {where} "
+                   f"ORDER BY c.activity DESC LIMIT ?), "
+                   f"scores AS (SELECT rowid >> {POSITION_BITS} AS id, bm25(conversation_search_fts) AS score "
+                   f"FROM conversation_search_fts WHERE conversation_search_fts MATCH ? "
+                   f"AND rowid >> {POSITION_BITS} IN (SELECT id FROM candidates) LIMIT -1), "
+                   f"ranked AS (SELECT id, SUM(score) AS rank FROM scores GROUP BY id) "
+                   f"SELECT {columns} FROM ranked r JOIN candidates k ON k.id = r.id "
+                   f"JOIN conversation_search c ON c.id = r.id ORDER BY r.rank, k.activity DESC LIMIT ? OFFSET ?")
+            params += [RELEVANCE_CANDIDATES, ' OR '.join(parts)]
+        else:
+            # El índice de actividad entrega las conversaciones de la más reciente a la más
+            # antigua: la página termina en cuanto hay limit + 1 que contienen todos los términos
+            sql = f"SELECT {columns} FROM conversation_search c {where} ORDER BY c.activity DESC LIMIT ? OFFSET ?"
+        connection = self._get_connection()
+        rows = connection.execute(sql, params + [limit + 1, offset]).fetchall()
+        
+        conversations = []
+        for (conversation_id, row_user_id, session_id, agents, captured, message_count, first_at,
+             last_at) in rows[:limit]:
+            snippets = []
+            if pattern is not None:
+                hits = []
+                first_id = conversation_id << POSITION_BITS
+                for message_id, role, message_agent, text in connection.execute(
+                    "SELECT id, role, agent, text FROM conversation_search_messages "
+                    "WHERE id BETWEEN ? AND ? ORDER BY id", (first_id, first_id | _POSITION_MASK)
+                ):
+                    position = message_id & _POSITION_MASK
+                    snippet = _snippet(text, pattern)
+                    if snippet:
+                        terms = {term.lower() for term in pattern.findall(normalize_text(text))}
+                        hits.append((terms, position, role, message_agent, snippet))
+                # Se eligen los mensajes que cubren más términos aún no mostrados
+                best = []
+                covered = set()
+                while hits and len(best) < SNIPPETS_PER_CONVERSATION:
+                    hit = max(hits, key=lambda candidate: (len(candidate[0] - covered), -candidate[1]))
+                    hits.remove(hit)
+                    covered |= hit[0]
+                    best.append(hit)
+                snippets = [{'position': position, 'role': role, 'agent': message_agent, 'text': snippet}
+                            for _, position, role, message_agent, snippet in sorted(best, key=lambda hit: hit[1])]
+            conversations.append({
+                'user_id': row_user_id,
+                'session_id': session_id or None,
+                'agents': [name for name in agents.split(',') if name],
+                'lead_captured': bool(captured),
+                'message_count': message_count,
+                'started_at': datetime.fromtimestamp(first_at).isoformat(),
+                'last_activity': datetime.fromtimestamp(last_at).isoformat(),
+                'snippets': snippets
+            })
+        return {
+            'conversations': conversations,
+            'has_more': len(rows) > limit,
+            'limit': limit,
+            'offset': offset
+        }
+    
+    def count(self) -> int:
+        """
+        Conversaciones indexadas.
+        """
+        return self._get_connection().execute("SELECT COUNT(*) FROM conversation_search").fetchone()[0]
+    
+    def rebuild(self, contexts: Iterator[Tuple[Any, Dict[str, Any]]]) -> int:
+        """
+        Indexa los contextos existentes (las conversaciones ya indexadas sin
+        cambios no se reindexan).
+        
+        Args:
+            contexts: Iterador de tuplas (timestamp, contexto), como el de
+                ContextPersistenceManager.iter_latest_contexts
+                
+        Returns:
+            Conversaciones recorridas
+        """
+        count = 0
+        for timestamp, context in contexts:
+            user_id = context.get('user_id')
+            if not user_id:
+                continue
+            self.record(user_id, None, context, float(timestamp))
+            count += 1
+        return count
+
+def main() -> int:
+    """
+    Punto de entrada de la línea de comandos.
+    
+    Returns:
+        Código de salida
+    """
+    parser = argparse.ArgumentParser(description="Búsqueda en las conversaciones guardadas")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    for name, help_text in (('rebuild', 'Indexar los contextos ya guardados'), ('search', 'Buscar conversaciones')):
+        subparser = subparsers.add_parser(name, help=help_text)
+        subparser.add_argument('--storage-dir', default='storage/contexts', help='Directorio de contextos')
+    search_parser = subparsers.choices['search']
+    search_parser.add_argument('query', nargs='?', default='', help='Términos buscados (frases entre comillas)')
+    search_parser.add_argument('--user-id', default=None)
+    search_parser.add_argument('--agent', default=None, help='Agente que participó (p. ej. SalesAgent)')
+    search_parser.add_argument('--lead', choices=['yes', 'no'], default=None, help='Con o sin lead capturado')
+    search_parser.add_argument('--since', default=None, help='Fecha ISO de última actividad mínima')
+    search_parser.add_argument('--until', default=None, help='Fecha ISO de inicio máxima')
+    search_parser.add_argument('--relevance', action='store_true', help='Ordenar por relevancia')
+    search_parser.add_argument('--limit', type=int, default=20)
+    search_parser.add_argument('--offset', type=int, default=0)
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.INFO)
+    # Importación local: context_manager depende de este módulo
+    from utils.context_manager import ContextPersistenceManager
+    manager = ContextPersistenceManager(args.storage_dir)
+    if manager.search_index is None:
+        print("La búsqueda de conversaciones está desactivada (CONVERSATION_SEARCH_ENABLED)")
+        return 1
+    if args.command == 'rebuild':
+        start = time.perf_counter()
+        count = manager.search_index.rebuild(manager.iter_latest_contexts())
+        print(f"Conversaciones indexadas: {count} en {time.perf_counter() - start:.1f}s "
+              f"-> {manager.search_index.db_path}")
+        return 0
+    
+    result = manager.search_index.search(
+        args.query, user_id=args.user_id, agent=args.agent,
+        lead=None if args.lead is None else args.lead == 'yes',
+        since=datetime.fromisoformat(args.since).timestamp() if args.since else None,
+        until=datetime.fromisoformat(args.until).timestamp() if args.until else None,
+        relevance=args.relevance, limit=args.limit, offset=args.offset
+    )
+    for conversation in result['conversations']:
+        print(f"{conversation['last_activity']}  {conversation['user_id']}  {conversation['session_id'] or '-'}  "
+              f"{','.join(conversation['agents'])}  {'lead' if conversation['lead_captured'] else ''}")
+        for snippet in conversation['snippets']:
+            print(f"    [{snippet['position']} {snippet['role']}] {snippet['text']}")
+    if result['has_more']:
+        print(f"... más resultados con --offset {args.offset + args.limit}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
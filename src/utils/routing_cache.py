@@ -0,0 +1,150 @@
+"""
+Caché de decisiones de enrutamiento para el gestor de agentes.
+Evita recalcular la confianza de todos los agentes para mensajes que se
+repiten constantemente entre sesiones ("sí", "vale", "quiero un presupuesto").
+"""
+from collections import OrderedDict
+from threading import Lock
+from typing import Dict, Any, Optional, Tuple
+import logging
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+# Tamaño máximo por defecto de la caché (número de decisiones)
+DEFAULT_ROUTING_CACHE_SIZE = 2048
+
+# Campos del contexto que influyen en la puntuación de los agentes
+# (clasificador de intenciones y métodos can_handle/_adjust_confidence)
+ROUTING_CONTEXT_FLAGS = (
+    'current_agent',
+    'previous_agent',
+    'data_collection_active',
+    'form_shown',
+    'form_active',
+    'form_completed',
+    'price_discussed',
+    'force_engineer',
+    'force_sales'
+)
+
+
+def build_routing_key(message: str, context: Optional[Dict[str, Any]]) -> Tuple:
+    """
+    Construye la clave de caché para un mensaje y su contexto.
+
+    El mensaje solo se normaliza eliminando espacios en los extremos: los
+    agentes distinguen mayúsculas y acentos (por ejemplo, "Sí" puede
+    interpretarse como un nombre propio), por lo que no es seguro unificarlos.
+
+    Args:
+        message: Mensaje del usuario
+        context: Contexto de la conversación
+
+    Returns:
+        Tupla inmutable que identifica la decisión de enrutamiento
+    """
+    context = context or {}
+    history = context.get('history') or []
+    last_history_agent = history[-1].get('agent') if history else None
+    project_info = context.get('project_info') or {}
+
+    flags = tuple(context.get(flag) for flag in ROUTING_CONTEXT_FLAGS)
+
+    return (
+        message.strip(),
+        len(message) < 15,  # GeneralAgent favorece mensajes cortos
+        flags,
+        last_history_agent,
+        context.get('message_count', 0) <= 1,
+        bool(project_info),
+        bool(project_info.get('has_file_analysis')),
+        context.get('project_file_hash') is not None,
+        min(len(context.get('conversation_history', [])), 3)
+    )
+
+
+class RoutingCache:
+    """
+    Caché LRU acotada de decisiones de enrutamiento.
+    Almacena el agente seleccionado y las puntuaciones de todos los agentes.
+    """
+
+    def __init__(self, max_size: int = DEFAULT_ROUTING_CACHE_SIZE):
+        """
+        Inicializa la caché.
+
+        Args:
+            max_size: Número máximo de decisiones almacenadas
+        """
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._invalidations = 0
+
+    def get(self, key: Tuple) -> Optional[Dict[str, Any]]:
+        """
+        Obtiene una decisión almacenada y la marca como usada recientemente.
+
+        Args:
+            key: Clave generada con build_routing_key
+
+        Returns:
+            La decisión almacenada o None si no existe
+        """
+        with self._lock:
+            decision = self._entries.get(key)
+            if decision is None:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return decision
+
+    def put(self, key: Tuple, decision: Dict[str, Any]) -> None:
+        """
+        Almacena una decisión, expulsando la menos usada si se supera el límite.
+
+        Args:
+            key: Clave generada con build_routing_key
+            decision: Agente seleccionado y puntuaciones de todos los agentes
+        """
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = decision
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def invalidate(self) -> None:
+        """
+        Elimina todas las decisiones almacenadas (por ejemplo, al registrar agentes).
+        """
+        with self._lock:
+            self._entries.clear()
+            self._invalidations += 1
+        logger.debug("Caché de enrutamiento invalidada")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Devuelve las métricas de uso de la caché.
+
+        Returns:
+            Diccionario con aciertos, fallos, tasa de aciertos y tamaño
+        """
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': self._hits / lookups if lookups else 0.0,
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'evictions': self._evictions,
+                'invalidations': self._invalidations
+            }
@@ -0,0 +1,292 @@
+"""
+Analítica de sentimiento por lotes sobre las conversaciones almacenadas.
+Recorre los mensajes de usuario del almacén de contextos, los analiza en
+paralelo por bloques y agrega distribuciones de emoción, urgencia y
+polaridad por día, agente y servicio.
+
+Uso (desde el directorio src):
+    python -m utils.sentiment_analytics --workers 4
+    python -m utils.sentiment_analytics --storage-dir storage/contexts --output informe.json
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime
+from typing import Dict, Any, Iterator, Iterable, List, Tuple
+
+from utils.context_manager import ContextPersistenceManager
+from utils.sentiment_analyzer import SentimentAnalyzer
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+# Mensajes por bloque enviado a cada proceso
+DEFAULT_CHUNK_SIZE = 500
+
+# Dimensiones de agregación
+DIMENSIONS = ('day', 'agent', 'service')
+
+# Valores por defecto cuando falta información en el contexto
+UNKNOWN_VALUE = 'desconocido'
+NO_EMOTION = 'neutral'
+
+# Analizador de cada proceso trabajador (se crea una sola vez por proceso)
+_worker_analyzer = None
+
+def urgency_level(urgency: float) -> str:
+    """
+    Clasifica la urgencia con los mismos umbrales que get_response_suggestion.
+    
+    Args:
+        urgency: Nivel de urgencia entre 0.0 y 1.0
+        
+    Returns:
+        'alta', 'media' o 'baja'
+    """
+    if urgency > 0.7:
+        return 'alta'
+    if urgency > 0.3:
+        return 'media'
+    return 'baja'
+
+def iter_user_messages(context_manager: ContextPersistenceManager) -> Iterator[Tuple[str, str, str, str]]:
+    """
+    Recorre los mensajes de usuario de la última instantánea de cada sesión.
+    
+    El agente de cada mensaje es el que generó la respuesta siguiente; si la
+    respuesta no lo indica (contextos antiguos) se usa el agente actual de
+    la sesión.
+    
+    Args:
+        context_manager: Gestor de persistencia de contextos
+        
+    Returns:
+        Iterador de tuplas (texto, día, agente, servicio)
+    """
+    for timestamp, context in context_manager.iter_latest_contexts():
+        metadata = context.get('_persistence_metadata') or {}
+        day = (metadata.get('last_saved') or datetime.fromtimestamp(timestamp).isoformat())[:10]
+        service = ((context.get('project_info') or {}).get('interest')
+                   or (context.get('user_info') or {}).get('interest')
+                   or UNKNOWN_VALUE)
+        session_agent = context.get('current_agent') or UNKNOWN_VALUE
+        
+        pending = []
+        for message in context.get('messages') or []:
+            if message.get('role') == 'user':
+                if message.get('content'):
+                    pending.append(message['content'])
+            elif message.get('role') == 'assistant' and pending:
+                agent = message.get('agent') or session_agent
+                for text in pending:
+                    yield text, day, agent, service
+                pending = []
+        
+        for text in pending:
+            yield text, day, session_agent, service
+
+def iter_chunks(records: Iterable[Tuple], chunk_size: int) -> Iterator[List[Tuple]]:
+    """
+    Agrupa un iterador en bloques de tamaño fijo.
+    
+    Args:
+        records: Elementos a agrupar
+        chunk_size: Número de elementos por bloque
+        
+    Returns:
+        Iterador de listas de elementos
+    """
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+class SentimentAggregate:
+    """
+    Agregado de análisis de sentimiento por día, agente y servicio.
+    Su tamaño depende del número de valores distintos de cada dimensión,
+    no del número de mensajes analizados.
+    """
+    
+    def __init__(self):
+        """
+        Inicializa un agregado vacío.
+        """
+        self.messages = 0
+        self.buckets = {dimension: {} for dimension in DIMENSIONS}
+    
+    def add(self, record: Tuple[str, str, str, str], analysis: Dict[str, Any]) -> None:
+        """
+        Añade el análisis de un mensaje.
+        
+        Args:
+            record: Tupla (texto, día, agente, servicio)
+            analysis: Resultado de SentimentAnalyzer.analyze
+        """
+        self.messages += 1
+        emotion = analysis.get('dominant_emotion') or NO_EMOTION
+        urgency = urgency_level(analysis.get('urgency', 0.0))
+        polarity = analysis.get('polarity', 0.0)
+        
+        for dimension, value in zip(DIMENSIONS, record[1:]):
+            bucket = self.buckets[dimension].get(value)
+            if bucket is None:
+                bucket = {'messages': 0, 'polarity_sum': 0.0, 'emotions': Counter(), 'urgency': Counter()}
+                self.buckets[dimension][value] = bucket
+            bucket['messages'] += 1
+            bucket['polarity_sum'] += polarity
+            bucket['emotions'][emotion] += 1
+            bucket['urgency'][urgency] += 1
+    
+    def merge(self, other: 'SentimentAggregate') -> None:
+        """
+        Combina otro agregado (por ejemplo, el resultado de un proceso) con este.
+        
+        Args:
+            other: Agregado a incorporar
+        """
+        self.messages += other.messages
+        for dimension, values in other.buckets.items():
+            for value, other_bucket in values.items():
+                bucket = self.buckets[dimension].get(value)
+                if bucket is None:
+                    self.buckets[dimension][value] = other_bucket
+                    continue
+                bucket['messages'] += other_bucket['messages']
+                bucket['polarity_sum'] += other_bucket['polarity_sum']
+                bucket['emotions'].update(other_bucket['emotions'])
+                bucket['urgency'].update(other_bucket['urgency'])
+    
+    def to_report(self) -> Dict[str, Any]:
+        """
+        Genera el informe de distribuciones.
+        
+        Returns:
+            Diccionario con el total de mensajes y las distribuciones por dimensión
+        """
+        report = {'messages': self.messages}
+        for dimension in DIMENSIONS:
+            report[dimension] = {
+                value: {
+                    'messages': bucket['messages'],
+                    'polarity_mean': round(bucket['polarity_sum'] / bucket['messages'], 4),
+                    'emotions': dict(bucket['emotions'].most_common()),
+                    'urgency': dict(bucket['urgency'])
+                }
+                for value, bucket in sorted(self.buckets[dimension].items())
+            }
+        return report
+
+def analyze_chunk(records: List[Tuple[str, str, str, str]]) -> SentimentAggregate:
+    """
+    Analiza un bloque de mensajes y devuelve su agregado parcial.
+    Se ejecuta en los procesos trabajadores.
+    
+    Args:
+        records: Tuplas (texto, día, agente, servicio)
+        
+    Returns:
+        Agregado parcial del bloque
+    """
+    global _worker_analyzer
+    if _worker_analyzer is None:
+        _worker_analyzer = SentimentAnalyzer()
+    
+    aggregate = SentimentAggregate()
+    analyses = _worker_analyzer.analyze_many(record[0] for record in records)
+    for record, analysis in zip(records, analyses):
+        aggregate.add(record, analysis)
+    return aggregate
+
+def run_sentiment_report(context_manager: ContextPersistenceManager, workers: int = 1,
+                         chunk_size: int = DEFAULT_CHUNK_SIZE) -> Dict[str, Any]:
+    """
+    Analiza todos los mensajes de usuario almacenados y agrega los resultados.
+    
+    Los mensajes se leen de forma incremental y como máximo hay 2 bloques
+    en vuelo por proceso, por lo que la memoria no crece con el volumen
+    de conversaciones.
+    
+    Args:
+        context_manager: Gestor de persistencia de contextos
+        workers: Número de procesos (1 analiza en el proceso actual)
+        chunk_size: Mensajes por bloque
+        
+    Returns:
+        Informe con distribuciones y métricas de rendimiento
+    """
+    start = time.perf_counter()
+    total = SentimentAggregate()
+    chunks = iter_chunks(iter_user_messages(context_manager), chunk_size)
+    
+    if workers <= 1:
+        for chunk in chunks:
+            total.merge(analyze_chunk(chunk))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            in_flight = set()
+            for chunk in chunks:
+                in_flight.add(executor.submit(analyze_chunk, chunk))
+                if len(in_flight) >= workers * 2:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        total.merge(future.result())
+            for future in in_flight:
+                total.merge(future.result())
+    
+    elapsed = time.perf_counter() - start
+    report = total.to_report()
+    rate = total.messages / elapsed if elapsed > 0 else 0.0
+    report['throughput'] = {
+        'workers': max(workers, 1),
+        'chunk_size': chunk_size,
+        'elapsed_seconds': round(elapsed, 3),
+        'messages_per_second': round(rate, 1),
+        'messages_per_second_per_core': round(rate / max(workers, 1), 1)
+    }
+    
+    logger.info(f"Analizados {total.messages} mensajes en {elapsed:.2f}s ({rate:.1f} mensajes/s)")
+    return report
+
+def main() -> int:
+    """
+    Punto de entrada de la línea de comandos.
+    
+    Returns:
+        Código de salida
+    """
+    parser = argparse.ArgumentParser(description="Tendencias de sentimiento de las conversaciones almacenadas")
+    parser.add_argument('--storage-dir', default='storage/contexts', help='Directorio de contextos')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Número de procesos')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='Mensajes por bloque')
+    parser.add_argument('--output', help='Archivo JSON de salida (por defecto, salida estándar)')
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.WARNING)
+    
+    report = run_sentiment_report(ContextPersistenceManager(args.storage_dir), args.workers, args.chunk_size)
+    
+    throughput = report['throughput']
+    print(f"Mensajes analizados: {report['messages']} en {throughput['elapsed_seconds']}s "
+          f"({throughput['messages_per_second']} mensajes/s, "
+          f"{throughput['messages_per_second_per_core']} mensajes/s por núcleo, "
+          f"{throughput['workers']} procesos)", file=sys.stderr)
+    
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    else:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
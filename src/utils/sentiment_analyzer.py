@@ -4,12 +4,23 @@ Proporciona funcionalidades para detectar emociones y estados de ánimo
 en los mensajes, permitiendo respuestas más contextuales.
 """
 import re
-from typing import Dict, List, Tuple, Any, Optional
+from typing import Dict, List, Tuple, Any, Optional, Iterable
 import logging
 
 # Configurar logging
 logger = logging.getLogger(__name__)
 
+# Tokenización en una sola pasada: espacios, palabras o secuencias de signos
+_TOKEN_PATTERN = re.compile(r'(\s+)|(\w+)|([^\s\w]+)')
+
+# Palabras en mayúsculas (3+ letras)
+_UPPERCASE_RUN = re.compile(r'[A-ZÁÉÍÓÚÑ]{3,}')
+
+# Tipos de separador entre dos palabras consecutivas
+_GAP_SINGLE_SPACE = 2
+_GAP_WHITESPACE = 1
+_GAP_OTHER = 0
+
 class SentimentAnalyzer:
     """
     Analizador de sentimiento para mensajes en español.
@@ -66,16 +77,71 @@ class SentimentAnalyzer:
             'no', 'ni', 'nunca', 'jamás', 'tampoco', 'ningún', 'ninguno', 'nada'
         ]
         
-        # Patrones de polaridad
-        self.positive_patterns = [
-            r'\b(me gusta|excelente|perfecto|bien|bueno|genial|gracias)\b',
-            r'(:\)|😊|😄|👍|❤️|♥|👏)'
+        # Términos de polaridad (palabras o expresiones de varias palabras)
+        self.positive_terms = [
+            'me gusta', 'excelente', 'perfecto', 'bien', 'bueno', 'genial', 'gracias'
         ]
+        self.positive_symbols = [':)', '😊', '😄', '👍', '❤️', '♥', '👏']
         
-        self.negative_patterns = [
-            r'\b(no funciona|error|problema|falla|malo|pésimo|terrible)\b',
-            r'(:\(|😞|😢|👎|😠|😡|🤬)'
+        self.negative_terms = [
+            'no funciona', 'error', 'problema', 'falla', 'malo', 'pésimo', 'terrible'
         ]
+        self.negative_symbols = [':(', '😞', '😢', '👎', '😠', '😡', '🤬']
+        
+        # Palabras que indican urgencia
+        self.urgency_words = [
+            'urgente', 'inmediato', 'rápido', 'prisa', 'ahora', 'emergencia',
+            'crítico', 'crítica', 'grave', 'importante', 'pronto', 'ya'
+        ]
+        
+        self._build_indexes()
+    
+    def _build_indexes(self) -> None:
+        """
+        Construye los índices de búsqueda a partir de los diccionarios.
+        
+        Cada palabra clave se indexa por su primera palabra. Las de una sola
+        palabra se resuelven con una consulta directa por token; las de varias
+        palabras (por ejemplo, "no entiendo") se comprueban contra los tokens
+        siguientes. Se conserva el orden del léxico para acumular las
+        puntuaciones exactamente en el mismo orden que el análisis original.
+        """
+        # palabra -> [(orden, emoción, palabra clave)]
+        self._keyword_index = {}
+        # primera palabra -> [(palabras, orden, emoción, palabra clave)]
+        self._phrase_index = {}
+        
+        for emotion_pos, (emotion, keywords) in enumerate(self.emotion_lexicon.items()):
+            for keyword_pos, keyword in enumerate(keywords):
+                order = (emotion_pos, keyword_pos)
+                parts = tuple(keyword.split(' '))
+                if len(parts) == 1:
+                    self._keyword_index.setdefault(keyword, []).append((order, emotion, keyword))
+                else:
+                    self._phrase_index.setdefault(parts[0], []).append((parts, order, emotion, keyword))
+        
+        self._max_keyword_length = max(len(keyword) for keyword in self._keyword_index)
+        self._opposites = {emotion: self._get_opposite_emotion(emotion) for emotion in self.emotion_lexicon}
+        self._negation_set = frozenset(self.negations)
+        self._intensifier_set = frozenset(self.intensifiers)
+        
+        self._positive_words, self._positive_phrases = self._split_terms(self.positive_terms)
+        self._negative_words, self._negative_phrases = self._split_terms(self.negative_terms)
+    
+    @staticmethod
+    def _split_terms(terms: List[str]) -> Tuple[frozenset, List[Tuple[str, ...]]]:
+        """
+        Separa una lista de términos en palabras sueltas y expresiones.
+        
+        Args:
+            terms: Términos de polaridad
+            
+        Returns:
+            Tupla con el conjunto de palabras y la lista de expresiones
+        """
+        words = frozenset(term for term in terms if ' ' not in term)
+        phrases = [tuple(term.split(' ')) for term in terms if ' ' in term]
+        return words, phrases
     
     def analyze(self, text: str) -> Dict[str, Any]:
         """
@@ -90,14 +156,17 @@ class SentimentAnalyzer:
         # Normalizar texto
         normalized_text = text.lower()
         
+        # Tokenizar una sola vez para todos los detectores
+        tokens = self._tokenize(normalized_text)
+        
         # Detectar emociones
-        emotions = self._detect_emotions(normalized_text)
+        emotions = self._detect_emotions(normalized_text, tokens)
         
         # Analizar polaridad
-        polarity = self._analyze_polarity(normalized_text)
+        polarity = self._analyze_polarity(normalized_text, tokens)
         
         # Detectar urgencia
-        urgency = self._detect_urgency(normalized_text)
+        urgency = self._detect_urgency(normalized_text, tokens)
         
         # Componer resultado
         result = {
@@ -108,59 +177,225 @@ class SentimentAnalyzer:
             'confidence': self._calculate_confidence(emotions, polarity)
         }
         
-        logger.debug(f"Análisis de sentimiento: {result}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Análisis de sentimiento: {result}")
         return result
     
-    def _detect_emotions(self, text: str) -> Dict[str, float]:
+    def analyze_many(self, texts: Iterable[str]) -> List[Dict[str, Any]]:
+        """
+        Analiza el sentimiento de varios textos con el mismo analizador.
+        
+        Args:
+            texts: Textos a analizar
+            
+        Returns:
+            Lista de análisis en el mismo orden que los textos
+        """
+        return [self.analyze(text) for text in texts]
+    
+    def _tokenize(self, text: str) -> Dict[str, Any]:
+        """
+        Recorre el texto una sola vez y extrae palabras y signos.
+        
+        Para cada palabra (secuencia \\w+) se guarda su posición, el separador
+        que la precede y su índice aproximado en el texto separado por
+        espacios, que es el que se usa para la ventana de negación.
+        
+        Args:
+            text: Texto normalizado
+            
+        Returns:
+            Diccionario con palabras, posiciones, separadores, índices y
+            secuencias de signos
+        """
+        words = []
+        starts = []
+        gaps = []
+        word_indices = []
+        symbol_runs = []
+        has_uppercase_run = False
+        
+        # Bloques separados por espacios (equivalente a str.split())
+        chunk_count = 0
+        chunk_start = -1
+        in_chunk = False
+        previous_end = 0
+        
+        for match in _TOKEN_PATTERN.finditer(text):
+            kind = match.lastindex
+            start = match.start()
+            
+            if kind == 1:
+                in_chunk = False
+                continue
+            
+            if not in_chunk:
+                in_chunk = True
+                chunk_count += 1
+                chunk_start = start
+            
+            if kind == 3:
+                symbol_runs.append(match.group())
+                continue
+            
+            word = match.group()
+            gap = text[previous_end:start]
+            if gap == ' ':
+                gaps.append(_GAP_SINGLE_SPACE)
+            elif gap.isspace():
+                gaps.append(_GAP_WHITESPACE)
+            else:
+                gaps.append(_GAP_OTHER)
+            
+            # Equivale a len(text[:start].split()) - 1
+            word_indices.append(chunk_count - (1 if chunk_start == start else 0) - 1)
+            words.append(word)
+            starts.append(start)
+            previous_end = match.end()
+            
+            if not has_uppercase_run and not word.islower() and _UPPERCASE_RUN.search(word):
+                has_uppercase_run = True
+        
+        return {
+            'words': words,
+            'starts': starts,
+            'gaps': gaps,
+            'word_indices': word_indices,
+            'symbol_runs': symbol_runs,
+            'has_uppercase_run': has_uppercase_run
+        }
+    
+    def _phrase_matches(self, tokens: Dict[str, Any], index: int, parts: Tuple[str, ...],
+                        prefix_last: bool = False) -> bool:
+        """
+        Comprueba si una expresión de varias palabras empieza en un token.
+        
+        Args:
+            tokens: Resultado de _tokenize
+            index: Índice del token donde empieza la expresión
+            parts: Palabras de la expresión
+            prefix_last: Si la última palabra solo debe ser prefijo del token
+            
+        Returns:
+            True si la expresión aparece separada por espacios simples
+        """
+        words = tokens['words']
+        gaps = tokens['gaps']
+        end = index + len(parts)
+        if end > len(words) or words[index] != parts[0]:
+            return False
+        
+        for offset in range(1, len(parts)):
+            position = index + offset
+            if gaps[position] != _GAP_SINGLE_SPACE:
+                return False
+            if offset == len(parts) - 1 and prefix_last:
+                if not words[position].startswith(parts[offset]):
+                    return False
+            elif words[position] != parts[offset]:
+                return False
+        return True
+    
+    def _collect_intensified(self, tokens: Dict[str, Any], index: int, found: Dict[str, set]) -> None:
+        """
+        Registra las palabras clave precedidas por el intensificador del token dado.
+        
+        Equivale a buscar r'\\b<intensificador>\\s+<palabra clave>' en el texto:
+        la palabra clave puede ser el prefijo de la palabra siguiente.
+        
+        Args:
+            tokens: Resultado de _tokenize
+            index: Índice del token intensificador
+            found: Palabra clave -> intensificadores encontrados (se actualiza)
+        """
+        words = tokens['words']
+        following = index + 1
+        if following >= len(words) or tokens['gaps'][following] == _GAP_OTHER:
+            return
+        
+        intensifier = words[index]
+        next_word = words[following]
+        for length in range(1, min(len(next_word), self._max_keyword_length) + 1):
+            prefix = next_word[:length]
+            if prefix in self._keyword_index:
+                found.setdefault(prefix, set()).add(intensifier)
+        
+        for parts, _, _, keyword in self._phrase_index.get(next_word, ()):
+            if self._phrase_matches(tokens, following, parts, prefix_last=True):
+                found.setdefault(keyword, set()).add(intensifier)
+    
+    def _is_negated(self, negation_prefix: List[int], word_index: int) -> bool:
+        """
+        Indica si hay una negación hasta 3 palabras antes del índice dado.
+        
+        Args:
+            negation_prefix: Número acumulado de negaciones por token
+            word_index: Índice aproximado de la palabra clave
+            
+        Returns:
+            True si la palabra clave está negada
+        """
+        low = max(word_index - 3, 0)
+        high = min(word_index, len(negation_prefix) - 1)
+        return high > low and negation_prefix[high] > negation_prefix[low]
+    
+    def _detect_emotions(self, text: str, tokens: Optional[Dict[str, Any]] = None) -> Dict[str, float]:
         """
         Detecta emociones en el texto basado en palabras clave.
         
         Args:
             text: Texto normalizado a analizar
+            tokens: Resultado de _tokenize (se calcula si no se proporciona)
             
         Returns:
             Diccionario con puntuaciones para cada emoción
         """
+        if tokens is None:
+            tokens = self._tokenize(text)
+        
         emotions = {emotion: 0.0 for emotion in self.emotion_lexicon.keys()}
-        words = re.findall(r'\b\w+\b', text)
-        
-        # Detectar negaciones en el texto
-        negation_indices = [i for i, word in enumerate(words) 
-                          if word in self.negations]
-        
-        for emotion, keywords in self.emotion_lexicon.items():
-            for keyword in keywords:
-                # Buscar la palabra clave en el texto
-                if keyword in text:
-                    # Obtener todas las ocurrencias
-                    for match in re.finditer(r'\b' + re.escape(keyword) + r'\b', text):
-                        start = match.start()
-                        
-                        # Calcular el índice aproximado en la lista de palabras
-                        word_index = len(text[:start].split()) - 1
-                        
-                        # Verificar si hay una negación cercana (hasta 3 palabras antes)
-                        is_negated = any(neg_idx >= 0 and neg_idx < word_index and 
-                                         word_index - neg_idx <= 3 
-                                         for neg_idx in negation_indices)
-                        
-                        # Calcular puntuación
-                        if is_negated:
-                            # Si hay negación, invertir la emoción o reducir su intensidad
-                            opposite_emotion = self._get_opposite_emotion(emotion)
-                            if opposite_emotion:
-                                emotions[opposite_emotion] += 0.5
-                            else:
-                                emotions[emotion] -= 0.3  # Reducir si no hay opuesto
-                        else:
-                            # Sin negación, añadir puntuación normal
-                            emotions[emotion] += 1.0
-                            
-                            # Verificar intensificadores
-                            for intensifier in self.intensifiers:
-                                pattern = r'\b' + re.escape(intensifier) + r'\s+' + re.escape(keyword)
-                                if re.search(pattern, text):
-                                    emotions[emotion] += 0.5
+        words = tokens['words']
+        
+        # Negaciones acumuladas: negation_prefix[i] = negaciones en words[:i]
+        negation_prefix = [0]
+        for word in words:
+            negation_prefix.append(negation_prefix[-1] + (word in self._negation_set))
+        
+        occurrences = []
+        intensified = {}
+        phrase_ends = {}
+        for index, word in enumerate(words):
+            for order, emotion, keyword in self._keyword_index.get(word, ()):
+                occurrences.append((order, tokens['starts'][index], emotion, keyword, index))
+            
+            for parts, order, emotion, keyword in self._phrase_index.get(word, ()):
+                # Las ocurrencias de una misma expresión no se solapan
+                if index >= phrase_ends.get(keyword, 0) and self._phrase_matches(tokens, index, parts):
+                    phrase_ends[keyword] = index + len(parts)
+                    occurrences.append((order, tokens['starts'][index], emotion, keyword, index))
+            
+            if word in self._intensifier_set:
+                self._collect_intensified(tokens, index, intensified)
+        
+        # Mismo orden de acumulación que el recorrido por emoción y palabra clave
+        occurrences.sort(key=lambda occurrence: (occurrence[0], occurrence[1]))
+        
+        for _, _, emotion, keyword, index in occurrences:
+            # Verificar si hay una negación cercana (hasta 3 palabras antes)
+            if self._is_negated(negation_prefix, tokens['word_indices'][index]):
+                # Si hay negación, invertir la emoción o reducir su intensidad
+                opposite_emotion = self._opposites[emotion]
+                if opposite_emotion:
+                    emotions[opposite_emotion] += 0.5
+                else:
+                    emotions[emotion] -= 0.3  # Reducir si no hay opuesto
+            else:
+                # Sin negación, añadir puntuación normal
+                emotions[emotion] += 1.0
+                
+                # Un incremento por cada intensificador distinto que precede a la palabra clave
+                for _ in intensified.get(keyword, ()):
+                    emotions[emotion] += 0.5
         
         # Normalizar puntuaciones (0.0 - 1.0)
         total = sum(emotions.values())
@@ -169,32 +404,67 @@ class SentimentAnalyzer:
         
         return emotions
     
-    def _analyze_polarity(self, text: str) -> float:
+    def _count_terms(self, tokens: Dict[str, Any], term_words: frozenset,
+                     term_phrases: List[Tuple[str, ...]], symbols: List[str]) -> Tuple[int, int]:
+        """
+        Cuenta las apariciones de términos y símbolos de polaridad.
+        
+        Args:
+            tokens: Resultado de _tokenize
+            term_words: Términos de una sola palabra
+            term_phrases: Términos de varias palabras
+            symbols: Emoticonos y emojis
+            
+        Returns:
+            Tupla (apariciones de términos, apariciones de símbolos)
+        """
+        term_count = 0
+        for index, word in enumerate(tokens['words']):
+            if word in term_words:
+                term_count += 1
+            for parts in term_phrases:
+                if word == parts[0] and self._phrase_matches(tokens, index, parts):
+                    term_count += 1
+        
+        # Los símbolos no contienen letras ni espacios: siempre quedan dentro
+        # de una misma secuencia de signos
+        symbol_count = 0
+        for run in tokens['symbol_runs']:
+            for symbol in symbols:
+                symbol_count += run.count(symbol)
+        
+        return term_count, symbol_count
+    
+    def _analyze_polarity(self, text: str, tokens: Optional[Dict[str, Any]] = None) -> float:
         """
         Determina la polaridad del texto (positivo o negativo).
         
         Args:
             text: Texto normalizado a analizar
+            tokens: Resultado de _tokenize (se calcula si no se proporciona)
             
         Returns:
             Puntuación de polaridad entre -1.0 (negativo) y 1.0 (positivo)
         """
+        if tokens is None:
+            tokens = self._tokenize(text)
+        
         # Inicializar puntuación
         score = 0.0
         
-        # Comprobar patrones positivos
-        positive_count = 0
-        for pattern in self.positive_patterns:
-            matches = re.findall(pattern, text)
-            positive_count += len(matches)
-            score += len(matches) * 0.5
+        # Comprobar términos positivos
+        positive_terms, positive_symbols = self._count_terms(
+            tokens, self._positive_words, self._positive_phrases, self.positive_symbols)
+        positive_count = positive_terms + positive_symbols
+        score += positive_terms * 0.5
+        score += positive_symbols * 0.5
         
-        # Comprobar patrones negativos
-        negative_count = 0
-        for pattern in self.negative_patterns:
-            matches = re.findall(pattern, text)
-            negative_count += len(matches)
-            score -= len(matches) * 0.5
+        # Comprobar términos negativos
+        negative_terms, negative_symbols = self._count_terms(
+            tokens, self._negative_words, self._negative_phrases, self.negative_symbols)
+        negative_count = negative_terms + negative_symbols
+        score -= negative_terms * 0.5
+        score -= negative_symbols * 0.5
         
         # Normalizar entre -1 y 1
         if positive_count + negative_count > 0:
@@ -202,33 +472,27 @@ class SentimentAnalyzer:
         
         return score
     
-    def _detect_urgency(self, text: str) -> float:
+    def _detect_urgency(self, text: str, tokens: Optional[Dict[str, Any]] = None) -> float:
         """
         Detecta el nivel de urgencia en el mensaje.
         
+        Las palabras de urgencia se buscan como subcadenas del texto completo
+        (por ejemplo, "ya" también cuenta dentro de "playa").
+        
         Args:
             text: Texto normalizado a analizar
+            tokens: Resultado de _tokenize (se calcula si no se proporciona)
             
         Returns:
             Nivel de urgencia entre 0.0 (baja) y 1.0 (alta)
         """
-        urgency_score = 0.0
-        
-        # Palabras que indican urgencia
-        urgency_words = [
-            'urgente', 'inmediato', 'rápido', 'prisa', 'ahora', 'emergencia',
-            'crítico', 'crítica', 'grave', 'importante', 'pronto', 'ya'
-        ]
+        if tokens is None:
+            tokens = self._tokenize(text)
         
-        # Patrones de urgencia (signos de exclamación, mayúsculas, repetición)
-        urgency_patterns = [
-            (r'!{2,}', 0.3),  # Múltiples signos de exclamación
-            (r'\?{2,}', 0.2),  # Múltiples signos de interrogación
-            (r'[A-ZÁÉÍÓÚÑ]{3,}', 0.2)  # Palabras en mayúsculas (3+ letras)
-        ]
+        urgency_score = 0.0
         
         # Verificar palabras de urgencia
-        for word in urgency_words:
+        for word in self.urgency_words:
             if word in text:
                 urgency_score += 0.2
                 
@@ -237,10 +501,14 @@ class SentimentAnalyzer:
                     if intensifier + ' ' + word in text:
                         urgency_score += 0.1
         
-        # Verificar patrones de urgencia
-        for pattern, score in urgency_patterns:
-            if re.search(pattern, text):
-                urgency_score += score
+        # Verificar patrones de urgencia (exclamaciones, interrogaciones, mayúsculas)
+        symbol_runs = tokens['symbol_runs']
+        if any('!!' in run for run in symbol_runs):
+            urgency_score += 0.3  # Múltiples signos de exclamación
+        if any('??' in run for run in symbol_runs):
+            urgency_score += 0.2  # Múltiples signos de interrogación
+        if tokens['has_uppercase_run']:
+            urgency_score += 0.2  # Palabras en mayúsculas (3+ letras)
         
         # Limitar a 1.0
         return min(urgency_score, 1.0)
@@ -0,0 +1,235 @@
+"""
+Estado de sentimiento acotado para las conversaciones.
+Sustituye al historial completo de análisis por una ventana circular de
+tamaño fijo con los últimos mensajes y agregados acumulados (polaridad
+EWMA, urgencia máxima y recuento de emociones), de modo que el contexto
+persistido no crece con la longitud de la conversación.
+"""
+import os
+import json
+import threading
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+import logging
+
+from core.config import SENTIMENT_WINDOW_SIZE, SENTIMENT_EWMA_ALPHA
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+def new_sentiment_state(window_size: int = SENTIMENT_WINDOW_SIZE) -> Dict[str, Any]:
+    """
+    Crea un estado de sentimiento vacío.
+    
+    Args:
+        window_size: Número de mensajes recientes que se conservan
+        
+    Returns:
+        Estado serializable en JSON
+    """
+    return {
+        'window_size': max(window_size, 1),
+        'window': [],
+        'next': 0,
+        'count': 0,
+        'polarity_ewma': 0.0,
+        'max_urgency': 0.0,
+        'emotion_counts': {}
+    }
+
+def update_sentiment_state(state: Optional[Dict[str, Any]], analysis: Dict[str, Any],
+                           message_index: int, alpha: float = SENTIMENT_EWMA_ALPHA) -> Dict[str, Any]:
+    """
+    Incorpora el análisis de un mensaje al estado.
+    
+    La ventana es un búfer circular: cuando está llena se sobrescribe la
+    entrada más antigua. La urgencia máxima y el recuento de emociones se
+    refieren a la ventana; la polaridad EWMA, a toda la conversación.
+    
+    Args:
+        state: Estado actual (se crea uno nuevo si es None)
+        analysis: Resultado de SentimentAnalyzer.analyze
+        message_index: Número del mensaje en la conversación
+        alpha: Peso del mensaje más reciente en la media exponencial
+        
+    Returns:
+        El estado actualizado (el mismo diccionario si se proporcionó)
+    """
+    if state is None:
+        state = new_sentiment_state()
+    
+    entry = {
+        'message_index': message_index,
+        'polarity': analysis.get('polarity', 0.0),
+        'urgency': analysis.get('urgency', 0.0),
+        'dominant_emotion': analysis.get('dominant_emotion')
+    }
+    
+    window = state['window']
+    emotion_counts = state['emotion_counts']
+    if len(window) < state['window_size']:
+        window.append(entry)
+    else:
+        evicted = window[state['next']]
+        emotion = evicted.get('dominant_emotion')
+        if emotion:
+            emotion_counts[emotion] -= 1
+            if emotion_counts[emotion] <= 0:
+                del emotion_counts[emotion]
+        window[state['next']] = entry
+    state['next'] = (state['next'] + 1) % state['window_size']
+    
+    if entry['dominant_emotion']:
+        emotion_counts[entry['dominant_emotion']] = emotion_counts.get(entry['dominant_emotion'], 0) + 1
+    
+    # La primera observación inicializa la media exponencial
+    if state['count'] == 0:
+        state['polarity_ewma'] = entry['polarity']
+    else:
+        state['polarity_ewma'] = alpha * entry['polarity'] + (1 - alpha) * state['polarity_ewma']
+    state['count'] += 1
+    state['max_urgency'] = max(item['urgency'] for item in window)
+    
+    return state
+
+def recent_sentiments(state: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Devuelve las entradas de la ventana de la más antigua a la más reciente.
+    
+    Args:
+        state: Estado de sentimiento
+        
+    Returns:
+        Lista de entradas compactas (índice, polaridad, urgencia, emoción)
+    """
+    if not state or not state.get('window'):
+        return []
+    window = state['window']
+    if len(window) < state['window_size']:
+        return list(window)
+    return window[state['next']:] + window[:state['next']]
+
+def recurring_emotion(state: Optional[Dict[str, Any]], min_count: int = 2) -> Optional[str]:
+    """
+    Obtiene la emoción que más se repite en la ventana reciente.
+    
+    Args:
+        state: Estado de sentimiento
+        min_count: Apariciones mínimas para considerarla recurrente
+        
+    Returns:
+        Nombre de la emoción o None si ninguna se repite lo suficiente
+    """
+    if not state or not state.get('emotion_counts'):
+        return None
+    emotion, count = max(state['emotion_counts'].items(), key=lambda item: item[1])
+    return emotion if count >= min_count else None
+
+def state_from_history(history: List[Dict[str, Any]], window_size: int = SENTIMENT_WINDOW_SIZE) -> Dict[str, Any]:
+    """
+    Convierte un historial de sentimiento antiguo (lista completa de análisis)
+    en el estado acotado.
+    
+    Args:
+        history: Entradas con las claves 'analysis' y 'message_index'
+        window_size: Tamaño de la ventana del nuevo estado
+        
+    Returns:
+        Estado de sentimiento equivalente
+    """
+    state = new_sentiment_state(window_size)
+    for position, item in enumerate(history):
+        update_sentiment_state(state, item.get('analysis', {}), item.get('message_index', position + 1))
+    return state
+
+class SentimentAnalyticsStore:
+    """
+    Almacén opcional de análisis completos por mensaje.
+    Escribe una línea JSON por mensaje en un archivo de solo anexado, fuera
+    del contexto de la conversación.
+    
+    Con un trabajador de persistencia, record() solo acumula la línea en
+    memoria y encola su escritura: las líneas pendientes se escriben juntas
+    en segundo plano, con un único trabajo en cola por archivo.
+    """
+    
+    def __init__(self, file_path: str, persistence: Any = None):
+        """
+        Inicializa el almacén.
+        
+        Args:
+            file_path: Ruta del archivo JSONL
+            persistence: Trabajador de persistencia (ver get_persistence_worker);
+                sin él, cada análisis se escribe en el momento
+        """
+        self.file_path = file_path
+        self.persistence = persistence
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        directory = os.path.dirname(file_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+    
+    def record(self, context: Dict[str, Any], message: str, analysis: Dict[str, Any]) -> bool:
+        """
+        Registra el análisis de un mensaje.
+        
+        Args:
+            context: Contexto de la conversación (para session_id, user_id e índice)
+            message: Mensaje analizado
+            analysis: Resultado completo de SentimentAnalyzer.analyze
+            
+        Returns:
+            True si se registró o se encoló correctamente, False en caso contrario
+        """
+        line = json.dumps({
+            'timestamp': datetime.now().isoformat(),
+            'session_id': context.get('session_id'),
+            'user_id': context.get('user_id', 'anonymous'),
+            'message_index': context.get('message_count'),
+            'message': message,
+            'analysis': analysis
+        }, ensure_ascii=False)
+        if self.persistence is None:
+            with self._write_lock:
+                return self._write([line])
+        
+        with self._lock:
+            self._buffer.append(line)
+        # Si ya hay una escritura pendiente se combina con ella y escribirá también esta línea
+        self.persistence.enqueue(('sentiment_analytics', self.file_path), self.flush)
+        return True
+    
+    def flush(self) -> bool:
+        """
+        Escribe las líneas acumuladas.
+        
+        Returns:
+            True si se escribieron correctamente (o no había ninguna), False en caso contrario
+        """
+        # El bloqueo de escritura mantiene el orden de las líneas entre vaciados simultáneos
+        with self._write_lock:
+            with self._lock:
+                lines, self._buffer = self._buffer, []
+            if not lines:
+                return True
+            return self._write(lines)
+    
+    def _write(self, lines: List[str]) -> bool:
+        """
+        Anexa líneas al archivo. Debe llamarse con el bloqueo de escritura adquirido.
+        
+        Args:
+            lines: Líneas JSON a escribir
+            
+        Returns:
+            True si se escribieron correctamente, False en caso contrario
+        """
+        try:
+            with open(self.file_path, 'a', encoding='utf-8') as f:
+                f.write(''.join(line + '\n' for line in lines))
+            return True
+        except Exception as e:
+            logger.error(f"Error al registrar análisis de sentimiento en {self.file_path}: {str(e)}")
+            return False
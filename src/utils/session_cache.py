@@ -0,0 +1,322 @@
+"""
+Caché en memoria de los contextos de conversación activos.
+Mantiene el contexto vivo de cada sesión en el proceso para que las
+peticiones de una conversación activa no lean del almacén. Está acotada
+por número de sesiones y por tamaño estimado en bytes (expulsión LRU),
+escribe cada actualización en el almacén persistente (write-through) y
+carga desde él, bajo demanda, las sesiones que no están en memoria.
+
+Con un almacén de sesiones compartido (SESSION_BACKEND=redis) cada
+actualización se publica además en él con un sello de versión, para que
+cualquier proceso atienda la siguiente petición de la sesión: si el sello
+coincide con el de la copia local se usa esta, y si no se carga la publicada.
+"""
+import sys
+import uuid
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+import logging
+
+from core.config import SESSION_CACHE_MAX_ENTRIES, SESSION_CACHE_MAX_BYTES
+from utils.context_manager import ContextPersistenceManager
+from services.persistence_worker import snapshot_context
+from services.session_backend import SessionBackend, SessionBackendError
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+# Espacios de nombres de los contextos y de sus sellos de versión en el almacén compartido
+CONTEXT_NAMESPACE = 'context'
+CONTEXT_VERSION_NAMESPACE = 'context_version'
+
+def estimate_size(value: Any) -> int:
+    """
+    Estima la memoria ocupada por un valor y todo lo que contiene.
+    
+    Args:
+        value: Valor a medir (estructuras JSON: dict, list, str, números)
+        
+    Returns:
+        Tamaño aproximado en bytes
+    """
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        for key, item in value.items():
+            size += sys.getsizeof(key) + estimate_size(item)
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            size += estimate_size(item)
+    return size
+
+def estimate_context_size(context: Dict[str, Any],
+                          previous: Optional[Dict[str, Tuple[int, int]]] = None) -> Tuple[int, Dict[str, Tuple[int, int]]]:
+    """
+    Estima el tamaño de un contexto reutilizando la medida anterior de sus listas.
+    
+    Las listas (mensajes, historiales) solo reciben elementos nuevos, así
+    que de cada una se recuerda cuántos elementos se midieron y cuánto
+    ocupaban, y solo se miden los añadidos después; si una lista se acorta
+    se mide completa. El resto de valores están acotados y se miden enteros.
+    
+    Args:
+        context: Contexto de la conversación
+        previous: Medida de las listas devuelta por la estimación anterior
+            del mismo contexto (None = medir todo)
+        
+    Returns:
+        Tupla (tamaño aproximado en bytes, medida de las listas por clave:
+        elementos medidos y bytes que ocupan)
+    """
+    size = sys.getsizeof(context)
+    list_sizes = {}
+    for key, value in context.items():
+        size += sys.getsizeof(key)
+        if isinstance(value, list):
+            counted, items_size = previous.get(key, (0, 0)) if previous else (0, 0)
+            if counted > len(value):
+                counted, items_size = 0, 0
+            for item in value[counted:]:
+                items_size += estimate_size(item)
+            list_sizes[key] = (len(value), items_size)
+            size += sys.getsizeof(value) + items_size
+        else:
+            size += estimate_size(value)
+    return size, list_sizes
+
+class SessionCache:
+    """
+    Caché LRU de contextos vivos indexada por clave de sesión.
+    Los contextos devueltos son los mismos objetos que modifican los
+    agentes; put() actualiza su tamaño y posición y encola su guardado.
+    """
+    
+    def __init__(self, context_manager: ContextPersistenceManager, persistence: Any,
+                 max_entries: int = SESSION_CACHE_MAX_ENTRIES, max_bytes: int = SESSION_CACHE_MAX_BYTES,
+                 shared: Optional[SessionBackend] = None):
+        """
+        Inicializa la caché.
+        
+        Args:
+            context_manager: Gestor de persistencia para cargas y escrituras
+            persistence: Trabajador de persistencia (ver get_persistence_worker)
+            max_entries: Número máximo de sesiones en memoria
+            max_bytes: Tamaño estimado máximo del conjunto de contextos
+            shared: Almacén de sesiones compartido entre procesos (opcional)
+        """
+        self.context_manager = context_manager
+        self.persistence = persistence
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.shared = shared
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._loads = 0
+        self._evictions = 0
+        self._writes = 0
+        self._shared_loads = 0
+        self._shared_errors = 0
+    
+    def get(self, session_key: str) -> Optional[Dict[str, Any]]:
+        """
+        Obtiene el contexto vivo de una sesión.
+        Si no está en memoria se carga del almacén y se incorpora a la caché.
+        Con almacén compartido se usa la última versión publicada.
+        
+        Args:
+            session_key: Clave de la sesión (también es el user_id en el almacén)
+            
+        Returns:
+            El contexto o None si la sesión no existe
+        """
+        if self.shared is not None:
+            context = self._get_shared(session_key)
+            if context is not None:
+                return context
+        
+        with self._lock:
+            entry = self._entries.get(session_key)
+            if entry is not None:
+                self._entries.move_to_end(session_key)
+                self._hits += 1
+                return entry[0]
+            self._misses += 1
+        
+        context = self.context_manager.load_context(session_key)
+        if context is None:
+            return None
+        size, list_sizes = estimate_context_size(context)
+        
+        with self._lock:
+            self._loads += 1
+            # Otra petición pudo cargar la misma sesión mientras tanto
+            entry = self._entries.get(session_key)
+            if entry is not None:
+                return entry[0]
+            self._store(session_key, context, size, list_sizes)
+        return context
+    
+    def _get_shared(self, session_key: str) -> Optional[Dict[str, Any]]:
+        """
+        Obtiene el contexto publicado en el almacén compartido.
+        Si su versión coincide con la copia local se devuelve esta, sin
+        descargar ni deserializar el contexto.
+        
+        Args:
+            session_key: Clave de la sesión
+            
+        Returns:
+            El contexto o None si no está publicado (o el almacén falla)
+        """
+        try:
+            stamp = self.shared.get(CONTEXT_VERSION_NAMESPACE, session_key)
+            if stamp is None:
+                return None
+            with self._lock:
+                entry = self._entries.get(session_key)
+                if entry is not None and entry[2] == stamp['version']:
+                    self._entries.move_to_end(session_key)
+                    self._hits += 1
+                    return entry[0]
+            published = self.shared.get(CONTEXT_NAMESPACE, session_key)
+        except (SessionBackendError, ValueError) as e:
+            logger.error(f"Error al leer el contexto compartido de {session_key}: {str(e)}")
+            with self._lock:
+                self._shared_errors += 1
+            return None
+        if published is None:
+            return None
+        
+        context = published['context']
+        size, list_sizes = estimate_context_size(context)
+        with self._lock:
+            self._misses += 1
+            self._shared_loads += 1
+            self._store(session_key, context, size, list_sizes, published['version'])
+        return context
+    
+    def _put_shared(self, session_key: str, context: Dict[str, Any], version: str) -> None:
+        """
+        Publica el contexto en el almacén compartido: primero el contenido y
+        después el sello que lo hace visible como versión actual.
+        
+        Args:
+            session_key: Clave de la sesión
+            context: Contexto de la conversación
+            version: Sello de la versión
+        """
+        try:
+            self.shared.set(CONTEXT_NAMESPACE, session_key, {'version': version, 'context': context})
+            self.shared.set(CONTEXT_VERSION_NAMESPACE, session_key, {'version': version})
+        except SessionBackendError as e:
+            logger.error(f"Error al publicar el contexto de {session_key}: {str(e)}")
+            with self._lock:
+                self._shared_errors += 1
+    
+    def put(self, session_key: str, context: Dict[str, Any], write_through: bool = True) -> None:
+        """
+        Registra o actualiza el contexto de una sesión.
+        
+        Args:
+            session_key: Clave de la sesión
+            context: Contexto vivo de la conversación
+            write_through: Si se debe encolar su guardado en el almacén
+        """
+        with self._lock:
+            entry = self._entries.get(session_key)
+            # La medida anterior solo sirve si la entrada es este mismo contexto
+            previous = entry[3] if entry is not None and entry[0] is context else None
+        size, list_sizes = estimate_context_size(context, previous)
+        version = uuid.uuid4().hex if self.shared is not None else None
+        with self._lock:
+            self._store(session_key, context, size, list_sizes, version)
+        
+        if self.shared is not None:
+            self._put_shared(session_key, context, version)
+        
+        if write_through:
+            self.persistence.enqueue(('context', session_key, context.get('session_id')),
+                                     self.context_manager.save_context, session_key, snapshot_context(context))
+            with self._lock:
+                self._writes += 1
+    
+    def _store(self, session_key: str, context: Dict[str, Any], size: int,
+               list_sizes: Dict[str, Tuple[int, int]], version: Optional[str] = None) -> None:
+        """
+        Inserta o actualiza una entrada y expulsa las menos usadas si se supera
+        algún límite. Debe llamarse con el bloqueo adquirido.
+        
+        Args:
+            session_key: Clave de la sesión
+            context: Contexto de la conversación
+            size: Tamaño estimado del contexto
+            list_sizes: Medida de sus listas (ver estimate_context_size)
+            version: Sello de la versión publicada en el almacén compartido
+        """
+        previous = self._entries.pop(session_key, None)
+        if previous is not None:
+            self._bytes -= previous[1]
+        
+        self._entries[session_key] = (context, size, version, list_sizes)
+        self._bytes += size
+        
+        # La entrada recién usada nunca se expulsa
+        while len(self._entries) > 1 and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            _, (_, evicted_size, _, _) = self._entries.popitem(last=False)
+            self._bytes -= evicted_size
+            self._evictions += 1
+    
+    def invalidate(self, session_key: Optional[str] = None) -> None:
+        """
+        Elimina una sesión de la caché (o todas si no se indica ninguna).
+        Sus datos persistidos no se modifican; la copia publicada en el
+        almacén compartido se elimina.
+        
+        Args:
+            session_key: Clave de la sesión
+        """
+        with self._lock:
+            if session_key is None:
+                self._entries.clear()
+                self._bytes = 0
+                return
+            entry = self._entries.pop(session_key, None)
+            if entry is not None:
+                self._bytes -= entry[1]
+        
+        if self.shared is not None:
+            try:
+                self.shared.delete(CONTEXT_VERSION_NAMESPACE, session_key)
+                self.shared.delete(CONTEXT_NAMESPACE, session_key)
+            except SessionBackendError as e:
+                logger.error(f"Error al eliminar el contexto compartido de {session_key}: {str(e)}")
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Devuelve las métricas de la caché.
+        
+        Returns:
+            Diccionario con aciertos, fallos, cargas del almacén, expulsiones,
+            escrituras, tasa de aciertos, ocupación y, con almacén
+            compartido, cargas de versiones publicadas por otros procesos
+        """
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'hits': self._hits,
+                'misses': self._misses,
+                'loads': self._loads,
+                'evictions': self._evictions,
+                'writes': self._writes,
+                'hit_rate': round(self._hits / lookups, 4) if lookups else 0.0,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'estimated_bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'shared': self.shared is not None,
+                'shared_loads': self._shared_loads,
+                'shared_errors': self._shared_errors
+            }
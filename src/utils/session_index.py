@@ -0,0 +1,274 @@
+"""
+Índice de metadatos de las sesiones de conversación.
+Mantiene una fila resumen por sesión (usuario, creación, último guardado,
+número de mensajes, último agente y si se capturó un lead) que se actualiza
+en cada guardado de contexto. Listar, ordenar y filtrar sesiones es una
+consulta indexada con paginación, sin abrir ni decodificar instantáneas.
+
+Reconstrucción del índice a partir de los contextos ya guardados (desde el
+directorio src):
+    python -m utils.session_index rebuild --storage-dir storage/contexts
+"""
+import os
+import sys
+import time
+import sqlite3
+import argparse
+import threading
+from datetime import datetime
+from typing import Dict, Any, Optional
+import logging
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+# Nombre de la base de datos del índice cuando el almacén no es SQLite
+DEFAULT_SESSION_INDEX_FILENAME = "sessions.db"
+
+# Sesiones por página como máximo
+MAX_PAGE_SIZE = 500
+
+# Columnas por las que se puede ordenar (todas indexadas)
+SORTABLE_COLUMNS = ('last_saved_at', 'created_at', 'message_count')
+
+def lead_captured(context: Dict[str, Any]) -> bool:
+    """
+    Indica si en la conversación se completaron los datos de contacto.
+    
+    Args:
+        context: Contexto de la conversación
+        
+    Returns:
+        True si se guardó un lead
+    """
+    return bool(context.get('form_completed') or context.get('data_collection_complete'))
+
+class SessionIndex:
+    """
+    Tabla session_index en SQLite con una fila por (usuario, session_id).
+    """
+    
+    def __init__(self, db_path: str):
+        """
+        Inicializa el índice y crea su tabla si no existe.
+        
+        Args:
+            db_path: Ruta de la base de datos (puede ser la del almacén de contextos)
+        """
+        self.db_path = db_path
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        self._init_schema()
+    
+    def _get_connection(self) -> sqlite3.Connection:
+        """
+        Obtiene la conexión del hilo actual.
+        
+        Returns:
+            Conexión a la base de datos
+        """
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.db_path, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+    
+    def _init_schema(self) -> None:
+        """
+        Crea la tabla del índice y los índices de ordenación y filtrado.
+        """
+        connection = self._get_connection()
+        with connection:
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS session_index (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id TEXT NOT NULL,
+                    session_id TEXT NOT NULL DEFAULT '',
+                    created_at REAL NOT NULL,
+                    last_saved_at REAL NOT NULL,
+                    message_count INTEGER NOT NULL DEFAULT 0,
+                    current_agent TEXT,
+                    lead_captured INTEGER NOT NULL DEFAULT 0,
+                    save_count INTEGER NOT NULL DEFAULT 0,
+                    snapshot_id TEXT,
+                    UNIQUE (user_id, session_id)
+                )
+            """)
+            for name, columns in (('last_saved', 'last_saved_at'),
+                                  ('created', 'created_at'),
+                                  ('message_count', 'message_count'),
+                                  ('agent', 'current_agent, last_saved_at'),
+                                  ('lead', 'lead_captured, last_saved_at'),
+                                  ('snapshot', 'snapshot_id')):
+                connection.execute(f"CREATE INDEX IF NOT EXISTS idx_session_index_{name} ON session_index ({columns})")
+    
+    def record(self, user_id: str, snapshot_id: str, context: Dict[str, Any],
+               saved_at: Optional[float] = None) -> None:
+        """
+        Registra un guardado de contexto en la fila de su sesión.
+        
+        Args:
+            user_id: Identificador del usuario
+            snapshot_id: Instantánea donde se guardó el contexto
+            context: Contexto guardado
+            saved_at: Momento del guardado (por defecto, ahora)
+        """
+        saved_at = saved_at or time.time()
+        connection = self._get_connection()
+        with connection:
+            connection.execute(
+                """
+                INSERT INTO session_index (user_id, session_id, created_at, last_saved_at, message_count,
+                                           current_agent, lead_captured, save_count, snapshot_id)
+                VALUES (?, ?, ?, ?, ?, ?, ?, 1, ?)
+                ON CONFLICT (user_id, session_id) DO UPDATE SET
+                    created_at = MIN(created_at, excluded.created_at),
+                    last_saved_at = MAX(last_saved_at, excluded.last_saved_at),
+                    message_count = excluded.message_count,
+                    current_agent = excluded.current_agent,
+                    lead_captured = MAX(lead_captured, excluded.lead_captured),
+                    save_count = save_count + 1,
+                    snapshot_id = excluded.snapshot_id
+                """,
+                (user_id, context.get('session_id') or '', saved_at, saved_at, context.get('message_count', 0),
+                 context.get('current_agent'), int(lead_captured(context)), snapshot_id)
+            )
+    
+    def forget_snapshot(self, snapshot_id: str) -> int:
+        """
+        Elimina las sesiones cuya última instantánea se ha borrado.
+        
+        Args:
+            snapshot_id: Identificador de la instantánea eliminada
+            
+        Returns:
+            Filas eliminadas
+        """
+        connection = self._get_connection()
+        with connection:
+            return connection.execute("DELETE FROM session_index WHERE snapshot_id = ?", (snapshot_id,)).rowcount
+    
+    def query(self, user_id: Optional[str] = None, agent: Optional[str] = None,
+              lead: Optional[bool] = None, since: Optional[float] = None, until: Optional[float] = None,
+              order_by: str = 'last_saved_at', descending: bool = True,
+              limit: int = 50, offset: int = 0) -> Dict[str, Any]:
+        """
+        Lista sesiones filtradas, ordenadas y paginadas.
+        
+        Args:
+            user_id: Solo las sesiones de este usuario
+            agent: Solo las sesiones cuyo último agente es este
+            lead: Solo las sesiones con (True) o sin (False) lead capturado
+            since: Último guardado posterior o igual a este momento (epoch)
+            until: Último guardado anterior a este momento (epoch)
+            order_by: Columna de ordenación (ver SORTABLE_COLUMNS)
+            descending: Orden descendente
+            limit: Sesiones por página (máximo MAX_PAGE_SIZE)
+            offset: Sesiones que se saltan
+            
+        Returns:
+            Diccionario con la página de sesiones, el total que cumple los
+            filtros y los parámetros de paginación
+        """
+        if order_by not in SORTABLE_COLUMNS:
+            raise ValueError(f"No se puede ordenar por '{order_by}'; opciones: {', '.join(SORTABLE_COLUMNS)}")
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        offset = max(offset, 0)
+        
+        conditions = []
+        params = []
+        if user_id is not None:
+            conditions.append("user_id = ?")
+            params.append(user_id)
+        if agent is not None:
+            conditions.append("current_agent = ?")
+            params.append(agent)
+        if lead is not None:
+            conditions.append("lead_captured = ?")
+            params.append(int(lead))
+        if since is not None:
+            conditions.append("last_saved_at >= ?")
+            params.append(since)
+        if until is not None:
+            conditions.append("last_saved_at < ?")
+            params.append(until)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        direction = "DESC" if descending else "ASC"
+        
+        connection = self._get_connection()
+        total = connection.execute(f"SELECT COUNT(*) FROM session_index {where}", params).fetchone()[0]
+        rows = connection.execute(
+            f"SELECT user_id, session_id, created_at, last_saved_at, message_count, current_agent, "
+            f"lead_captured, save_count, snapshot_id FROM session_index {where} "
+            f"ORDER BY {order_by} {direction}, id {direction} LIMIT ? OFFSET ?",
+            params + [limit, offset]
+        ).fetchall()
+        return {
+            'sessions': [
+                {
+                    'user_id': user_id,
+                    'session_id': session_id or None,
+                    'created_at': datetime.fromtimestamp(created_at).isoformat(),
+                    'last_saved': datetime.fromtimestamp(last_saved_at).isoformat(),
+                    'message_count': message_count,
+                    'current_agent': current_agent,
+                    'lead_captured': bool(captured),
+                    'save_count': save_count,
+                    'snapshot_id': snapshot_id
+                }
+                for (user_id, session_id, created_at, last_saved_at, message_count, current_agent,
+                     captured, save_count, snapshot_id) in rows
+            ],
+            'total': total,
+            'limit': limit,
+            'offset': offset
+        }
+    
+    def rebuild(self, contexts: Any) -> int:
+        """
+        Rellena el índice con los contextos existentes (sin borrar filas).
+        
+        Args:
+            contexts: Iterador de tuplas (timestamp, contexto), como el de
+                ContextPersistenceManager.iter_latest_contexts
+                
+        Returns:
+            Sesiones registradas
+        """
+        count = 0
+        for timestamp, context in contexts:
+            user_id = context.get('user_id')
+            if not user_id:
+                continue
+            self.record(user_id, None, context, float(timestamp))
+            count += 1
+        return count
+
+def main() -> int:
+    """
+    Punto de entrada de la línea de comandos.
+    
+    Returns:
+        Código de salida
+    """
+    parser = argparse.ArgumentParser(description="Índice de metadatos de sesiones")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    rebuild_parser = subparsers.add_parser('rebuild', help='Indexar los contextos ya guardados')
+    rebuild_parser.add_argument('--storage-dir', default='storage/contexts', help='Directorio de contextos')
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.INFO)
+    # Importación local: context_manager depende de este módulo
+    from utils.context_manager import ContextPersistenceManager
+    manager = ContextPersistenceManager(args.storage_dir)
+    start = time.perf_counter()
+    count = manager.index.rebuild(manager.iter_latest_contexts())
+    print(f"Sesiones indexadas: {count} en {time.perf_counter() - start:.1f}s -> {manager.index.db_path}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,180 @@
+"""
+Bloqueos por sesión para el procesamiento de turnos de conversación.
+Los turnos de una misma sesión se ejecutan de uno en uno; los de sesiones
+distintas no comparten bloqueo y se ejecutan en paralelo. La tabla de
+bloqueos está repartida en fragmentos (shards) para que registrar y liberar
+sesiones no serialice a todas las peticiones en un único mutex, y cada
+bloqueo se elimina cuando ningún turno lo usa.
+
+Los turnos asíncronos (hold_async) no esperan en un hilo: se apuntan en la
+entrada de la sesión y el turno que libera el bloqueo despierta al primero.
+"""
+import time
+import asyncio
+import threading
+from collections import deque
+from contextlib import contextmanager, asynccontextmanager
+from typing import Dict, Any, Hashable, Iterator, AsyncIterator
+import logging
+
+from core.config import SESSION_LOCK_SHARDS
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+class _LockShard:
+    """Fragmento de la tabla: mutex propio y bloqueos de sus sesiones"""
+    
+    def __init__(self):
+        self.mutex = threading.Lock()
+        self.locks = {}
+
+class SessionLockTable:
+    """
+    Tabla de bloqueos por clave de sesión repartida en fragmentos.
+    """
+    
+    def __init__(self, shards: int = SESSION_LOCK_SHARDS):
+        """
+        Inicializa la tabla.
+        
+        Args:
+            shards: Número de fragmentos
+        """
+        self._shards = [_LockShard() for _ in range(max(shards, 1))]
+        self._stats_lock = threading.Lock()
+        self._acquisitions = 0
+        self._contended = 0
+        self._wait_seconds = 0.0
+    
+    def _register(self, session_key: Hashable) -> list:
+        """Registra un turno de la sesión y devuelve su entrada [bloqueo, turnos, turnos asíncronos en espera]"""
+        shard = self._shards[hash(session_key) % len(self._shards)]
+        with shard.mutex:
+            entry = shard.locks.get(session_key)
+            if entry is None:
+                entry = [threading.Lock(), 0, deque()]
+                shard.locks[session_key] = entry
+            entry[1] += 1
+        return entry
+    
+    def _release(self, session_key: Hashable, entry: list, locked: bool = True) -> None:
+        """
+        Libera el bloqueo (si locked), despierta al primer turno asíncrono en
+        espera y elimina la entrada si ningún turno la usa.
+        """
+        shard = self._shards[hash(session_key) % len(self._shards)]
+        if locked:
+            entry[0].release()
+        with shard.mutex:
+            entry[1] -= 1
+            if locked:
+                self._wake(entry)
+            if entry[1] == 0:
+                del shard.locks[session_key]
+    
+    @staticmethod
+    def _wake(entry: list) -> None:
+        """Despierta al primer turno asíncrono en espera (con el mutex del fragmento adquirido)"""
+        while entry[2]:
+            loop, waiter = entry[2].popleft()
+            if not waiter.done():
+                loop.call_soon_threadsafe(lambda w=waiter: w.done() or w.set_result(None))
+                return
+    
+    def _record(self, session_key: Hashable, contended: bool, waited: float) -> None:
+        """Actualiza las métricas de una adquisición"""
+        if contended:
+            logger.debug(f"Turno de la sesión {session_key} esperó {waited * 1000:.1f} ms")
+        with self._stats_lock:
+            self._acquisitions += 1
+            if contended:
+                self._contended += 1
+                self._wait_seconds += waited
+    
+    @contextmanager
+    def hold(self, session_key: Hashable) -> Iterator[None]:
+        """
+        Adquiere el bloqueo de una sesión durante el bloque with.
+        
+        Args:
+            session_key: Clave de la sesión
+        """
+        entry = self._register(session_key)
+        lock = entry[0]
+        contended = not lock.acquire(blocking=False)
+        waited = 0.0
+        if contended:
+            start = time.perf_counter()
+            lock.acquire()
+            waited = time.perf_counter() - start
+        self._record(session_key, contended, waited)
+        
+        try:
+            yield
+        finally:
+            self._release(session_key, entry)
+    
+    @asynccontextmanager
+    async def hold_async(self, session_key: Hashable) -> AsyncIterator[None]:
+        """
+        Versión para corrutinas de hold: comparte los bloqueos con los turnos
+        síncronos y, si la sesión está ocupada, espera en el bucle de eventos
+        sin bloquearlo ni ocupar un hilo del executor (que necesitan los turnos
+        en curso para terminar y liberar el bloqueo).
+        
+        Args:
+            session_key: Clave de la sesión
+        """
+        entry = self._register(session_key)
+        lock = entry[0]
+        shard = self._shards[hash(session_key) % len(self._shards)]
+        loop = asyncio.get_running_loop()
+        contended = False
+        start = time.perf_counter()
+        while True:
+            # Probar y apuntarse a la vez: un _release posterior verá al turno en espera
+            with shard.mutex:
+                if lock.acquire(blocking=False):
+                    break
+                waiter = loop.create_future()
+                entry[2].append((loop, waiter))
+            contended = True
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                with shard.mutex:
+                    if (loop, waiter) in entry[2]:
+                        entry[2].remove((loop, waiter))
+                    else:
+                        # Ya lo habían despertado: el aviso pasa al siguiente
+                        self._wake(entry)
+                self._release(session_key, entry, locked=False)
+                raise
+        self._record(session_key, contended, time.perf_counter() - start if contended else 0.0)
+        
+        try:
+            yield
+        finally:
+            self._release(session_key, entry)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Devuelve las métricas de los bloqueos.
+        
+        Returns:
+            Adquisiciones, adquisiciones con espera, tiempo total de espera y
+            sesiones con turnos en curso
+        """
+        active = 0
+        for shard in self._shards:
+            with shard.mutex:
+                active += len(shard.locks)
+        with self._stats_lock:
+            return {
+                'shards': len(self._shards),
+                'acquisitions': self._acquisitions,
+                'contended': self._contended,
+                'wait_seconds': round(self._wait_seconds, 3),
+                'active_sessions': active
+            }
@@ -0,0 +1,176 @@
+"""
+Compresión de instantáneas de contexto con diccionario entrenado.
+Los contextos de conversación tienen siempre la misma forma (claves de
+nivel superior, mensajes {"role": ..., "content": ...}, estado de
+sentimiento, metadatos de persistencia...), así que un diccionario
+entrenado con instantáneas reales permite comprimir bien incluso los
+contextos pequeños.
+
+Se usa zstd (paquete opcional zstandard) si está instalado y, si no, zlib
+con un diccionario predefinido construido con los fragmentos más
+frecuentes de las muestras.
+"""
+import re
+import zlib
+from collections import Counter
+from typing import List, Optional
+import logging
+
+# Importar zstd si está disponible
+try:
+    import zstandard
+    ZSTD_SUPPORT = True
+except ImportError:
+    ZSTD_SUPPORT = False
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+CODEC_ZSTD = 'zstd'
+CODEC_ZLIB = 'zlib'
+
+# Tamaño máximo útil de un diccionario zlib (ventana de 32 KB)
+ZLIB_MAX_DICTIONARY_SIZE = 32768
+
+# Niveles de compresión: las instantáneas se comprimen fuera del camino de respuesta
+ZSTD_LEVEL = 9
+ZLIB_LEVEL = 9
+
+# Fragmentos candidatos para el diccionario zlib: cadenas JSON (claves y
+# valores) con el separador que las sigue
+_SEGMENT_RE = re.compile(r'"(?:[^"\\]|\\.){1,160}"[:,]?')
+
+def resolve_codec(name: str) -> Optional[str]:
+    """
+    Determina el códec efectivo a partir del configurado.
+    
+    Args:
+        name: 'auto', 'zstd', 'zlib' o 'none'
+        
+    Returns:
+        Códec disponible o None si la compresión está desactivada
+    """
+    if name == 'none':
+        return None
+    if name == CODEC_ZLIB:
+        return CODEC_ZLIB
+    if name == CODEC_ZSTD and not ZSTD_SUPPORT:
+        logger.warning("zstandard no está instalado, las instantáneas se comprimen con zlib")
+        return CODEC_ZLIB
+    return CODEC_ZSTD if ZSTD_SUPPORT else CODEC_ZLIB
+
+def _train_zlib_dictionary(samples: List[bytes], size: int) -> bytes:
+    """
+    Construye un diccionario zlib con los fragmentos más frecuentes.
+    
+    Cada fragmento puntúa por el número de muestras en que aparece por su
+    longitud; los de mayor puntuación se colocan al final del diccionario,
+    que es la parte más cercana a los datos en la ventana de deflate.
+    
+    Args:
+        samples: JSON compacto de instantáneas representativas
+        size: Tamaño máximo del diccionario
+        
+    Returns:
+        Bytes del diccionario
+    """
+    size = min(size, ZLIB_MAX_DICTIONARY_SIZE)
+    counts = Counter()
+    for sample in samples:
+        counts.update(set(_SEGMENT_RE.findall(sample.decode('utf-8', errors='ignore'))))
+    
+    minimum = 2 if len(samples) > 1 else 1
+    candidates = sorted(
+        ((count * len(segment), segment) for segment, count in counts.items() if count >= minimum),
+        reverse=True
+    )
+    chosen = []
+    total = 0
+    for _, segment in candidates:
+        encoded = segment.encode('utf-8')
+        if total + len(encoded) > size:
+            continue
+        chosen.append(encoded)
+        total += len(encoded)
+    return b''.join(reversed(chosen))
+
+def train_dictionary(codec: str, samples: List[bytes], size: int) -> bytes:
+    """
+    Entrena un diccionario de compresión con instantáneas de ejemplo.
+    
+    Args:
+        codec: CODEC_ZSTD o CODEC_ZLIB
+        samples: JSON compacto de instantáneas representativas
+        size: Tamaño máximo del diccionario en bytes
+        
+    Returns:
+        Bytes del diccionario
+    """
+    if codec == CODEC_ZSTD:
+        try:
+            return zstandard.train_dictionary(size, samples).as_bytes()
+        except zstandard.ZstdError as e:
+            # Con pocas muestras el entrenador de zstd falla; el diccionario de fragmentos sirve igual
+            logger.warning(f"No se pudo entrenar el diccionario zstd ({str(e)}), se usan fragmentos frecuentes")
+            return _train_zlib_dictionary(samples, size)
+    return _train_zlib_dictionary(samples, size)
+
+class SnapshotCodec:
+    """
+    Compresor y descompresor de instantáneas con un diccionario concreto.
+    """
+    
+    def __init__(self, codec: str, dictionary: bytes = b''):
+        """
+        Inicializa el códec.
+        
+        Args:
+            codec: CODEC_ZSTD o CODEC_ZLIB
+            dictionary: Diccionario entrenado (vacío = sin diccionario)
+        """
+        if codec == CODEC_ZSTD and not ZSTD_SUPPORT:
+            raise RuntimeError("Instantáneas comprimidas con zstd, pero zstandard no está instalado")
+        if codec not in (CODEC_ZSTD, CODEC_ZLIB):
+            raise ValueError(f"Códec de instantáneas desconocido: {codec}")
+        self.codec = codec
+        self.dictionary = dictionary
+        if codec == CODEC_ZSTD:
+            zstd_dict = zstandard.ZstdCompressionDict(dictionary) if dictionary else None
+            self._compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL, dict_data=zstd_dict)
+            self._decompressor = zstandard.ZstdDecompressor(dict_data=zstd_dict)
+    
+    def compress(self, data: bytes) -> bytes:
+        """
+        Comprime los bytes de una instantánea.
+        
+        Args:
+            data: JSON compacto codificado en UTF-8
+            
+        Returns:
+            Bytes comprimidos
+        """
+        if self.codec == CODEC_ZSTD:
+            return self._compressor.compress(data)
+        if self.dictionary:
+            compressor = zlib.compressobj(ZLIB_LEVEL, zdict=self.dictionary)
+        else:
+            compressor = zlib.compressobj(ZLIB_LEVEL)
+        return compressor.compress(data) + compressor.flush()
+    
+    def decompress(self, data: bytes) -> bytes:
+        """
+        Descomprime los bytes de una instantánea.
+        
+        Args:
+            data: Bytes comprimidos con este códec y diccionario
+            
+        Returns:
+            JSON compacto codificado en UTF-8
+        """
+        if self.codec == CODEC_ZSTD:
+            return self._decompressor.decompress(data)
+        if self.dictionary:
+            decompressor = zlib.decompressobj(zdict=self.dictionary)
+        else:
+            decompressor = zlib.decompressobj()
+        return decompressor.decompress(data) + decompressor.flush()
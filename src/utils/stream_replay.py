@@ -0,0 +1,339 @@
+"""
+Búferes de reanudación de los streams SSE (cabecera Last-Event-ID).
+
+Cuando la conexión de un EventSource se corta (p. ej. en una red móvil), el
+navegador se reconecta a la misma URL; sin más, eso volvía a enviar el
+mensaje, lanzaba otra generación del LLM y duplicaba el turno en el contexto.
+Cada evento de un stream reanudable lleva ahora un id "<stream>-<n>" y se
+guarda en un ReplayBuffer mientras se genera la respuesta. La generación ya
+no depende de la conexión: si el cliente se va, termina igualmente. Al
+reconectar, el navegador envía el último id recibido y el servidor envía los
+eventos posteriores y sigue la generación en curso (o reproduce la ya
+terminada) sin volver a llamar al agente.
+
+Límites:
+- STREAM_REPLAY_MAX_BYTES por stream: al superarlos se descartan sus eventos
+  más antiguos (una reconexión anterior a ellos ya no se puede reanudar);
+- STREAM_REPLAY_TTL: segundos que se conserva un stream terminado;
+- STREAM_REPLAY_TOTAL_BYTES en el proceso: si se superan, se descartan antes
+  de tiempo los streams terminados más antiguos.
+
+Los búferes son del proceso: con varios workers, la reconexión tiene que
+llegar al mismo (sesiones persistentes en el balanceador).
+"""
+import time
+import uuid
+import asyncio
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, Tuple, Iterator, AsyncIterator
+import logging
+
+from core.config import STREAM_REPLAY_MAX_BYTES, STREAM_REPLAY_TOTAL_BYTES, STREAM_REPLAY_TTL, STREAM_RETRY_MS
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+class StreamExpired(LookupError):
+    """El stream no se puede reanudar: no existe, caducó o ya no tiene los eventos pedidos"""
+
+class ReplayBuffer:
+    """
+    Eventos numerados de un stream. Un productor los añade (append) y
+    cualquier número de conexiones los siguen (follow / follow_async).
+    """
+    
+    def __init__(self, registry: 'StreamReplayRegistry', owner: str, max_bytes: int):
+        """
+        Inicializa el búfer.
+        
+        Args:
+            registry: Registro del proceso
+            owner: Clave de la sesión que puede reanudar el stream
+            max_bytes: Bytes de eventos que se conservan
+        """
+        self.registry = registry
+        self.stream_id = uuid.uuid4().hex
+        self.owner = owner
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.done = False
+        # Tarea que produce los eventos en el servidor ASGI (referencia fuerte)
+        self.task = None
+        self._frames: List[str] = []
+        self._first_seq = 1
+        self._next_seq = 1
+        self._cond = threading.Condition()
+        self._waiters: List[Tuple[asyncio.AbstractEventLoop, asyncio.Event]] = []
+    
+    def event_id(self, seq: int) -> str:
+        """Id SSE del evento seq"""
+        return f"{self.stream_id}-{seq}"
+    
+    def open(self) -> str:
+        """
+        Registra el stream para que se pueda reanudar y devuelve su primer
+        frame: sin datos, solo el tiempo de reconexión y el id 0, de modo que
+        el navegador envíe Last-Event-ID aunque se corte antes del primer evento.
+        
+        Returns:
+            Frame SSE inicial
+        """
+        self.registry._register(self)
+        return f"retry: {STREAM_RETRY_MS}\nid: {self.event_id(0)}\n\n"
+    
+    def append(self, event: str) -> str:
+        """
+        Numera un evento SSE, lo guarda y despierta a las conexiones que siguen el stream.
+        
+        Args:
+            event: Evento SSE (data: ...)
+            
+        Returns:
+            Evento con su línea id
+        """
+        with self._cond:
+            frame = f"id: {self.event_id(self._next_seq)}\n{event}"
+            self._frames.append(frame)
+            self._next_seq += 1
+            added = len(frame)
+            self.size += added
+            if self.size > self.max_bytes and len(self._frames) > 1:
+                # Se descarta de una vez hasta 3/4 del límite para no recortar en cada evento
+                drop = 0
+                while self.size > self.max_bytes * 3 // 4 and drop < len(self._frames) - 1:
+                    self.size -= len(self._frames[drop])
+                    added -= len(self._frames[drop])
+                    drop += 1
+                del self._frames[:drop]
+                self._first_seq += drop
+            self._notify()
+        self.registry._add_bytes(added)
+        return frame
+    
+    def close(self) -> None:
+        """
+        Marca el stream como terminado; se conserva STREAM_REPLAY_TTL segundos.
+        """
+        with self._cond:
+            if self.done:
+                return
+            self.done = True
+            self._notify()
+        self.registry._finish(self)
+    
+    def _notify(self) -> None:
+        """Despierta a los consumidores (con self._cond adquirido)"""
+        self._cond.notify_all()
+        waiters, self._waiters = self._waiters, []
+        for loop, waiter in waiters:
+            try:
+                running = asyncio.get_running_loop()
+            except RuntimeError:
+                running = None
+            if running is loop:
+                waiter.set()
+            else:
+                loop.call_soon_threadsafe(waiter.set)
+    
+    def _frames_after(self, seq: int) -> List[str]:
+        """Eventos posteriores a seq (con self._cond adquirido)"""
+        if seq + 1 < self._first_seq:
+            raise StreamExpired(f"Los eventos posteriores a {self.event_id(seq)} ya se descartaron")
+        return self._frames[seq + 1 - self._first_seq:]
+    
+    def check(self, seq: int) -> None:
+        """
+        Comprueba que se puede reanudar el stream tras el evento seq.
+        
+        Raises:
+            StreamExpired: Si seq no es un evento del stream o ya se descartaron los siguientes
+        """
+        with self._cond:
+            if seq < 0 or seq >= self._next_seq:
+                raise StreamExpired(f"El stream {self.stream_id} no tiene el evento {seq}")
+            self._frames_after(seq)
+    
+    def follow(self, after: int) -> Iterator[str]:
+        """
+        Sigue el stream desde el evento after, esperando en el hilo actual a
+        los siguientes hasta que termina.
+        
+        Args:
+            after: Último evento recibido por el cliente
+            
+        Returns:
+            Iterador de eventos SSE
+            
+        Raises:
+            StreamExpired: Si el cliente se queda atrás y se descartan sus eventos
+        """
+        seq = after
+        while True:
+            with self._cond:
+                while not self.done and seq + 1 >= self._next_seq:
+                    self._cond.wait()
+                frames = self._frames_after(seq)
+                done = self.done
+            yield from frames
+            seq += len(frames)
+            if done:
+                return
+    
+    async def follow_async(self, after: int) -> AsyncIterator[str]:
+        """
+        Versión para corrutinas de follow: espera en el bucle de eventos.
+        
+        Args:
+            after: Último evento recibido por el cliente
+            
+        Returns:
+            Iterador asíncrono de eventos SSE
+        """
+        loop = asyncio.get_running_loop()
+        seq = after
+        while True:
+            waiter = None
+            with self._cond:
+                frames = self._frames_after(seq)
+                done = self.done
+                if not frames and not done:
+                    waiter = asyncio.Event()
+                    self._waiters.append((loop, waiter))
+            if waiter is not None:
+                try:
+                    await waiter.wait()
+                finally:
+                    with self._cond:
+                        if (loop, waiter) in self._waiters:
+                            self._waiters.remove((loop, waiter))
+                continue
+            for frame in frames:
+                yield frame
+            seq += len(frames)
+            if done:
+                return
+
+class StreamReplayRegistry:
+    """
+    Streams reanudables del proceso, indexados por id.
+    """
+    
+    def __init__(self, max_bytes: int = STREAM_REPLAY_MAX_BYTES, total_bytes: int = STREAM_REPLAY_TOTAL_BYTES,
+                 ttl: float = STREAM_REPLAY_TTL):
+        """
+        Inicializa el registro.
+        
+        Args:
+            max_bytes: Bytes de eventos que se conservan por stream
+            total_bytes: Bytes de eventos que se conservan en total
+            ttl: Segundos que se conserva un stream terminado
+        """
+        self.max_bytes = max_bytes
+        self.total_bytes = total_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._streams: Dict[str, ReplayBuffer] = {}
+        # Streams terminados, en orden de finalización (id -> instante)
+        self._finished: 'OrderedDict[str, float]' = OrderedDict()
+        self._bytes = 0
+        self._created = 0
+        self._resumed = 0
+        self._expired = 0
+        self._evicted = 0
+    
+    def create(self, owner: str) -> ReplayBuffer:
+        """
+        Crea el búfer de un stream nuevo; se registra al abrirlo (ReplayBuffer.open).
+        
+        Args:
+            owner: Clave de la sesión que puede reanudarlo
+            
+        Returns:
+            ReplayBuffer del stream
+        """
+        return ReplayBuffer(self, owner, self.max_bytes)
+    
+    def resume(self, last_event_id: str, owner: str) -> Tuple[ReplayBuffer, int]:
+        """
+        Busca el stream de un id recibido en Last-Event-ID.
+        
+        Args:
+            last_event_id: Último id recibido por el navegador
+            owner: Clave de la sesión de la petición
+            
+        Returns:
+            Tupla (búfer del stream, número del último evento recibido)
+            
+        Raises:
+            StreamExpired: Si el stream no existe, es de otra sesión, caducó o
+                ya no tiene los eventos siguientes
+        """
+        stream_id, _, seq = last_event_id.strip().rpartition('-')
+        with self._lock:
+            self._sweep(time.monotonic())
+            buffer = self._streams.get(stream_id)
+        try:
+            if buffer is None or not owner or buffer.owner != owner:
+                raise StreamExpired(f"No hay ningún stream reanudable con el id {last_event_id!r}")
+            buffer.check(int(seq) if seq.isdigit() else -1)
+        except StreamExpired:
+            with self._lock:
+                self._expired += 1
+            raise
+        with self._lock:
+            self._resumed += 1
+        return buffer, int(seq)
+    
+    def _register(self, buffer: ReplayBuffer) -> None:
+        """Añade un stream que empieza a generarse"""
+        with self._lock:
+            self._sweep(time.monotonic())
+            self._streams[buffer.stream_id] = buffer
+            self._created += 1
+    
+    def _add_bytes(self, added: int) -> None:
+        """Actualiza los bytes en uso tras añadir (y recortar) eventos"""
+        with self._lock:
+            self._bytes += added
+    
+    def _finish(self, buffer: ReplayBuffer) -> None:
+        """Pasa un stream a la lista de terminados"""
+        with self._lock:
+            if buffer.stream_id in self._streams:
+                self._finished[buffer.stream_id] = time.monotonic()
+            self._sweep(time.monotonic())
+    
+    def _sweep(self, now: float) -> None:
+        """Descarta los streams terminados caducados o que exceden el total (con self._lock adquirido)"""
+        while self._finished:
+            stream_id, finished_at = next(iter(self._finished.items()))
+            if now - finished_at < self.ttl and self._bytes <= self.total_bytes:
+                break
+            del self._finished[stream_id]
+            buffer = self._streams.pop(stream_id)
+            self._bytes -= buffer.size
+            if now - finished_at < self.ttl:
+                self._evicted += 1
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Devuelve las métricas de los streams reanudables.
+        
+        Returns:
+            Streams creados, reanudados, reconexiones que no se pudieron
+            reanudar, streams descartados por el límite total, streams en
+            memoria (en curso y terminados) y bytes en uso
+        """
+        with self._lock:
+            return {
+                'created': self._created,
+                'resumed': self._resumed,
+                'expired': self._expired,
+                'evicted': self._evicted,
+                'running': len(self._streams) - len(self._finished),
+                'finished': len(self._finished),
+                'bytes': self._bytes,
+                'max_bytes': self.total_bytes,
+                'ttl': self.ttl
+            }